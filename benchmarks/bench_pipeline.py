@@ -0,0 +1,542 @@
+"""
+Benchmark del pipeline de análisis completo con imágenes sintéticas.
+
+Genera conjuntos de imágenes reproducibles (semilla fija) con los
+generadores del proyecto (generar_imagenes_prueba.py y
+ejemplos/generar_muestras.py) a varias densidades y resoluciones, y mide
+cada etapa del análisis de una muestra tal como lo hace la interfaz:
+
+    carga -> detección -> morfología -> anotación -> guardado -> DataFrame
+          -> estadística -> gráficos -> Excel
+
+Las etapas de detección, morfología y anotación llaman a los mismos métodos
+que YOLODetector.detect_particles (predict_boxes, measure_particles y
+annotate_image), así que el benchmark mide el código de producción.
+
+Funciona sin conexión: por defecto usa un YOLOv8n construido localmente
+desde su configuración con pesos aleatorios (semilla fija), así que mide
+el coste del pipeline, no la calidad del modelo. Con pesos aleatorios el
+número de detecciones no sigue a la imagen y cambia con el entorno; por
+eso se guardan las partículas de cada carga y --compare avisa si difieren,
+ya que las etapas posteriores a la detección dependen de ese número. Con
+--model se usa un modelo entrenado.
+
+El resultado se guarda en JSON (benchmarks/results/) con la información
+del entorno, y --compare compara dos resultados y marca las etapas que
+empeoran más del umbral (código de salida 1 si hay regresiones).
+
+Uso:
+    python benchmarks/bench_pipeline.py                  # matriz completa
+    python benchmarks/bench_pipeline.py --quick          # una carga pequeña
+    python benchmarks/bench_pipeline.py --baseline base.json
+    python benchmarks/bench_pipeline.py --compare base.json nuevo.json
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+import generar_imagenes_prueba
+from ejemplos.generar_muestras import generate_synthetic_microplastics
+
+
+BENCHMARK_VERSION = 2
+BENCHMARK_DIR = PROJECT_ROOT / "benchmarks"
+RESULTS_DIR = BENCHMARK_DIR / "results"
+CACHE_DIR = BENCHMARK_DIR / ".cache"
+
+STAGES = ['load', 'detect', 'morphology', 'annotate', 'save', 'dataframe', 'stats', 'plots', 'excel']
+
+# Cargas de trabajo: generador, resolución (alto, ancho) y partículas por megapíxel
+WORKLOADS = [
+    {'name': 'muestras_1mp_baja', 'generator': 'muestras', 'size': (1024, 1024), 'density': 20},
+    {'name': 'muestras_1mp_alta', 'generator': 'muestras', 'size': (1024, 1024), 'density': 120},
+    {'name': 'muestras_4mp_baja', 'generator': 'muestras', 'size': (2048, 2048), 'density': 20},
+    {'name': 'muestras_4mp_alta', 'generator': 'muestras', 'size': (2048, 2048), 'density': 120},
+    {'name': 'prueba_mixta', 'generator': 'prueba', 'size': (800, 1000), 'density': None},
+]
+QUICK_WORKLOADS = ['muestras_1mp_baja']
+
+# Una etapa empeora si su mediana sube más del umbral y más que el ruido mínimo
+REGRESSION_THRESHOLD = 0.15
+NOISE_FLOOR_MS = 2.0
+
+
+def generate_workload(workload: Dict, n_images: int, seed: int, output_dir: Path) -> List[Path]:
+    """
+    Genera (o reutiliza) las imágenes de una carga de trabajo.
+    
+    Las imágenes dependen solo de la carga, el índice y la semilla, así que
+    dos ejecuciones con la misma semilla miden exactamente las mismas.
+    
+    Args:
+        workload: Entrada de WORKLOADS.
+        n_images: Número de imágenes.
+        seed: Semilla base.
+        output_dir: Carpeta de caché de imágenes.
+    
+    Returns:
+        Rutas de las imágenes.
+    """
+    height, width = workload['size']
+    folder = output_dir / f"{workload['name']}_s{seed}"
+    folder.mkdir(parents=True, exist_ok=True)
+    
+    paths = []
+    for index in range(n_images):
+        path = folder / f"{workload['name']}_{index:03d}.jpg"
+        paths.append(path)
+        if path.exists():
+            continue
+        
+        # Los generadores usan el estado global de numpy
+        np.random.seed(seed * 1000 + index)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if workload['generator'] == 'muestras':
+                generate_synthetic_microplastics(
+                    output_path=str(path),
+                    num_particles=max(1, round(workload['density'] * height * width / 1e6)),
+                    image_size=(height, width)
+                )
+            else:
+                # Alterna los tres tipos de muestra de generar_imagenes_prueba
+                generators = [generar_imagenes_prueba.generar_imagen_mixta,
+                              generar_imagenes_prueba.generar_imagen_fibras,
+                              generar_imagenes_prueba.generar_imagen_particulas]
+                generators[index % len(generators)](str(path))
+    return paths
+
+
+def build_tiny_model(output_path: Path, seed: int, class_names: List[str]) -> Path:
+    """
+    Construye un YOLOv8n con pesos aleatorios sin descargar nada.
+    
+    Args:
+        output_path: Archivo .pt a crear (se reutiliza si existe).
+        seed: Semilla de los pesos.
+        class_names: Nombres de las clases del detector.
+    
+    Returns:
+        Ruta del modelo.
+    """
+    if output_path.exists():
+        return output_path
+    
+    import torch
+    from ultralytics.nn.tasks import DetectionModel
+    
+    torch.manual_seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = DetectionModel('yolov8n.yaml', nc=len(class_names), verbose=False)
+    model.names = dict(enumerate(class_names))
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Mismo formato de checkpoint que guarda el entrenamiento de ultralytics
+    torch.save({'model': model.half(), 'train_args': {}, 'date': None, 'version': None}, output_path)
+    return output_path
+
+
+def environment_info() -> Dict:
+    """Versiones y máquina, para saber si dos resultados son comparables."""
+    def version(module_name):
+        try:
+            return __import__(module_name).__version__
+        except Exception:
+            return None
+    
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+        'packages': {name: version(name) for name in
+                     ['numpy', 'cv2', 'pandas', 'matplotlib', 'scipy', 'torch', 'ultralytics']},
+    }
+    try:
+        import torch
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+class PipelineRunner:
+    """Ejecuta las etapas del análisis de una muestra y acumula su tiempo."""
+    
+    def __init__(self, detector, work_dir: Path):
+        """
+        Inicializa el ejecutor.
+        
+        Args:
+            detector: YOLODetector ya cargado.
+            work_dir: Carpeta temporal para gráficos y Excel.
+        """
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from src.statistical_analysis import StatisticalAnalyzer
+        from src.size_sketch import SizeSketch
+        from src.visualization import DataVisualizer
+        
+        self._plt = plt
+        self._sketch_class = SizeSketch
+        self.detector = detector
+        self.analyzer = StatisticalAnalyzer()
+        self.visualizer = DataVisualizer()
+        self.work_dir = work_dir
+        self.errors: Dict[str, str] = {}
+    
+    def _timed(self, timings: Dict[str, float], stage: str, func: Callable):
+        """Ejecuta una etapa y suma su tiempo; los errores se guardan y la etapa se omite."""
+        if stage in self.errors:
+            return None
+        start = time.perf_counter()
+        try:
+            return func()
+        except Exception as e:
+            self.errors[stage] = f"{type(e).__name__}: {e}"
+            return None
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    
+    def _save(self, annotated: np.ndarray, sample_id: str):
+        """Guarda la imagen anotada como ImageProcessor (sin el mensaje por imagen)."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.detector.save_annotated_image(annotated, self.work_dir / f"yolo_{sample_id}.jpg")
+    
+    def _stats(self, df, particles, sample_id):
+        """Análisis de tamaño y clase y reporte (desde el resumen de tamaños)."""
+        self.analyzer.analyze_size_distribution(df)
+        self.analyzer.analyze_class_distribution(df)
+        sketch = self._sketch_class()
+        sketch.add_particles(particles, sample_id)
+        return self.analyzer.generate_summary_report(None, sample_id, sketch=sketch)
+    
+    def _plots(self, df, sample_id):
+        """Gráficos de tamaño, frecuencia y clase (se cierran para no acumular figuras)."""
+        for name, plot in (('size', self.visualizer.plot_size_distribution),
+                           ('frequency', self.visualizer.plot_size_frequency_curve),
+                           ('class', self.visualizer.plot_class_distribution)):
+            fig = plot(df, sample_id, str(self.work_dir / f"{sample_id}_{name}.png"))
+            self._plt.close(fig)
+    
+    def run_image(self, image_path: Path, timings: Dict[str, float]) -> int:
+        """
+        Analiza una imagen etapa por etapa.
+        
+        Returns:
+            Número de partículas detectadas.
+        """
+        sample_id = image_path.stem
+        image = self._timed(timings, 'load', lambda: cv2.imread(str(image_path)))
+        if image is None:
+            raise FileNotFoundError(f"No se pudo cargar la imagen: {image_path}")
+        
+        # Las mismas llamadas que detect_particles, cronometradas por separado
+        prediction = self._timed(timings, 'detect', lambda: self.detector.predict_boxes([image], batch_size=1)[0])
+        if prediction is None:
+            return 0
+        particles = self._timed(timings, 'morphology',
+                                lambda: self.detector.measure_particles(image, prediction)) or []
+        annotated = self._timed(timings, 'annotate', lambda: self.detector.annotate_image(image, particles))
+        if annotated is not None:
+            self._timed(timings, 'save', lambda: self._save(annotated, sample_id))
+        
+        df = self._timed(timings, 'dataframe',
+                         lambda: self.analyzer.particles_to_dataframe(particles, sample_id))
+        if df is not None and len(df):
+            self._timed(timings, 'stats', lambda: self._stats(df, particles, sample_id))
+            self._timed(timings, 'plots', lambda: self._plots(df, sample_id))
+            self._timed(timings, 'excel',
+                        lambda: df.to_excel(self.work_dir / f"{sample_id}_data.xlsx", index=False))
+        return len(particles)
+
+
+def run_benchmark(workloads: List[Dict],
+                  n_images: int = 3,
+                  repeats: int = 3,
+                  seed: int = 0,
+                  model_path: Optional[str] = None,
+                  imgsz: int = 640,
+                  confidence_threshold: float = 0.01) -> Dict:
+    """
+    Mide todas las cargas de trabajo.
+    
+    Cada repetición analiza todas las imágenes de la carga; antes se hace
+    una pasada de calentamiento que no se mide (primera inferencia,
+    cachés de fuentes de matplotlib...).
+    
+    Args:
+        workloads: Entradas de WORKLOADS.
+        n_images: Imágenes por carga.
+        repeats: Repeticiones medidas.
+        seed: Semilla de las imágenes y del modelo aleatorio.
+        model_path: Modelo entrenado; None = YOLOv8n aleatorio local.
+        imgsz: Tamaño de inferencia.
+        confidence_threshold: Umbral de confianza (bajo con el modelo
+                              aleatorio para que haya partículas que medir).
+    
+    Returns:
+        Diccionario con 'environment', 'config' y 'workloads'.
+    """
+    from src.yolo_detector import YOLODetector
+    
+    if model_path is None:
+        model_path = str(build_tiny_model(CACHE_DIR / f"yolov8n_random_s{seed}.pt",
+                                          seed, YOLODetector.CLASS_NAMES))
+    
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = YOLODetector(model_path=model_path, imgsz=imgsz,
+                                confidence_threshold=confidence_threshold)
+    model_load_s = time.perf_counter() - start
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        runner = PipelineRunner(detector, Path(work_dir))
+        for workload in workloads:
+            print(f"⏱️ {workload['name']} ({n_images} imágenes × {repeats} repeticiones)")
+            paths = generate_workload(workload, n_images, seed, CACHE_DIR / "images")
+            runner.errors = {}
+            
+            # Calentamiento
+            for path in paths:
+                runner.run_image(path, {})
+            
+            runs = []
+            counts = []
+            for _ in range(repeats):
+                timings: Dict[str, float] = {}
+                counts = [runner.run_image(path, timings) for path in paths]
+                runs.append(timings)
+            
+            stages = {}
+            for stage in STAGES:
+                values = [run[stage] for run in runs if stage in run]
+                if not values:
+                    continue
+                stages[stage] = {
+                    'median_ms_per_image': statistics.median(values) / len(paths) * 1000,
+                    'min_ms_per_image': min(values) / len(paths) * 1000,
+                    'runs_s': [round(v, 6) for v in values],
+                }
+            total = [sum(run.values()) for run in runs]
+            results[workload['name']] = {
+                'workload': dict(workload, size=list(workload['size'])),
+                'images': len(paths),
+                'particles_per_run': sum(counts),
+                'particles_per_image': counts,
+                'total_ms_per_image': statistics.median(total) / len(paths) * 1000,
+                'stages': stages,
+                'errors': dict(runner.errors),
+            }
+            for stage, error in runner.errors.items():
+                print(f"   ⚠️ Etapa {stage} omitida: {error}")
+    
+    return {
+        'version': BENCHMARK_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'config': {
+            'seed': seed, 'n_images': n_images, 'repeats': repeats, 'imgsz': imgsz,
+            'confidence_threshold': confidence_threshold,
+            'model': Path(model_path).name, 'model_load_s': round(model_load_s, 4),
+        },
+        'workloads': results,
+    }
+
+
+def compare_results(baseline: Dict, current: Dict,
+                    threshold: float = REGRESSION_THRESHOLD,
+                    noise_floor_ms: float = NOISE_FLOOR_MS) -> List[Dict]:
+    """
+    Compara dos resultados etapa por etapa.
+    
+    Args:
+        baseline: Resultado de referencia.
+        current: Resultado nuevo.
+        threshold: Aumento relativo de la mediana que se considera regresión (0.15 = 15 %).
+        noise_floor_ms: Aumento absoluto mínimo (ms por imagen) para marcarla.
+    
+    Returns:
+        Filas con 'workload', 'stage', 'baseline_ms', 'current_ms', 'ratio'
+        y 'status' ('regresión', 'mejora' o 'igual').
+    """
+    rows = []
+    for name, entry in current['workloads'].items():
+        base_entry = baseline['workloads'].get(name)
+        if base_entry is None:
+            continue
+        for stage in STAGES + ['total']:
+            if stage == 'total':
+                base_ms, current_ms = base_entry['total_ms_per_image'], entry['total_ms_per_image']
+            elif stage in entry['stages'] and stage in base_entry['stages']:
+                base_ms = base_entry['stages'][stage]['median_ms_per_image']
+                current_ms = entry['stages'][stage]['median_ms_per_image']
+            else:
+                continue
+            ratio = current_ms / base_ms if base_ms > 0 else float('inf')
+            if ratio > 1 + threshold and current_ms - base_ms > noise_floor_ms:
+                status = 'regresión'
+            elif ratio < 1 / (1 + threshold) and base_ms - current_ms > noise_floor_ms:
+                status = 'mejora'
+            else:
+                status = 'igual'
+            rows.append({'workload': name, 'stage': stage, 'baseline_ms': base_ms,
+                         'current_ms': current_ms, 'ratio': ratio, 'status': status})
+    return rows
+
+
+def environment_differences(baseline: Dict, current: Dict) -> List[str]:
+    """Diferencias de entorno o configuración que hacen dudosa la comparación."""
+    differences = []
+    for key in ['machine', 'processor', 'cpu_count', 'python', 'torch_threads']:
+        a, b = baseline['environment'].get(key), current['environment'].get(key)
+        if a != b:
+            differences.append(f"{key}: {a} -> {b}")
+    for name, a in baseline['environment'].get('packages', {}).items():
+        b = current['environment'].get('packages', {}).get(name)
+        if a != b:
+            differences.append(f"{name}: {a} -> {b}")
+    for key in ['seed', 'n_images', 'imgsz', 'confidence_threshold', 'model']:
+        a, b = baseline['config'].get(key), current['config'].get(key)
+        if a != b:
+            differences.append(f"config {key}: {a} -> {b}")
+    return differences
+
+
+def particle_count_differences(baseline: Dict, current: Dict) -> List[str]:
+    """Cargas con un número de partículas distinto (sus etapas posteriores a la detección no son comparables)."""
+    differences = []
+    for name, entry in current['workloads'].items():
+        base_entry = baseline['workloads'].get(name)
+        if base_entry is not None and base_entry['particles_per_image'] != entry['particles_per_image']:
+            differences.append(f"{name}: {base_entry['particles_per_run']} -> {entry['particles_per_run']}")
+    return differences
+
+
+def print_results(result: Dict) -> None:
+    """Tabla de medianas en ms por imagen."""
+    print(f"\n{'carga':<20}{'partíc.':>8}" + ''.join(f"{s:>11}" for s in STAGES) + f"{'total':>11}")
+    for name, entry in result['workloads'].items():
+        cells = ''.join(
+            f"{entry['stages'][s]['median_ms_per_image']:>11.1f}" if s in entry['stages'] else f"{'-':>11}"
+            for s in STAGES
+        )
+        print(f"{name:<20}{entry['particles_per_run']:>8}{cells}{entry['total_ms_per_image']:>11.1f}")
+
+
+def print_comparison(baseline: Dict, current: Dict, rows: List[Dict]) -> None:
+    """Muestra la comparación, con las regresiones primero."""
+    for difference in environment_differences(baseline, current):
+        print(f"⚠️ Entorno distinto ({difference}): la comparación puede no ser fiable")
+    for difference in particle_count_differences(baseline, current):
+        print(f"⚠️ Partículas distintas ({difference}): las etapas posteriores a la detección "
+              f"procesan otra cantidad de datos")
+    
+    order = {'regresión': 0, 'mejora': 1, 'igual': 2}
+    print(f"\n{'carga':<20}{'etapa':<12}{'base ms':>10}{'nuevo ms':>10}{'cambio':>9}  estado")
+    stage_order = STAGES + ['total']
+    for row in sorted(rows, key=lambda r: (order[r['status']], r['workload'], stage_order.index(r['stage']))):
+        marker = {'regresión': '❌', 'mejora': '✅', 'igual': '  '}[row['status']]
+        print(f"{row['workload']:<20}{row['stage']:<12}{row['baseline_ms']:>10.1f}{row['current_ms']:>10.1f}"
+              f"{(row['ratio'] - 1) * 100:>+8.1f}%  {marker} {row['status']}")
+
+
+def load_result(path: Path) -> Dict:
+    """Carga un resultado guardado."""
+    with open(path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    if result.get('version') != BENCHMARK_VERSION:
+        raise ValueError(f"Versión de benchmark no soportada en {path}: {result.get('version')}")
+    return result
+
+
+def main():
+    """Función principal del benchmark."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Medir el rendimiento del pipeline de análisis con imágenes sintéticas'
+    )
+    parser.add_argument('--workloads', type=str, nargs='+', default=None,
+                        choices=[w['name'] for w in WORKLOADS],
+                        help='Cargas de trabajo a medir (por defecto todas)')
+    parser.add_argument('--quick', action='store_true',
+                        help='Solo una carga pequeña, 2 imágenes y 1 repetición')
+    parser.add_argument('--images', type=int, default=3,
+                        help='Imágenes por carga de trabajo')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Repeticiones medidas de cada carga')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Semilla de las imágenes y del modelo aleatorio')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Modelo entrenado (por defecto YOLOv8n aleatorio construido localmente)')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='Tamaño de inferencia')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Archivo JSON de resultados (por defecto benchmarks/results/<fecha>.json)')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Comparar el resultado con este archivo al terminar')
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('BASE', 'NUEVO'),
+                        help='Solo comparar dos resultados ya guardados')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Aumento relativo que se considera regresión (0.15 = 15 %%)')
+    
+    args = parser.parse_args()
+    
+    if args.compare:
+        baseline, current = (load_result(Path(p)) for p in args.compare)
+    else:
+        names = QUICK_WORKLOADS if args.quick else (args.workloads or [w['name'] for w in WORKLOADS])
+        workloads = [w for w in WORKLOADS if w['name'] in names]
+        n_images, repeats = (2, 1) if args.quick else (args.images, args.repeats)
+        
+        current = run_benchmark(workloads, n_images, repeats, args.seed, args.model, args.imgsz)
+        print_results(current)
+        
+        output = Path(args.output) if args.output else \
+            RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}_{current['environment']['git_commit'] or 'local'}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=1)
+        print(f"\n✅ Resultados guardados: {output}")
+        
+        if not args.baseline:
+            return
+        baseline = load_result(Path(args.baseline))
+    
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(baseline, current, rows)
+    regressions = [r for r in rows if r['status'] == 'regresión']
+    if regressions:
+        print(f"\n❌ {len(regressions)} etapas más lentas que la referencia (umbral {args.threshold:.0%})")
+        sys.exit(1)
+    print(f"\n✅ Sin regresiones (umbral {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
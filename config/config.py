@@ -13,9 +13,17 @@ ANALYSIS_IMAGES_DIR = DATA_DIR / "analysis_images"  # Para análisis (sin XML)
 PROCESSED_IMAGES_DIR = DATA_DIR / "processed_images"
 # LabelImg guarda los XML junto a las imágenes por defecto
 ANNOTATIONS_DIR = RAW_IMAGES_DIR
+# Caché de hashes perceptuales para detectar imágenes casi duplicadas
+IMAGE_HASH_INDEX = DATA_DIR / ".image_hashes.json"
+# Mosaicos piramidales de muestras capturadas en varios campos
+MOSAICS_DIR = DATA_DIR / "mosaics"
 RESULTS_DIR = PROJECT_ROOT / "results"
 GRAPHS_DIR = RESULTS_DIR / "graphs"
 REPORTS_DIR = RESULTS_DIR / "reports"
+# Registro de modelos YOLO entrenados y exportados
+MODEL_REGISTRY_DB = PROJECT_ROOT / "yolo_training" / "model_registry.sqlite"
+# Puntuaciones y lista priorizada del aprendizaje activo
+ACTIVE_LEARNING_DIR = PROJECT_ROOT / "yolo_training" / "active_learning"
 
 # Parámetros de procesamiento de imágenes
 IMAGE_PARAMS = {
@@ -8,89 +8,33 @@ convierte a un DataFrame de pandas para análisis posterior.
 
 import sys
 from pathlib import Path
-import xml.etree.ElementTree as ET
 import pandas as pd
 
 # Agregar directorio src al path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from src.annotation_index import AnnotationIndex
 from src.image_annotation import ImageAnnotator
 from config.config import RAW_IMAGES_DIR
 
 
-def parse_labelimg_xml(xml_file):
-    """
-    Parsea un archivo XML de LabelImg.
-    
-    Args:
-        xml_file (Path): Ruta al archivo XML
-        
-    Returns:
-        list: Lista de diccionarios con información de objetos
-    """
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    
-    filename = root.find('filename').text
-    size = root.find('size')
-    width = int(size.find('width').text)
-    height = int(size.find('height').text)
-    
-    objects = []
-    
-    for obj in root.findall('object'):
-        name = obj.find('name').text
-        bndbox = obj.find('bndbox')
-        
-        xmin = int(bndbox.find('xmin').text)
-        ymin = int(bndbox.find('ymin').text)
-        xmax = int(bndbox.find('xmax').text)
-        ymax = int(bndbox.find('ymax').text)
-        
-        # Calcular dimensiones de la caja
-        box_width = xmax - xmin
-        box_height = ymax - ymin
-        box_area = box_width * box_height
-        aspect_ratio = box_width / box_height if box_height > 0 else 0
-        
-        objects.append({
-            'filename': filename,
-            'image_width': width,
-            'image_height': height,
-            'class': name,
-            'xmin': xmin,
-            'ymin': ymin,
-            'xmax': xmax,
-            'ymax': ymax,
-            'box_width': box_width,
-            'box_height': box_height,
-            'box_area': box_area,
-            'aspect_ratio': aspect_ratio
-        })
-    
-    return objects
-
-
 def annotations_to_dataframe(annotations_dir):
     """
     Convierte todas las anotaciones a un DataFrame.
     
+    Usa el índice de anotaciones: solo se leen los XML nuevos o
+    modificados desde la última ejecución.
+    
     Args:
         annotations_dir (Path): Directorio con archivos XML
         
     Returns:
         pd.DataFrame: DataFrame con todas las anotaciones
     """
-    annotations_dir = Path(annotations_dir)
-    
-    all_objects = []
+    index = AnnotationIndex(annotations_dir)
+    index.refresh()
     
-    for xml_file in annotations_dir.glob("*.xml"):
-        try:
-            objects = parse_labelimg_xml(xml_file)
-            all_objects.extend(objects)
-        except Exception as e:
-            print(f"⚠️  Error al procesar {xml_file.name}: {e}")
+    all_objects = index.records()
     
     if not all_objects:
         return pd.DataFrame()
@@ -47,6 +47,8 @@ from libs.create_ml_io import CreateMLReader
 from libs.create_ml_io import JSON_EXT
 from libs.ustr import ustr
 from libs.hashableQListWidgetItem import HashableQListWidgetItem
+from libs.fileList import FileListModel, ImageScanner, iter_image_batches, read_worklist
+from libs.prefetch import PrefetchCache, PREFETCH_RADIUS
 
 __appname__ = 'labelImg'
 
@@ -93,7 +95,13 @@ class MainWindow(QMainWindow, WindowMixin):
         self.label_file_format = settings.get(SETTING_LABEL_FILE_FORMAT, LabelFileFormat.PASCAL_VOC)
 
         # For loading all image under a directory
-        self.m_img_list = []
+        # The model is filled in batches by a background scan
+        self.file_list_model = FileListModel()
+        self.m_img_list = self.file_list_model
+        self.image_scanner = None
+        self.open_first_scanned = False
+        # Neighbouring images decoded in the background
+        self.prefetch_cache = PrefetchCache()
         self.dir_name = None
         self.label_hist = []
         self.last_open_dir = None
@@ -169,8 +177,10 @@ class MainWindow(QMainWindow, WindowMixin):
         self.dock.setObjectName(get_str('labels'))
         self.dock.setWidget(label_list_container)
 
-        self.file_list_widget = QListWidget()
-        self.file_list_widget.itemDoubleClicked.connect(self.file_item_double_clicked)
+        self.file_list_widget = QListView()
+        self.file_list_widget.setModel(self.file_list_model)
+        self.file_list_widget.setUniformItemSizes(True)
+        self.file_list_widget.doubleClicked.connect(self.file_item_double_clicked)
         file_list_layout = QVBoxLayout()
         file_list_layout.setContentsMargins(0, 0, 0, 0)
         file_list_layout.addWidget(self.file_list_widget)
@@ -522,6 +532,10 @@ class MainWindow(QMainWindow, WindowMixin):
         # Since loading the file may take some time, make sure it runs in the background.
         if self.file_path and os.path.isdir(self.file_path):
             self.queue_event(partial(self.import_dir_images, self.file_path or ""))
+        elif self.file_path and self.file_path.lower().endswith('.txt'):
+            worklist_path = self.file_path
+            self.file_path = None
+            self.queue_event(partial(self.import_worklist, worklist_path))
         elif self.file_path:
             self.queue_event(partial(self.load_file, self.file_path or ""))
 
@@ -763,8 +777,8 @@ class MainWindow(QMainWindow, WindowMixin):
             self.update_combo_box()
 
     # Tzutalin 20160906 : Add file list and dock to move faster
-    def file_item_double_clicked(self, item=None):
-        self.cur_img_idx = self.m_img_list.index(ustr(item.text()))
+    def file_item_double_clicked(self, index=None):
+        self.cur_img_idx = index.row()
         filename = self.m_img_list[self.cur_img_idx]
         if filename:
             self.load_file(filename)
@@ -950,6 +964,7 @@ class MainWindow(QMainWindow, WindowMixin):
         if label != shape.label:
             shape.label = item.text()
             shape.line_color = generate_color_by_text(shape.label)
+            self.canvas.invalidate_layer()
             self.set_dirty()
         else:  # User probably changed item visibility
             self.canvas.set_shape_visible(shape, item.checkState() == Qt.Checked)
@@ -1104,14 +1119,13 @@ class MainWindow(QMainWindow, WindowMixin):
         unicode_file_path = os.path.abspath(unicode_file_path)
         # Tzutalin 20160906 : Add file list and dock to move faster
         # Highlight the file item
-        if unicode_file_path and self.file_list_widget.count() > 0:
-            if unicode_file_path in self.m_img_list:
-                index = self.m_img_list.index(unicode_file_path)
-                file_widget_item = self.file_list_widget.item(index)
-                file_widget_item.setSelected(True)
+        if unicode_file_path and len(self.file_list_model) > 0:
+            index = self.file_list_model.row_of(unicode_file_path)
+            if index >= 0:
+                self.file_list_widget.setCurrentIndex(self.file_list_model.index(index))
             else:
-                self.file_list_widget.clear()
-                self.m_img_list.clear()
+                self.stop_image_scan()
+                self.file_list_model.clear()
 
         if unicode_file_path and os.path.exists(unicode_file_path):
             if LabelFile.is_label_file(unicode_file_path):
@@ -1132,7 +1146,10 @@ class MainWindow(QMainWindow, WindowMixin):
             else:
                 # Load image:
                 # read data first and store for saving into label file.
-                self.image_data = read(unicode_file_path, None)
+                # The neighbour prefetch may already have decoded it.
+                self.image_data = self.prefetch_cache.image(unicode_file_path)
+                if self.image_data is None:
+                    self.image_data = read(unicode_file_path, None)
                 self.label_file = None
                 self.canvas.verified = False
 
@@ -1161,6 +1178,7 @@ class MainWindow(QMainWindow, WindowMixin):
 
             counter = self.counter_str()
             self.setWindowTitle(__appname__ + ' ' + file_path + ' ' + counter)
+            self.prefetch_neighbours(unicode_file_path)
 
             # Default : select last item if there is at least one item
             if self.label_list.count():
@@ -1177,35 +1195,53 @@ class MainWindow(QMainWindow, WindowMixin):
         """
         return '[{} / {}]'.format(self.cur_img_idx + 1, self.img_count)
 
-    def show_bounding_box_from_annotation_file(self, file_path):
+    def find_annotation_file(self, file_path):
+        """Annotation file priority:
+        PascalXML > YOLO > CreateML
+        """
         if self.default_save_dir is not None:
-            basename = os.path.basename(os.path.splitext(file_path)[0])
-            xml_path = os.path.join(self.default_save_dir, basename + XML_EXT)
-            txt_path = os.path.join(self.default_save_dir, basename + TXT_EXT)
-            json_path = os.path.join(self.default_save_dir, basename + JSON_EXT)
+            basename = os.path.join(self.default_save_dir, os.path.basename(os.path.splitext(file_path)[0]))
+        else:
+            basename = os.path.splitext(file_path)[0]
 
-            """Annotation file priority:
-            PascalXML > YOLO
-            """
-            if os.path.isfile(xml_path):
-                self.load_pascal_xml_by_filename(xml_path)
-            elif os.path.isfile(txt_path):
-                self.load_yolo_txt_by_filename(txt_path)
-            elif os.path.isfile(json_path):
-                self.load_create_ml_json_by_filename(json_path, file_path)
+        for annotation_format, ext in ((FORMAT_PASCALVOC, XML_EXT), (FORMAT_YOLO, TXT_EXT), (FORMAT_CREATEML, JSON_EXT)):
+            if os.path.isfile(basename + ext):
+                return annotation_format, basename + ext
+        return None
 
+    def show_bounding_box_from_annotation_file(self, file_path):
+        annotation = self.find_annotation_file(file_path)
+        if annotation is None:
+            return
+        annotation_format, annotation_path = annotation
+
+        prefetched = self.prefetch_cache.annotation(file_path, annotation)
+        if prefetched is not None and self.file_path is not None:
+            shapes, verified = prefetched
+            self.set_format(annotation_format)
+            self.load_labels(shapes)
+            self.canvas.verified = verified
+        elif annotation_format == FORMAT_PASCALVOC:
+            self.load_pascal_xml_by_filename(annotation_path)
+        elif annotation_format == FORMAT_YOLO:
+            self.load_yolo_txt_by_filename(annotation_path)
         else:
-            xml_path = os.path.splitext(file_path)[0] + XML_EXT
-            txt_path = os.path.splitext(file_path)[0] + TXT_EXT
-            json_path = os.path.splitext(file_path)[0] + JSON_EXT
-
-            if os.path.isfile(xml_path):
-                self.load_pascal_xml_by_filename(xml_path)
-            elif os.path.isfile(txt_path):
-                self.load_yolo_txt_by_filename(txt_path)
-            elif os.path.isfile(json_path):
-                self.load_create_ml_json_by_filename(json_path, file_path)
-            
+            self.load_create_ml_json_by_filename(annotation_path, file_path)
+
+    def prefetch_neighbours(self, file_path):
+        row = self.file_list_model.row_of(file_path)
+        if row < 0:
+            return
+        # Next images first: that is the usual direction when annotating
+        rows = []
+        for offset in range(1, PREFETCH_RADIUS + 1):
+            rows.extend([row + offset, row - offset])
+        requests = []
+        for neighbour in rows:
+            if 0 <= neighbour < len(self.file_list_model):
+                path = self.file_list_model[neighbour]
+                requests.append((path, self.find_annotation_file(path)))
+        self.prefetch_cache.prefetch(requests)
 
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull()\
@@ -1245,6 +1281,9 @@ class MainWindow(QMainWindow, WindowMixin):
     def closeEvent(self, event):
         if not self.may_continue():
             event.ignore()
+        else:
+            self.stop_image_scan()
+            self.prefetch_cache.stop()
         settings = self.settings
         # If it loads images from dir, don't load it at the beginning
         if self.dir_name is None:
@@ -1280,19 +1319,30 @@ class MainWindow(QMainWindow, WindowMixin):
         if self.may_continue():
             self.load_file(filename)
 
+    def image_extensions(self):
+        return ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
+
     def scan_all_images(self, folder_path):
-        extensions = ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
         images = []
-
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relative_path = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relative_path))
-                    images.append(path)
-        natural_sort(images, key=lambda x: x.lower())
+        for batch in iter_image_batches(folder_path, self.image_extensions()):
+            images.extend(batch)
         return images
 
+    def stop_image_scan(self):
+        if self.image_scanner is not None:
+            self.image_scanner.stop()
+            self.image_scanner.batch_found.disconnect()
+            self.image_scanner.wait()
+            self.image_scanner = None
+
+    def add_scanned_images(self, paths):
+        self.file_list_model.append_paths(paths)
+        self.img_count = len(self.file_list_model)
+        # Show the first image as soon as the first batch arrives
+        if self.open_first_scanned:
+            self.open_first_scanned = False
+            self.open_next_image()
+
     def change_save_dir_dialog(self, _value=False):
         if self.default_save_dir is not None:
             path = ustr(self.default_save_dir)
@@ -1368,13 +1418,31 @@ class MainWindow(QMainWindow, WindowMixin):
         self.last_open_dir = dir_path
         self.dir_name = dir_path
         self.file_path = None
-        self.file_list_widget.clear()
-        self.m_img_list = self.scan_all_images(dir_path)
-        self.img_count = len(self.m_img_list)
+        self.stop_image_scan()
+        self.file_list_model.clear()
+        self.prefetch_cache.clear()
+        self.img_count = 0
+        self.open_first_scanned = True
+        self.image_scanner = ImageScanner(dir_path, self.image_extensions(), self)
+        self.image_scanner.batch_found.connect(self.add_scanned_images)
+        self.image_scanner.start()
+
+    def import_worklist(self, worklist_path):
+        """Load the images listed in a worklist file, keeping its order."""
+        if not self.may_continue():
+            return
+
+        paths = read_worklist(worklist_path, self.image_extensions())
+        self.stop_image_scan()
+        self.file_list_model.clear()
+        self.prefetch_cache.clear()
+        self.file_path = None
+        self.dir_name = os.path.dirname(paths[0]) if paths else None
+        self.last_open_dir = self.dir_name
+        self.file_list_model.append_paths(paths)
+        self.img_count = len(self.file_list_model)
+        self.open_first_scanned = False
         self.open_next_image()
-        for imgPath in self.m_img_list:
-            item = QListWidgetItem(imgPath)
-            self.file_list_widget.addItem(item)
 
     def verify_image(self, _value=False):
         # Proceeding next image without dialog if having any label
@@ -1522,7 +1590,8 @@ class MainWindow(QMainWindow, WindowMixin):
             idx = self.cur_img_idx
             if os.path.exists(delete_path):
                 os.remove(delete_path)
-            self.import_dir_images(self.last_open_dir)
+            self.file_list_model.remove_path(delete_path)
+            self.img_count = len(self.file_list_model)
             if self.img_count > 0:
                 self.cur_img_idx = min(idx, self.img_count - 1)
                 filename = self.m_img_list[self.cur_img_idx]
@@ -1568,6 +1637,7 @@ class MainWindow(QMainWindow, WindowMixin):
             self.line_color = color
             Shape.line_color = color
             self.canvas.set_drawing_color(color)
+            self.canvas.invalidate_layer()
             self.canvas.update()
             self.set_dirty()
 
@@ -1656,7 +1726,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.canvas.verified = create_ml_parse_reader.verified
 
     def copy_previous_bounding_boxes(self):
-        current_index = self.m_img_list.index(self.file_path)
+        current_index = self.file_list_model.row_of(self.file_path)
         if current_index - 1 >= 0:
             prev_file_path = self.m_img_list[current_index - 1]
             self.show_bounding_box_from_annotation_file(prev_file_path)
@@ -1665,6 +1735,8 @@ class MainWindow(QMainWindow, WindowMixin):
     def toggle_paint_labels_option(self):
         for shape in self.canvas.shapes:
             shape.paint_label = self.display_label_option.isChecked()
+        self.canvas.invalidate_layer()
+        self.canvas.update()
 
     def toggle_draw_square(self):
         self.canvas.set_drawing_shape_to_square(self.draw_squares_option.isChecked())
@@ -11,6 +11,7 @@ except ImportError:
 
 from libs.shape import Shape
 from libs.utils import distance
+from libs.spatialIndex import SpatialGrid
 
 CURSOR_DEFAULT = Qt.ArrowCursor
 CURSOR_POINT = Qt.PointingHandCursor
@@ -18,6 +19,11 @@ CURSOR_DRAW = Qt.CrossCursor
 CURSOR_MOVE = Qt.ClosedHandCursor
 CURSOR_GRAB = Qt.OpenHandCursor
 
+# Below this zoom, unselected shapes are drawn without vertices and labels
+LOD_SCALE_THRESHOLD = 0.5
+# Largest static shape layer kept in memory (widget pixels)
+MAX_LAYER_PIXELS = 4096 * 4096
+
 # class Canvas(QGLWidget):
 
 
@@ -39,6 +45,13 @@ class Canvas(QWidget):
         # Initialise local state.
         self.mode = self.EDIT
         self.shapes = []
+        # Bounding rects of self.shapes, for hover and selection hit-testing
+        self.shape_index = SpatialGrid()
+        # Render caches: background with the light overlay, and a layer with
+        # every shape that is not selected (redrawn only when invalidated)
+        self._background = (None, None)
+        self._layer = (None, None)
+        self._layer_version = 0
         self.current = None
         self.selected_shape = None  # save the selected shape here
         self.selected_shape_copy = None
@@ -108,6 +121,35 @@ class Canvas(QWidget):
     def selected_vertex(self):
         return self.h_vertex is not None
 
+    def index_shape(self, shape):
+        """Add or move a shape in the spatial index (call after its points change)."""
+        if not shape.points:
+            return
+        xs = [p.x() for p in shape.points]
+        ys = [p.y() for p in shape.points]
+        self.shape_index.update(shape, (min(xs), min(ys), max(xs), max(ys)), self.epsilon)
+        # The selected shape is not part of the cached layer
+        if shape is not self.selected_shape:
+            self.invalidate_layer()
+
+    def unindex_shape(self, shape):
+        self.shape_index.remove(shape)
+        self.invalidate_layer()
+
+    def rebuild_shape_index(self):
+        self.shape_index.clear()
+        for shape in self.shapes:
+            self.index_shape(shape)
+        self.invalidate_layer()
+
+    def invalidate_layer(self):
+        """Call when shapes outside the selection change how they look."""
+        self._layer_version += 1
+
+    def shapes_at(self, pos, margin=0.0):
+        """Visible shapes near pos, topmost first."""
+        return [s for s in self.shape_index.query_point(pos.x(), pos.y(), margin) if self.isVisible(s)]
+
     def mouseMoveEvent(self, ev):
         """Update line with last point and current coordinates."""
         pos = self.transform_pos(ev.pos())
@@ -178,9 +220,11 @@ class Canvas(QWidget):
         # Polygon/Vertex moving.
         if Qt.LeftButton & ev.buttons():
             if self.selected_vertex():
+                old_rect = self.shape_widget_rect(self.h_shape)
                 self.bounded_move_vertex(pos)
+                self.index_shape(self.h_shape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.update(old_rect.united(self.shape_widget_rect(self.h_shape)))
 
                 # Display annotation width and height while moving vertex
                 point1 = self.h_shape[1]
@@ -191,9 +235,11 @@ class Canvas(QWidget):
                         'Width: %d, Height: %d / X: %d; Y: %d' % (current_width, current_height, pos.x(), pos.y()))
             elif self.selected_shape and self.prev_point:
                 self.override_cursor(CURSOR_MOVE)
+                old_rect = self.shape_widget_rect(self.selected_shape)
                 self.bounded_move_shape(self.selected_shape, pos)
+                self.index_shape(self.selected_shape)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.update(old_rect.united(self.shape_widget_rect(self.selected_shape)))
 
                 # Display annotation width and height while moving shape
                 point1 = self.selected_shape[1]
@@ -215,8 +261,13 @@ class Canvas(QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         self.setToolTip("Image")
-        priority_list = self.shapes + ([self.selected_shape] if self.selected_shape else [])
-        for shape in reversed([s for s in priority_list if self.isVisible(s)]):
+        # Only shapes whose bounding rect (grown by epsilon) is under the cursor
+        candidates = self.shapes_at(pos, self.epsilon)
+        if self.selected_shape in candidates:
+            # The selected shape has priority, as if drawn on top
+            candidates.remove(self.selected_shape)
+            candidates.insert(0, self.selected_shape)
+        for shape in candidates:
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
             index = shape.nearest_vertex(pos, self.epsilon)
@@ -304,11 +355,14 @@ class Canvas(QWidget):
         # del shape.line_color
         if copy:
             self.shapes.append(shape)
+            self.index_shape(shape)
             self.selected_shape.selected = False
             self.selected_shape = shape
+            self.invalidate_layer()
             self.repaint()
         else:
             self.selected_shape.points = [p for p in shape.points]
+            self.index_shape(self.selected_shape)
         self.selected_shape_copy = None
 
     def hide_background_shapes(self, value):
@@ -356,6 +410,7 @@ class Canvas(QWidget):
         self.de_select_shape()
         shape.selected = True
         self.selected_shape = shape
+        self.invalidate_layer()
         self.set_hiding()
         self.selectionChanged.emit(True)
         self.update()
@@ -368,8 +423,8 @@ class Canvas(QWidget):
             shape.highlight_vertex(index, shape.MOVE_VERTEX)
             self.select_shape(shape)
             return self.h_vertex
-        for shape in reversed(self.shapes):
-            if self.isVisible(shape) and shape.contains_point(point):
+        for shape in self.shapes_at(point):
+            if shape.contains_point(point):
                 self.select_shape(shape)
                 self.calculate_offsets(shape, point)
                 return self.selected_shape
@@ -459,6 +514,7 @@ class Canvas(QWidget):
         if self.selected_shape:
             self.selected_shape.selected = False
             self.selected_shape = None
+            self.invalidate_layer()
             self.set_hiding(False)
             self.selectionChanged.emit(False)
             self.update()
@@ -468,6 +524,7 @@ class Canvas(QWidget):
             shape = self.selected_shape
             self.un_highlight(shape)
             self.shapes.remove(self.selected_shape)
+            self.unindex_shape(self.selected_shape)
             self.selected_shape = None
             self.update()
             return shape
@@ -480,6 +537,7 @@ class Canvas(QWidget):
             shape.selected = True
             self.selected_shape = shape
             self.bounded_shift_shape(shape)
+            self.index_shape(shape)
             return shape
 
     def bounded_shift_shape(self, shape):
@@ -492,6 +550,65 @@ class Canvas(QWidget):
         if not self.bounded_move_shape(shape, point - offset):
             self.bounded_move_shape(shape, point + offset)
 
+    def shape_widget_rect(self, shape):
+        """Area of the widget covered by a shape, including vertices and its label."""
+        xs = [p.x() for p in shape.points]
+        ys = [p.y() for p in shape.points]
+        if shape.paint_label:
+            # The label can be wider than the box: repaint everything
+            return QRect(0, 0, self.width(), self.height())
+        offset = self.offset_to_center()
+        margin = Shape.point_size + 2
+        return QRectF(
+            QPointF((min(xs) + offset.x()) * self.scale - margin, (min(ys) + offset.y()) * self.scale - margin),
+            QPointF((max(xs) + offset.x()) * self.scale + margin, (max(ys) + offset.y()) * self.scale + margin)
+        ).toAlignedRect()
+
+    def background_pixmap(self):
+        """Image with the light overlay applied, composited once per overlay color."""
+        key = (self.pixmap.cacheKey(), self.overlay_color.rgba() if self.overlay_color else None)
+        if self._background[0] != key:
+            temp = self.pixmap
+            if self.overlay_color:
+                temp = QPixmap(self.pixmap)
+                painter = QPainter(temp)
+                painter.setCompositionMode(painter.CompositionMode_Overlay)
+                painter.fillRect(temp.rect(), self.overlay_color)
+                painter.end()
+            self._background = (key, temp)
+        return self._background[1]
+
+    def static_layer(self):
+        """
+        Pixmap (at the current zoom) with every visible shape except the
+        selected one, or None if it would be too large to keep in memory.
+        """
+        width = int(round(self.pixmap.width() * self.scale))
+        height = int(round(self.pixmap.height() * self.scale))
+        if width * height > MAX_LAYER_PIXELS or width <= 0 or height <= 0:
+            self._layer = (None, None)
+            return None
+
+        key = (self._layer_version, self.scale, self.label_font_size, self.pixmap.cacheKey())
+        if self._layer[0] != key:
+            layer = QPixmap(width, height)
+            layer.fill(Qt.transparent)
+            painter = QPainter(layer)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setRenderHint(QPainter.HighQualityAntialiasing)
+            painter.scale(self.scale, self.scale)
+            for shape in self.shapes:
+                if shape is not self.selected_shape and self.isVisible(shape):
+                    # Hover highlights are drawn on top, never baked into the layer
+                    highlight = shape._highlight_index
+                    shape._highlight_index = None
+                    shape.fill = False
+                    shape.paint(painter)
+                    shape._highlight_index = highlight
+            painter.end()
+            self._layer = (key, layer)
+        return self._layer[1]
+
     def paintEvent(self, event):
         if not self.pixmap:
             return super(Canvas, self).paintEvent(event)
@@ -505,18 +622,38 @@ class Canvas(QWidget):
         p.scale(self.scale, self.scale)
         p.translate(self.offset_to_center())
 
-        temp = self.pixmap
-        if self.overlay_color:
-            temp = QPixmap(self.pixmap)
-            painter = QPainter(temp)
-            painter.setCompositionMode(painter.CompositionMode_Overlay)
-            painter.fillRect(temp.rect(), self.overlay_color)
-            painter.end()
+        # Only the exposed part of the image, in image coordinates
+        exposed = QRectF(event.rect())
+        offset = self.offset_to_center()
+        exposed = QRectF(exposed.x() / self.scale - offset.x(), exposed.y() / self.scale - offset.y(),
+                         exposed.width() / self.scale, exposed.height() / self.scale)
+        exposed = exposed.intersected(QRectF(self.pixmap.rect()))
+        if not exposed.isEmpty():
+            p.drawPixmap(exposed, self.background_pixmap(), exposed)
 
-        p.drawPixmap(0, 0, temp)
         Shape.scale = self.scale
         Shape.label_font_size = self.label_font_size
-        for shape in self.shapes:
+        Shape.paint_details = self.scale >= LOD_SCALE_THRESHOLD
+
+        layer = None if self._hide_background else self.static_layer()
+        if layer is not None:
+            # Static shapes come from the layer; only the selection and the
+            # hovered shape (filled) are drawn on top
+            p.save()
+            p.resetTransform()
+            p.drawPixmap(event.rect(), layer, event.rect().translated(
+                -int(round(offset.x() * self.scale)), -int(round(offset.y() * self.scale))))
+            p.restore()
+            shapes = [s for s in (self.h_shape, self.selected_shape) if s is not None]
+        else:
+            # No layer: draw the shapes that reach the exposed area
+            margin = Shape.point_size / self.scale + 2 * self.label_font_size
+            shapes = self.shape_index.query_rect((exposed.left() - margin, exposed.top() - margin,
+                                                  exposed.right() + margin, exposed.bottom() + margin))
+            if self.selected_shape is not None and self.selected_shape not in shapes:
+                shapes.append(self.selected_shape)
+
+        for shape in shapes:
             if (shape.selected or not self._hide_background) and self.isVisible(shape):
                 shape.fill = shape.selected or shape == self.h_shape
                 shape.paint(p)
@@ -581,6 +718,7 @@ class Canvas(QWidget):
 
         self.current.close()
         self.shapes.append(self.current)
+        self.index_shape(self.current)
         self.current = None
         self.set_hiding(False)
         self.newShape.emit()
@@ -670,6 +808,7 @@ class Canvas(QWidget):
             self.selected_shape.points[1] += QPointF(0, 1.0)
             self.selected_shape.points[2] += QPointF(0, 1.0)
             self.selected_shape.points[3] += QPointF(0, 1.0)
+        self.index_shape(self.selected_shape)
         self.shapeMoved.emit()
         self.repaint()
 
@@ -680,6 +819,7 @@ class Canvas(QWidget):
     def set_last_label(self, text, line_color=None, fill_color=None):
         assert text
         self.shapes[-1].label = text
+        self.invalidate_layer()
         if line_color:
             self.shapes[-1].line_color = line_color
 
@@ -691,6 +831,7 @@ class Canvas(QWidget):
     def undo_last_line(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.unindex_shape(self.current)
         self.current.set_open()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -698,6 +839,7 @@ class Canvas(QWidget):
     def reset_all_lines(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.unindex_shape(self.current)
         self.current.set_open()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -708,15 +850,19 @@ class Canvas(QWidget):
     def load_pixmap(self, pixmap):
         self.pixmap = pixmap
         self.shapes = []
+        self.shape_index.clear()
+        self.invalidate_layer()
         self.repaint()
 
     def load_shapes(self, shapes):
         self.shapes = list(shapes)
+        self.rebuild_shape_index()
         self.current = None
         self.repaint()
 
     def set_shape_visible(self, shape, value):
         self.visible[shape] = value
+        self.invalidate_layer()
         self.repaint()
 
     def current_cursor(self):
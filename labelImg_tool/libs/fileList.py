@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import codecs
+import os
+import sys
+
+try:
+    from PyQt5.QtCore import *
+except ImportError:
+    # needed for py3+qt4
+    # Ref:
+    # http://pyqt.sourceforge.net/Docs/PyQt4/incompatible_apis.html
+    # http://stackoverflow.com/questions/21217399/pyqt4-qtcore-qvariant-object-instead-of-a-string
+    if sys.version_info.major >= 3:
+        import sip
+        sip.setapi('QVariant', 2)
+    from PyQt4.QtCore import *
+
+from libs.constants import DEFAULT_ENCODING
+from libs.ustr import ustr
+from libs.utils import natural_sort
+
+# Number of paths sent to the GUI thread at a time while scanning
+SCAN_BATCH_SIZE = 1000
+
+
+def iter_image_batches(folder_path, extensions, batch_size=SCAN_BATCH_SIZE, should_stop=None):
+    """
+    Walk a folder and yield batches of absolute image paths.
+
+    Each directory is sorted on its own (natural order, sub-directories
+    after the files of their parent), so the first batch is ready as soon
+    as the first directory has been listed instead of after the whole tree.
+    """
+    extensions = tuple(extensions)
+    for root, dirs, files in os.walk(folder_path):
+        if should_stop is not None and should_stop():
+            return
+        natural_sort(dirs, key=lambda x: x.lower())
+        images = [ustr(os.path.abspath(os.path.join(root, f))) for f in files
+                  if f.lower().endswith(extensions)]
+        natural_sort(images, key=lambda x: x.lower())
+        for start in range(0, len(images), batch_size):
+            if should_stop is not None and should_stop():
+                return
+            yield images[start:start + batch_size]
+
+
+def read_worklist(worklist_path, extensions):
+    """
+    Read a worklist file: one image path per line, in the order to annotate.
+
+    Blank lines and lines starting with '#' are skipped, relative paths are
+    resolved against the folder of the worklist and missing files or
+    non-image paths are dropped.
+    """
+    extensions = tuple(extensions)
+    base_dir = os.path.dirname(os.path.abspath(worklist_path))
+    paths = []
+    with codecs.open(worklist_path, 'r', encoding=DEFAULT_ENCODING) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = os.path.abspath(os.path.join(base_dir, line))
+            if path.lower().endswith(extensions) and os.path.isfile(path):
+                paths.append(ustr(path))
+    return paths
+
+
+class ImageScanner(QThread):
+    """Scans a folder in the background and emits the images found in batches."""
+
+    batch_found = pyqtSignal(list)
+
+    def __init__(self, folder_path, extensions, parent=None):
+        super(ImageScanner, self).__init__(parent)
+        self.folder_path = folder_path
+        self.extensions = extensions
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self):
+        for batch in iter_image_batches(self.folder_path, self.extensions,
+                                        should_stop=lambda: self._stopped):
+            self.batch_found.emit(batch)
+
+
+class FileListModel(QAbstractListModel):
+    """
+    Virtual list of image paths for a QListView.
+
+    Only the rows on screen are ever turned into items by the view, and
+    path -> row lookups go through a dict instead of list.index().
+    """
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self.paths = []
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, row):
+        return self.paths[row]
+
+    def __contains__(self, path):
+        return path in self.rows
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.DisplayRole, Qt.ToolTipRole) and 0 <= index.row() < len(self.paths):
+            return self.paths[index.row()]
+        return None
+
+    def row_of(self, path):
+        """Row of a path, or -1 if it is not in the list."""
+        return self.rows.get(path, -1)
+
+    def append_paths(self, paths):
+        paths = [p for p in paths if p not in self.rows]
+        if not paths:
+            return
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        for offset, path in enumerate(paths):
+            self.rows[path] = first + offset
+        self.paths.extend(paths)
+        self.endInsertRows()
+
+    def remove_path(self, path):
+        row = self.rows.get(path)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.paths[row]
+        del self.rows[path]
+        for index in range(row, len(self.paths)):
+            self.rows[self.paths[index]] = index
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.paths = []
+        self.rows = {}
+        self.endResetModel()
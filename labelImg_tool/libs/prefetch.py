@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtGui import *
+except ImportError:
+    # needed for py3+qt4
+    # Ref:
+    # http://pyqt.sourceforge.net/Docs/PyQt4/incompatible_apis.html
+    # http://stackoverflow.com/questions/21217399/pyqt4-qtcore-qvariant-object-instead-of-a-string
+    if sys.version_info.major >= 3:
+        import sip
+        sip.setapi('QVariant', 2)
+    from PyQt4.QtGui import *
+
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO
+from libs.pascal_voc_io import PascalVocReader
+from libs.yolo_io import YoloReader
+from libs.create_ml_io import CreateMLReader
+
+# Images decoded before and after the current one
+PREFETCH_RADIUS = 3
+# LRU bounds on decoded images
+PREFETCH_MAX_IMAGES = 2 * PREFETCH_RADIUS + 2
+PREFETCH_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _annotation_mtimes(annotation_format, annotation_path):
+    """Modification times the parsed shapes depend on.
+
+    YOLO labels store class indices, so their names also depend on the
+    classes.txt next to the label file.
+    """
+    if annotation_format == FORMAT_YOLO:
+        classes_path = os.path.join(os.path.dirname(os.path.abspath(annotation_path)), "classes.txt")
+        return _mtime(annotation_path), _mtime(classes_path)
+    return (_mtime(annotation_path),)
+
+
+def _image_bytes(image):
+    if hasattr(image, 'sizeInBytes'):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+def read_annotation(annotation_format, annotation_path, image, image_path):
+    """Parse an annotation file into (shapes, verified)."""
+    if annotation_format == FORMAT_PASCALVOC:
+        reader = PascalVocReader(annotation_path)
+    elif annotation_format == FORMAT_YOLO:
+        reader = YoloReader(annotation_path, image)
+    else:
+        reader = CreateMLReader(annotation_path, image_path)
+    return reader.get_shapes(), reader.verified
+
+
+class PrefetchCache(object):
+    """
+    Decodes neighbouring images and parses their annotations in a worker thread.
+
+    QImage can be decoded outside the GUI thread (unlike QPixmap), so the
+    worker stores QImages and the window turns them into a pixmap when the
+    image is shown. Entries are checked against the file modification times
+    before being used, so an image or annotation saved in the meantime is
+    read again instead of being served stale.
+    """
+
+    def __init__(self, max_images=PREFETCH_MAX_IMAGES, max_bytes=PREFETCH_MAX_BYTES):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pending = []
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def prefetch(self, requests):
+        """
+        Queue images to decode, replacing any request not started yet.
+
+        requests is a list of (image_path, annotation) where annotation is
+        (format, path) of the annotation file to parse, or None.
+        """
+        with self._condition:
+            self._pending = [r for r in requests if r[0] not in self._entries]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def image(self, image_path):
+        """Decoded QImage of a file, or None if it is not cached or changed on disk."""
+        with self._condition:
+            entry = self._entries.get(image_path)
+            if entry is None or entry['mtime'] != _mtime(image_path):
+                return None
+            self._entries.move_to_end(image_path)
+            return entry['image']
+
+    def annotation(self, image_path, annotation):
+        """Cached (shapes, verified) for the annotation file, or None if it must be read again."""
+        with self._condition:
+            entry = self._entries.get(image_path)
+            if entry is None or entry['annotation'] is None:
+                return None
+            annotation_format, annotation_path, mtimes, shapes, verified = entry['annotation']
+            if ((annotation_format, annotation_path) != tuple(annotation)
+                    or mtimes != _annotation_mtimes(annotation_format, annotation_path)):
+                return None
+            return shapes, verified
+
+    def clear(self):
+        with self._condition:
+            self._entries.clear()
+            self._bytes = 0
+            self._pending = []
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._pending = []
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                image_path, annotation = self._pending.pop(0)
+                if image_path in self._entries:
+                    continue
+
+            entry = self._load(image_path, annotation)
+            if entry is None:
+                continue
+
+            with self._condition:
+                self._entries[image_path] = entry
+                self._bytes += entry['bytes']
+                while self._entries and (len(self._entries) > self.max_images or self._bytes > self.max_bytes):
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted['bytes']
+
+    def _load(self, image_path, annotation):
+        mtime = _mtime(image_path)
+        reader = QImageReader(image_path)
+        reader.setAutoTransform(True)
+        image = reader.read()
+        if mtime is None or image.isNull():
+            return None
+
+        parsed = None
+        if annotation is not None:
+            annotation_format, annotation_path = annotation
+            mtimes = _annotation_mtimes(annotation_format, annotation_path)
+            try:
+                shapes, verified = read_annotation(annotation_format, annotation_path, image, image_path)
+                parsed = (annotation_format, annotation_path, mtimes, shapes, verified)
+            except Exception:
+                parsed = None
+
+        return {'image': image, 'mtime': mtime, 'bytes': _image_bytes(image), 'annotation': parsed}
@@ -37,6 +37,10 @@ class Shape(object):
     point_size = 16
     scale = 1.0
     label_font_size = 8
+    # Level of detail: the canvas turns this off when zoomed far out, and
+    # only highlighted or selected shapes keep their vertices and label.
+    paint_details = True
+    _label_font = None
 
     def __init__(self, label=None, line_color=None, difficult=False, paint_label=False):
         self.label = label
@@ -101,18 +105,22 @@ class Shape(object):
             # may be desirable.
             # self.drawVertex(vertex_path, 0)
 
+            details = self.paint_details or self.selected or self.fill or self._highlight_index is not None
+
             for i, p in enumerate(self.points):
                 line_path.lineTo(p)
-                self.draw_vertex(vertex_path, i)
+                if details:
+                    self.draw_vertex(vertex_path, i)
             if self.is_closed():
                 line_path.lineTo(self.points[0])
 
             painter.drawPath(line_path)
-            painter.drawPath(vertex_path)
-            painter.fillPath(vertex_path, self.vertex_fill_color)
+            if details:
+                painter.drawPath(vertex_path)
+                painter.fillPath(vertex_path, self.vertex_fill_color)
 
             # Draw text at the top-left
-            if self.paint_label:
+            if self.paint_label and details:
                 min_x = sys.maxsize
                 min_y = sys.maxsize
                 min_y_label = int(1.25 * self.label_font_size)
@@ -120,10 +128,7 @@ class Shape(object):
                     min_x = min(min_x, point.x())
                     min_y = min(min_y, point.y())
                 if min_x != sys.maxsize and min_y != sys.maxsize:
-                    font = QFont()
-                    font.setPointSize(self.label_font_size)
-                    font.setBold(True)
-                    painter.setFont(font)
+                    painter.setFont(self.label_font())
                     if self.label is None:
                         self.label = ""
                     if min_y < min_y_label:
@@ -134,6 +139,16 @@ class Shape(object):
                 color = self.select_fill_color if self.selected else self.fill_color
                 painter.fillPath(line_path, color)
 
+    @classmethod
+    def label_font(cls):
+        """Bold label font, shared by all shapes and rebuilt only when the size changes."""
+        if cls._label_font is None or cls._label_font.pointSize() != cls.label_font_size:
+            font = QFont()
+            font.setPointSize(cls.label_font_size)
+            font.setBold(True)
+            Shape._label_font = font
+        return Shape._label_font
+
     def draw_vertex(self, path, i):
         d = self.point_size / self.scale
         shape = self.point_type
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from itertools import count
+from math import floor
+
+# Side of a grid cell in image pixels
+DEFAULT_CELL_SIZE = 128
+
+
+class SpatialGrid(object):
+    """
+    Uniform grid over the bounding rectangles of shapes.
+
+    Every key is stored in the cells its rectangle overlaps, so a point
+    query only looks at the keys of one cell instead of every shape.
+    Keys also remember the order they were inserted in, which matches the
+    drawing order of Canvas.shapes (later shapes are on top).
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self._cells = defaultdict(set)
+        self._rects = {}
+        self._cell_ranges = {}
+        self._order = {}
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __contains__(self, key):
+        return key in self._rects
+
+    def _cell_range(self, rect, margin):
+        x1, y1, x2, y2 = rect
+        size = self.cell_size
+        return (int(floor((min(x1, x2) - margin) / size)), int(floor((min(y1, y2) - margin) / size)),
+                int(floor((max(x1, x2) + margin) / size)), int(floor((max(y1, y2) + margin) / size)))
+
+    def _cells_of(self, cell_range):
+        cx1, cy1, cx2, cy2 = cell_range
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                yield cx, cy
+
+    def insert(self, key, rect, margin=0.0):
+        """
+        Add or move a key. rect is (x1, y1, x2, y2); margin grows the area
+        it is registered in, so points near the border are also found.
+        """
+        if key in self._rects:
+            self.update(key, rect, margin)
+            return
+        cell_range = self._cell_range(rect, margin)
+        for cell in self._cells_of(cell_range):
+            self._cells[cell].add(key)
+        self._rects[key] = rect
+        self._cell_ranges[key] = cell_range
+        self._order[key] = next(self._counter)
+
+    def update(self, key, rect, margin=0.0):
+        """Move a key, keeping its drawing order. Only touches cells that changed."""
+        if key not in self._rects:
+            self.insert(key, rect, margin)
+            return
+        old_range = self._cell_ranges[key]
+        new_range = self._cell_range(rect, margin)
+        if new_range != old_range:
+            old_cells = set(self._cells_of(old_range))
+            new_cells = set(self._cells_of(new_range))
+            for cell in old_cells - new_cells:
+                self._discard(cell, key)
+            for cell in new_cells - old_cells:
+                self._cells[cell].add(key)
+            self._cell_ranges[key] = new_range
+        self._rects[key] = rect
+
+    def remove(self, key):
+        if key not in self._rects:
+            return
+        for cell in self._cells_of(self._cell_ranges.pop(key)):
+            self._discard(cell, key)
+        del self._rects[key]
+        del self._order[key]
+
+    def _discard(self, cell, key):
+        keys = self._cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._rects.clear()
+        self._cell_ranges.clear()
+        self._order.clear()
+        self._counter = count()
+
+    def query_point(self, x, y, margin=0.0):
+        """
+        Keys whose rectangle (grown by margin) contains the point, topmost
+        (last inserted) first.
+        """
+        size = self.cell_size
+        keys = self._cells.get((int(floor(x / size)), int(floor(y / size))), ())
+        hits = []
+        for key in keys:
+            x1, y1, x2, y2 = self._rects[key]
+            if (min(x1, x2) - margin <= x <= max(x1, x2) + margin and
+                    min(y1, y2) - margin <= y <= max(y1, y2) + margin):
+                hits.append(key)
+        hits.sort(key=self._order.__getitem__, reverse=True)
+        return hits
+
+    def query_rect(self, rect):
+        """Keys whose rectangle intersects rect (x1, y1, x2, y2), in insertion order."""
+        x1, y1, x2, y2 = rect
+        cx1, cy1, cx2, cy2 = self._cell_range(rect, 0.0)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            # Large area: cheaper to test every key than every cell
+            keys = self._rects.keys()
+        else:
+            keys = set()
+            for cell in self._cells_of((cx1, cy1, cx2, cy2)):
+                keys.update(self._cells.get(cell, ()))
+        hits = []
+        for key in keys:
+            kx1, ky1, kx2, ky2 = self._rects[key]
+            if min(kx1, kx2) <= max(x1, x2) and max(kx1, kx2) >= min(x1, x2) and \
+                    min(ky1, ky2) <= max(y1, y2) and max(ky1, ky2) >= min(y1, y2):
+                hits.append(key)
+        hits.sort(key=self._order.__getitem__)
+        return hits
@@ -0,0 +1,64 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.fileList import FileListModel, iter_image_batches, read_worklist
+
+
+class TestFileList(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for name in ['img10.jpg', 'img2.jpg', 'img1.PNG', 'notes.txt']:
+            open(os.path.join(self.folder, name), 'w').close()
+        os.mkdir(os.path.join(self.folder, 'sub'))
+        open(os.path.join(self.folder, 'sub', 'a.jpg'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_batches_are_naturally_sorted_per_directory(self):
+        batches = list(iter_image_batches(self.folder, ['.jpg', '.png'], batch_size=2))
+        paths = [os.path.basename(p) for batch in batches for p in batch]
+        self.assertEqual(paths, ['img1.PNG', 'img2.jpg', 'img10.jpg', 'a.jpg'])
+        self.assertEqual([len(batch) for batch in batches], [2, 1, 1])
+
+    def test_batches_stop_when_requested(self):
+        batches = list(iter_image_batches(self.folder, ['.jpg'], should_stop=lambda: True))
+        self.assertEqual(batches, [])
+
+    def test_worklist_keeps_order_and_skips_missing(self):
+        worklist = os.path.join(self.folder, 'worklist.txt')
+        with open(worklist, 'w') as f:
+            f.write('# ranked\n')
+            f.write('img10.jpg\n\n')
+            f.write(os.path.join(self.folder, 'sub', 'a.jpg') + '\n')
+            f.write('missing.jpg\nnotes.txt\nimg1.PNG\n')
+        paths = read_worklist(worklist, ['.jpg', '.png'])
+        self.assertEqual([os.path.basename(p) for p in paths], ['img10.jpg', 'a.jpg', 'img1.PNG'])
+        self.assertTrue(all(os.path.isabs(p) for p in paths))
+
+    def test_model_lookup_and_remove(self):
+        model = FileListModel()
+        model.append_paths(['a', 'b', 'c'])
+        model.append_paths(['b', 'd'])
+        self.assertEqual(len(model), 4)
+        self.assertEqual(model.row_of('d'), 3)
+        self.assertEqual(model.row_of('missing'), -1)
+
+        model.remove_path('b')
+        self.assertEqual(model.paths, ['a', 'c', 'd'])
+        self.assertEqual(model.row_of('d'), 2)
+        self.assertTrue('c' in model)
+        self.assertEqual(model.rowCount(), 3)
+
+        model.clear()
+        self.assertEqual(len(model), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
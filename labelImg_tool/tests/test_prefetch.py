@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO
+from libs.pascal_voc_io import PascalVocWriter
+from libs.prefetch import PrefetchCache
+
+
+class TestPrefetchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.image_path = os.path.join(dir_name, 'test.512.512.bmp')
+        self.xml_path = os.path.join(tempfile.mkdtemp(), 'test.xml')
+        writer = PascalVocWriter('tests', 'test', (512, 512, 1), local_img_path=self.image_path)
+        writer.add_bnd_box(60, 40, 430, 504, 'person', 0)
+        writer.save(self.xml_path)
+        self.cache = PrefetchCache(max_images=1)
+
+    def tearDown(self):
+        self.cache.stop()
+
+    def wait_for(self, path):
+        for _ in range(100):
+            if self.cache.image(path) is not None:
+                return
+            time.sleep(0.05)
+        self.fail('image was not prefetched')
+
+    def test_prefetch_image_and_annotation(self):
+        annotation = (FORMAT_PASCALVOC, self.xml_path)
+        self.cache.prefetch([(self.image_path, annotation)])
+        self.wait_for(self.image_path)
+
+        self.assertEqual(self.cache.image(self.image_path).width(), 512)
+        shapes, verified = self.cache.annotation(self.image_path, annotation)
+        self.assertEqual(shapes[0][0], 'person')
+        self.assertFalse(verified)
+
+    def test_changed_annotation_is_not_served(self):
+        annotation = (FORMAT_PASCALVOC, self.xml_path)
+        self.cache.prefetch([(self.image_path, annotation)])
+        self.wait_for(self.image_path)
+
+        mtime = os.path.getmtime(self.xml_path)
+        os.utime(self.xml_path, (mtime + 10, mtime + 10))
+        self.assertIsNone(self.cache.annotation(self.image_path, annotation))
+
+    def test_changed_yolo_classes_are_not_served(self):
+        labels_dir = tempfile.mkdtemp()
+        txt_path = os.path.join(labels_dir, 'test.txt')
+        classes_path = os.path.join(labels_dir, 'classes.txt')
+        with open(txt_path, 'w') as f:
+            f.write('0 0.5 0.5 0.2 0.2\n')
+        with open(classes_path, 'w') as f:
+            f.write('person\n')
+
+        annotation = (FORMAT_YOLO, txt_path)
+        self.cache.prefetch([(self.image_path, annotation)])
+        self.wait_for(self.image_path)
+        shapes, _ = self.cache.annotation(self.image_path, annotation)
+        self.assertEqual(shapes[0][0], 'person')
+
+        mtime = os.path.getmtime(classes_path)
+        os.utime(classes_path, (mtime + 10, mtime + 10))
+        self.assertIsNone(self.cache.annotation(self.image_path, annotation))
+
+
+if __name__ == '__main__':
+    unittest.main()
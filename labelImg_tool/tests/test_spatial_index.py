@@ -0,0 +1,64 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.spatialIndex import SpatialGrid
+
+
+class TestSpatialGrid(unittest.TestCase):
+
+    def test_point_query_returns_topmost_first(self):
+        grid = SpatialGrid(cell_size=10)
+        grid.insert('a', (0, 0, 30, 30))
+        grid.insert('b', (20, 20, 50, 50))
+        grid.insert('c', (100, 100, 110, 110))
+        self.assertEqual(grid.query_point(25, 25), ['b', 'a'])
+        self.assertEqual(grid.query_point(5, 5), ['a'])
+        self.assertEqual(grid.query_point(70, 70), [])
+
+    def test_margin_finds_points_near_the_border(self):
+        grid = SpatialGrid(cell_size=10)
+        grid.insert('a', (0, 0, 10, 10), margin=5)
+        self.assertEqual(grid.query_point(14, 5), [])
+        self.assertEqual(grid.query_point(14, 5, margin=5), ['a'])
+
+    def test_update_moves_key_and_keeps_order(self):
+        grid = SpatialGrid(cell_size=10)
+        grid.insert('a', (0, 0, 10, 10))
+        grid.insert('b', (200, 200, 210, 210))
+        grid.update('a', (195, 195, 205, 205))
+        self.assertEqual(grid.query_point(5, 5), [])
+        self.assertEqual(grid.query_point(202, 202), ['b', 'a'])
+
+    def test_remove_and_clear(self):
+        grid = SpatialGrid(cell_size=10)
+        grid.insert('a', (0, 0, 100, 100))
+        grid.insert('b', (0, 0, 5, 5))
+        grid.remove('a')
+        self.assertEqual(grid.query_point(50, 50), [])
+        self.assertEqual(len(grid), 1)
+        self.assertFalse(grid._cells.get((5, 5)))
+
+        grid.clear()
+        self.assertEqual(grid.query_point(1, 1), [])
+        self.assertNotIn('b', grid)
+
+    def test_rect_query_returns_drawing_order(self):
+        grid = SpatialGrid(cell_size=10)
+        grid.insert('a', (0, 0, 30, 30))
+        grid.insert('b', (20, 20, 50, 50))
+        grid.insert('c', (100, 100, 110, 110))
+        self.assertEqual(grid.query_rect((25, 25, 105, 105)), ['a', 'b', 'c'])
+        self.assertEqual(grid.query_rect((40, 0, 60, 10)), [])
+        self.assertEqual(grid.query_rect((-1000, -1000, 1000, 1000)), ['a', 'b', 'c'])
+
+    def test_negative_coordinates(self):
+        grid = SpatialGrid(cell_size=10)
+        grid.insert('a', (-15, -15, -5, -5))
+        self.assertEqual(grid.query_point(-10, -10), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
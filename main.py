@@ -9,6 +9,7 @@ usando tkinter para facilitar el uso del sistema.
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
+import multiprocessing
 import sys
 import subprocess
 from pathlib import Path
@@ -22,15 +23,35 @@ from src.image_processing import ImageProcessor
 from src.statistical_analysis import StatisticalAnalyzer
 from src.visualization import DataVisualizer
 from src.image_annotation import ImageAnnotator, launch_labelimg_standalone
+from src.image_pyramid import TilePyramidCache
+from src.graph_index import GraphIndex, CURRENT_RUN
+from src.size_sketch import SizeSketch, SKETCH_SUFFIX
+from src.model_registry import ModelRegistry, describe_model
 from config.config import (
     RAW_IMAGES_DIR, ANALYSIS_IMAGES_DIR, PROCESSED_IMAGES_DIR, 
-    ANNOTATIONS_DIR, GRAPHS_DIR, REPORTS_DIR, IMAGE_PARAMS
+    ANNOTATIONS_DIR, GRAPHS_DIR, REPORTS_DIR, IMAGE_PARAMS, ACTIVE_LEARNING_DIR
 )
 
 
 class MicroplasticAnalysisGUI:
     """Interfaz gráfica para el análisis de microplásticos."""
     
+    # Filtro del visor -> tipo de figura en el índice
+    GRAPH_FILTERS = {
+        "Dashboard": "dashboard",
+        "Distribución Tamaños": "size_distribution",
+        "Distribución Formas": "shape_distribution",
+        "Frecuencia": "frequency_curve",
+        "Correlación": "correlation_matrix",
+        "Comparativos": "comparative",
+    }
+    
+    # Opción del selector de ejecución que busca en todas
+    ALL_RUNS = "Todas las ejecuciones"
+    
+    # Líneas máximas en la consola de entrenamiento
+    MAX_CONSOLE_LINES = 2000
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Análisis de Microplásticos en Máscaras de Pestañas")
@@ -45,11 +66,19 @@ class MicroplasticAnalysisGUI:
         self.message_queue = queue.Queue()
         
         # Variables para YOLOv8
-        self.yolo_model_path = tk.StringVar(value="")
+        # Registro de modelos (el predeterminado se preselecciona)
+        self.model_registry = ModelRegistry()
+        self.registered_models = []
+        default_model = self.model_registry.get_default()
+        self.yolo_model_path = tk.StringVar(value=default_model['path'] if default_model else "")
         self.yolo_epochs = tk.IntVar(value=30)
         self.yolo_batch = tk.IntVar(value=2)
         self.yolo_model_size = tk.StringVar(value='n')
         self.yolo_imgsz = tk.IntVar(value=320)
+        self.yolo_autotune = tk.BooleanVar(value=False)
+        self.yolo_memory_budget = tk.IntVar(value=4096)
+        self.yolo_queue = queue.Queue()
+        self.yolo_metrics = []
         
         # Inicializar anotador de imágenes
         self.annotator = ImageAnnotator(RAW_IMAGES_DIR)
@@ -59,6 +88,7 @@ class MicroplasticAnalysisGUI:
         
         # Verificar cola de mensajes
         self.root.after(100, self.check_message_queue)
+        self.root.after(200, self.check_yolo_queue)
     
     def create_widgets(self):
         """Crea todos los widgets de la interfaz."""
@@ -415,6 +445,21 @@ class MicroplasticAnalysisGUI:
         )
         btn_launch.pack(pady=10)
         
+        # Pre-anotación con el modelo actual (XML sin verificar para corregir en LabelImg)
+        self.btn_pre_annotate = ttk.Button(
+            action_frame,
+            text="🤖 Pre-anotar imágenes nuevas con el modelo actual",
+            command=self.run_pre_annotation
+        )
+        self.btn_pre_annotate.pack(pady=5)
+        
+        # Lista priorizada por aprendizaje activo (python -m src.active_learning)
+        ttk.Button(
+            action_frame,
+            text="📋 Anotar en orden de prioridad (aprendizaje activo)",
+            command=self.launch_labelimg_worklist
+        ).pack(pady=5)
+        
         # Información rápida de uso
         quick_info = tk.Label(
             action_frame,
@@ -522,6 +567,56 @@ class MicroplasticAnalysisGUI:
             self.log_console(f"❌ Error al lanzar LabelImg: {e}\n")
             messagebox.showerror("Error", f"Error al lanzar LabelImg:\n{str(e)}")
     
+    def launch_labelimg_worklist(self):
+        """Lanza LabelImg con la lista priorizada generada por src/active_learning.py."""
+        from src.active_learning import WORKLIST_FILENAME
+        
+        worklist = ACTIVE_LEARNING_DIR / WORKLIST_FILENAME
+        if not worklist.exists():
+            messagebox.showinfo(
+                "Sin lista priorizada",
+                "Aún no hay una lista priorizada.\n\n"
+                "Genérala (puede tardar horas con muchas imágenes) con:\n"
+                "python -m src.active_learning"
+            )
+            return
+        
+        try:
+            if self.annotator.launch_labelimg(worklist=worklist):
+                self.log_console(f"✅ LabelImg lanzado con la lista priorizada: {worklist}\n")
+            else:
+                self.log_console("❌ No se pudo lanzar LabelImg\n")
+        except Exception as e:
+            self.log_console(f"❌ Error al lanzar LabelImg: {e}\n")
+            messagebox.showerror("Error", f"Error al lanzar LabelImg:\n{str(e)}")
+    
+    def run_pre_annotation(self):
+        """Genera en segundo plano XML sin verificar para las imágenes que aún no tienen anotación humana."""
+        model_path = self.yolo_model_path.get() or None
+        self.btn_pre_annotate.config(state=tk.DISABLED)
+        
+        def worker():
+            try:
+                from src.pre_annotation import pre_annotate
+                summary = pre_annotate(RAW_IMAGES_DIR, self.annotator.annotations_dir,
+                                       model_path=model_path, registry=self.model_registry)
+                message = (
+                    f"XML escritos: {summary['written']} ({summary['boxes']} cajas sin verificar)\n"
+                    f"Omitidas verificadas: {summary['skipped_verified']}\n"
+                    f"Omitidas editadas por una persona: {summary['skipped_human']}\n"
+                    f"Ya pre-anotadas con este modelo: {summary['skipped_current']}\n\n"
+                    "Abre LabelImg para revisar y verificar las predicciones."
+                )
+                self.root.after(0, lambda: messagebox.showinfo("Pre-anotación completada", message))
+                self.root.after(0, self.update_annotation_stats)
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Error", f"Error al pre-anotar:\n{error}"))
+            finally:
+                self.root.after(0, lambda: self.btn_pre_annotate.config(state=tk.NORMAL))
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
     def launch_labelimg_vbs(self):
         """Lanza LabelImg usando VBScript (método alternativo más confiable)."""
         try:
@@ -551,7 +646,21 @@ class MicroplasticAnalysisGUI:
             self.annotation_stats_text.insert(tk.END, "═" * 60 + "\n\n")
             
             self.annotation_stats_text.insert(tk.END, f"📷 Imágenes anotadas: {stats['total_images']}\n")
-            self.annotation_stats_text.insert(tk.END, f"🎯 Total de objetos etiquetados: {stats['total_objects']}\n\n")
+            self.annotation_stats_text.insert(tk.END, f"🎯 Total de objetos etiquetados: {stats['total_objects']}\n")
+            if stats['total_objects']:
+                per_image = stats['objects_per_image']
+                box_area = stats['box_area']
+                self.annotation_stats_text.insert(
+                    tk.END,
+                    f"🔢 Objetos por imagen: media {per_image['mean']:.1f}, "
+                    f"mediana {per_image['median']:.0f}, máx. {per_image['max']}\n"
+                )
+                self.annotation_stats_text.insert(
+                    tk.END,
+                    f"📐 Área de cajas: mediana {box_area['median']:.0f} px² "
+                    f"({box_area['min']:.0f} - {box_area['max']:.0f})\n"
+                )
+            self.annotation_stats_text.insert(tk.END, "\n")
             
             if stats['classes']:
                 self.annotation_stats_text.insert(tk.END, "─" * 60 + "\n")
@@ -653,6 +762,18 @@ class MicroplasticAnalysisGUI:
         ttk.Entry(imgsz_frame, textvariable=self.yolo_imgsz, width=10).pack(side=tk.LEFT, padx=5)
         ttk.Label(imgsz_frame, text="(320=rápido/poca RAM | 416=balance | 640=lento/preciso)", foreground="gray").pack(side=tk.LEFT)
         
+        # Autoajuste de batch y workers
+        autotune_frame = ttk.Frame(train_frame)
+        autotune_frame.pack(fill=tk.X, pady=5)
+        ttk.Checkbutton(
+            autotune_frame,
+            text="Autoajustar batch y workers",
+            variable=self.yolo_autotune
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Label(autotune_frame, text="Memoria máx. (MB):").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(autotune_frame, textvariable=self.yolo_memory_budget, width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Label(autotune_frame, text="(prueba combinaciones y usa la más rápida; ignora el batch indicado)", foreground="gray").pack(side=tk.LEFT)
+        
         # Botones de entrenamiento
         btn_frame = ttk.Frame(train_frame)
         btn_frame.pack(pady=15)
@@ -663,6 +784,12 @@ class MicroplasticAnalysisGUI:
             command=self.start_yolo_training
         ).pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(
+            btn_frame,
+            text="⏯️ Reanudar Entrenamiento",
+            command=self.resume_yolo_training
+        ).pack(side=tk.LEFT, padx=5)
+        
         ttk.Button(
             btn_frame,
             text="📂 Abrir Carpeta de Modelos",
@@ -696,6 +823,22 @@ class MicroplasticAnalysisGUI:
             command=self.browse_yolo_model
         ).pack(side=tk.LEFT, padx=5)
         
+        # Modelos del registro (cambio rápido: el detector queda precargado)
+        registry_frame = ttk.Frame(use_frame)
+        registry_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(registry_frame, text="Modelos registrados:", font=("Arial", 10, "bold")).pack(side=tk.LEFT, padx=5)
+        self.model_combo = ttk.Combobox(registry_frame, width=70, state="readonly")
+        self.model_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.model_combo.bind("<<ComboboxSelected>>", self.on_registered_model_selected)
+        ttk.Button(
+            registry_frame,
+            text="🔄 Actualizar",
+            command=self.refresh_model_registry
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self.root.after(2000, self.refresh_model_registry)
+        
         # Consola de entrenamiento
         console_frame = ttk.LabelFrame(parent, text="📋 Log de Entrenamiento", padding=10)
         console_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -715,6 +858,11 @@ class MicroplasticAnalysisGUI:
         self.yolo_progress_label = ttk.Label(progress_frame, text="Esperando...", font=("Arial", 9))
         self.yolo_progress_label.pack(side=tk.LEFT, padx=5)
         
+        # Gráfico de métricas por época (se actualiza en vivo)
+        self.yolo_chart = tk.Canvas(console_frame, height=150, bg="white", highlightthickness=0)
+        self.yolo_chart.pack(fill=tk.X, pady=(0, 10))
+        self.yolo_chart.bind("<Configure>", lambda e: self.draw_training_chart())
+        
         self.yolo_console = scrolledtext.ScrolledText(
             console_frame,
             height=12,
@@ -729,7 +877,11 @@ class MicroplasticAnalysisGUI:
         """Busca un modelo YOLO entrenado."""
         file_path = filedialog.askopenfilename(
             title="Seleccionar modelo YOLO entrenado",
-            filetypes=[("Modelos PyTorch", "*.pt"), ("Todos los archivos", "*.*")],
+            filetypes=[
+                ("Modelos YOLO", "*.pt *.torchscript *.onnx"),
+                ("Modelos PyTorch", "*.pt"),
+                ("Todos los archivos", "*.*")
+            ],
             initialdir="yolo_training/models"
         )
         
@@ -745,52 +897,160 @@ class MicroplasticAnalysisGUI:
                 f"Ve a la pestaña 'Análisis' para procesar imágenes."
             )
     
-    def start_yolo_training(self):
-        """Inicia el entrenamiento de YOLO en un hilo separado."""
-        if self.analysis_running:
-            messagebox.showwarning("Advertencia", "Ya hay un proceso en ejecución.")
-            return
+    def refresh_model_registry(self):
+        """Registra en segundo plano los modelos de yolo_training/models y actualiza la lista."""
+        def worker():
+            try:
+                self.model_registry.scan(Path("yolo_training") / "models")
+            except Exception as e:
+                print(f"⚠️ No se pudo actualizar el registro de modelos: {e}")
+            models = self.model_registry.list_models()
+            self.root.after(0, lambda: self.populate_model_combo(models))
         
-        # Verificar que hay anotaciones
-        stats = self.annotator.get_annotation_stats()
-        if stats['total_images'] == 0:
-            messagebox.showerror(
-                "Error",
-                "No hay imágenes anotadas.\n\n"
-                "Ve a la pestaña 'Anotar Imágenes' y anota algunas imágenes con LabelImg primero."
-            )
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def populate_model_combo(self, models):
+        """Muestra los modelos registrados en el selector."""
+        self.registered_models = models
+        self.model_combo['values'] = [describe_model(m) for m in models]
+        
+        current = self.yolo_model_path.get()
+        for index, model in enumerate(models):
+            if current and Path(model['path']) == Path(current).resolve():
+                self.model_combo.current(index)
+                break
+    
+    def on_registered_model_selected(self, event=None):
+        """Selecciona un modelo del registro y precarga su detector en segundo plano."""
+        index = self.model_combo.current()
+        if index < 0:
             return
         
-        # Confirmar
-        response = messagebox.askyesno(
-            "Confirmar Entrenamiento",
-            f"Se entrenarán {stats['total_images']} imágenes anotadas con {stats['total_objects']} objetos.\n\n"
-            f"Configuración:\n"
-            f"- Modelo: YOLOv8{self.yolo_model_size.get()}\n"
-            f"- Épocas: {self.yolo_epochs.get()}\n"
-            f"- Batch: {self.yolo_batch.get()}\n\n"
-            f"⚠️ Esto puede tomar varios minutos u horas.\n\n"
-            f"¿Continuar?"
-        )
+        model = self.registered_models[index]
+        self.yolo_model_path.set(model['path'])
+        self.log_yolo(f"✅ Modelo seleccionado: {model['name']} (v{model['hash'][:12]})\n")
+        
+        def preload():
+            try:
+                from src.yolo_detector import get_detector
+                get_detector(model['path'], pixels_to_um=self.pixels_to_um.get(),
+                             registry=self.model_registry)
+                self.log_yolo("   ⚡ Detector cargado en memoria\n")
+            except Exception as e:
+                self.log_yolo(f"   ⚠️ No se pudo precargar el detector: {e}\n")
         
-        if not response:
+        threading.Thread(target=preload, daemon=True).start()
+    
+    def start_yolo_training(self, resume_dir=None):
+        """
+        Inicia el entrenamiento de YOLO en un hilo separado.
+        
+        Args:
+            resume_dir: Carpeta de un entrenamiento interrumpido a reanudar
+                        (None = entrenamiento nuevo).
+        """
+        if self.analysis_running:
+            messagebox.showwarning("Advertencia", "Ya hay un proceso en ejecución.")
             return
         
+        if resume_dir is None:
+            # Verificar que hay anotaciones
+            stats = self.annotator.get_annotation_stats()
+            if stats['total_images'] == 0:
+                messagebox.showerror(
+                    "Error",
+                    "No hay imágenes anotadas.\n\n"
+                    "Ve a la pestaña 'Anotar Imágenes' y anota algunas imágenes con LabelImg primero."
+                )
+                return
+            
+            # Confirmar
+            response = messagebox.askyesno(
+                "Confirmar Entrenamiento",
+                f"Se entrenarán {stats['total_images']} imágenes anotadas con {stats['total_objects']} objetos.\n\n"
+                f"Configuración:\n"
+                f"- Modelo: YOLOv8{self.yolo_model_size.get()}\n"
+                f"- Épocas: {self.yolo_epochs.get()}\n"
+                f"- Batch: {'automático' if self.yolo_autotune.get() else self.yolo_batch.get()}\n\n"
+                f"⚠️ Esto puede tomar varios minutos u horas.\n\n"
+                f"¿Continuar?"
+            )
+            
+            if not response:
+                return
+        
         self.analysis_running = True
         self.yolo_console.delete(1.0, tk.END)
-        self.log_yolo("🚀 Iniciando entrenamiento YOLOv8...\n")
+        self.yolo_metrics = []
+        self.draw_training_chart()
+        self.yolo_progress.config(mode='indeterminate', value=0)
+        self.yolo_progress.start(10)
+        self.log_yolo("⏯️ Reanudando entrenamiento YOLOv8...\n" if resume_dir else "🚀 Iniciando entrenamiento YOLOv8...\n")
         self.log_yolo("="*60 + "\n\n")
         
         # Ejecutar en hilo separado
-        thread = threading.Thread(target=self.run_yolo_training, daemon=True)
+        thread = threading.Thread(target=self.run_yolo_training, args=(resume_dir,), daemon=True)
         thread.start()
     
-    def run_yolo_training(self):
-        """Ejecuta el entrenamiento YOLO."""
+    def resume_yolo_training(self):
+        """Busca el último entrenamiento interrumpido y ofrece reanudarlo."""
+        if self.analysis_running:
+            messagebox.showwarning("Advertencia", "Ya hay un proceso en ejecución.")
+            return
+        
         try:
-            # Iniciar animación de progreso
-            self.yolo_progress.start(10)
-            self.yolo_progress_label.config(text="Inicializando...")
+            from src.train_yolo import YOLOTrainer
+            trainer = YOLOTrainer(
+                annotations_dir=str(ANNOTATIONS_DIR),
+                images_dir=str(RAW_IMAGES_DIR),
+                output_dir="yolo_training"
+            )
+        except ImportError as e:
+            messagebox.showerror("Error", f"Falta ultralytics:\n{str(e)}\n\nEjecuta:\npip install ultralytics")
+            return
+        
+        def ask(run_dir, error):
+            if error is not None:
+                messagebox.showerror("Error", f"No se pudieron revisar los entrenamientos:\n{error}")
+                return
+            if run_dir is None:
+                messagebox.showinfo("Reanudar Entrenamiento", "No hay entrenamientos interrumpidos para reanudar.")
+                return
+            
+            if messagebox.askyesno(
+                "Reanudar Entrenamiento",
+                f"Se encontró un entrenamiento interrumpido:\n\n{run_dir.name}\n\n"
+                f"Se continuará desde su último checkpoint (weights/last.pt).\n\n¿Continuar?"
+            ):
+                self.start_yolo_training(resume_dir=str(run_dir))
+        
+        # Revisar las carpetas de entrenamiento fuera del hilo de Tk
+        def worker():
+            try:
+                run_dir = trainer.find_interrupted_run()
+                self.root.after(0, lambda: ask(run_dir, None))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: ask(None, error))
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def run_yolo_training(self, resume_dir=None):
+        """
+        Ejecuta el entrenamiento YOLO (en un hilo de trabajo).
+        
+        Este método no toca los widgets: envía los mensajes, el estado y las
+        métricas de cada época por yolo_queue, que procesa check_yolo_queue
+        en el hilo de la interfaz.
+        
+        Args:
+            resume_dir: Carpeta de un entrenamiento interrumpido a reanudar.
+        """
+        def on_epoch(metrics):
+            self.yolo_queue.put(('metrics', metrics))
+        
+        try:
+            self.set_yolo_status("Inicializando...")
             
             from src.train_yolo import YOLOTrainer
             
@@ -803,75 +1063,198 @@ class MicroplasticAnalysisGUI:
             )
             
             self.log_yolo("✅ Entrenador inicializado\n\n")
-            self.yolo_progress_label.config(text="Convirtiendo dataset...")
-            self.log_yolo("📋 Convirtiendo anotaciones VOC a formato YOLO...\n")
-            
-            # Convertir dataset
-            data_yaml = trainer.convert_voc_to_yolo()
-            self.log_yolo(f"✅ Dataset convertido: {data_yaml}\n\n")
-            
-            # Entrenar
-            self.yolo_progress_label.config(text="Entrenando modelo...")
-            self.log_yolo("🎯 Iniciando entrenamiento...\n")
-            self.log_yolo("   (Esto puede tomar mucho tiempo)\n")
-            self.log_yolo(f"   Épocas: {self.yolo_epochs.get()}\n")
-            self.log_yolo(f"   Tamaño: {self.yolo_imgsz.get()}px\n\n")
-            
-            best_model, training_number = trainer.train_model(
-                data_yaml=data_yaml,
-                model_size=self.yolo_model_size.get(),
-                epochs=self.yolo_epochs.get(),
-                batch=self.yolo_batch.get(),
-                imgsz=self.yolo_imgsz.get(),
-                device='cpu'  # Usar CPU (no hay GPU disponible)
-            )
             
-            self.yolo_progress_label.config(text="Evaluando modelo...")
+            if resume_dir:
+                self.set_yolo_status("Reanudando entrenamiento...")
+                self.log_yolo(f"⏯️ Reanudando desde {Path(resume_dir).name}/weights/last.pt\n\n")
+                best_model, training_number = trainer.resume_training(
+                    resume_dir,
+                    epoch_callback=on_epoch
+                )
+                data_yaml = str(trainer.output_dir / 'data.yaml')
+            else:
+                self.set_yolo_status("Convirtiendo dataset...")
+                self.log_yolo("📋 Convirtiendo anotaciones VOC a formato YOLO...\n")
+                
+                # Convertir dataset
+                data_yaml = trainer.convert_voc_to_yolo()
+                self.log_yolo(f"✅ Dataset convertido: {data_yaml}\n\n")
+                
+                # Entrenar
+                self.set_yolo_status("Entrenando modelo...")
+                self.log_yolo("🎯 Iniciando entrenamiento...\n")
+                self.log_yolo("   (Esto puede tomar mucho tiempo)\n")
+                self.log_yolo(f"   Épocas: {self.yolo_epochs.get()}\n")
+                self.log_yolo(f"   Tamaño: {self.yolo_imgsz.get()}px\n")
+                self.log_yolo("   💾 Se guarda un checkpoint en cada época (se puede reanudar)\n\n")
+                
+                best_model, training_number = trainer.train_model(
+                    data_yaml=data_yaml,
+                    model_size=self.yolo_model_size.get(),
+                    epochs=self.yolo_epochs.get(),
+                    batch=self.yolo_batch.get(),
+                    imgsz=self.yolo_imgsz.get(),
+                    device='cpu',  # Usar CPU (no hay GPU disponible)
+                    autotune=self.yolo_autotune.get(),
+                    memory_budget_mb=self.yolo_memory_budget.get(),
+                    epoch_callback=on_epoch
+                )
+            
+            self.set_yolo_status("Evaluando modelo...")
             self.log_yolo("\n" + "="*60 + "\n")
             self.log_yolo(f"🎉 ENTRENAMIENTO #{training_number} COMPLETADO\n")
             self.log_yolo("="*60 + "\n\n")
             self.log_yolo(f"📦 Modelo guardado en:\n   {best_model}\n\n")
             
             # Actualizar path del modelo
-            self.yolo_model_path.set(best_model)
+            self.yolo_queue.put(('call', lambda: self.yolo_model_path.set(best_model)))
             
             # Evaluar
             self.log_yolo("📊 Evaluando modelo...\n")
             trainer.evaluate_model(best_model, data_yaml)
             
-            self.yolo_progress_label.config(text="✅ Completado")
-            self.yolo_progress.stop()
+            self.set_yolo_status("✅ Completado")
             self.log_yolo("\n✅ Proceso completado exitosamente\n")
             self.log_yolo("💡 Ahora puedes usar este modelo en la pestaña de Análisis\n")
             
-            messagebox.showinfo(
+            self.yolo_queue.put(('call', lambda: messagebox.showinfo(
                 "Entrenamiento Completado",
                 f"Entrenamiento #{training_number} completado exitosamente.\n\n"
                 f"Modelo guardado en:\n{best_model}\n\n"
                 f"Ve a la pestaña de Análisis y activa 'Usar YOLOv8'"
-            )
+            )))
             
         except ImportError as e:
-            self.yolo_progress.stop()
-            self.yolo_progress_label.config(text="❌ Error")
+            error = str(e)
+            self.set_yolo_status("❌ Error")
             self.log_yolo(f"\n❌ ERROR: ultralytics no está instalado\n")
             self.log_yolo(f"   Ejecuta: pip install ultralytics torch torchvision\n")
-            messagebox.showerror("Error", f"Falta ultralytics:\n{str(e)}\n\nEjecuta:\npip install ultralytics")
+            self.yolo_queue.put(('call', lambda: messagebox.showerror(
+                "Error", f"Falta ultralytics:\n{error}\n\nEjecuta:\npip install ultralytics")))
             
         except Exception as e:
-            self.yolo_progress.stop()
-            self.yolo_progress_label.config(text="❌ Error")
-            self.log_yolo(f"\n❌ ERROR durante el entrenamiento:\n{str(e)}\n")
-            messagebox.showerror("Error", f"Error durante el entrenamiento:\n{str(e)}")
+            error = str(e)
+            self.set_yolo_status("❌ Error")
+            self.log_yolo(f"\n❌ ERROR durante el entrenamiento:\n{error}\n")
+            self.log_yolo("💡 Usa 'Reanudar Entrenamiento' para continuar desde el último checkpoint\n")
+            self.yolo_queue.put(('call', lambda: messagebox.showerror(
+                "Error", f"Error durante el entrenamiento:\n{error}")))
             
         finally:
+            self.yolo_queue.put(('call', self.yolo_progress.stop))
             self.analysis_running = False
     
     def log_yolo(self, message):
-        """Agrega mensaje a la consola YOLO."""
-        self.yolo_console.insert(tk.END, message)
-        self.yolo_console.see(tk.END)
-        self.root.update_idletasks()
+        """Agrega mensaje a la consola YOLO (seguro desde cualquier hilo)."""
+        self.yolo_queue.put(('log', message))
+    
+    def set_yolo_status(self, text):
+        """Actualiza la etiqueta de progreso YOLO (seguro desde cualquier hilo)."""
+        self.yolo_queue.put(('status', text))
+    
+    def check_yolo_queue(self):
+        """Procesa en el hilo de la interfaz los eventos del entrenamiento YOLO."""
+        messages = []
+        new_metrics = False
+        try:
+            while True:
+                kind, payload = self.yolo_queue.get_nowait()
+                if kind == 'log':
+                    messages.append(payload)
+                elif kind == 'status':
+                    self.yolo_progress_label.config(text=payload)
+                elif kind == 'metrics':
+                    self.yolo_metrics.append(payload)
+                    messages.append(self.format_epoch_metrics(payload))
+                    new_metrics = True
+                elif kind == 'call':
+                    payload()
+        except queue.Empty:
+            pass
+        
+        # Una sola inserción por ciclo aunque lleguen muchos mensajes
+        if messages:
+            self.yolo_console.insert(tk.END, "".join(messages))
+            
+            # Limitar el tamaño de la consola
+            line_count = int(self.yolo_console.index('end-1c').split('.')[0])
+            if line_count > self.MAX_CONSOLE_LINES:
+                self.yolo_console.delete('1.0', f"{line_count - self.MAX_CONSOLE_LINES + 1}.0")
+            
+            self.yolo_console.see(tk.END)
+        
+        if new_metrics:
+            last = self.yolo_metrics[-1]
+            self.yolo_progress.stop()
+            self.yolo_progress.config(mode='determinate', maximum=last['epochs'], value=last['epoch'])
+            self.yolo_progress_label.config(text=f"Época {last['epoch']}/{last['epochs']}")
+            self.draw_training_chart()
+        
+        self.root.after(200, self.check_yolo_queue)
+    
+    @staticmethod
+    def format_epoch_metrics(metrics):
+        """Línea de consola con las métricas de una época."""
+        def fmt(value, digits=3):
+            return "-" if value is None else f"{value:.{digits}f}"
+        
+        return (f"📈 Época {metrics['epoch']}/{metrics['epochs']}: "
+                f"loss={fmt(metrics['loss'])} mAP50={fmt(metrics['map50'])} "
+                f"mAP50-95={fmt(metrics['map50_95'])} "
+                f"tiempo={fmt(metrics['epoch_seconds'], 1)}s "
+                f"({fmt(metrics['images_per_second'], 1)} img/s)\n")
+    
+    def draw_training_chart(self):
+        """Dibuja la curva de pérdida y mAP50 por época en el gráfico del entrenamiento."""
+        canvas = self.yolo_chart
+        canvas.delete("all")
+        
+        width = max(canvas.winfo_width(), 200)
+        height = max(canvas.winfo_height(), 100)
+        left, right, top, bottom = 40, 10, 20, 20
+        plot_w = width - left - right
+        plot_h = height - top - bottom
+        
+        canvas.create_rectangle(left, top, left + plot_w, top + plot_h, outline="#d1d5db")
+        canvas.create_text(left + 5, 4, anchor=tk.NW, fill="#dc2626", text="— pérdida (train)", font=("Arial", 8))
+        canvas.create_text(left + 120, 4, anchor=tk.NW, fill="#047857", text="— mAP50 (val)", font=("Arial", 8))
+        
+        metrics = self.yolo_metrics
+        if not metrics:
+            canvas.create_text(width / 2, height / 2, text="Las métricas aparecerán al terminar cada época",
+                               fill="gray", font=("Arial", 9))
+            return
+        
+        epochs = max(metrics[-1]['epochs'], 2)
+        losses = [m['loss'] for m in metrics if m['loss'] is not None]
+        max_loss = max(losses) if losses else 1.0
+        
+        def point(epoch, fraction):
+            x = left + (epoch - 1) / (epochs - 1) * plot_w
+            y = top + (1 - fraction) * plot_h
+            return x, y
+        
+        # Pérdida normalizada a su máximo y mAP50 en escala 0-1
+        for key, color, scale in [('loss', "#dc2626", max_loss or 1.0), ('map50', "#047857", 1.0)]:
+            coords = []
+            for m in metrics:
+                if m[key] is not None:
+                    coords.extend(point(m['epoch'], min(m[key] / scale, 1.0)))
+            if len(coords) >= 4:
+                canvas.create_line(*coords, fill=color, width=2)
+            elif len(coords) == 2:
+                x, y = coords
+                canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline=color)
+        
+        canvas.create_text(left - 4, top, anchor=tk.NE, text="1.0", font=("Arial", 7))
+        canvas.create_text(left - 4, top + plot_h, anchor=tk.SE, text="0", font=("Arial", 7))
+        canvas.create_text(left + plot_w, top + plot_h + 2, anchor=tk.NE, text=f"época {epochs}", font=("Arial", 7))
+        
+        last = metrics[-1]
+        canvas.create_text(
+            left + plot_w, 4, anchor=tk.NE, font=("Arial", 8),
+            text=f"{last['epoch_seconds']:.1f}s/época · {last['images_per_second']:.1f} img/s"
+        )
     
     def create_viewer_tab(self, parent):
         """Crea la pestaña de visualización de gráficos."""
@@ -910,9 +1293,26 @@ class MicroplasticAnalysisGUI:
                 text=filter_name,
                 variable=self.filter_var,
                 value=filter_name,
-                command=self.refresh_graph_list
+                command=lambda: self.refresh_graph_list(rescan=False)
             ).pack(side=tk.LEFT, padx=3)
         
+        # Búsqueda por nombre o muestra (sobre el índice, sin recorrer la carpeta)
+        self.graph_search_var = tk.StringVar(value="")
+        search_entry = ttk.Entry(category_frame, textvariable=self.graph_search_var, width=18)
+        search_entry.pack(side=tk.RIGHT, padx=5)
+        search_entry.bind("<Return>", lambda event: self.refresh_graph_list(rescan=False))
+        ttk.Label(category_frame, text="🔎 Buscar:", font=("Arial", 9)).pack(side=tk.RIGHT)
+        
+        # Ejecución: la actual, un respaldo o todas
+        self.graph_run_var = tk.StringVar(value=CURRENT_RUN)
+        self.graph_run_combo = ttk.Combobox(
+            category_frame, textvariable=self.graph_run_var, width=24, state="readonly",
+            values=[self.ALL_RUNS, CURRENT_RUN]
+        )
+        self.graph_run_combo.pack(side=tk.RIGHT, padx=5)
+        self.graph_run_combo.bind("<<ComboboxSelected>>", lambda event: self.refresh_graph_list(rescan=False))
+        ttk.Label(category_frame, text="🗂️ Ejecución:", font=("Arial", 9)).pack(side=tk.RIGHT)
+        
         # Frame con scroll para la imagen
         canvas_frame = ttk.LabelFrame(parent, text="📊 Vista Previa del Gráfico", padding=10)
         canvas_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -938,20 +1338,32 @@ class MicroplasticAnalysisGUI:
         )
         self.image_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        v_scrollbar.config(command=self.image_canvas.yview)
-        h_scrollbar.config(command=self.image_canvas.xview)
+        # Al desplazar se dibujan solo las teselas que entran en pantalla
+        def on_yview(*args):
+            self.image_canvas.yview(*args)
+            self.draw_visible_tiles()
+        
+        def on_xview(*args):
+            self.image_canvas.xview(*args)
+            self.draw_visible_tiles()
+        
+        v_scrollbar.config(command=on_yview)
+        h_scrollbar.config(command=on_xview)
         
         # Bind de la rueda del ratón para scroll
         def on_mouse_wheel(event):
             # En Windows, event.delta es múltiplo de 120
             self.image_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+            self.draw_visible_tiles()
         
         def on_shift_mouse_wheel(event):
             # Shift + rueda = scroll horizontal
             self.image_canvas.xview_scroll(int(-1 * (event.delta / 120)), "units")
+            self.draw_visible_tiles()
         
         self.image_canvas.bind("<MouseWheel>", on_mouse_wheel)
         self.image_canvas.bind("<Shift-MouseWheel>", on_shift_mouse_wheel)
+        self.image_canvas.bind("<Configure>", lambda event: self.draw_visible_tiles())
         
         # Botones de control de imagen
         img_control_frame = ttk.Frame(parent)
@@ -999,50 +1411,80 @@ class MicroplasticAnalysisGUI:
         self.current_photo = None
         self.original_image = None
         
+        # Pirámide de teselas del gráfico actual (zoom y scroll rápidos)
+        self.pyramid_cache = TilePyramidCache(max_pyramids=4, tile_size=512)
+        self.current_pyramid = None
+        self.tile_items = {}  # (col, fila) -> (id en canvas, PhotoImage)
+        
+        # Índice SQLite de gráficos (metadatos + miniaturas)
+        self.graph_index = GraphIndex()
+        self.graph_paths = {}  # nombre mostrado -> ruta
+        self.graph_rescan_running = False
+        
         # Cargar lista al inicio
         self.root.after(1500, self.refresh_graph_list)
     
-    def refresh_graph_list(self):
-        """Actualiza la lista de gráficos disponibles."""
-        graph_files = list(GRAPHS_DIR.glob("*.png"))
+    def refresh_graph_list(self, rescan=True):
+        """
+        Actualiza la lista de gráficos disponibles.
+        
+        El reescaneo del índice (que genera miniaturas) se hace en un hilo de
+        trabajo; la lista se rellena en el hilo de Tk cuando termina.
+        
+        Args:
+            rescan: Si True, actualiza antes el índice de forma incremental
+                    (ejecución actual y respaldos).
+        """
+        if not rescan:
+            self.show_graph_list()
+            return
         
-        if not graph_files:
-            self.graph_combo['values'] = ["No hay gráficos disponibles"]
-            self.graph_combo.current(0)
+        if self.graph_rescan_running:
             return
+        self.graph_rescan_running = True
+        
+        def finish(error):
+            self.graph_rescan_running = False
+            if error is not None:
+                self.log_console(f"[!] No se pudo actualizar el índice de gráficos: {error}\n")
+            self.graph_run_combo['values'] = [self.ALL_RUNS] + self.graph_index.run_ids()
+            self.show_graph_list()
+        
+        def worker():
+            try:
+                self.graph_index.update_runs()
+                self.root.after(0, lambda: finish(None))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: finish(error))
         
-        # Filtrar según categoría
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def show_graph_list(self):
+        """Rellena la lista de gráficos desde el índice según filtro, ejecución y búsqueda."""
         filter_value = self.filter_var.get()
+        run_id = self.graph_run_var.get()
+        entries = self.graph_index.query(
+            figure_type=self.GRAPH_FILTERS.get(filter_value),
+            run_id=None if run_id == self.ALL_RUNS else run_id,
+            search=self.graph_search_var.get().strip() or None
+        )
         
-        filtered_files = []
-        for file in graph_files:
-            name = file.stem
-            
-            if filter_value == "Todos":
-                filtered_files.append(file)
-            elif filter_value == "Dashboard" and "dashboard" in name:
-                filtered_files.append(file)
-            elif filter_value == "Distribución Tamaños" and "size_distribution" in name:
-                filtered_files.append(file)
-            elif filter_value == "Distribución Formas" and "shape_distribution" in name:
-                filtered_files.append(file)
-            elif filter_value == "Frecuencia" and "frequency" in name:
-                filtered_files.append(file)
-            elif filter_value == "Correlación" and "correlation" in name:
-                filtered_files.append(file)
-            elif filter_value == "Comparativos" and "comparative" in name:
-                filtered_files.append(file)
-        
-        if not filtered_files:
-            self.graph_combo['values'] = ["No hay gráficos en esta categoría"]
+        if not entries:
+            if filter_value == "Todos" and not self.graph_search_var.get().strip():
+                self.graph_combo['values'] = ["No hay gráficos disponibles"]
+            else:
+                self.graph_combo['values'] = ["No hay gráficos en esta categoría"]
             self.graph_combo.current(0)
             return
         
-        # Ordenar por nombre
-        filtered_files.sort()
-        
-        # Crear lista de nombres
-        graph_names = [f.name for f in filtered_files]
+        # Crear lista de nombres (el índice ya viene ordenado por nombre)
+        self.graph_paths = {
+            entry['name'] if entry['run_id'] == CURRENT_RUN else f"{entry['name']}  [{entry['run_id']}]":
+                Path(entry['path'])
+            for entry in entries
+        }
+        graph_names = list(self.graph_paths)
         self.graph_combo['values'] = graph_names
         
         # Mensaje informativo
@@ -1054,53 +1496,104 @@ class MicroplasticAnalysisGUI:
             self.load_selected_graph()
     
     def load_selected_graph(self, event=None):
-        """Carga el gráfico seleccionado."""
+        """Carga el gráfico seleccionado (miniatura inmediata, imagen completa en segundo plano)."""
         selected = self.graph_combo.get()
         
         if not selected or selected in ["No hay gráficos disponibles", "No hay gráficos en esta categoría"]:
             return
         
-        graph_path = GRAPHS_DIR / selected
+        graph_path = self.graph_paths.get(selected, GRAPHS_DIR / selected)
         
         if not graph_path.exists():
             messagebox.showerror("Error", f"No se encontró el archivo:\n{graph_path}")
             return
         
-        try:
-            # Cargar imagen
-            self.current_image_path = graph_path
-            self.original_image = Image.open(graph_path)
+        # Vista previa inmediata desde la miniatura en caché
+        thumbnail = self.graph_index.get_thumbnail(graph_path)
+        if thumbnail is not None:
+            self.current_pyramid = None
+            self.tile_items = {}
+            self.current_photo = ImageTk.PhotoImage(thumbnail)
+            self.image_canvas.delete("all")
+            self.image_canvas.create_image(0, 0, anchor=tk.NW, image=self.current_photo)
+            self.image_canvas.config(scrollregion=(0, 0, thumbnail.width, thumbnail.height))
+        
+        self.current_image_path = graph_path
+        
+        def load_full_image():
+            try:
+                image = Image.open(graph_path)
+                pyramid = self.pyramid_cache.get(graph_path, image)
+                self.root.after(0, lambda: show_full_image(image, pyramid))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror(
+                    "Error", f"Error al cargar la imagen:\n{error}"))
+        
+        def show_full_image(image, pyramid):
+            # Ignorar si el usuario ya eligió otro gráfico
+            if self.current_image_path != graph_path:
+                return
+            self.original_image = image
+            self.current_pyramid = pyramid
             self.zoom_var.set(0.3)  # Zoom inicial 30%
             self.display_image()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al cargar la imagen:\n{str(e)}")
+        
+        threading.Thread(target=load_full_image, daemon=True).start()
     
     def display_image(self):
         """Muestra la imagen en el canvas."""
-        if self.original_image is None:
+        if self.original_image is None or self.current_pyramid is None:
             return
         
-        # Aplicar zoom
+        # Aplicar zoom (solo cambia la región de scroll; las teselas se generan bajo demanda)
         zoom = self.zoom_var.get()
-        new_width = int(self.original_image.width * zoom)
-        new_height = int(self.original_image.height * zoom)
-        
-        self.current_image = self.original_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        self.current_photo = ImageTk.PhotoImage(self.current_image)
+        new_width, new_height = self.current_pyramid.display_size(zoom)
         
         # Limpiar canvas
         self.image_canvas.delete("all")
-        
-        # Mostrar imagen
-        self.image_canvas.create_image(0, 0, anchor=tk.NW, image=self.current_photo)
+        self.tile_items = {}
         
         # Actualizar scroll region
         self.image_canvas.config(scrollregion=(0, 0, new_width, new_height))
         
+        # Mostrar solo las teselas visibles
+        self.draw_visible_tiles()
+        
         # Actualizar etiqueta de zoom
         self.zoom_label.config(text=f"{int(zoom * 100)}%")
     
+    def draw_visible_tiles(self):
+        """Dibuja las teselas visibles del gráfico y descarta las que salen de pantalla."""
+        if self.current_pyramid is None:
+            return
+        
+        zoom = self.zoom_var.get()
+        x0 = self.image_canvas.canvasx(0)
+        y0 = self.image_canvas.canvasy(0)
+        x1 = self.image_canvas.canvasx(self.image_canvas.winfo_width())
+        y1 = self.image_canvas.canvasy(self.image_canvas.winfo_height())
+        
+        visible = set(self.current_pyramid.visible_tiles(zoom, x0, y0, x1, y1, margin=1))
+        
+        # Liberar teselas fuera del área visible
+        for key in list(self.tile_items):
+            if key not in visible:
+                item_id, _ = self.tile_items.pop(key)
+                self.image_canvas.delete(item_id)
+        
+        # Crear las teselas que faltan
+        tile_size = self.current_pyramid.tile_size
+        for col, row in visible:
+            if (col, row) in self.tile_items:
+                continue
+            tile = self.current_pyramid.get_tile(zoom, col, row)
+            photo = ImageTk.PhotoImage(tile)
+            item_id = self.image_canvas.create_image(
+                col * tile_size, row * tile_size, anchor=tk.NW, image=photo
+            )
+            self.tile_items[(col, row)] = (item_id, photo)
+    
     def zoom_image(self, factor, reset=False):
         """Aplica zoom a la imagen."""
         if self.original_image is None:
@@ -1208,8 +1701,9 @@ class MicroplasticAnalysisGUI:
             command=self.open_backups_folder
         ).pack(fill=tk.X, pady=5)
         
-        # Actualizar info al cargar
+        # Actualizar info al cargar (el registro de uso se corrige en segundo plano)
         self.root.after(1000, self.update_results_info)
+        self.root.after(1500, self.reconcile_results_ledger)
     
     def browse_images(self):
         """Abre diálogo para seleccionar imágenes y luego abre LabelImg para anotarlas."""
@@ -1411,13 +1905,17 @@ class MicroplasticAnalysisGUI:
             from src.image_processing import ImageProcessor
             from src.statistical_analysis import StatisticalAnalyzer
             from src.visualization import DataVisualizer
+            from src.results_manager import ResultsManager
             
             self.message_queue.put("="*60 + "\n")
             self.message_queue.put("[INICIO] ANALISIS DE MICROPLASTICOS CON YOLOv8\n")
             self.message_queue.put("="*60 + "\n\n")
             
-            # Mostrar información del modelo
+            # Mostrar información del modelo (versión = hash del registro)
             model_name = Path(self.yolo_model_path.get()).name
+            model_info = self.model_registry.find_by_path(self.yolo_model_path.get())
+            if model_info:
+                model_name = f"{model_info['name']} (v{model_info['hash'][:12]})"
             self.message_queue.put(f"🤖 Método de detección: YOLOv8\n")
             self.message_queue.put(f"📦 Modelo: {model_name}\n")
             self.message_queue.put(f"📏 Calibración: {self.pixels_to_um.get():.4f} μm/píxel\n")
@@ -1433,7 +1931,13 @@ class MicroplasticAnalysisGUI:
                     )
                     self_inner.analyzer = StatisticalAnalyzer()
                     self_inner.visualizer = DataVisualizer()
+                    self_inner.results_manager = ResultsManager()
                     self_inner.results = {}
+                    # Imagen de cada muestra (para encontrar slide_layout.json de su carpeta)
+                    self_inner.image_paths = {}
+                    self_inner.sketches = {}
+                    # Resumen de tamaños de todo el lote (se suma muestra a muestra)
+                    self_inner.batch_sketch = SizeSketch()
                 
                 def analyze_single_sample(self, image_path, sample_id):
                     """Analiza una única muestra."""
@@ -1450,6 +1954,19 @@ class MicroplasticAnalysisGUI:
                             output_dir=str(PROCESSED_IMAGES_DIR)
                         )
                         self.message_queue.put(f"   ✓ Detectadas {len(particles)} partículas\n")
+                        self.results_manager.register_output(
+                            PROCESSED_IMAGES_DIR / f"yolo_{Path(image_path).name}"
+                        )
+                        
+                        # Resumen de tamaños de la muestra, para los informes del lote
+                        sketch = SizeSketch()
+                        sketch.add_particles(particles, sample_id)
+                        sketch_path = REPORTS_DIR / f"{sample_id}{SKETCH_SUFFIX}"
+                        sketch.save(sketch_path)
+                        self.results_manager.register_output(sketch_path)
+                        self.batch_sketch.merge(sketch)
+                        self.image_paths[sample_id] = Path(image_path)
+                        self.sketches[sample_id] = sketch
                         
                         # Verificar si se detectaron partículas
                         if not particles or len(particles) == 0:
@@ -1475,28 +1992,34 @@ class MicroplasticAnalysisGUI:
                             class_plot_path = GRAPHS_DIR / f"{sample_id}_class_distribution.png"
                             self.visualizer.plot_class_distribution(df, sample_id, str(class_plot_path))
                             self.message_queue.put(f"   ✓ Guardado: {class_plot_path.name}\n")
+                            self.results_manager.register_output(class_plot_path)
                         
                         if 'equivalent_diameter_um' in df.columns:
                             size_plot_path = GRAPHS_DIR / f"{sample_id}_size_distribution.png"
                             self.visualizer.plot_size_distribution(df, sample_id, str(size_plot_path))
                             self.message_queue.put(f"   ✓ Guardado: {size_plot_path.name}\n")
+                            self.results_manager.register_output(size_plot_path)
                         
                         if 'aspect_ratio' in df.columns:
                             shape_plot_path = GRAPHS_DIR / f"{sample_id}_shape_distribution.png"
                             self.visualizer.plot_shape_distribution(df, sample_id, str(shape_plot_path))
                             self.message_queue.put(f"   ✓ Guardado: {shape_plot_path.name}\n")
+                            self.results_manager.register_output(shape_plot_path)
                         
                         dashboard_path = GRAPHS_DIR / f"{sample_id}_dashboard.png"
                         self.visualizer.create_summary_dashboard(df, sample_id, str(dashboard_path))
                         self.message_queue.put(f"   ✓ Guardado: {dashboard_path.name}\n")
+                        self.results_manager.register_output(dashboard_path)
                         
                         freq_path = GRAPHS_DIR / f"{sample_id}_frequency_curve.png"
                         self.visualizer.plot_size_frequency_curve(df, sample_id, str(freq_path))
                         self.message_queue.put(f"   ✓ Guardado: {freq_path.name}\n")
+                        self.results_manager.register_output(freq_path)
                         
                         corr_path = GRAPHS_DIR / f"{sample_id}_correlation_matrix.png"
                         self.visualizer.plot_correlation_matrix(df, str(corr_path))
                         self.message_queue.put(f"   ✓ Guardado: {corr_path.name}\n")
+                        self.results_manager.register_output(corr_path)
                         
                         # 4. Generar reporte textual
                         self.message_queue.put("4. Generando reporte...\n")
@@ -1505,12 +2028,14 @@ class MicroplasticAnalysisGUI:
                         with open(report_path, 'w', encoding='utf-8') as f:
                             f.write(report)
                         self.message_queue.put(f"   ✓ Guardado: {report_path.name}\n")
+                        self.results_manager.register_output(report_path)
                         
                         # 5. Exportar datos a Excel
                         self.message_queue.put("5. Exportando datos...\n")
                         excel_path = REPORTS_DIR / f"{sample_id}_data.xlsx"
                         df.to_excel(excel_path, index=False)
                         self.message_queue.put(f"   ✓ Guardado: {excel_path.name}\n")
+                        self.results_manager.register_output(excel_path)
                         
                         self.results[sample_id] = df
                         self.message_queue.put(f"\n✓ Análisis de {sample_id} completado exitosamente\n")
@@ -1538,18 +2063,63 @@ class MicroplasticAnalysisGUI:
                             self.results, 'area_um2', str(comp_area_path)
                         )
                         self.message_queue.put(f"   ✓ Guardado: {comp_area_path.name}\n")
+                        self.results_manager.register_output(comp_area_path)
                         
                         comp_diam_path = GRAPHS_DIR / "comparative_diameter.png"
                         self.visualizer.plot_comparative_analysis(
                             self.results, 'equivalent_diameter_um', str(comp_diam_path)
                         )
                         self.message_queue.put(f"   ✓ Guardado: {comp_diam_path.name}\n")
+                        self.results_manager.register_output(comp_diam_path)
                         
                         comp_aspect_path = GRAPHS_DIR / "comparative_aspect_ratio.png"
                         self.visualizer.plot_comparative_analysis(
                             self.results, 'aspect_ratio', str(comp_aspect_path)
                         )
                         self.message_queue.put(f"   ✓ Guardado: {comp_aspect_path.name}\n")
+                        self.results_manager.register_output(comp_aspect_path)
+                
+                def mark_slide_duplicates(self):
+                    """Marca las partículas repetidas en campos solapados de carpetas registradas."""
+                    import pandas as pd
+                    from src.slide_registration import LAYOUT_FILENAME, mark_slide_duplicates
+                    
+                    folders = {}
+                    for sample_id in self.results:
+                        folders.setdefault(self.image_paths[sample_id].parent, []).append(sample_id)
+                    
+                    for folder, sample_ids in folders.items():
+                        slide_df = pd.concat([self.results[s] for s in sample_ids], ignore_index=True)
+                        marked = mark_slide_duplicates(slide_df, folder)
+                        if marked is None:
+                            continue
+                        
+                        n_duplicates = int(marked['is_duplicate'].sum())
+                        self.message_queue.put(
+                            f"📐 {folder.name}: {n_duplicates} copias de partículas en campos "
+                            f"solapados ({LAYOUT_FILENAME})\n"
+                        )
+                        for sample_id, frame_df in marked.groupby('sample_id', sort=False):
+                            frame_df = frame_df.reset_index(drop=True)
+                            self.results[sample_id] = frame_df
+                            # El resumen de tamaños de cada campo tampoco cuenta las copias
+                            sketch = SizeSketch()
+                            sketch.add_particles(
+                                frame_df[~frame_df['is_duplicate']].to_dict('records'), sample_id
+                            )
+                            sketch.save(REPORTS_DIR / f"{sample_id}{SKETCH_SUFFIX}")
+                            self.sketches[sample_id] = sketch
+                        
+                        report = self.analyzer.generate_summary_report(marked, f"{folder.name} (campos unidos)")
+                        report_path = REPORTS_DIR / f"{folder.name}_slide_report.txt"
+                        with open(report_path, 'w', encoding='utf-8') as f:
+                            f.write(report)
+                        self.message_queue.put(f"✓ Reporte de la muestra completa guardado: {report_path.name}\n")
+                        self.results_manager.register_output(report_path)
+                    
+                    self.batch_sketch = SizeSketch()
+                    for sketch in self.sketches.values():
+                        self.batch_sketch.merge(sketch)
                 
                 def generate_consolidated_report(self):
                     if not self.results:
@@ -1561,17 +2131,24 @@ class MicroplasticAnalysisGUI:
                     
                     import pandas as pd
                     
+                    self.mark_slide_duplicates()
+                    
                     all_data = pd.concat(self.results.values(), ignore_index=True)
                     
                     consolidated_path = REPORTS_DIR / "consolidated_data.xlsx"
                     all_data.to_excel(consolidated_path, index=False)
                     self.message_queue.put(f"✓ Datos consolidados guardados: {consolidated_path.name}\n")
+                    self.results_manager.register_output(consolidated_path)
                     
                     summary_stats = []
                     for sample_id, df in self.results.items():
+                        n_duplicates = int(df['is_duplicate'].sum()) if 'is_duplicate' in df.columns else 0
+                        if n_duplicates:
+                            df = df[~df['is_duplicate']]
                         stats = {
                             'Muestra': sample_id,
                             'N_partículas': len(df),
+                            'N_copias_solape': n_duplicates,
                             'Área_media_μm2': df['area_um2'].mean() if 'area_um2' in df.columns else 0,
                             'Área_std_μm2': df['area_um2'].std() if 'area_um2' in df.columns else 0,
                             'Diámetro_medio_μm': df['equivalent_diameter_um'].mean() if 'equivalent_diameter_um' in df.columns else 0,
@@ -1584,6 +2161,28 @@ class MicroplasticAnalysisGUI:
                     summary_path = REPORTS_DIR / "summary_statistics.xlsx"
                     summary_df.to_excel(summary_path, index=False)
                     self.message_queue.put(f"✓ Estadísticos resumen guardados: {summary_path.name}\n")
+                    self.results_manager.register_output(summary_path)
+                    
+                    # Informe y distribución de tamaños del lote desde el resumen combinado
+                    batch_sketch_path = REPORTS_DIR / f"consolidated{SKETCH_SUFFIX}"
+                    self.batch_sketch.save(batch_sketch_path)
+                    self.results_manager.register_output(batch_sketch_path)
+                    
+                    batch_report = self.analyzer.generate_summary_report(
+                        None, f"Lote ({len(self.batch_sketch.samples)} muestras)", sketch=self.batch_sketch
+                    )
+                    batch_report_path = REPORTS_DIR / "consolidated_report.txt"
+                    with open(batch_report_path, 'w', encoding='utf-8') as f:
+                        f.write(batch_report)
+                    self.message_queue.put(f"✓ Reporte del lote guardado: {batch_report_path.name}\n")
+                    self.results_manager.register_output(batch_report_path)
+                    
+                    batch_plot_path = GRAPHS_DIR / "consolidated_size_distribution.png"
+                    self.visualizer.plot_sketch_size_distribution(
+                        self.batch_sketch, "Lote", str(batch_plot_path)
+                    )
+                    self.message_queue.put(f"✓ Guardado: {batch_plot_path.name}\n")
+                    self.results_manager.register_output(batch_plot_path)
             
             # Vincular message_queue al sistema
             MicroplasticAnalysisSystem.message_queue = self.message_queue
@@ -1642,6 +2241,14 @@ class MicroplasticAnalysisGUI:
         self.analysis_running = False
         self.log_console("\n[!] Analisis detenido por el usuario.\n")
     
+    def reconcile_results_ledger(self):
+        """Reconcilia en segundo plano el registro de uso de disco con las carpetas."""
+        from src.results_manager import ResultsManager
+        
+        ResultsManager().start_background_reconcile(
+            callback=lambda: self.root.after(0, self.update_results_info)
+        )
+    
     def update_results_info(self):
         """Actualiza la información de resultados."""
         try:
@@ -1692,10 +2299,14 @@ class MicroplasticAnalysisGUI:
             self.info_text.insert(1.0, error_msg)
             print(f"DEBUG: {error_msg}")
     
-    def backup_results(self):
-        """Crea respaldo de resultados."""
+    def backup_results(self, on_complete=None):
+        """
+        Crea respaldo incremental de resultados en un hilo de trabajo.
+        
+        Args:
+            on_complete: Función opcional que se llama al terminar (o si no se respalda).
+        """
         from src.results_manager import ResultsManager
-        from datetime import datetime
         
         # Verificar si hay resultados para respaldar
         manager = ResultsManager()
@@ -1708,105 +2319,93 @@ class MicroplasticAnalysisGUI:
                 "No hay resultados disponibles para respaldar.\n\n"
                 "Ejecuta un análisis primero para generar resultados."
             )
+            if on_complete:
+                on_complete()
             return
         
-        if messagebox.askyesno(
+        if not messagebox.askyesno(
             "Crear Respaldo", 
             f"Se respaldarán:\n"
             f"• {graphs_count} gráficos\n"
             f"• {reports_count} reportes\n\n"
             f"¿Deseas continuar?"
         ):
-            try:
-                # Mostrar ventana de progreso
-                progress_win = tk.Toplevel(self.root)
-                progress_win.title("Creando Respaldo")
-                progress_win.geometry("400x150")
-                progress_win.transient(self.root)
-                progress_win.grab_set()
-                
-                tk.Label(
-                    progress_win, 
-                    text="🔄 Creando respaldo...\nPor favor espera.",
-                    font=("Arial", 12),
-                    pady=20
-                ).pack()
-                
-                progress_bar = ttk.Progressbar(progress_win, mode='indeterminate')
-                progress_bar.pack(fill=tk.X, padx=20, pady=20)
-                progress_bar.start()
-                
-                status_label = tk.Label(progress_win, text="Iniciando...", font=("Arial", 9))
-                status_label.pack()
-                
-                self.root.update()
-                
-                # Crear respaldo
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_folder = manager.backups_dir / f"backup_{timestamp}"
-                backup_folder.mkdir(parents=True, exist_ok=True)
-                
-                import shutil
-                
-                # Copiar gráficos
-                if graphs_count > 0:
-                    status_label.config(text="Copiando gráficos...")
-                    self.root.update()
-                    backup_graphs = backup_folder / "graphs"
-                    backup_graphs.mkdir(parents=True, exist_ok=True)
-                    for file in GRAPHS_DIR.glob("*.png"):
-                        shutil.copy2(file, backup_graphs / file.name)
-                
-                # Copiar reportes
-                if reports_count > 0:
-                    status_label.config(text="Copiando reportes...")
-                    self.root.update()
-                    backup_reports = backup_folder / "reports"
-                    backup_reports.mkdir(parents=True, exist_ok=True)
-                    for file in REPORTS_DIR.glob("*"):
-                        if file.suffix in ['.xlsx', '.txt']:
-                            shutil.copy2(file, backup_reports / file.name)
-                
-                # Copiar imágenes procesadas
-                processed_files = [f for f in PROCESSED_IMAGES_DIR.glob("*") 
-                                 if f.name not in [".gitkeep", "INSTRUCCIONES.md"]]
-                if processed_files:
-                    status_label.config(text="Copiando imágenes procesadas...")
-                    self.root.update()
-                    backup_processed = backup_folder / "processed_images"
-                    backup_processed.mkdir(parents=True, exist_ok=True)
-                    for file in processed_files:
-                        shutil.copy2(file, backup_processed / file.name)
-                
-                backup_size = manager.get_folder_size(backup_folder)
-                
-                progress_bar.stop()
-                progress_win.destroy()
-                
+            if on_complete:
+                on_complete()
+            return
+        
+        # Mostrar ventana de progreso
+        progress_win = tk.Toplevel(self.root)
+        progress_win.title("Creando Respaldo")
+        progress_win.geometry("400x150")
+        progress_win.transient(self.root)
+        progress_win.grab_set()
+        
+        tk.Label(
+            progress_win, 
+            text="🔄 Creando respaldo...\nPor favor espera.",
+            font=("Arial", 12),
+            pady=20
+        ).pack()
+        
+        progress_bar = ttk.Progressbar(progress_win, mode='determinate', maximum=1)
+        progress_bar.pack(fill=tk.X, padx=20, pady=20)
+        
+        status_label = tk.Label(progress_win, text="Iniciando...", font=("Arial", 9))
+        status_label.pack()
+        
+        def update_progress(done, total, file_name):
+            # Llamado desde el hilo de trabajo: delegar al hilo de Tk
+            def apply():
+                progress_bar.config(maximum=max(total, 1), value=done)
+                status_label.config(text=f"{done}/{total}  {file_name}")
+            self.root.after(0, apply)
+        
+        def finish(summary, error):
+            progress_win.destroy()
+            
+            if error is not None:
+                messagebox.showerror(
+                    "Error al Crear Respaldo",
+                    f"Ocurrió un error al crear el respaldo:\n\n{error}"
+                )
+            else:
+                backup_folder = summary['snapshot_dir']
                 messagebox.showinfo(
                     "Respaldo Creado", 
                     f"✓ El respaldo se ha creado exitosamente.\n\n"
                     f"Ubicación: {backup_folder.name}\n"
-                    f"Tamaño: {backup_size:.2f} MB\n\n"
+                    f"Archivos: {summary['files']} "
+                    f"({summary['total_bytes'] / (1024 * 1024):.2f} MB)\n"
+                    f"Espacio nuevo usado: {summary['new_bytes'] / (1024 * 1024):.2f} MB "
+                    f"({summary['new_objects']} archivos nuevos)\n"
+                    f"Espacio liberado de respaldos borrados: "
+                    f"{summary['freed_bytes'] / (1024 * 1024):.2f} MB\n\n"
+                    f"Los archivos del respaldo son de solo lectura.\n"
                     f"Carpeta completa:\n{backup_folder}"
                 )
                 
                 # Abrir carpeta de respaldo
-                import subprocess
                 try:
                     subprocess.Popen(f'explorer "{backup_folder}"')
                 except:
                     pass
                 
                 self.update_results_info()
-                
+            
+            # Si el respaldo falló no se continúa (ej. no limpiar resultados)
+            if on_complete and error is None:
+                on_complete()
+        
+        def worker():
+            try:
+                summary = manager.create_backup(progress_callback=update_progress)
+                self.root.after(0, lambda: finish(summary, None))
             except Exception as e:
-                if 'progress_win' in locals():
-                    progress_win.destroy()
-                messagebox.showerror(
-                    "Error al Crear Respaldo",
-                    f"Ocurrió un error al crear el respaldo:\n\n{str(e)}"
-                )
+                error = str(e)
+                self.root.after(0, lambda: finish(None, error))
+        
+        threading.Thread(target=worker, daemon=True).start()
     
     def clean_results(self):
         """Limpia todos los resultados."""
@@ -1848,9 +2447,18 @@ class MicroplasticAnalysisGUI:
         if response is None:  # Cancelar
             return
         
-        if response:  # Sí - respaldar primero
-            self.backup_results()
+        if response:  # Sí - respaldar primero (la limpieza espera a que termine)
+            self.backup_results(on_complete=lambda: self.remove_results(processed_files))
+        else:
+            self.remove_results(processed_files)
+    
+    def remove_results(self, processed_files):
+        """
+        Elimina los archivos de resultados.
         
+        Args:
+            processed_files: Lista de imágenes procesadas a eliminar.
+        """
         try:
             # Mostrar ventana de progreso
             progress_win = tk.Toplevel(self.root)
@@ -1875,25 +2483,32 @@ class MicroplasticAnalysisGUI:
             
             self.root.update()
             
+            from src.results_manager import ResultsManager
+            manager = ResultsManager()
+            
             deleted_count = 0
             
             # Limpiar gráficos
             for file in GRAPHS_DIR.glob("*.png"):
                 file.unlink()
+                manager.unregister_output(file)
                 deleted_count += 1
             
             # Limpiar reportes
             for file in REPORTS_DIR.glob("*.xlsx"):
                 file.unlink()
+                manager.unregister_output(file)
                 deleted_count += 1
             
             for file in REPORTS_DIR.glob("*.txt"):
                 file.unlink()
+                manager.unregister_output(file)
                 deleted_count += 1
             
             # Limpiar imágenes procesadas
             for file in processed_files:
                 file.unlink()
+                manager.unregister_output(file)
                 deleted_count += 1
             
             progress_bar.stop()
@@ -2015,4 +2630,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Necesario para el pool de procesos en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     main()
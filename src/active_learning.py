@@ -0,0 +1,529 @@
+"""
+Módulo de aprendizaje activo: qué imágenes anotar a continuación.
+
+Ejecuta el modelo entrenado sobre las imágenes que aún no tienen una
+anotación humana y puntúa cada una por incertidumbre:
+- Detecciones de confianza baja (ni claramente objeto ni claramente fondo).
+- Margen entre clases: cajas casi iguales predichas con clases distintas
+  y confianzas parecidas.
+- Desacuerdo con la imagen volteada horizontalmente (test-time flip).
+
+Para que la lista no se llene de imágenes casi iguales, las imágenes se
+agrupan con k-means sobre vectores de la red troncal del modelo y la
+lista priorizada alterna entre grupos. El resultado es un archivo de
+texto con una ruta por línea que LabelImg abre en ese orden.
+
+La inferencia se hace en lotes (imagen y su versión volteada en la misma
+llamada), la lectura de imágenes en paralelo con hilos mientras el modelo
+procesa el lote anterior, y las puntuaciones se guardan en SQLite después
+de cada lote: una ejecución interrumpida continúa donde se quedó.
+"""
+
+import csv
+import sqlite3
+import sys
+import time
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import ACTIVE_LEARNING_DIR, RAW_IMAGES_DIR
+from src.annotation_index import STATUS_MISSING, STATUS_PRELABEL, read_annotation_status
+from src.image_files import list_images
+from src.model_registry import ModelRegistry
+from src.yolo_detector import get_detector
+
+
+# Umbral de confianza de la inferencia (bajo, para ver también las detecciones dudosas)
+SCORE_CONFIDENCE = 0.05
+# Rango de confianza que se considera dudoso
+UNCERTAIN_RANGE = (0.1, 0.5)
+# Número de detecciones dudosas a partir del cual la puntuación se satura
+MAX_UNCERTAIN_COUNT = 10
+# IoU mínimo para considerar que dos cajas son el mismo objeto
+MATCH_IOU = 0.5
+# Lado de la miniatura usada como vector si el modelo no da vectores de la red troncal
+THUMBNAIL_SIZE = 16
+DEFAULT_CLUSTERS = 50
+
+# Tipo de vector guardado con cada puntuación (solo se comparan vectores del mismo tipo)
+EMBEDDING_BACKBONE = 'backbone'
+EMBEDDING_THUMBNAIL = 'thumbnail'
+
+SCORES_FILENAME = "scores.sqlite"
+WORKLIST_FILENAME = "worklist.txt"
+WORKLIST_CSV_FILENAME = "worklist.csv"
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    IoU entre dos conjuntos de cajas [x1, y1, x2, y2].
+    
+    Returns:
+        Matriz (N, M).
+    """
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def unflip_boxes(boxes: np.ndarray, width: int) -> np.ndarray:
+    """Lleva cajas predichas en la imagen volteada horizontalmente a la original."""
+    unflipped = boxes.copy()
+    unflipped[:, 0] = width - boxes[:, 2]
+    unflipped[:, 2] = width - boxes[:, 0]
+    return unflipped
+
+
+def uncertainty_scores(prediction, flipped_prediction) -> Dict[str, float]:
+    """
+    Puntuaciones de incertidumbre de una imagen, cada una entre 0 y 1.
+    
+    Args:
+        prediction: (cajas, clases, confianzas) de la imagen.
+        flipped_prediction: Lo mismo para la imagen volteada, con las cajas
+                            ya llevadas a la imagen original.
+    
+    Returns:
+        Diccionario con 'low_confidence', 'margin', 'disagreement',
+        'uncertainty' (media de las tres) y 'detections'.
+    """
+    boxes, class_ids, confidences = prediction
+    low, high = UNCERTAIN_RANGE
+    
+    # Detecciones de confianza dudosa
+    uncertain_count = int(np.count_nonzero((confidences >= low) & (confidences < high)))
+    low_confidence = min(uncertain_count, MAX_UNCERTAIN_COUNT) / MAX_UNCERTAIN_COUNT
+    
+    # El resto de medidas ignora el ruido por debajo del rango dudoso
+    keep = confidences >= low
+    boxes, class_ids, confidences = boxes[keep], class_ids[keep], confidences[keep]
+    flip_boxes, flip_class_ids, flip_confidences = flipped_prediction
+    flip_keep = flip_confidences >= low
+    flip_boxes, flip_class_ids = flip_boxes[flip_keep], flip_class_ids[flip_keep]
+    
+    # Margen entre clases: el NMS es por clase, así que un objeto dudoso
+    # aparece como cajas solapadas de clases distintas
+    margin = 0.0
+    if len(boxes) > 1:
+        competing = (box_iou(boxes, boxes) > MATCH_IOU) & (class_ids[:, None] != class_ids[None, :])
+        if competing.any():
+            gaps = np.abs(confidences[:, None] - confidences[None, :])[competing]
+            margin = float(1.0 - gaps.min())
+    
+    # Desacuerdo con la imagen volteada: 1 - IoU medio del mejor emparejamiento
+    disagreement = 0.0
+    if len(boxes) or len(flip_boxes):
+        if len(boxes) and len(flip_boxes):
+            iou = box_iou(boxes, flip_boxes) * (class_ids[:, None] == flip_class_ids[None, :])
+            best = np.concatenate([iou.max(axis=1), iou.max(axis=0)])
+        else:
+            best = np.zeros(len(boxes) + len(flip_boxes))
+        disagreement = float(1.0 - best.mean())
+    
+    return {
+        'low_confidence': low_confidence,
+        'margin': margin,
+        'disagreement': disagreement,
+        'uncertainty': (low_confidence + margin + disagreement) / 3.0,
+        'detections': int(len(boxes)),
+    }
+
+
+def thumbnail_embedding(image: np.ndarray) -> np.ndarray:
+    """Vector de apariencia barato: miniatura en gris centrada en cero."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thumbnail = cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    vector = thumbnail.astype(np.float32).reshape(-1)
+    return vector - vector.mean()
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> np.ndarray:
+    """
+    Agrupa vectores con k-means (inicialización k-means++).
+    
+    Args:
+        vectors: Array (N, D).
+        k: Número de grupos.
+        iterations: Máximo de iteraciones.
+        seed: Semilla para que la lista sea reproducible.
+    
+    Returns:
+        Grupo de cada vector (N,).
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    n = len(vectors)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    squared_norms = np.einsum('ij,ij->i', vectors, vectors)
+    
+    def distances(centers):
+        d = squared_norms[:, None] - 2.0 * vectors @ centers.T + np.einsum('ij,ij->i', centers, centers)[None, :]
+        return np.maximum(d, 0.0)
+    
+    centers = vectors[[rng.integers(n)]]
+    closest = distances(centers)[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        index = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centers = np.vstack([centers, vectors[index]])
+        closest = np.minimum(closest, distances(centers[-1:])[:, 0])
+    
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        new_labels = distances(centers).argmin(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = labels == cluster
+            if members.any():
+                centers[cluster] = vectors[members].mean(axis=0)
+    return labels
+
+
+def rank_diverse(uncertainty: np.ndarray, clusters: np.ndarray) -> np.ndarray:
+    """
+    Ordena alternando entre grupos: primero la imagen más dudosa de cada
+    grupo, luego la segunda de cada grupo, etc. (cada ronda por incertidumbre).
+    
+    Returns:
+        Índices en orden de prioridad.
+    """
+    by_cluster = np.lexsort((-uncertainty, clusters))
+    sorted_clusters = clusters[by_cluster]
+    starts = np.flatnonzero(np.r_[True, sorted_clusters[1:] != sorted_clusters[:-1]])
+    rank_in_cluster = np.empty(len(clusters), dtype=np.int64)
+    rank_in_cluster[by_cluster] = np.arange(len(clusters)) - np.repeat(starts, np.diff(np.r_[starts, len(clusters)]))
+    return np.lexsort((-uncertainty, rank_in_cluster))
+
+
+def _read_image(path: Path) -> Optional[np.ndarray]:
+    return cv2.imread(str(path))
+
+
+class ActiveLearningSampler:
+    """Puntúa imágenes sin anotar y genera la lista priorizada para LabelImg."""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scores (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            model_version TEXT,
+            uncertainty REAL,
+            low_confidence REAL,
+            margin REAL,
+            disagreement REAL,
+            detections INTEGER,
+            embedding_kind TEXT,
+            embedding BLOB
+        );
+    """
+    
+    def __init__(self,
+                 model_path: Optional[str] = None,
+                 output_dir: Path = ACTIVE_LEARNING_DIR,
+                 batch_size: int = 16,
+                 workers: int = 4,
+                 registry: Optional[ModelRegistry] = None):
+        """
+        Inicializa el muestreador.
+        
+        Args:
+            model_path: Modelo a usar. None = modelo predeterminado del registro.
+            output_dir: Carpeta de las puntuaciones y de la lista priorizada.
+            batch_size: Imágenes por lote de inferencia (cada una va con su
+                        versión volteada, así que el lote real es el doble).
+            workers: Hilos de lectura de imágenes.
+            registry: Registro de modelos (por defecto el del proyecto).
+        """
+        registry = registry or ModelRegistry()
+        if model_path is None:
+            default = registry.get_default()
+            if default is None:
+                raise FileNotFoundError(
+                    "No hay un modelo predeterminado. Entrena un modelo o indica --model."
+                )
+            model_path = default['path']
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"No existe el modelo: {model_path}")
+        
+        self.detector = get_detector(model_path, confidence_threshold=SCORE_CONFIDENCE,
+                                     registry=registry)
+        self.model_version = self.detector.model_version
+        self.batch_size = batch_size
+        self.workers = workers
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.output_dir / SCORES_FILENAME
+        with self._connect() as conn:
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(scores)")}
+            if columns and 'embedding_kind' not in columns:
+                # Tabla de una versión anterior: las puntuaciones son una caché y se recalculan
+                conn.execute("DROP TABLE scores")
+            conn.executescript(self.SCHEMA)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión nueva (una por llamada, apta para hilos); confirma y la cierra al salir."""
+        with closing(sqlite3.connect(str(self.db_path))) as conn, conn:
+            conn.row_factory = sqlite3.Row
+            yield conn
+    
+    @staticmethod
+    def unlabeled_pool(images_dirs: List[Path],
+                       annotations_dir: Optional[Path] = None) -> List[Path]:
+        """
+        Imágenes sin anotación humana (sin XML o solo con una pre-anotación).
+        
+        Args:
+            images_dirs: Carpetas de imágenes.
+            annotations_dir: Carpeta de los XML (por defecto la de cada imagen).
+        
+        Returns:
+            Lista de rutas.
+        """
+        pool = []
+        for images_dir in images_dirs:
+            xml_dir = Path(annotations_dir) if annotations_dir else Path(images_dir)
+            for image_path in list_images(Path(images_dir)):
+                status, _ = read_annotation_status(xml_dir / f"{image_path.stem}.xml")
+                if status in (STATUS_MISSING, STATUS_PRELABEL):
+                    pool.append(image_path.resolve())
+        return pool
+    
+    def _pending(self, images: List[Path]) -> List[Path]:
+        """Imágenes sin puntuación válida (nuevas, modificadas o de otro modelo)."""
+        with self._connect() as conn:
+            cached = {row['path']: (row['size'], row['mtime'])
+                      for row in conn.execute("SELECT path, size, mtime FROM scores WHERE model_version = ?",
+                                              (self.model_version,))}
+        pending = []
+        for path in images:
+            stat = path.stat()
+            if cached.get(str(path)) != (stat.st_size, stat.st_mtime):
+                pending.append(path)
+        return pending
+    
+    def _score_batch(self, paths: List[Path], images: List[np.ndarray]) -> List[tuple]:
+        """Puntúa un lote y devuelve las filas para la base de datos."""
+        flipped = [cv2.flip(image, 1) for image in images]
+        predictions = self.detector.predict_boxes(images + flipped, batch_size=2 * len(images))
+        
+        embeddings = self.detector.embed_images(images)
+        embedding_kind = EMBEDDING_BACKBONE
+        if embeddings is None:
+            embeddings = np.stack([thumbnail_embedding(image) for image in images])
+            embedding_kind = EMBEDDING_THUMBNAIL
+        
+        rows = []
+        for i, (path, image) in enumerate(zip(paths, images)):
+            flip_boxes, flip_class_ids, flip_confidences = predictions[len(images) + i]
+            scores = uncertainty_scores(
+                predictions[i],
+                (unflip_boxes(flip_boxes, image.shape[1]), flip_class_ids, flip_confidences)
+            )
+            stat = path.stat()
+            rows.append((
+                str(path), stat.st_size, stat.st_mtime, self.model_version,
+                scores['uncertainty'], scores['low_confidence'], scores['margin'],
+                scores['disagreement'], scores['detections'], embedding_kind,
+                embeddings[i].astype(np.float32).tobytes()
+            ))
+        return rows
+    
+    def score(self, images: List[Path],
+              progress_callback: Optional[Callable[[int, int, str], None]] = None) -> int:
+        """
+        Puntúa las imágenes que aún no tienen puntuación con el modelo actual.
+        
+        Args:
+            images: Imágenes del conjunto sin anotar.
+            progress_callback: Función (procesados, total, nombre_archivo).
+        
+        Returns:
+            Número de imágenes puntuadas en esta llamada.
+        """
+        pending = self._pending(images)
+        if not pending:
+            return 0
+        
+        print(f"🧮 Puntuando {len(pending)} imágenes ({len(images) - len(pending)} ya en caché)")
+        chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        start_time = time.time()
+        done = 0
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            next_images = [executor.submit(_read_image, path) for path in chunks[0]]
+            for index, chunk in enumerate(chunks):
+                loaded = [future.result() for future in next_images]
+                # Leer el lote siguiente mientras el modelo procesa este
+                if index + 1 < len(chunks):
+                    next_images = [executor.submit(_read_image, path) for path in chunks[index + 1]]
+                
+                valid = [(path, image) for path, image in zip(chunk, loaded) if image is not None]
+                for path, image in zip(chunk, loaded):
+                    if image is None:
+                        print(f"   ⚠️ No se pudo leer {path.name}")
+                if valid:
+                    rows = self._score_batch([p for p, _ in valid], [img for _, img in valid])
+                    with self._connect() as conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                        )
+                
+                done += len(chunk)
+                if progress_callback:
+                    progress_callback(done, len(pending), chunk[-1].name)
+                elif index % 50 == 0 or done == len(pending):
+                    elapsed = time.time() - start_time
+                    rate = done / elapsed if elapsed > 0 else 0.0
+                    remaining = (len(pending) - done) / rate if rate > 0 else 0.0
+                    print(f"   {done}/{len(pending)} imágenes | {rate:.1f} img/s | "
+                          f"quedan ~{remaining / 60:.0f} min")
+        
+        return len(pending)
+    
+    def rank(self, images: List[Path], n_clusters: int = DEFAULT_CLUSTERS) -> List[Dict]:
+        """
+        Ordena las imágenes puntuadas por incertidumbre alternando entre grupos.
+        
+        Los vectores de la red troncal y las miniaturas no son comparables:
+        si hay puntuaciones de ambos tipos (p. ej. embed falló en algunos
+        lotes), cada tipo se agrupa por separado y los grupos se reparten
+        según el número de imágenes de cada uno.
+        
+        Args:
+            images: Imágenes del conjunto sin anotar (ya puntuadas).
+            n_clusters: Número de grupos de k-means para la diversidad.
+        
+        Returns:
+            Lista de diccionarios (path, uncertainty, low_confidence, margin,
+            disagreement, detections, cluster) en orden de prioridad.
+        """
+        wanted = {str(path) for path in images}
+        with self._connect() as conn:
+            rows = [dict(row) for row in conn.execute("SELECT * FROM scores WHERE model_version = ?",
+                                                      (self.model_version,))
+                    if row['path'] in wanted]
+        if not rows:
+            return []
+        
+        uncertainty = np.array([row['uncertainty'] for row in rows])
+        kinds = np.array([row['embedding_kind'] for row in rows])
+        clusters = np.zeros(len(rows), dtype=np.int64)
+        first_cluster = 0
+        for kind in np.unique(kinds):
+            members = np.flatnonzero(kinds == kind)
+            embeddings = np.stack([np.frombuffer(rows[i]['embedding'], dtype=np.float32) for i in members])
+            # Distancia coseno: vectores de norma 1
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-9)
+            k = max(1, round(n_clusters * len(members) / len(rows)))
+            clusters[members] = first_cluster + kmeans(embeddings, k)
+            first_cluster += k
+        for row in rows:
+            del row['embedding']
+        
+        ranking = []
+        for index in rank_diverse(uncertainty, clusters):
+            row = rows[index]
+            row['cluster'] = int(clusters[index])
+            ranking.append(row)
+        return ranking
+    
+    def write_worklist(self, ranking: List[Dict]) -> Path:
+        """
+        Escribe la lista priorizada (una ruta por línea) y un CSV con las puntuaciones.
+        
+        Returns:
+            Ruta de la lista para abrirla con LabelImg.
+        """
+        worklist_path = self.output_dir / WORKLIST_FILENAME
+        with open(worklist_path, 'w', encoding='utf-8') as f:
+            f.write(f"# Lista priorizada de anotación (modelo v{self.model_version})\n")
+            for row in ranking:
+                f.write(f"{row['path']}\n")
+        
+        with open(self.output_dir / WORKLIST_CSV_FILENAME, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['rank', 'path', 'uncertainty', 'low_confidence', 'margin',
+                             'disagreement', 'detections', 'cluster'])
+            for rank, row in enumerate(ranking, 1):
+                writer.writerow([rank, row['path'], f"{row['uncertainty']:.4f}",
+                                 f"{row['low_confidence']:.4f}", f"{row['margin']:.4f}",
+                                 f"{row['disagreement']:.4f}", row['detections'], row['cluster']])
+        return worklist_path
+    
+    def run(self, images_dirs: List[Path],
+            annotations_dir: Optional[Path] = None,
+            n_clusters: int = DEFAULT_CLUSTERS,
+            progress_callback: Optional[Callable[[int, int, str], None]] = None) -> Path:
+        """
+        Puntúa el conjunto sin anotar y escribe la lista priorizada.
+        
+        Returns:
+            Ruta de la lista (worklist.txt).
+        """
+        pool = self.unlabeled_pool(images_dirs, annotations_dir)
+        print(f"🔎 {len(pool)} imágenes sin anotación humana")
+        self.score(pool, progress_callback)
+        ranking = self.rank(pool, n_clusters)
+        worklist_path = self.write_worklist(ranking)
+        
+        print(f"✅ Lista priorizada: {worklist_path} ({len(ranking)} imágenes)")
+        for row in ranking[:10]:
+            print(f"   {row['uncertainty']:.3f}  grupo {row['cluster']:>3}  {Path(row['path']).name}")
+        return worklist_path
+
+
+def main():
+    """Función principal para generar la lista priorizada desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Priorizar qué imágenes anotar según la incertidumbre del modelo'
+    )
+    parser.add_argument('--images', type=str, nargs='+', default=[str(RAW_IMAGES_DIR)],
+                        help='Carpetas de imágenes sin anotar')
+    parser.add_argument('--annotations', type=str, default=None,
+                        help='Carpeta de los XML (por defecto la de las imágenes)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Modelo a usar (por defecto el predeterminado del registro)')
+    parser.add_argument('--batch', type=int, default=16,
+                        help='Imágenes por lote de inferencia')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Hilos de lectura de imágenes')
+    parser.add_argument('--clusters', type=int, default=DEFAULT_CLUSTERS,
+                        help='Grupos de k-means para la diversidad')
+    parser.add_argument('--open', action='store_true',
+                        help='Abrir LabelImg con la lista al terminar')
+    
+    args = parser.parse_args()
+    
+    sampler = ActiveLearningSampler(args.model, batch_size=args.batch, workers=args.workers)
+    worklist_path = sampler.run(
+        [Path(p) for p in args.images],
+        Path(args.annotations) if args.annotations else None,
+        n_clusters=args.clusters
+    )
+    
+    if args.open:
+        from src.image_annotation import ImageAnnotator
+        annotator = ImageAnnotator(args.images[0], args.annotations)
+        annotator.launch_labelimg(worklist=worklist_path)
+
+
+if __name__ == "__main__":
+    main()
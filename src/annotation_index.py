@@ -0,0 +1,319 @@
+"""
+Módulo de índice de anotaciones de LabelImg.
+
+Las estadísticas del dataset (conteo por clase, tamaños de caja, objetos
+por imagen) se calculaban releyendo todos los XML con ElementTree en cada
+consulta. Este índice lee cada XML una sola vez con iterparse (sin
+construir el árbol completo), en paralelo cuando hay muchos archivos, y
+guarda las cajas en una caché JSON indexada por tamaño y fecha de
+modificación. En las siguientes consultas solo se vuelven a leer los
+archivos nuevos o modificados.
+
+Las pre-anotaciones del modelo que nadie ha revisado (ver pre_annotation)
+se guardan en el índice pero no cuentan en las estadísticas.
+"""
+
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.voc_conversion import map_files
+
+
+INDEX_FILENAME = ".annotation_index.json"
+# 2: parse_voc_boxes guarda las coordenadas como float (antes se truncaban a int)
+# 3: cada entrada guarda el estado de la anotación ('status')
+INDEX_VERSION = 3
+
+BOX_TAGS = ('xmin', 'ymin', 'xmax', 'ymax')
+
+# Texto del campo source/database que identifica un XML pre-anotado
+PRELABEL_DATABASE = "Pre-anotación YOLO"
+PRELABEL_PATTERN = re.compile(re.escape(PRELABEL_DATABASE) + r".* v([0-9a-f]+)$")
+
+# Estados de la anotación existente de una imagen
+STATUS_MISSING = 'missing'
+STATUS_VERIFIED = 'verified'
+STATUS_HUMAN = 'human'
+STATUS_PRELABEL = 'prelabel'
+
+
+def read_annotation_status(xml_path: Path) -> Tuple[str, Optional[str]]:
+    """
+    Clasifica el XML de una imagen sin leer sus cajas.
+    
+    Solo se recorre el principio del archivo (la raíz y source/database)
+    con iterparse.
+    
+    Args:
+        xml_path: Ruta al XML (puede no existir).
+    
+    Returns:
+        Tupla (estado, versión del modelo si es una pre-anotación). Un XML
+        ilegible se trata como humano para no sobrescribirlo.
+    """
+    xml_path = Path(xml_path)
+    if not xml_path.exists():
+        return STATUS_MISSING, None
+    
+    try:
+        for event, elem in ET.iterparse(str(xml_path), events=('start', 'end')):
+            if event == 'start' and elem.tag == 'annotation':
+                if elem.attrib.get('verified') == 'yes':
+                    return STATUS_VERIFIED, None
+            elif event == 'end' and elem.tag == 'database':
+                match = PRELABEL_PATTERN.match((elem.text or '').strip())
+                if match:
+                    return STATUS_PRELABEL, match.group(1)
+                return STATUS_HUMAN, None
+            elif event == 'start' and elem.tag in ('size', 'object'):
+                break
+    except ET.ParseError:
+        pass
+    return STATUS_HUMAN, None
+
+
+def parse_voc_boxes(xml_path: str) -> Dict:
+    """
+    Lee las cajas de un XML de LabelImg en streaming (iterparse).
+    
+    Args:
+        xml_path: Ruta al archivo XML.
+    
+    Returns:
+        Diccionario con 'filename', 'width', 'height', 'boxes' (lista de
+        [clase, xmin, ymin, xmax, ymax]), 'status' (ver read_annotation_status)
+        y 'error' (None si se leyó bien).
+    """
+    result = {'filename': None, 'width': 0, 'height': 0, 'boxes': [],
+              'status': read_annotation_status(xml_path)[0], 'error': None}
+    
+    try:
+        name = None
+        coords = {}
+        for _, elem in ET.iterparse(xml_path, events=('end',)):
+            tag = elem.tag
+            if tag == 'name':
+                name = (elem.text or '').strip()
+            elif tag in BOX_TAGS:
+                coords[tag] = float(elem.text)
+            elif tag == 'object':
+                if name and len(coords) == 4:
+                    result['boxes'].append([name] + [coords[t] for t in BOX_TAGS])
+                name = None
+                coords = {}
+                elem.clear()
+            elif tag == 'filename':
+                result['filename'] = elem.text
+            elif tag == 'width':
+                result['width'] = int(float(elem.text))
+            elif tag == 'height':
+                result['height'] = int(float(elem.text))
+    
+    except Exception as e:
+        result['error'] = str(e)
+    
+    return result
+
+
+class AnnotationIndex:
+    """Índice de cajas de un directorio de anotaciones con caché por mtime."""
+    
+    def __init__(self, annotations_dir, index_path: Optional[Path] = None):
+        """
+        Inicializa el índice.
+        
+        Args:
+            annotations_dir: Directorio con los XML de LabelImg.
+            index_path: Archivo de caché (por defecto, .annotation_index.json
+                        dentro del directorio de anotaciones).
+        """
+        self.annotations_dir = Path(annotations_dir)
+        self.index_path = Path(index_path) if index_path else self.annotations_dir / INDEX_FILENAME
+        self._entries: Dict[str, Dict] = {}
+        self._load()
+    
+    def _load(self):
+        """Carga la caché si existe y es de la versión actual."""
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self._entries = data['files']
+        except (OSError, ValueError, KeyError):
+            self._entries = {}
+    
+    def _save(self):
+        """Guarda la caché de forma atómica."""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'files': self._entries}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice de anotaciones: {e}")
+    
+    def refresh(self, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Sincroniza el índice con el directorio.
+        
+        Solo se leen los XML nuevos o cuyo tamaño/fecha cambió; los
+        eliminados se quitan del índice.
+        
+        Args:
+            workers: Procesos para leer los XML. None = número de CPUs; 1 = secuencial.
+        
+        Returns:
+            Diccionario con 'total', 'parsed' y 'removed'.
+        """
+        current = {}
+        if self.annotations_dir.exists():
+            with os.scandir(self.annotations_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith('.xml'):
+                        stat = entry.stat()
+                        current[entry.name] = (stat.st_size, stat.st_mtime)
+        
+        removed = [name for name in self._entries if name not in current]
+        for name in removed:
+            del self._entries[name]
+        
+        changed = [
+            name for name, (size, mtime) in current.items()
+            if name not in self._entries
+            or self._entries[name]['size'] != size
+            or self._entries[name]['mtime'] != mtime
+        ]
+        
+        if changed:
+            paths = [self.annotations_dir / name for name in changed]
+            results = map_files(parse_voc_boxes, paths, workers)
+            
+            for name, result in zip(changed, results):
+                if result['error']:
+                    print(f"Error al leer {name}: {result['error']}")
+                size, mtime = current[name]
+                self._entries[name] = dict(result, size=size, mtime=mtime)
+        
+        if changed or removed:
+            self._save()
+        
+        return {'total': len(current), 'parsed': len(changed), 'removed': len(removed)}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def entries(self, include_prelabels: bool = False) -> List[Tuple[str, Dict]]:
+        """
+        Pares (nombre del XML, datos leídos) ordenados por nombre.
+        
+        Args:
+            include_prelabels: Incluir las pre-anotaciones sin revisar.
+        
+        Returns:
+            Lista de pares; por defecto sin las pre-anotaciones.
+        """
+        return sorted(
+            (name, entry) for name, entry in self._entries.items()
+            if include_prelabels or entry.get('status') != STATUS_PRELABEL
+        )
+    
+    def class_counts(self) -> Dict[str, int]:
+        """Número de objetos por clase (sin pre-anotaciones)."""
+        counts = {}
+        for _, entry in self.entries():
+            for box in entry['boxes']:
+                counts[box[0]] = counts.get(box[0], 0) + 1
+        return counts
+    
+    def per_image_counts(self) -> Dict[str, int]:
+        """Número de objetos por archivo XML (sin pre-anotaciones)."""
+        return {name: len(entry['boxes']) for name, entry in self.entries()}
+    
+    def box_sizes(self, class_name: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Dimensiones de todas las cajas (sin pre-anotaciones).
+        
+        Args:
+            class_name: Si se indica, solo las cajas de esa clase.
+        
+        Returns:
+            Diccionario con arrays 'width', 'height', 'area' y 'aspect_ratio'.
+        """
+        coords = [
+            box[1:] for _, entry in self.entries() for box in entry['boxes']
+            if class_name is None or box[0] == class_name
+        ]
+        boxes = np.array(coords, dtype=np.float64).reshape(-1, 4)
+        width = boxes[:, 2] - boxes[:, 0]
+        height = boxes[:, 3] - boxes[:, 1]
+        aspect_ratio = np.divide(width, height, out=np.zeros_like(width), where=height > 0)
+        return {'width': width, 'height': height, 'area': width * height, 'aspect_ratio': aspect_ratio}
+    
+    def stats(self) -> Dict:
+        """
+        Resumen del dataset (sin pre-anotaciones).
+        
+        Returns:
+            Diccionario con 'total_images', 'total_objects', 'classes',
+            'objects_per_image' (media, mediana y máximo) y 'box_area'
+            (media, mediana, mínimo y máximo en píxeles²).
+        """
+        classes = self.class_counts()
+        per_image_counts = self.per_image_counts()
+        per_image = np.array(list(per_image_counts.values()) or [0])
+        areas = self.box_sizes()['area']
+        
+        return {
+            'total_images': len(per_image_counts),
+            'total_objects': sum(classes.values()),
+            'classes': classes,
+            'objects_per_image': {
+                'mean': float(per_image.mean()),
+                'median': float(np.median(per_image)),
+                'max': int(per_image.max()),
+            },
+            'box_area': {
+                'mean': float(areas.mean()) if areas.size else 0.0,
+                'median': float(np.median(areas)) if areas.size else 0.0,
+                'min': float(areas.min()) if areas.size else 0.0,
+                'max': float(areas.max()) if areas.size else 0.0,
+            },
+        }
+    
+    def records(self) -> List[Dict]:
+        """
+        Una fila por objeto anotado, sin pre-anotaciones (para construir un DataFrame).
+        
+        Returns:
+            Lista de diccionarios con archivo, tamaño de imagen, clase,
+            coordenadas y dimensiones de la caja.
+        """
+        rows = []
+        for name, entry in self.entries():
+            for class_name, *coords in entry['boxes']:
+                xmin, ymin, xmax, ymax = (int(c) for c in coords)
+                box_width = xmax - xmin
+                box_height = ymax - ymin
+                rows.append({
+                    'filename': entry['filename'] or name,
+                    'image_width': entry['width'],
+                    'image_height': entry['height'],
+                    'class': class_name,
+                    'xmin': xmin,
+                    'ymin': ymin,
+                    'xmax': xmax,
+                    'ymax': ymax,
+                    'box_width': box_width,
+                    'box_height': box_height,
+                    'box_area': box_width * box_height,
+                    'aspect_ratio': box_width / box_height if box_height > 0 else 0
+                })
+        return rows
@@ -0,0 +1,614 @@
+"""
+Módulo de almacén columnar de anotaciones.
+
+Guarda todas las cajas de un dataset en arrays de NumPy (una fila por
+caja: imagen, clase y x1, y1, x2, y2 en píxeles) en lugar de recorrer los
+objetos de cada XML. Importa y exporta en bloque los formatos que usa
+LabelImg (PASCAL VOC, YOLO y CreateML) y el CSV de AutoML (mismo formato
+que labelImg_tool/tools/label_to_csv.py), de modo que las conversiones y
+las estadísticas del dataset son operaciones vectorizadas sobre los arrays.
+
+Uso desde la línea de comandos (exportación a CSV de AutoML):
+    python -m src.annotation_store labels/ --prefix bucket --mode xml
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+import numpy as np
+from PIL import Image
+
+from src.annotation_index import AnnotationIndex, parse_voc_boxes
+from src.image_files import list_images
+from src.voc_conversion import map_files
+
+
+VOC_TEMPLATE = """<annotation>
+    <folder>{folder}</folder>
+    <filename>{filename}</filename>
+    <path>{path}</path>
+    <source>
+        <database>{database}</database>
+    </source>
+    <size>
+        <width>{width}</width>
+        <height>{height}</height>
+        <depth>3</depth>
+    </size>
+    <segmented>0</segmented>
+{objects}</annotation>
+"""
+
+VOC_OBJECT_TEMPLATE = """    <object>
+        <name>{name}</name>
+        <pose>Unspecified</pose>
+        <truncated>{truncated}</truncated>
+        <difficult>0</difficult>
+        <bndbox>
+            <xmin>{xmin}</xmin>
+            <ymin>{ymin}</ymin>
+            <xmax>{xmax}</xmax>
+            <ymax>{ymax}</ymax>
+        </bndbox>
+    </object>
+"""
+
+
+def _read_yolo_labels(label_path: str) -> np.ndarray:
+    """Lee un archivo de etiquetas YOLO como array (N, 5)."""
+    with open(label_path, 'r', encoding='utf-8') as f:
+        rows = [line.split() for line in f if line.strip()]
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+class AnnotationStore:
+    """Cajas de un dataset en arrays columnares con conversión entre formatos."""
+    
+    def __init__(self, class_names: Optional[List[str]] = None):
+        """
+        Inicializa un almacén vacío.
+        
+        Args:
+            class_names: Lista ordenada de clases (el índice es el ID). Si se
+                         indica, las clases que no están en la lista se
+                         descartan y se anotan en 'unknown_classes' de la
+                         imagen; si es None, las clases se añaden al leerlas.
+        """
+        self.class_names: List[str] = list(class_names or [])
+        self.fixed_classes = class_names is not None
+        
+        # Una entrada por imagen: filename, width, height, source, error, unknown_classes
+        self.images: List[Dict] = []
+        
+        # Una fila por caja
+        self.image_id = np.empty(0, dtype=np.int32)
+        self.class_id = np.empty(0, dtype=np.int32)
+        self.boxes = np.empty((0, 4), dtype=np.float64)
+    
+    def __len__(self) -> int:
+        return len(self.image_id)
+    
+    def _add_image(self, filename: str, width: int, height: int,
+                   source: Optional[str] = None, error: Optional[str] = None) -> int:
+        """Registra una imagen y devuelve su ID."""
+        self.images.append({
+            'filename': filename,
+            'width': width,
+            'height': height,
+            'source': source,
+            'error': error,
+            'unknown_classes': [],
+        })
+        return len(self.images) - 1
+    
+    def _append(self, image_ids: List[int], labels: List[str], boxes: List) -> None:
+        """
+        Añade cajas en bloque a partir de nombres de clase.
+        
+        Args:
+            image_ids: ID de imagen de cada caja.
+            labels: Nombre de clase de cada caja.
+            boxes: Coordenadas [x1, y1, x2, y2] en píxeles de cada caja.
+        """
+        if not labels:
+            return
+        
+        # Resolver cada nombre distinto una sola vez
+        unique_labels, inverse = np.unique(np.array(labels, dtype=object).astype(str), return_inverse=True)
+        lookup = {name.lower(): idx for idx, name in enumerate(self.class_names)}
+        mapping = np.empty(len(unique_labels), dtype=np.int32)
+        for i, label in enumerate(unique_labels):
+            key = label.lower()
+            if key not in lookup and not self.fixed_classes:
+                self.class_names.append(str(label))
+                lookup[key] = len(self.class_names) - 1
+            mapping[i] = lookup.get(key, -1)
+        
+        image_ids = np.asarray(image_ids, dtype=np.int32)
+        class_ids = mapping[inverse]
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        
+        unknown = class_ids < 0
+        for index in np.flatnonzero(unknown):
+            self.images[image_ids[index]]['unknown_classes'].append(labels[index].lower())
+        
+        keep = ~unknown
+        self.image_id = np.concatenate([self.image_id, image_ids[keep]])
+        self.class_id = np.concatenate([self.class_id, class_ids[keep]])
+        self.boxes = np.concatenate([self.boxes, boxes[keep]])
+    
+    def _add_voc_results(self, results) -> None:
+        """Añade resultados de parse_voc_boxes: pares (ruta del XML, datos)."""
+        image_ids, labels, boxes = [], [], []
+        for source, result in results:
+            image = self._add_image(result['filename'] or f"{Path(source).stem}.jpg",
+                                    result['width'], result['height'],
+                                    source=str(source), error=result['error'])
+            for label, *coords in result['boxes']:
+                image_ids.append(image)
+                labels.append(label)
+                boxes.append(coords)
+        self._append(image_ids, labels, boxes)
+    
+    def add_detections(self, filename: str, width: int, height: int,
+                       class_ids: np.ndarray, boxes: np.ndarray,
+                       source: Optional[str] = None) -> int:
+        """
+        Añade una imagen con cajas ya expresadas como IDs de clase (p. ej. predicciones).
+        
+        Args:
+            filename: Nombre del archivo de imagen.
+            width: Ancho de la imagen en píxeles.
+            height: Alto de la imagen en píxeles.
+            class_ids: ID de clase de cada caja (índices de class_names).
+            boxes: Coordenadas (N, 4) x1, y1, x2, y2 en píxeles.
+            source: Origen de la imagen.
+        
+        Returns:
+            ID de la imagen. Las cajas con IDs fuera de class_names se descartan.
+        """
+        image = self._add_image(filename, width, height, source=source)
+        class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        
+        # Recortar al tamaño de la imagen (las predicciones pueden salirse)
+        boxes = np.clip(boxes, 0, [width, height, width, height])
+        
+        keep = (class_ids >= 0) & (class_ids < len(self.class_names))
+        self.image_id = np.concatenate([self.image_id, np.full(int(keep.sum()), image, dtype=np.int32)])
+        self.class_id = np.concatenate([self.class_id, class_ids[keep]])
+        self.boxes = np.concatenate([self.boxes, boxes[keep]])
+        return image
+    
+    @classmethod
+    def from_voc(cls, xml_files: List[Path],
+                 class_names: Optional[List[str]] = None,
+                 workers: Optional[int] = None) -> 'AnnotationStore':
+        """
+        Importa archivos XML de PASCAL VOC (LabelImg), leyéndolos en paralelo.
+        
+        Args:
+            xml_files: Archivos XML.
+            class_names: Lista ordenada de clases (None = las que aparezcan).
+            workers: Número de procesos. None = número de CPUs; 1 = secuencial.
+        
+        Returns:
+            Almacén con una imagen por XML (también los que fallaron, con 'error').
+        """
+        store = cls(class_names)
+        xml_files = [Path(p) for p in xml_files]
+        store._add_voc_results(zip(xml_files, map_files(parse_voc_boxes, xml_files, workers)))
+        return store
+    
+    @classmethod
+    def from_index(cls, index: AnnotationIndex,
+                   class_names: Optional[List[str]] = None) -> 'AnnotationStore':
+        """
+        Importa las anotaciones de un AnnotationIndex (sin volver a leer los XML).
+        
+        Args:
+            index: Índice ya sincronizado con refresh().
+            class_names: Lista ordenada de clases (None = las que aparezcan).
+        
+        Returns:
+            Almacén con una imagen por XML del índice (sin pre-anotaciones
+            sin revisar).
+        """
+        store = cls(class_names)
+        store._add_voc_results(
+            (index.annotations_dir / name, entry) for name, entry in index.entries()
+        )
+        return store
+    
+    @classmethod
+    def from_yolo(cls, labels_dir: Path,
+                  images_dir: Optional[Path] = None,
+                  class_names: Optional[List[str]] = None) -> 'AnnotationStore':
+        """
+        Importa etiquetas YOLO (un .txt por imagen con coordenadas normalizadas).
+        
+        Args:
+            labels_dir: Carpeta con los .txt (y classes.txt si class_names es None).
+            images_dir: Carpeta de las imágenes, para obtener su tamaño en
+                        píxeles. Si es None, las coordenadas se conservan
+                        normalizadas (imágenes de tamaño 1x1).
+            class_names: Lista ordenada de clases.
+        
+        Returns:
+            Almacén con una imagen por archivo de etiquetas.
+        """
+        labels_dir = Path(labels_dir)
+        if class_names is None:
+            classes_file = labels_dir / 'classes.txt'
+            class_names = classes_file.read_text(encoding='utf-8').split() if classes_file.exists() else None
+        store = cls(class_names)
+        
+        images_by_stem = {p.stem: p for p in list_images(images_dir)} if images_dir else {}
+        
+        label_files = sorted(p for p in labels_dir.glob('*.txt') if p.name != 'classes.txt')
+        rows, image_ids = [], []
+        for label_file in label_files:
+            image_path = images_by_stem.get(label_file.stem)
+            width, height, error = 1, 1, None
+            if images_dir is not None:
+                if image_path is None:
+                    width, height, error = 0, 0, "imagen no encontrada"
+                else:
+                    # Solo se lee la cabecera de la imagen
+                    with Image.open(image_path) as img:
+                        width, height = img.size
+            
+            filename = image_path.name if image_path else f"{label_file.stem}.jpg"
+            try:
+                data = _read_yolo_labels(label_file)
+            except (OSError, ValueError) as e:
+                data, error = np.empty((0, 5)), str(e)
+            
+            image = store._add_image(filename, width, height, source=str(label_file), error=error)
+            rows.append(data)
+            image_ids.append(np.full(len(data), image, dtype=np.int32))
+        
+        if rows:
+            data = np.concatenate(rows)
+            ids = np.concatenate(image_ids)
+            sizes = store.image_sizes()[ids]
+            xc, yc, w, h = (data[:, i] for i in range(1, 5))
+            boxes = np.stack([
+                np.clip(xc - w / 2, 0, 1) * sizes[:, 0],
+                np.clip(yc - h / 2, 0, 1) * sizes[:, 1],
+                np.clip(xc + w / 2, 0, 1) * sizes[:, 0],
+                np.clip(yc + h / 2, 0, 1) * sizes[:, 1],
+            ], axis=1)
+            
+            class_ids = data[:, 0].astype(np.int32)
+            valid = (class_ids >= 0) & (class_ids < len(store.class_names))
+            for index in np.flatnonzero(~valid):
+                store.images[ids[index]]['unknown_classes'].append(str(class_ids[index]))
+            
+            store.image_id = ids[valid]
+            store.class_id = class_ids[valid]
+            store.boxes = boxes[valid]
+        
+        return store
+    
+    @classmethod
+    def from_createml(cls, json_path: Path,
+                      images_dir: Optional[Path] = None,
+                      class_names: Optional[List[str]] = None) -> 'AnnotationStore':
+        """
+        Importa un archivo JSON de CreateML (coordenadas de centro en píxeles).
+        
+        Args:
+            json_path: Archivo JSON de CreateML.
+            images_dir: Carpeta de las imágenes (CreateML no guarda su tamaño).
+            class_names: Lista ordenada de clases (None = las que aparezcan).
+        
+        Returns:
+            Almacén con una imagen por entrada del JSON.
+        """
+        store = cls(class_names)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        
+        image_ids, labels, boxes = [], [], []
+        for entry in entries:
+            width = height = 0
+            if images_dir is not None and (Path(images_dir) / entry['image']).exists():
+                with Image.open(Path(images_dir) / entry['image']) as img:
+                    width, height = img.size
+            
+            image = store._add_image(entry['image'], width, height, source=str(json_path))
+            for annotation in entry.get('annotations', []):
+                c = annotation['coordinates']
+                image_ids.append(image)
+                labels.append(annotation['label'])
+                boxes.append([c['x'] - c['width'] / 2, c['y'] - c['height'] / 2,
+                              c['x'] + c['width'] / 2, c['y'] + c['height'] / 2])
+        
+        store._append(image_ids, labels, boxes)
+        return store
+    
+    def image_sizes(self) -> np.ndarray:
+        """Array (imágenes, 2) con ancho y alto de cada imagen."""
+        return np.array([[img['width'], img['height']] for img in self.images],
+                        dtype=np.float64).reshape(-1, 2)
+    
+    def class_counts(self) -> Dict[str, int]:
+        """Número de cajas por clase."""
+        counts = np.bincount(self.class_id, minlength=len(self.class_names))
+        return {name: int(count) for name, count in zip(self.class_names, counts) if count}
+    
+    def per_image_counts(self) -> np.ndarray:
+        """Número de cajas de cada imagen (indexado por ID de imagen)."""
+        return np.bincount(self.image_id, minlength=len(self.images))
+    
+    def box_sizes(self) -> Dict[str, np.ndarray]:
+        """Arrays 'width', 'height', 'area' y 'aspect_ratio' de las cajas (píxeles)."""
+        width = self.boxes[:, 2] - self.boxes[:, 0]
+        height = self.boxes[:, 3] - self.boxes[:, 1]
+        aspect_ratio = np.divide(width, height, out=np.zeros_like(width), where=height > 0)
+        return {'width': width, 'height': height, 'area': width * height, 'aspect_ratio': aspect_ratio}
+    
+    def normalized_xywh(self) -> np.ndarray:
+        """
+        Cajas en formato YOLO: centro y tamaño normalizados por la imagen.
+        
+        Returns:
+            Array (N, 4) con x_center, y_center, width, height. Las cajas de
+            imágenes sin tamaño conocido quedan como NaN.
+        """
+        sizes = self.image_sizes()[self.image_id]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sizes = np.where(sizes > 0, sizes, np.nan)
+            x1, y1, x2, y2 = (self.boxes[:, i] for i in range(4))
+            return np.stack([
+                (x1 + x2) / 2 / sizes[:, 0],
+                (y1 + y2) / 2 / sizes[:, 1],
+                (x2 - x1) / sizes[:, 0],
+                (y2 - y1) / sizes[:, 1],
+            ], axis=1).reshape(-1, 4)
+    
+    def _group_by_image(self, mask: Optional[np.ndarray] = None) -> Dict[int, np.ndarray]:
+        """Índices de las cajas de cada imagen (en el orden original)."""
+        indices = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        order = indices[np.argsort(self.image_id[indices], kind='stable')]
+        ids, starts = np.unique(self.image_id[order], return_index=True)
+        return dict(zip(ids.tolist(), np.split(order, starts[1:])))
+    
+    def yolo_label_lines(self) -> Dict[int, List[str]]:
+        """
+        Líneas de etiqueta YOLO de cada imagen.
+        
+        Se descartan las cajas fuera de la imagen o de tamaño nulo.
+        
+        Returns:
+            Diccionario {ID de imagen: líneas "clase xc yc w h"}.
+        """
+        xywh = self.normalized_xywh()
+        with np.errstate(invalid='ignore'):
+            valid = (
+                (xywh[:, 0] >= 0) & (xywh[:, 0] <= 1) &
+                (xywh[:, 1] >= 0) & (xywh[:, 1] <= 1) &
+                (xywh[:, 2] > 0) & (xywh[:, 2] <= 1) &
+                (xywh[:, 3] > 0) & (xywh[:, 3] <= 1)
+            )
+        
+        lines = {}
+        for image, indices in self._group_by_image(valid).items():
+            lines[image] = [
+                f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}"
+                for c, (x, y, w, h) in zip(self.class_id[indices].tolist(), xywh[indices].tolist())
+            ]
+        return lines
+    
+    def to_yolo(self, labels_dir: Path) -> int:
+        """
+        Escribe un .txt YOLO por imagen con cajas y el archivo classes.txt.
+        
+        Args:
+            labels_dir: Carpeta de salida.
+        
+        Returns:
+            Número de archivos de etiquetas escritos.
+        """
+        labels_dir = Path(labels_dir)
+        labels_dir.mkdir(parents=True, exist_ok=True)
+        
+        lines = self.yolo_label_lines()
+        for image, image_lines in lines.items():
+            stem = Path(self.images[image]['filename']).stem
+            with open(labels_dir / f"{stem}.txt", 'w') as f:
+                f.write('\n'.join(image_lines))
+        
+        with open(labels_dir / 'classes.txt', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.class_names) + '\n')
+        
+        return len(lines)
+    
+    def to_voc(self, output_dir: Path, images_dir: Optional[Path] = None,
+               database: str = 'Unknown') -> int:
+        """
+        Escribe un XML de PASCAL VOC (igual que LabelImg) por imagen.
+        
+        Args:
+            output_dir: Carpeta de salida de los XML.
+            images_dir: Carpeta de las imágenes (para los campos folder y path).
+            database: Texto del campo source/database (LabelImg escribe 'Unknown').
+        
+        Returns:
+            Número de archivos XML escritos.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        images_dir = Path(images_dir) if images_dir else output_dir
+        
+        groups = self._group_by_image()
+        boxes = np.rint(self.boxes).astype(np.int64)
+        written = 0
+        
+        for image_id, image in enumerate(self.images):
+            if image['error'] is not None:
+                continue
+            
+            objects = []
+            for index in groups.get(image_id, []):
+                xmin, ymin, xmax, ymax = boxes[index].tolist()
+                # Mismo criterio de "truncated" que PascalVocWriter de LabelImg
+                truncated = int(xmin == 1 or ymin == 1 or
+                                xmax == image['width'] or ymax == image['height'])
+                objects.append(VOC_OBJECT_TEMPLATE.format(
+                    name=escape(self.class_names[self.class_id[index]]),
+                    truncated=truncated, xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax
+                ))
+            
+            content = VOC_TEMPLATE.format(
+                folder=escape(images_dir.name),
+                filename=escape(image['filename']),
+                path=escape(str(images_dir / image['filename'])),
+                database=escape(database),
+                width=image['width'],
+                height=image['height'],
+                objects=''.join(objects)
+            )
+            with open(output_dir / f"{Path(image['filename']).stem}.xml", 'w', encoding='utf-8') as f:
+                f.write(content)
+            written += 1
+        
+        return written
+    
+    def to_createml(self, json_path: Path) -> int:
+        """
+        Escribe todas las imágenes en un archivo JSON de CreateML.
+        
+        Args:
+            json_path: Archivo de salida.
+        
+        Returns:
+            Número de imágenes escritas.
+        """
+        groups = self._group_by_image()
+        x1, y1, x2, y2 = (self.boxes[:, i] for i in range(4))
+        centers = np.stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], axis=1)
+        
+        output = []
+        for image_id, image in enumerate(self.images):
+            if image['error'] is not None:
+                continue
+            output.append({
+                'image': image['filename'],
+                'verified': False,
+                'annotations': [
+                    {
+                        'label': self.class_names[self.class_id[index]],
+                        'coordinates': dict(zip(('x', 'y', 'width', 'height'), centers[index].tolist()))
+                    }
+                    for index in groups.get(image_id, [])
+                ]
+            })
+        
+        tmp_path = Path(json_path).with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f)
+        os.replace(tmp_path, json_path)
+        
+        return len(output)
+    
+    def to_automl_rows(self, training_dir: str, path_prefix: str) -> List[List]:
+        """
+        Filas del CSV de AutoML Vision (formato de label_to_csv.py).
+        
+        Args:
+            training_dir: Valor de la columna de conjunto (TRAIN, VALIDATION...).
+            path_prefix: Prefijo de la ruta en el bucket (gs://...).
+        
+        Returns:
+            Lista de filas [conjunto, ruta, clase, x_min, y_min, '', '',
+            x_max, y_max, '', ''] con coordenadas normalizadas.
+        """
+        sizes = self.image_sizes()[self.image_id]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized = np.clip(self.boxes / np.tile(sizes, 2), 0.0, 1.0)
+        
+        rows = []
+        for image, label, (x_min, y_min, x_max, y_max) in zip(
+                self.image_id.tolist(), self.class_id.tolist(), normalized.tolist()):
+            source = self.images[image]['source'] or self.images[image]['filename']
+            rows.append([
+                str(training_dir),
+                f"{path_prefix}/{Path(source).stem}.jpg",
+                self.class_names[label],
+                x_min, y_min, "", "",
+                x_max, y_max, "", ""
+            ])
+        return rows
+
+
+def export_automl_csv(location: Path, prefix: str, mode: str,
+                      class_names: Optional[List[str]] = None) -> List[List]:
+    """
+    Convierte una carpeta de etiquetas al CSV de AutoML Vision.
+    
+    La carpeta sigue la estructura de label_to_csv.py: una subcarpeta por
+    conjunto (TRAINING, VALIDATION, TEST, UNASSIGNED) y dentro una por clase,
+    con el mismo nombre que la carpeta de imágenes del bucket.
+    
+    Args:
+        location: Carpeta raíz de las etiquetas.
+        prefix: Nombre del bucket (sin gs://).
+        mode: 'xml' (PASCAL VOC) o 'txt' (YOLO).
+        class_names: Lista ordenada de clases (modo 'txt'). Si es None se
+                     usa el classes.txt de cada carpeta.
+    
+    Returns:
+        Filas del CSV.
+    """
+    if mode not in ('xml', 'txt'):
+        raise ValueError(f"Modo no válido: {mode} (use 'xml' o 'txt')")
+    
+    rows = []
+    for set_dir in sorted(p for p in Path(location).iterdir() if p.is_dir()):
+        for class_dir in sorted(p for p in set_dir.iterdir() if p.is_dir()):
+            if mode == 'txt':
+                store = AnnotationStore.from_yolo(class_dir, class_names=class_names)
+            else:
+                store = AnnotationStore.from_voc(sorted(class_dir.glob('*.xml')))
+            rows.extend(store.to_automl_rows(set_dir.name, f"gs://{prefix}/{class_dir.name}"))
+    return rows
+
+
+def main():
+    """Función principal para exportar etiquetas al CSV de AutoML desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Exportar etiquetas de LabelImg (VOC o YOLO) al CSV de AutoML Vision'
+    )
+    parser.add_argument('location', type=str,
+                        help='Carpeta con una subcarpeta por conjunto y otra por clase')
+    parser.add_argument('-p', '--prefix', type=str, required=True,
+                        help='Nombre del bucket de almacenamiento en la nube')
+    parser.add_argument('-m', '--mode', type=str, required=True, choices=['xml', 'txt'],
+                        help="'xml' para PASCAL VOC y 'txt' para YOLO")
+    parser.add_argument('-o', '--output', type=str, default='res.csv',
+                        help='Archivo CSV de salida')
+    parser.add_argument('-c', '--classes', type=str, default=None,
+                        help='Archivo con las clases, una por línea (modo txt; por defecto classes.txt)')
+    
+    args = parser.parse_args()
+    
+    class_names = None
+    if args.classes:
+        class_names = Path(args.classes).read_text(encoding='utf-8').split()
+    
+    rows = export_automl_csv(Path(args.location), args.prefix, args.mode, class_names)
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    print(f"✅ {len(rows)} cajas exportadas: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
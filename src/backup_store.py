@@ -0,0 +1,370 @@
+"""
+Módulo de respaldos incrementales con almacenamiento direccionado por contenido.
+
+Cada archivo respaldado se identifica por el hash SHA-256 de su contenido y
+se guarda una sola vez en ``backups/.store/objects``. Cada respaldo
+(``backups/backup_<timestamp>``) contiene un ``manifest.json`` con la lista
+de archivos y sus hashes, y los archivos se materializan como enlaces duros
+al objeto almacenado, de modo que repetir un respaldo de resultados casi sin
+cambios no ocupa espacio adicional ni requiere copiar datos.
+
+Los respaldos son de solo lectura: un archivo enlazado comparte el contenido
+con el objeto y con los demás respaldos que lo incluyen, así que los objetos
+y sus enlaces se marcan como de solo lectura. Para trabajar con los archivos
+se usa restore_snapshot, que escribe copias independientes.
+
+Los objetos que ya no aparecen en ningún manifiesto (porque se borró su
+respaldo) se eliminan con collect_garbage, que se ejecuta tras cada respaldo.
+
+Para no volver a calcular el hash de archivos sin cambios, se mantiene una
+caché (ruta, tamaño, fecha de modificación) -> hash.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+class BackupStore:
+    """Almacén de respaldos deduplicado por hash de contenido."""
+
+    MANIFEST_NAME = "manifest.json"
+    CHUNK_SIZE = 1024 * 1024  # Lectura en bloques de 1 MB para el hash
+    READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+    def __init__(self,
+                 backups_dir: Path,
+                 compress: bool = False,
+                 compression_level: int = 3):
+        """
+        Inicializa el almacén de respaldos.
+
+        Args:
+            backups_dir: Carpeta raíz de respaldos.
+            compress: Si True, guarda los objetos comprimidos con zstd.
+                      Los respaldos comprimidos solo contienen el manifiesto
+                      (se recuperan con restore_snapshot).
+            compression_level: Nivel de compresión zstd (1-22).
+        """
+        self.backups_dir = Path(backups_dir)
+        self.store_dir = self.backups_dir / ".store"
+        self.objects_dir = self.store_dir / "objects"
+        self.hash_cache_path = self.store_dir / "hash_cache.json"
+
+        if compress and not ZSTD_AVAILABLE:
+            print("⚠️ zstandard no está instalado; los respaldos se guardarán sin comprimir.")
+            print("   Ejecuta: pip install zstandard")
+            compress = False
+
+        self.compress = compress
+        self.compression_level = compression_level
+
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._hash_cache = self._load_hash_cache()
+
+    def _load_hash_cache(self) -> Dict[str, List]:
+        """Carga la caché ruta -> [tamaño, mtime_ns, sha256]."""
+        if not self.hash_cache_path.exists():
+            return {}
+        try:
+            with open(self.hash_cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hash_cache(self):
+        """Guarda la caché de hashes de forma atómica."""
+        tmp_path = self.hash_cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._hash_cache, f)
+        os.replace(tmp_path, self.hash_cache_path)
+
+    def file_hash(self, file_path: Path) -> str:
+        """
+        Obtiene el SHA-256 de un archivo, reutilizando la caché si no cambió.
+
+        Args:
+            file_path: Ruta al archivo.
+
+        Returns:
+            Hash hexadecimal del contenido.
+        """
+        stat = file_path.stat()
+        key = str(file_path.resolve())
+        cached = self._hash_cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(block)
+
+        sha = digest.hexdigest()
+        self._hash_cache[key] = [stat.st_size, stat.st_mtime_ns, sha]
+        return sha
+
+    def _object_path(self, sha: str) -> Path:
+        """Ruta del objeto en el almacén (subcarpeta por los 2 primeros caracteres)."""
+        suffix = ".zst" if self.compress else ""
+        return self.objects_dir / sha[:2] / f"{sha}{suffix}"
+
+    def _store_object(self, file_path: Path, sha: str) -> int:
+        """
+        Guarda el contenido de un archivo en el almacén si aún no existe.
+
+        Args:
+            file_path: Archivo de origen.
+            sha: Hash del contenido.
+
+        Returns:
+            Bytes añadidos al almacén (0 si el objeto ya existía).
+        """
+        object_path = self._object_path(sha)
+        if object_path.exists():
+            return 0
+
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = object_path.with_name(object_path.name + ".tmp")
+
+        # Se copia (no se enlaza) el origen: los resultados se sobrescriben
+        # en el mismo archivo y eso corrompería el objeto almacenado.
+        if self.compress:
+            compressor = zstandard.ZstdCompressor(level=self.compression_level)
+            with open(file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                compressor.copy_stream(src, dst)
+        else:
+            shutil.copy2(file_path, tmp_path)
+
+        os.chmod(tmp_path, self.READ_ONLY)
+        os.replace(tmp_path, object_path)
+        return object_path.stat().st_size
+
+    def _materialize(self, sha: str, target: Path):
+        """
+        Crea el archivo del respaldo como enlace duro al objeto (o copia si no es posible).
+
+        El enlace comparte el contenido (y el modo de solo lectura) con el
+        objeto; la copia de respaldo también se deja de solo lectura.
+
+        Args:
+            sha: Hash del contenido.
+            target: Ruta del archivo dentro de la carpeta de respaldo.
+
+        Raises:
+            FileExistsError: Si el archivo ya existe en el respaldo.
+        """
+        target.parent.mkdir(parents=True, exist_ok=True)
+        object_path = self._object_path(sha)
+        try:
+            os.link(object_path, target)
+        except FileExistsError:
+            # Nunca se copia sobre un archivo existente: podría ser el mismo
+            # inodo que el objeto y se corromperían los demás respaldos
+            raise
+        except OSError:
+            # Sistemas de archivos sin enlaces duros (FAT, algunas unidades de red)
+            shutil.copyfile(object_path, target)
+            os.chmod(target, self.READ_ONLY)
+
+    def _new_snapshot_dir(self, name: Optional[str]) -> Path:
+        """
+        Crea la carpeta de un respaldo nuevo sin reutilizar nunca una existente.
+
+        Args:
+            name: Nombre pedido, o None para backup_<timestamp> (con un
+                  contador si ya hay un respaldo en el mismo segundo).
+
+        Returns:
+            Carpeta creada.
+
+        Raises:
+            FileExistsError: Si se pidió un nombre que ya existe.
+        """
+        if name is not None:
+            snapshot_dir = self.backups_dir / name
+            snapshot_dir.mkdir(parents=True)
+            return snapshot_dir
+
+        base = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        counter = 0
+        while True:
+            snapshot_dir = self.backups_dir / (base if counter == 0 else f"{base}_{counter}")
+            try:
+                snapshot_dir.mkdir(parents=True)
+                return snapshot_dir
+            except FileExistsError:
+                counter += 1
+
+    def create_snapshot(self,
+                        sources: Dict[str, List[Path]],
+                        name: Optional[str] = None,
+                        progress_callback: Optional[Callable[[int, int, str], None]] = None) -> Dict:
+        """
+        Crea un respaldo incremental.
+
+        Args:
+            sources: Diccionario {subcarpeta: lista de archivos} a respaldar
+                     (ej. {'graphs': [...], 'reports': [...]}).
+            name: Nombre de la carpeta de respaldo. Por defecto backup_<timestamp>.
+            progress_callback: Función (procesados, total, nombre_archivo)
+                               llamada tras cada archivo.
+
+        Returns:
+            Diccionario con 'snapshot_dir', 'files', 'new_objects',
+            'new_bytes', 'total_bytes' y 'freed_bytes' (objetos de respaldos
+            borrados que se eliminaron del almacén).
+        """
+        snapshot_dir = self._new_snapshot_dir(name)
+
+        total = sum(len(files) for files in sources.values())
+        done = 0
+        new_objects = 0
+        new_bytes = 0
+        total_bytes = 0
+        entries = []
+
+        for section, files in sources.items():
+            for file_path in files:
+                file_path = Path(file_path)
+                sha = self.file_hash(file_path)
+                added = self._store_object(file_path, sha)
+                if added:
+                    new_objects += 1
+                    new_bytes += added
+
+                size = file_path.stat().st_size
+                total_bytes += size
+                relative = f"{section}/{file_path.name}"
+                entries.append({'path': relative, 'sha256': sha, 'size': size})
+
+                if not self.compress:
+                    self._materialize(sha, snapshot_dir / section / file_path.name)
+
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, file_path.name)
+
+        manifest = {
+            'name': snapshot_dir.name,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'compressed': self.compress,
+            'files': entries,
+        }
+        with open(snapshot_dir / self.MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        self._save_hash_cache()
+
+        return {
+            'snapshot_dir': snapshot_dir,
+            'files': len(entries),
+            'new_objects': new_objects,
+            'new_bytes': new_bytes,
+            'total_bytes': total_bytes,
+            'freed_bytes': self.collect_garbage(),
+        }
+
+    def _referenced_objects(self) -> set:
+        """Nombres de los objetos que aparecen en algún manifiesto."""
+        referenced = set()
+        for manifest_path in self.backups_dir.glob(f"*/{self.MANIFEST_NAME}"):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            suffix = ".zst" if manifest.get('compressed') else ""
+            referenced.update(f"{entry['sha256']}{suffix}" for entry in manifest.get('files', []))
+        return referenced
+
+    def collect_garbage(self) -> int:
+        """
+        Elimina del almacén los objetos que ningún respaldo referencia.
+
+        Un respaldo cuenta mientras exista su manifest.json; los archivos
+        temporales que dejó un respaldo interrumpido también se eliminan.
+
+        Returns:
+            Bytes liberados.
+        """
+        referenced = self._referenced_objects()
+        freed = 0
+        for object_path in self.objects_dir.glob("*/*"):
+            if object_path.name in referenced:
+                continue
+            size = object_path.stat().st_size
+            # En Windows no se puede borrar un archivo de solo lectura
+            os.chmod(object_path, stat.S_IWUSR | stat.S_IRUSR)
+            object_path.unlink()
+            freed += size
+        return freed
+
+    def delete_snapshot(self, snapshot_dir: Path) -> int:
+        """
+        Borra un respaldo y los objetos que solo él usaba.
+
+        Args:
+            snapshot_dir: Carpeta del respaldo.
+
+        Returns:
+            Bytes liberados en el almacén.
+        """
+        def make_writable(function, path, _):
+            os.chmod(path, stat.S_IWUSR | stat.S_IRUSR)
+            function(path)
+
+        shutil.rmtree(snapshot_dir, onerror=make_writable)
+        return self.collect_garbage()
+
+    def restore_snapshot(self, snapshot_dir: Path, target_dir: Path) -> int:
+        """
+        Restaura los archivos de un respaldo a partir de su manifiesto.
+
+        Cada archivo se escribe en un temporal y reemplaza al destino, así que
+        restaurar encima de otro respaldo no modifica el objeto enlazado, y los
+        archivos restaurados se pueden editar.
+
+        Args:
+            snapshot_dir: Carpeta del respaldo (con manifest.json).
+            target_dir: Carpeta destino.
+
+        Returns:
+            Número de archivos restaurados.
+        """
+        with open(Path(snapshot_dir) / self.MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        target_dir = Path(target_dir)
+        suffix = ".zst" if manifest.get('compressed') else ""
+
+        for entry in manifest['files']:
+            sha = entry['sha256']
+            object_path = self.objects_dir / sha[:2] / f"{sha}{suffix}"
+            target = target_dir / entry['path']
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(target.name + ".tmp")
+
+            if manifest.get('compressed'):
+                decompressor = zstandard.ZstdDecompressor()
+                with open(object_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                    decompressor.copy_stream(src, dst)
+            else:
+                shutil.copyfile(object_path, tmp_path)
+                shutil.copystat(object_path, tmp_path)
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(tmp_path).st_mode) | stat.S_IWUSR)
+
+            os.replace(tmp_path, target)
+
+        return len(manifest['files'])
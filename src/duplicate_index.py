@@ -0,0 +1,334 @@
+"""
+Módulo de detección de imágenes duplicadas y casi duplicadas.
+
+Los operadores del microscopio guardan a menudo campos de visión que se
+solapan o vuelven a exportar la misma muestra. Si esas copias caen en
+splits distintos, el modelo se valida con imágenes que ya vio al entrenar.
+
+Este índice calcula dos hashes perceptuales de 64 bits por imagen (pHash,
+basado en la DCT, y dHash, basado en gradientes) y los guarda en una
+caché JSON indexada por tamaño y fecha de modificación, de modo que solo
+se procesan las imágenes nuevas o modificadas (en paralelo). Los casi
+duplicados se buscan con un árbol BK por distancia de Hamming y se
+agrupan por transitividad; train_yolo usa esos grupos para que todas las
+copias de una imagen acaben en el mismo split.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import ANALYSIS_IMAGES_DIR, IMAGE_HASH_INDEX, RAW_IMAGES_DIR
+from src.image_files import IMAGE_EXTENSIONS
+from src.voc_conversion import map_files
+
+
+INDEX_VERSION = 1
+
+# Distancias de Hamming máximas (de 64 bits) para considerar dos imágenes casi iguales
+PHASH_THRESHOLD = 8
+DHASH_THRESHOLD = 10
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """Convierte 64 booleanos en un entero sin signo de 64 bits."""
+    return int.from_bytes(np.packbits(bits.reshape(-1)).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    """Número de bits distintos entre dos hashes."""
+    return bin(a ^ b).count('1')
+
+
+def image_hashes(image_path: str) -> Dict:
+    """
+    Calcula pHash y dHash de una imagen.
+    
+    Args:
+        image_path: Ruta a la imagen.
+    
+    Returns:
+        Diccionario con 'phash', 'dhash' (enteros de 64 bits), 'width',
+        'height' y 'error' (None si se leyó bien).
+    """
+    result = {'phash': None, 'dhash': None, 'width': 0, 'height': 0, 'error': None}
+    
+    try:
+        with Image.open(image_path) as img:
+            result['width'], result['height'] = img.size
+            # En JPEG, draft decodifica directamente a escala reducida
+            img.draft('L', (128, 128))
+            gray = np.asarray(img.convert('L'), dtype=np.float32)
+        
+        # pHash: signo de las frecuencias bajas de la DCT respecto a su mediana
+        small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+        low = cv2.dct(small)[:8, :8]
+        result['phash'] = _pack_bits(low > np.median(low.reshape(-1)[1:]))
+        
+        # dHash: si cada píxel es más claro que su vecino de la derecha
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        result['dhash'] = _pack_bits(small[:, 1:] > small[:, :-1])
+    
+    except Exception as e:
+        result['error'] = str(e)
+    
+    return result
+
+
+class BKTree:
+    """Árbol BK para buscar hashes a una distancia de Hamming máxima."""
+    
+    def __init__(self):
+        # Nodo: [hash, lista de claves con ese hash, {distancia: nodo hijo}]
+        self._root = None
+    
+    def add(self, value: int, key) -> None:
+        """Inserta un hash con su clave (los hashes idénticos comparten nodo)."""
+        if self._root is None:
+            self._root = [value, [key], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+    
+    def search(self, value: int, radius: int) -> List[Tuple[object, int]]:
+        """
+        Claves cuyo hash está a distancia <= radius.
+        
+        Returns:
+            Lista de pares (clave, distancia).
+        """
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((key, distance) for key in node[1])
+            # Desigualdad triangular: solo los hijos en [d - r, d + r] pueden estar cerca
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class ImageHashIndex:
+    """Hashes perceptuales de varias carpetas de imágenes con caché por mtime."""
+    
+    def __init__(self, image_dirs: Optional[List[Path]] = None,
+                 index_path: Optional[Path] = None):
+        """
+        Inicializa el índice.
+        
+        Args:
+            image_dirs: Carpetas a indexar (por defecto raw_images y analysis_images).
+            index_path: Archivo de caché (por defecto data/.image_hashes.json).
+                        Puede compartirse entre índices de carpetas distintas.
+        """
+        dirs = image_dirs if image_dirs is not None else [RAW_IMAGES_DIR, ANALYSIS_IMAGES_DIR]
+        self.image_dirs = [Path(d).resolve() for d in dirs]
+        self.index_path = Path(index_path) if index_path else IMAGE_HASH_INDEX
+        self._entries: Dict[str, Dict] = {}
+        self._load()
+    
+    def _load(self):
+        """Carga la caché si existe y es de la versión actual."""
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self._entries = data['files']
+        except (OSError, ValueError, KeyError):
+            self._entries = {}
+    
+    def _save(self):
+        """Guarda la caché de forma atómica."""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'files': self._entries}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice de hashes: {e}")
+    
+    def _in_scope(self, path: str) -> bool:
+        """Si una entrada pertenece a las carpetas de este índice."""
+        return Path(path).parent in self.image_dirs
+    
+    def refresh(self, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Sincroniza el índice con las carpetas.
+        
+        Solo se procesan las imágenes nuevas o cuyo tamaño/fecha cambió; las
+        eliminadas se quitan del índice. Las entradas de otras carpetas
+        (de otro índice que comparte el archivo) no se tocan.
+        
+        Args:
+            workers: Procesos para calcular los hashes. None = número de CPUs; 1 = secuencial.
+        
+        Returns:
+            Diccionario con 'total', 'hashed' y 'removed'.
+        """
+        current = {}
+        for image_dir in self.image_dirs:
+            if not image_dir.exists():
+                continue
+            with os.scandir(image_dir) as it:
+                for entry in it:
+                    if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                        stat = entry.stat()
+                        current[str(image_dir / entry.name)] = (stat.st_size, stat.st_mtime)
+        
+        removed = [path for path in self._entries if self._in_scope(path) and path not in current]
+        for path in removed:
+            del self._entries[path]
+        
+        changed = [
+            path for path, (size, mtime) in current.items()
+            if path not in self._entries
+            or self._entries[path]['size'] != size
+            or self._entries[path]['mtime'] != mtime
+        ]
+        
+        if changed:
+            results = map_files(image_hashes, changed, workers)
+            for path, result in zip(changed, results):
+                if result['error']:
+                    print(f"Error al leer {Path(path).name}: {result['error']}")
+                size, mtime = current[path]
+                self._entries[path] = dict(result, size=size, mtime=mtime)
+        
+        if changed or removed:
+            self._save()
+        
+        return {'total': len(current), 'hashed': len(changed), 'removed': len(removed)}
+    
+    def __len__(self) -> int:
+        return sum(1 for path in self._entries if self._in_scope(path))
+    
+    def entries(self) -> List[Tuple[str, Dict]]:
+        """Pares (ruta de la imagen, hashes) de las carpetas del índice, ordenados por ruta."""
+        return sorted((path, entry) for path, entry in self._entries.items()
+                      if self._in_scope(path) and entry['error'] is None)
+    
+    def duplicate_groups(self,
+                         phash_threshold: int = PHASH_THRESHOLD,
+                         dhash_threshold: int = DHASH_THRESHOLD) -> List[List[str]]:
+        """
+        Agrupa las imágenes casi duplicadas.
+        
+        Dos imágenes son casi iguales si ambos hashes están dentro de su
+        umbral; los grupos son transitivos (A~B y B~C ponen A, B y C juntos).
+        
+        Args:
+            phash_threshold: Distancia de Hamming máxima del pHash.
+            dhash_threshold: Distancia de Hamming máxima del dHash.
+        
+        Returns:
+            Grupos de dos o más rutas (ordenadas), ordenados por su primera ruta.
+        """
+        entries = self.entries()
+        tree = BKTree()
+        for index, (_, entry) in enumerate(entries):
+            tree.add(entry['phash'], index)
+        
+        parent = list(range(len(entries)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for index, (_, entry) in enumerate(entries):
+            for other, _ in tree.search(entry['phash'], phash_threshold):
+                if other > index and hamming(entry['dhash'], entries[other][1]['dhash']) <= dhash_threshold:
+                    parent[find(other)] = find(index)
+        
+        groups = {}
+        for index, (path, _) in enumerate(entries):
+            groups.setdefault(find(index), []).append(path)
+        return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+    
+    def split_groups(self, keys: List[str],
+                     phash_threshold: int = PHASH_THRESHOLD,
+                     dhash_threshold: int = DHASH_THRESHOLD) -> Dict[str, str]:
+        """
+        Grupo de cada anotación para repartir los splits.
+        
+        Args:
+            keys: Nombres de imagen sin extensión (los de los XML).
+        
+        Returns:
+            Diccionario {nombre: nombre representativo del grupo} solo para
+            las anotaciones que tienen algún casi duplicado entre keys. El
+            representativo es el menor nombre del grupo, así que no depende
+            del orden de lectura.
+        """
+        wanted = set(keys)
+        mapping = {}
+        for group in self.duplicate_groups(phash_threshold, dhash_threshold):
+            stems = sorted({Path(path).stem for path in group} & wanted)
+            if len(stems) > 1:
+                for stem in stems:
+                    mapping[stem] = stems[0]
+        return mapping
+
+
+def main():
+    """Función principal para listar los casi duplicados desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Buscar imágenes duplicadas o casi duplicadas'
+    )
+    parser.add_argument('--images', type=str, nargs='+',
+                        default=[str(RAW_IMAGES_DIR), str(ANALYSIS_IMAGES_DIR)],
+                        help='Carpetas de imágenes')
+    parser.add_argument('--phash', type=int, default=PHASH_THRESHOLD,
+                        help='Distancia de Hamming máxima del pHash (0-64)')
+    parser.add_argument('--dhash', type=int, default=DHASH_THRESHOLD,
+                        help='Distancia de Hamming máxima del dHash (0-64)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos para calcular los hashes')
+    
+    args = parser.parse_args()
+    
+    index = ImageHashIndex([Path(p) for p in args.images])
+    info = index.refresh(args.workers)
+    print(f"🔎 {info['total']} imágenes ({info['hashed']} nuevas o modificadas)")
+    
+    groups = index.duplicate_groups(args.phash, args.dhash)
+    if not groups:
+        print("✅ No se encontraron imágenes casi duplicadas")
+        return
+    
+    print(f"⚠️ {len(groups)} grupos de imágenes casi duplicadas:")
+    for number, group in enumerate(groups, 1):
+        print(f"\n   Grupo {number}:")
+        for path in group:
+            print(f"     {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Módulo de índice de gráficos para el visor de resultados.
+
+Mantiene una base de datos SQLite con los metadatos de cada gráfico PNG
+(muestra, tipo de figura, ejecución, fecha de modificación) y una miniatura
+pequeña, de modo que el visor pueda filtrar, buscar y previsualizar sin
+volver a recorrer ni abrir los archivos completos. El índice se actualiza
+de forma incremental comparando la fecha de modificación de cada archivo.
+
+Cada ejecución es una carpeta de gráficos: la actual (results/graphs) y la
+de cada respaldo (backups/backup_<timestamp>/graphs).
+"""
+
+import io
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import sys
+
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import GRAPHS_DIR, PROJECT_ROOT, RESULTS_DIR
+
+
+# Sufijos de nombre de archivo generados por el análisis -> tipo de figura
+FIGURE_TYPES = [
+    'class_distribution',
+    'size_distribution',
+    'shape_distribution',
+    'frequency_curve',
+    'correlation_matrix',
+    'dashboard',
+]
+
+# Prefijo de los gráficos comparativos entre muestras
+COMPARATIVE_PREFIX = 'comparative_'
+
+# Ejecución de los gráficos de results/graphs
+CURRENT_RUN = 'actual'
+
+BACKUPS_DIR = PROJECT_ROOT / "backups"
+
+
+def parse_graph_name(stem: str) -> Dict[str, str]:
+    """
+    Extrae la muestra y el tipo de figura del nombre de un gráfico.
+
+    Args:
+        stem: Nombre del archivo sin extensión (ej. 'M1_size_distribution').
+
+    Returns:
+        Diccionario con 'sample_id' y 'figure_type'.
+    """
+    if stem.startswith(COMPARATIVE_PREFIX):
+        return {'sample_id': '', 'figure_type': 'comparative'}
+
+    for figure_type in FIGURE_TYPES:
+        suffix = f"_{figure_type}"
+        if stem.endswith(suffix):
+            return {'sample_id': stem[:-len(suffix)], 'figure_type': figure_type}
+
+    return {'sample_id': stem, 'figure_type': 'otro'}
+
+
+class GraphIndex:
+    """Índice SQLite de gráficos con miniaturas en caché."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS graphs (
+            path TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            directory TEXT NOT NULL,
+            sample_id TEXT,
+            figure_type TEXT,
+            run_id TEXT,
+            mtime REAL NOT NULL,
+            size INTEGER,
+            width INTEGER,
+            height INTEGER,
+            thumbnail BLOB
+        );
+        CREATE INDEX IF NOT EXISTS idx_graphs_type ON graphs (figure_type);
+        CREATE INDEX IF NOT EXISTS idx_graphs_run ON graphs (run_id);
+        CREATE INDEX IF NOT EXISTS idx_graphs_dir ON graphs (directory);
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 thumbnail_size: int = 256):
+        """
+        Inicializa el índice de gráficos.
+
+        Args:
+            db_path: Ruta a la base de datos SQLite. Por defecto
+                     results/graph_index.sqlite.
+            thumbnail_size: Lado máximo de las miniaturas en píxeles.
+        """
+        self.db_path = Path(db_path) if db_path else RESULTS_DIR / "graph_index.sqlite"
+        self.thumbnail_size = thumbnail_size
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión nueva (una por llamada, apta para hilos); confirma y la cierra al salir."""
+        with closing(sqlite3.connect(str(self.db_path))) as conn, conn:
+            yield conn
+
+    def _make_thumbnail(self, image_path: Path) -> Dict:
+        """
+        Genera la miniatura PNG de un gráfico.
+
+        Args:
+            image_path: Ruta al gráfico.
+
+        Returns:
+            Diccionario con 'width', 'height' y 'thumbnail' (bytes PNG).
+        """
+        with Image.open(image_path) as img:
+            width, height = img.size
+            # draft() permite decodificar a menor escala cuando el formato lo soporta
+            img.draft('RGB', (self.thumbnail_size, self.thumbnail_size))
+            thumb = img.convert('RGB')
+            thumb.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        thumb.save(buffer, format='PNG', optimize=True)
+        return {'width': width, 'height': height, 'thumbnail': buffer.getvalue()}
+
+    def update(self, directory: Path = GRAPHS_DIR, run_id: str = CURRENT_RUN) -> Dict[str, int]:
+        """
+        Actualiza el índice de forma incremental para un directorio.
+
+        Solo se regeneran las entradas cuyo archivo es nuevo o cambió de
+        fecha de modificación; las entradas de archivos eliminados se borran.
+
+        Args:
+            directory: Directorio con gráficos PNG.
+            run_id: Identificador de la ejecución (ej. 'actual' o 'backup_20260222_165352').
+
+        Returns:
+            Diccionario con el número de archivos 'added', 'updated' y 'removed'.
+        """
+        directory = Path(directory)
+        dir_key = str(directory.resolve())
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+
+        with self._connect() as conn:
+            known = dict(conn.execute(
+                "SELECT path, mtime FROM graphs WHERE directory = ?", (dir_key,)
+            ).fetchall())
+
+            present = set()
+            if directory.exists():
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not entry.is_file() or not entry.name.lower().endswith('.png'):
+                            continue
+
+                        stat = entry.stat()
+                        path_key = str(Path(entry.path).resolve())
+                        present.add(path_key)
+
+                        if known.get(path_key) == stat.st_mtime:
+                            continue
+
+                        try:
+                            thumb_info = self._make_thumbnail(Path(entry.path))
+                        except Exception as e:
+                            print(f"⚠️ No se pudo indexar {entry.name}: {e}")
+                            continue
+
+                        meta = parse_graph_name(Path(entry.name).stem)
+                        conn.execute(
+                            "INSERT OR REPLACE INTO graphs "
+                            "(path, name, directory, sample_id, figure_type, run_id, "
+                            " mtime, size, width, height, thumbnail) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (path_key, entry.name, dir_key, meta['sample_id'],
+                             meta['figure_type'], run_id, stat.st_mtime, stat.st_size,
+                             thumb_info['width'], thumb_info['height'],
+                             thumb_info['thumbnail'])
+                        )
+                        counts['updated' if path_key in known else 'added'] += 1
+
+            removed = [path for path in known if path not in present]
+            conn.executemany("DELETE FROM graphs WHERE path = ?", [(p,) for p in removed])
+            counts['removed'] = len(removed)
+
+        return counts
+
+    def update_runs(self,
+                    graphs_dir: Path = GRAPHS_DIR,
+                    backups_dir: Path = BACKUPS_DIR) -> Dict[str, int]:
+        """
+        Actualiza el índice de todas las ejecuciones: la actual y cada respaldo.
+
+        Las entradas de carpetas que ya no existen (respaldos borrados) se
+        eliminan del índice.
+
+        Args:
+            graphs_dir: Carpeta de gráficos de la ejecución actual.
+            backups_dir: Carpeta con los respaldos (backup_*/graphs).
+
+        Returns:
+            Diccionario con el total de archivos 'added', 'updated' y 'removed'.
+        """
+        runs = {Path(graphs_dir): CURRENT_RUN}
+        if Path(backups_dir).exists():
+            for graphs in sorted(Path(backups_dir).glob("*/graphs")):
+                runs[graphs] = graphs.parent.name
+
+        totals = {'added': 0, 'updated': 0, 'removed': 0}
+        for directory, run_id in runs.items():
+            for key, value in self.update(directory, run_id).items():
+                totals[key] += value
+
+        indexed = {str(directory.resolve()) for directory in runs}
+        with self._connect() as conn:
+            stale = [row[0] for row in conn.execute("SELECT DISTINCT directory FROM graphs")
+                     if row[0] not in indexed]
+            for directory in stale:
+                totals['removed'] += conn.execute(
+                    "DELETE FROM graphs WHERE directory = ?", (directory,)
+                ).rowcount
+
+        return totals
+
+    def run_ids(self) -> List[str]:
+        """
+        Ejecuciones presentes en el índice.
+
+        Returns:
+            Lista con la ejecución actual primero y los respaldos del más
+            reciente al más antiguo.
+        """
+        with self._connect() as conn:
+            runs = [row[0] for row in conn.execute("SELECT DISTINCT run_id FROM graphs")]
+        backups = sorted((run for run in runs if run != CURRENT_RUN), reverse=True)
+        return ([CURRENT_RUN] if CURRENT_RUN in runs else []) + backups
+
+    def query(self,
+              figure_type: Optional[str] = None,
+              run_id: Optional[str] = None,
+              search: Optional[str] = None) -> List[Dict]:
+        """
+        Busca gráficos en el índice.
+
+        Args:
+            figure_type: Tipo de figura (ver FIGURE_TYPES o 'comparative').
+            run_id: Identificador de ejecución (None para todas).
+            search: Texto a buscar en el nombre o la muestra (literal:
+                    '%' y '_' no actúan como comodines).
+
+        Returns:
+            Lista de diccionarios ordenada por nombre y ejecución (sin miniatura).
+        """
+        sql = ("SELECT path, name, sample_id, figure_type, run_id, mtime, size, "
+               "width, height FROM graphs WHERE 1 = 1")
+        params = []
+
+        if figure_type:
+            sql += " AND figure_type = ?"
+            params.append(figure_type)
+        if run_id:
+            sql += " AND run_id = ?"
+            params.append(run_id)
+        if search:
+            pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            sql += " AND (name LIKE ? ESCAPE '\\' OR sample_id LIKE ? ESCAPE '\\')"
+            params.extend([f"%{pattern}%", f"%{pattern}%"])
+
+        sql += " ORDER BY name, run_id"
+
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def get_thumbnail(self, image_path: Path) -> Optional[Image.Image]:
+        """
+        Obtiene la miniatura en caché de un gráfico.
+
+        Args:
+            image_path: Ruta al gráfico.
+
+        Returns:
+            Miniatura como imagen PIL, o None si no está indexado.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT thumbnail FROM graphs WHERE path = ?",
+                (str(Path(image_path).resolve()),)
+            ).fetchone()
+
+        if row is None or row[0] is None:
+            return None
+
+        return Image.open(io.BytesIO(row[0]))
@@ -34,6 +34,9 @@ class ImageAnnotator:
         # Archivo de clases predefinidas para microplásticos
         self.predefined_classes_file = self.annotations_dir / "predefined_classes.txt"
         self._create_predefined_classes()
+        
+        # Índice de anotaciones (se crea al pedir estadísticas)
+        self._annotation_index = None
     
     def _create_predefined_classes(self):
         """Crea un archivo con clases predefinidas para microplásticos."""
@@ -50,10 +53,15 @@ class ImageAnnotator:
             for cls in classes:
                 f.write(f"{cls}\n")
     
-    def launch_labelimg(self):
+    def launch_labelimg(self, worklist=None):
         """
         Lanza LabelImg para anotar imágenes.
         
+        Args:
+            worklist (str): Lista priorizada (una ruta por línea, ver
+                            src/active_learning.py). Si se indica, LabelImg
+                            abre esas imágenes en ese orden en lugar de la carpeta.
+        
         Returns:
             bool: True si se lanzó correctamente, False si hubo error
         """
@@ -82,6 +90,8 @@ class ImageAnnotator:
             print(f"  - Directorio de imágenes: {self.images_dir}")
             print(f"  - Directorio de anotaciones: {self.annotations_dir}")
             print(f"  - Clases predefinidas: {self.predefined_classes_file}")
+            if worklist:
+                print(f"  - Lista priorizada: {worklist}")
             
             # Intentar usar labelImg directamente desde el entorno virtual
             try:
@@ -99,7 +109,7 @@ class ImageAnnotator:
                 cmd = [
                     str(venv_pythonw),
                     str(labelimg_script),
-                    str(self.images_dir),
+                    str(worklist or self.images_dir),
                     str(self.predefined_classes_file),
                     str(self.annotations_dir)
                 ]
@@ -174,39 +184,24 @@ class ImageAnnotator:
         Obtiene estadísticas de las anotaciones realizadas.
         
         Returns:
-            dict: Diccionario con estadísticas de anotaciones
+            dict: Diccionario con estadísticas de anotaciones ('total_images',
+                  'total_objects', 'classes', 'objects_per_image', 'box_area')
         """
-        import xml.etree.ElementTree as ET
-        
-        annotation_files = self.get_annotation_files()
-        
-        if not annotation_files:
-            return {
-                'total_images': 0,
-                'total_objects': 0,
-                'classes': {}
-            }
-        
-        total_objects = 0
-        classes_count = {}
-        
-        for xml_file in annotation_files:
-            try:
-                tree = ET.parse(xml_file)
-                root = tree.getroot()
-                
-                for obj in root.findall('object'):
-                    name = obj.find('name').text
-                    total_objects += 1
-                    classes_count[name] = classes_count.get(name, 0) + 1
-            except Exception as e:
-                print(f"Error al leer {xml_file}: {e}")
+        index = self.get_annotation_index()
+        index.refresh()
+        return index.stats()
+    
+    def get_annotation_index(self):
+        """
+        Obtiene el índice de anotaciones (se crea una vez y se reutiliza).
         
-        return {
-            'total_images': len(annotation_files),
-            'total_objects': total_objects,
-            'classes': classes_count
-        }
+        Returns:
+            AnnotationIndex: Índice con caché de los XML de anotación
+        """
+        if self._annotation_index is None:
+            from src.annotation_index import AnnotationIndex
+            self._annotation_index = AnnotationIndex(self.annotations_dir)
+        return self._annotation_index
 
 
 def launch_labelimg_standalone(images_dir=None, annotations_dir=None):
@@ -0,0 +1,28 @@
+"""
+Módulo de utilidades para listar las imágenes de una carpeta.
+
+Se mantiene ligero (sin importar ultralytics, torch ni OpenCV) para que lo
+puedan usar los scripts de anotación, los procesos de trabajo y las
+herramientas de preparaciones sin cargar el entorno de entrenamiento.
+"""
+
+from pathlib import Path
+from typing import List
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
+
+
+def list_images(images_dir: Path) -> List[Path]:
+    """
+    Lista las imágenes de una carpeta del dataset.
+
+    Args:
+        images_dir: Carpeta con imágenes.
+
+    Returns:
+        Lista ordenada de rutas.
+    """
+    if not Path(images_dir).exists():
+        return []
+    return sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
@@ -15,7 +15,7 @@ from config.config import IMAGE_PARAMS
 
 # Importar detector YOLO
 try:
-    from src.yolo_detector import YOLODetector, YOLO_AVAILABLE
+    from src.yolo_detector import YOLODetector, YOLO_AVAILABLE, get_detector
 except ImportError:
     YOLO_AVAILABLE = False
     YOLODetector = None
@@ -48,10 +48,10 @@ class ImageProcessor:
                 "Entrena uno en la pestaña 'Entrenar YOLOv8' primero."
             )
         
-        # Inicializar detector YOLO
+        # Inicializar detector YOLO (reutiliza el ya cargado para el mismo modelo)
         try:
-            self.yolo_detector = YOLODetector(
-                model_path=yolo_model_path,
+            self.yolo_detector = get_detector(
+                yolo_model_path,
                 pixels_to_um=self.pixels_to_um
             )
             print("✅ Detector YOLOv8 inicializado correctamente")
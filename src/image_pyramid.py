@@ -0,0 +1,214 @@
+"""
+Módulo de pirámide de teselas para visualizar gráficos de alta resolución.
+
+Los gráficos se guardan a 300 dpi, por lo que un dashboard puede medir
+más de 4000×3000 píxeles. En lugar de redimensionar la imagen completa en
+cada paso de zoom, este módulo precalcula niveles de resolución (1, 1/2,
+1/4, ...) y entrega teselas pequeñas bajo demanda, de modo que el visor
+solo dibuja la parte visible del canvas.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+
+class TilePyramid:
+    """Pirámide multi-resolución de una imagen con caché LRU de teselas."""
+
+    def __init__(self,
+                 image: Image.Image,
+                 tile_size: int = 512,
+                 max_cached_tiles: int = 256):
+        """
+        Inicializa la pirámide a partir de una imagen PIL.
+
+        Args:
+            image: Imagen original (resolución completa).
+            tile_size: Lado de cada tesela en píxeles de pantalla.
+            max_cached_tiles: Número máximo de teselas en la caché LRU.
+        """
+        self.tile_size = tile_size
+        self.max_cached_tiles = max_cached_tiles
+        self.width, self.height = image.size
+
+        # Forzar la decodificación una sola vez (Image.open es perezoso)
+        base = image.convert('RGBA') if image.mode not in ('RGB', 'RGBA') else image.copy()
+
+        # Nivel 0 = resolución completa; cada nivel siguiente es la mitad
+        self.levels: List[Tuple[float, Image.Image]] = [(1.0, base)]
+        scale = 1.0
+        level_image = base
+        while max(level_image.size) > tile_size:
+            level_image = level_image.reduce(2)
+            scale /= 2
+            self.levels.append((scale, level_image))
+
+        self._tile_cache: "OrderedDict[Tuple[float, int, int], Image.Image]" = OrderedDict()
+
+    def display_size(self, zoom: float) -> Tuple[int, int]:
+        """
+        Calcula el tamaño de la imagen completa para un zoom dado.
+
+        Args:
+            zoom: Factor de zoom (1.0 = resolución original).
+
+        Returns:
+            Tupla (ancho, alto) en píxeles de pantalla.
+        """
+        return max(1, int(self.width * zoom)), max(1, int(self.height * zoom))
+
+    def _select_level(self, zoom: float) -> Tuple[float, Image.Image]:
+        """
+        Selecciona el nivel precalculado más cercano con resolución suficiente.
+
+        Se elige el nivel más pequeño cuya escala sea >= zoom, de modo que
+        siempre se reduce (o se amplía desde el nivel 0 si zoom > 1).
+        """
+        for scale, level_image in reversed(self.levels):
+            if scale >= zoom:
+                return scale, level_image
+        return self.levels[0]
+
+    def visible_tiles(self, zoom: float,
+                      x0: float, y0: float,
+                      x1: float, y1: float,
+                      margin: int = 0) -> List[Tuple[int, int]]:
+        """
+        Obtiene las teselas que intersectan un rectángulo visible.
+
+        Args:
+            zoom: Factor de zoom.
+            x0, y0, x1, y1: Rectángulo visible en coordenadas de pantalla.
+            margin: Teselas adicionales alrededor del área visible.
+
+        Returns:
+            Lista de (columna, fila) de las teselas visibles.
+        """
+        width, height = self.display_size(zoom)
+        n_cols = (width + self.tile_size - 1) // self.tile_size
+        n_rows = (height + self.tile_size - 1) // self.tile_size
+
+        col_start = max(0, int(x0 // self.tile_size) - margin)
+        row_start = max(0, int(y0 // self.tile_size) - margin)
+        col_end = min(n_cols - 1, int(x1 // self.tile_size) + margin)
+        row_end = min(n_rows - 1, int(y1 // self.tile_size) + margin)
+
+        return [(col, row)
+                for row in range(row_start, row_end + 1)
+                for col in range(col_start, col_end + 1)]
+
+    def get_tile(self, zoom: float, col: int, row: int) -> Image.Image:
+        """
+        Obtiene una tesela para el zoom indicado (usando la caché si existe).
+
+        Args:
+            zoom: Factor de zoom.
+            col: Columna de la tesela.
+            row: Fila de la tesela.
+
+        Returns:
+            Imagen PIL de la tesela (puede ser menor en los bordes).
+        """
+        key = (round(zoom, 4), col, row)
+        tile = self._tile_cache.get(key)
+        if tile is not None:
+            self._tile_cache.move_to_end(key)
+            return tile
+
+        width, height = self.display_size(zoom)
+        left = col * self.tile_size
+        top = row * self.tile_size
+        right = min(left + self.tile_size, width)
+        bottom = min(top + self.tile_size, height)
+
+        # Región equivalente dentro del nivel elegido
+        scale, level_image = self._select_level(zoom)
+        factor = scale / zoom
+        box = (
+            left * factor,
+            top * factor,
+            min(right * factor, level_image.width),
+            min(bottom * factor, level_image.height)
+        )
+        tile = level_image.resize(
+            (right - left, bottom - top),
+            Image.Resampling.LANCZOS,
+            box=box
+        )
+
+        self._tile_cache[key] = tile
+        if len(self._tile_cache) > self.max_cached_tiles:
+            self._tile_cache.popitem(last=False)
+
+        return tile
+
+    def clear_cache(self):
+        """Vacía la caché de teselas (los niveles se conservan)."""
+        self._tile_cache.clear()
+
+
+class TilePyramidCache:
+    """
+    Caché LRU de pirámides, una por gráfico (clave: ruta + fecha de modificación).
+
+    Es segura entre hilos: el visor la consulta desde el hilo de carga
+    mientras Tk lee la pirámide actual, así que el diccionario interno solo
+    se toca con el candado tomado. La construcción de la pirámide se hace
+    fuera del candado para no bloquear otras consultas.
+    """
+
+    def __init__(self, max_pyramids: int = 4, tile_size: int = 512):
+        """
+        Inicializa la caché de pirámides.
+
+        Args:
+            max_pyramids: Número máximo de gráficos con pirámide en memoria.
+            tile_size: Lado de las teselas de cada pirámide.
+        """
+        self.max_pyramids = max_pyramids
+        self.tile_size = tile_size
+        self._pyramids: "OrderedDict[Tuple[str, float], TilePyramid]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_path: Path, image: Optional[Image.Image] = None) -> TilePyramid:
+        """
+        Obtiene la pirámide de un gráfico, construyéndola si no existe.
+
+        Args:
+            image_path: Ruta al archivo del gráfico.
+            image: Imagen ya abierta (opcional, evita abrirla de nuevo).
+
+        Returns:
+            Pirámide de teselas del gráfico.
+        """
+        image_path = Path(image_path)
+        key = (str(image_path.resolve()), image_path.stat().st_mtime)
+
+        with self._lock:
+            pyramid = self._pyramids.get(key)
+            if pyramid is not None:
+                self._pyramids.move_to_end(key)
+                return pyramid
+
+        if image is None:
+            with Image.open(image_path) as img:
+                pyramid = TilePyramid(img, tile_size=self.tile_size)
+        else:
+            pyramid = TilePyramid(image, tile_size=self.tile_size)
+
+        with self._lock:
+            # Otro hilo pudo construirla mientras tanto: se conserva la primera
+            existing = self._pyramids.get(key)
+            if existing is not None:
+                self._pyramids.move_to_end(key)
+                return existing
+
+            self._pyramids[key] = pyramid
+            if len(self._pyramids) > self.max_pyramids:
+                self._pyramids.popitem(last=False)
+
+        return pyramid
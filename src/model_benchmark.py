@@ -0,0 +1,383 @@
+"""
+Módulo de exportación y benchmark de modelos YOLOv8.
+
+Exporta un modelo entrenado (best.pt) a varios formatos de inferencia
+(TorchScript, ONNX, OpenVINO), verifica que cada exportación produce las
+mismas detecciones que el modelo original sobre el split de validación
+(paridad numérica) y mide su latencia p50/p95 y su rendimiento a varios
+tamaños de batch en CPU. El resultado se guarda en un informe JSON junto
+al modelo y el formato más rápido que pasa la verificación se registra
+como modelo por defecto del detector.
+"""
+
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+try:
+    from ultralytics import YOLO
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO_AVAILABLE = False
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.image_files import list_images
+from src.model_registry import ModelRegistry
+
+
+# Formatos de exportación probados (nombres de ultralytics)
+EXPORT_FORMATS = ['torchscript', 'onnx', 'openvino']
+
+# Formatos que admiten batch variable al exportar con dynamic=True
+DYNAMIC_FORMATS = {'onnx', 'openvino'}
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Calcula la matriz IoU entre dos conjuntos de cajas [x1, y1, x2, y2].
+    
+    Args:
+        boxes_a: Array (N, 4).
+        boxes_b: Array (M, 4).
+    
+    Returns:
+        Array (N, M) con el IoU de cada par.
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)))
+    
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def compare_detections(reference: List[Dict],
+                       candidate: List[Dict],
+                       iou_threshold: float = 0.9,
+                       conf_tolerance: float = 0.05,
+                       min_match_ratio: float = 0.95) -> Dict:
+    """
+    Compara las detecciones de un modelo exportado con las del original.
+    
+    Cada detección del original se empareja (de forma voraz, por IoU) con
+    una detección de la misma clase del modelo exportado.
+    
+    Args:
+        reference: Detecciones del modelo original por imagen
+                   ({'boxes': (N, 4), 'conf': (N,), 'cls': (N,)}).
+        candidate: Detecciones del modelo exportado, en el mismo orden.
+        iou_threshold: IoU mínimo para considerar dos cajas equivalentes.
+        conf_tolerance: Diferencia máxima de confianza permitida.
+        min_match_ratio: Proporción mínima de detecciones emparejadas.
+    
+    Returns:
+        Diccionario con 'matched', 'total', 'match_ratio',
+        'max_conf_diff' y 'passed'.
+    """
+    matched = 0
+    total = 0
+    max_conf_diff = 0.0
+    
+    for ref, cand in zip(reference, candidate):
+        total += max(len(ref['cls']), len(cand['cls']))
+        iou = box_iou(ref['boxes'], cand['boxes'])
+        used = set()
+        
+        for i in np.argsort(-ref['conf']):
+            best_j, best_iou = None, iou_threshold
+            for j in range(len(cand['cls'])):
+                if j in used or cand['cls'][j] != ref['cls'][i]:
+                    continue
+                if iou[i, j] >= best_iou:
+                    best_j, best_iou = j, iou[i, j]
+            if best_j is not None:
+                used.add(best_j)
+                matched += 1
+                max_conf_diff = max(max_conf_diff, abs(float(ref['conf'][i] - cand['conf'][best_j])))
+    
+    match_ratio = matched / total if total else 1.0
+    return {
+        'matched': matched,
+        'total': total,
+        'match_ratio': match_ratio,
+        'max_conf_diff': max_conf_diff,
+        'passed': match_ratio >= min_match_ratio and max_conf_diff <= conf_tolerance,
+    }
+
+
+def latency_stats(timings_ms: List[float], batch: int) -> Dict:
+    """
+    Resume tiempos por llamada en latencia p50/p95 y rendimiento.
+    
+    Args:
+        timings_ms: Duración de cada llamada en milisegundos.
+        batch: Imágenes por llamada.
+    
+    Returns:
+        Diccionario con 'p50_ms', 'p95_ms' e 'images_per_second'.
+    """
+    ordered = sorted(timings_ms)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    total_seconds = sum(ordered) / 1000
+    return {
+        'p50_ms': statistics.median(ordered),
+        'p95_ms': ordered[p95_index],
+        'images_per_second': batch * len(ordered) / total_seconds if total_seconds > 0 else 0.0,
+    }
+
+
+def load_images(image_paths: List[Path]) -> List[np.ndarray]:
+    """Carga imágenes BGR (omite las que no se pueden leer)."""
+    images = []
+    for path in image_paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def predict_detections(model, images: List[np.ndarray], imgsz: int, conf: float = 0.25) -> List[Dict]:
+    """
+    Obtiene las detecciones de un modelo imagen por imagen.
+    
+    Args:
+        model: Modelo YOLO (cualquier formato).
+        images: Imágenes BGR.
+        imgsz: Tamaño de inferencia.
+        conf: Umbral de confianza.
+    
+    Returns:
+        Lista de {'boxes', 'conf', 'cls'} (arrays NumPy) por imagen.
+    """
+    detections = []
+    for image in images:
+        boxes = model.predict(image, imgsz=imgsz, conf=conf, device='cpu', verbose=False)[0].boxes
+        detections.append({
+            'boxes': boxes.xyxy.cpu().numpy(),
+            'conf': boxes.conf.cpu().numpy(),
+            'cls': boxes.cls.cpu().numpy().astype(int),
+        })
+    return detections
+
+
+def measure_latency(model,
+                    images: List[np.ndarray],
+                    imgsz: int,
+                    batch_sizes: List[int],
+                    repeats: int = 20,
+                    warmup: int = 3) -> Dict[int, Dict]:
+    """
+    Mide latencia y rendimiento de un modelo a varios tamaños de batch.
+    
+    Args:
+        model: Modelo YOLO.
+        images: Imágenes BGR de validación.
+        imgsz: Tamaño de inferencia.
+        batch_sizes: Tamaños de batch a medir.
+        repeats: Llamadas cronometradas por batch.
+        warmup: Llamadas iniciales no cronometradas.
+    
+    Returns:
+        Diccionario {batch: latency_stats o {'error': ...}}.
+    """
+    results = {}
+    for batch in batch_sizes:
+        # Repetir imágenes si el split de validación es más pequeño que el batch
+        batch_images = [images[i % len(images)] for i in range(batch)]
+        try:
+            for _ in range(warmup):
+                model.predict(batch_images, imgsz=imgsz, device='cpu', verbose=False)
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model.predict(batch_images, imgsz=imgsz, device='cpu', verbose=False)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[batch] = latency_stats(timings, batch)
+        except Exception as e:
+            results[batch] = {'error': str(e).splitlines()[0] if str(e) else type(e).__name__}
+    return results
+
+
+def export_and_benchmark(model_path: str,
+                         val_images_dir: Path,
+                         formats: Optional[List[str]] = None,
+                         batch_sizes: Optional[List[int]] = None,
+                         imgsz: Optional[int] = None,
+                         max_images: int = 32,
+                         repeats: int = 20,
+                         register_default: bool = True) -> Dict:
+    """
+    Exporta un modelo a varios formatos, verifica paridad y mide latencia.
+    
+    Args:
+        model_path: Ruta al modelo entrenado (best.pt).
+        val_images_dir: Carpeta de imágenes de validación.
+        formats: Formatos de exportación (por defecto EXPORT_FORMATS).
+        batch_sizes: Tamaños de batch a medir (por defecto [1, 4, 8]).
+        imgsz: Tamaño de inferencia (por defecto el del entrenamiento).
+        max_images: Máximo de imágenes de validación usadas.
+        repeats: Llamadas cronometradas por batch.
+        register_default: Si True, marca en el registro de modelos el formato
+                          más rápido que pasa la verificación como predeterminado.
+    
+    Returns:
+        Informe con los resultados por formato y el formato elegido. Se
+        guarda también en export_benchmark.json en la carpeta del
+        entrenamiento que indica el registro de modelos (run_dir).
+    """
+    if not YOLO_AVAILABLE:
+        raise ImportError(
+            "ultralytics no está instalado. "
+            "Ejecuta: pip install ultralytics torch torchvision"
+        )
+    
+    model_path = Path(model_path)
+    formats = formats or EXPORT_FORMATS
+    batch_sizes = sorted(batch_sizes or [1, 4, 8])
+    
+    images = load_images(list_images(val_images_dir)[:max_images])
+    if not images:
+        raise FileNotFoundError(f"No hay imágenes de validación en {val_images_dir}")
+    
+    reference_model = YOLO(str(model_path))
+    imgsz = imgsz or reference_model.overrides.get('imgsz', 320)
+    
+    print(f"\n📦 Exportando y midiendo {model_path.name} ({imgsz}px, {len(images)} imágenes de validación)")
+    
+    reference = predict_detections(reference_model, images, imgsz)
+    entries = [{
+        'format': 'pytorch',
+        'path': str(model_path),
+        'parity': {'passed': True, 'match_ratio': 1.0, 'max_conf_diff': 0.0},
+        'latency': measure_latency(reference_model, images, imgsz, batch_sizes, repeats),
+        'error': None,
+    }]
+    
+    for fmt in formats:
+        entry = {'format': fmt, 'path': None, 'parity': None, 'latency': {}, 'error': None}
+        try:
+            exported = reference_model.export(
+                format=fmt, imgsz=imgsz, device='cpu', dynamic=fmt in DYNAMIC_FORMATS
+            )
+            entry['path'] = str(exported)
+            
+            exported_model = YOLO(str(exported), task='detect')
+            candidate = predict_detections(exported_model, images, imgsz)
+            entry['parity'] = compare_detections(reference, candidate)
+            entry['latency'] = measure_latency(exported_model, images, imgsz, batch_sizes, repeats)
+        except Exception as e:
+            entry['error'] = str(e).splitlines()[0] if str(e) else type(e).__name__
+        entries.append(entry)
+    
+    # Elegir el más rápido (p50 con batch 1, como en el análisis) entre los que pasan la paridad
+    def single_image_latency(entry):
+        stats = entry['latency'].get(batch_sizes[0], {})
+        return stats.get('p50_ms')
+    
+    candidates = [e for e in entries
+                  if e['error'] is None and e['parity'] and e['parity']['passed']
+                  and single_image_latency(e) is not None]
+    fastest = min(candidates, key=single_image_latency) if candidates else None
+    
+    report = {
+        'model': str(model_path),
+        'imgsz': imgsz,
+        'batch_sizes': batch_sizes,
+        'validation_images': len(images),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'results': entries,
+        'fastest': fastest['format'] if fastest else None,
+    }
+    
+    registry = ModelRegistry()
+    model_info = registry.find_by_path(model_path)
+    if not model_info or not model_info.get('run_dir'):
+        model_info = registry.register(model_path)
+    report_path = Path(model_info['run_dir']) / 'export_benchmark.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    print_report(report)
+    print(f"\n💾 Informe guardado en: {report_path}")
+    
+    # Registrar cada exportación válida con sus latencias
+    registered = {}
+    for entry in entries:
+        if entry['error'] is None:
+            registered[entry['format']] = registry.register(
+                entry['path'], fmt=entry['format'], imgsz=imgsz,
+                latency=dict(entry['latency'], parity=entry['parity']),
+                source_path=str(model_path) if entry['format'] != 'pytorch' else None
+            )
+    
+    if register_default and fastest:
+        registry.set_default(registered[fastest['format']]['path'])
+        print(f"⭐ Modelo por defecto: {fastest['path']} ({fastest['format']})")
+    
+    return report
+
+
+def print_report(report: Dict):
+    """Imprime la tabla de formatos con paridad y latencias."""
+    print(f"\n{'formato':<13}{'paridad':>9}{'batch':>7}{'p50 ms':>9}{'p95 ms':>9}{'img/s':>9}")
+    for entry in report['results']:
+        if entry['error']:
+            print(f"{entry['format']:<13}  ❌ {entry['error']}")
+            continue
+        parity = entry['parity']
+        parity_text = f"{parity['match_ratio']:.0%}" + ("" if parity['passed'] else "✗")
+        for batch, stats in entry['latency'].items():
+            if 'error' in stats:
+                print(f"{entry['format']:<13}{parity_text:>9}{batch:>7}  ❌ {stats['error']}")
+                continue
+            mark = " ⭐" if entry['format'] == report['fastest'] and batch == report['batch_sizes'][0] else ""
+            print(f"{entry['format']:<13}{parity_text:>9}{batch:>7}{stats['p50_ms']:>9.1f}"
+                  f"{stats['p95_ms']:>9.1f}{stats['images_per_second']:>9.1f}{mark}")
+
+
+def main():
+    """Función principal para exportar y medir un modelo desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Exportar YOLOv8 a varios formatos y medir latencia'
+    )
+    parser.add_argument('--model', type=str, required=True,
+                        help='Ruta al modelo entrenado (best.pt)')
+    parser.add_argument('--val-images', type=str, default='yolo_training/dataset/val/images',
+                        help='Carpeta de imágenes de validación')
+    parser.add_argument('--formats', type=str, nargs='+', default=EXPORT_FORMATS,
+                        help='Formatos de exportación')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8],
+                        help='Tamaños de batch a medir')
+    parser.add_argument('--no-register', action='store_true',
+                        help='No registrar el modelo más rápido como predeterminado')
+    
+    args = parser.parse_args()
+    
+    export_and_benchmark(
+        args.model,
+        Path(args.val_images),
+        formats=args.formats,
+        batch_sizes=args.batch_sizes,
+        register_default=not args.no_register
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Módulo de registro de modelos YOLO.
+
+Mantiene una base de datos SQLite con cada modelo entrenado o exportado:
+hash SHA-256 del contenido (identificador de versión), ruta, formato,
+clases, tamaño de imagen, métricas de validación y latencias medidas.
+Cada entrada es una ruta: los mismos pesos copiados en dos carpetas son dos
+entradas con el mismo hash (ver find_by_hash).
+Permite listar los modelos sin recorrer las carpetas de entrenamiento,
+marcar uno como predeterminado y sellar los resultados del análisis con
+la versión exacta del modelo que los produjo.
+"""
+
+import csv
+import hashlib
+import json
+import sqlite3
+import sys
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import yaml
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import MODEL_REGISTRY_DB
+
+
+# Extensión -> formato de ultralytics
+MODEL_FORMATS = {
+    '.pt': 'pytorch',
+    '.torchscript': 'torchscript',
+    '.onnx': 'onnx',
+}
+
+
+def detect_format(model_path: Path) -> str:
+    """
+    Deduce el formato de un modelo a partir de su ruta.
+    
+    Args:
+        model_path: Archivo del modelo o carpeta (OpenVINO).
+    
+    Returns:
+        Nombre del formato ('pytorch', 'torchscript', 'onnx', 'openvino' o 'otro').
+    """
+    model_path = Path(model_path)
+    if model_path.is_dir() and model_path.name.endswith('_openvino_model'):
+        return 'openvino'
+    return MODEL_FORMATS.get(model_path.suffix.lower(), 'otro')
+
+
+def read_run_metrics(run_dir: Path) -> Optional[Dict]:
+    """
+    Obtiene las métricas de la mejor época de un entrenamiento (results.csv).
+    
+    Args:
+        run_dir: Carpeta del entrenamiento (yolov8_N).
+    
+    Returns:
+        Diccionario con 'map50', 'map50_95', 'precision', 'recall' y
+        'epoch', o None si no hay results.csv.
+    """
+    results_path = Path(run_dir) / 'results.csv'
+    if not results_path.exists():
+        return None
+    
+    with open(results_path, 'r', encoding='utf-8') as f:
+        # ultralytics rellena los encabezados con espacios
+        rows = [{k.strip(): v.strip() for k, v in row.items()} for row in csv.DictReader(f)]
+    
+    rows = [r for r in rows if r.get('metrics/mAP50-95(B)')]
+    if not rows:
+        return None
+    
+    best = max(rows, key=lambda r: float(r['metrics/mAP50-95(B)']))
+    return {
+        'map50': float(best['metrics/mAP50(B)']),
+        'map50_95': float(best['metrics/mAP50-95(B)']),
+        'precision': float(best['metrics/precision(B)']),
+        'recall': float(best['metrics/recall(B)']),
+        'epoch': int(float(best['epoch'])),
+    }
+
+
+class ModelRegistry:
+    """Índice SQLite de modelos YOLO con su versión (hash) y metadatos."""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS models (
+            path TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            name TEXT,
+            format TEXT,
+            source_hash TEXT,
+            class_names TEXT,
+            imgsz INTEGER,
+            metrics TEXT,
+            latency TEXT,
+            size INTEGER,
+            mtime REAL,
+            created TEXT,
+            is_default INTEGER NOT NULL DEFAULT 0,
+            run_dir TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_models_hash ON models (hash);
+    """
+    
+    JSON_COLUMNS = ('class_names', 'metrics', 'latency')
+    
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Inicializa el registro de modelos.
+        
+        Args:
+            db_path: Ruta a la base de datos SQLite. Por defecto
+                     yolo_training/model_registry.sqlite.
+        """
+        self.db_path = Path(db_path) if db_path else MODEL_REGISTRY_DB
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            self._migrate(conn)
+            conn.executescript(self.SCHEMA)
+    
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """Actualiza tablas anteriores: clave = ruta (antes hash) y columna run_dir."""
+        columns = list(conn.execute("PRAGMA table_info(models)"))
+        if not columns:
+            return
+        if 'run_dir' not in {row['name'] for row in columns}:
+            conn.execute("ALTER TABLE models ADD COLUMN run_dir TEXT")
+        if [row['name'] for row in columns if row['pk']] != ['hash']:
+            return
+        conn.execute("DROP INDEX IF EXISTS idx_models_path")
+        conn.execute("ALTER TABLE models RENAME TO models_v1")
+        conn.executescript(ModelRegistry.SCHEMA)
+        conn.execute(
+            "INSERT OR IGNORE INTO models (path, hash, name, format, source_hash, class_names, "
+            " imgsz, metrics, latency, size, mtime, created, is_default) "
+            "SELECT path, hash, name, format, source_hash, class_names, "
+            " imgsz, metrics, latency, size, mtime, created, is_default FROM models_v1"
+        )
+        conn.execute("DROP TABLE models_v1")
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión nueva (una por llamada, apta para hilos); confirma y la cierra al salir."""
+        with closing(sqlite3.connect(str(self.db_path))) as conn, conn:
+            conn.row_factory = sqlite3.Row
+            yield conn
+    
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        """Convierte una fila en diccionario decodificando las columnas JSON."""
+        info = dict(row)
+        for column in self.JSON_COLUMNS:
+            info[column] = json.loads(info[column]) if info[column] else None
+        info['is_default'] = bool(info['is_default'])
+        return info
+    
+    @staticmethod
+    def _signature(model_path: Path) -> Dict:
+        """Tamaño total y fecha de modificación más reciente (archivo o carpeta)."""
+        if model_path.is_dir():
+            files = [p for p in model_path.rglob('*') if p.is_file()]
+            stats = [p.stat() for p in files]
+            return {'size': sum(s.st_size for s in stats),
+                    'mtime': max((s.st_mtime for s in stats), default=0.0)}
+        stat = model_path.stat()
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+    
+    @staticmethod
+    def _content_hash(model_path: Path) -> str:
+        """SHA-256 del contenido (en carpetas, de todos sus archivos en orden)."""
+        digest = hashlib.sha256()
+        files = sorted(p for p in model_path.rglob('*') if p.is_file()) if model_path.is_dir() else [model_path]
+        for file_path in files:
+            if model_path.is_dir():
+                digest.update(str(file_path.relative_to(model_path)).encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+    
+    def register(self,
+                 model_path: str,
+                 fmt: Optional[str] = None,
+                 name: Optional[str] = None,
+                 class_names: Optional[List[str]] = None,
+                 imgsz: Optional[int] = None,
+                 metrics: Optional[Dict] = None,
+                 latency: Optional[Dict] = None,
+                 source_path: Optional[str] = None,
+                 run_dir: Optional[str] = None) -> Dict:
+        """
+        Registra (o actualiza) un modelo.
+        
+        El hash solo se recalcula si cambió el tamaño o la fecha del archivo.
+        Los metadatos no indicados conservan su valor anterior, salvo que el
+        archivo de esa ruta tenga ahora otro contenido (otro hash).
+        
+        Args:
+            model_path: Ruta al modelo (archivo o carpeta OpenVINO).
+            fmt: Formato (por defecto se deduce de la ruta).
+            name: Nombre legible (por defecto <proyecto>/<entrenamiento>).
+            class_names: Clases del modelo.
+            imgsz: Tamaño de imagen de entrenamiento/exportación.
+            metrics: Métricas de validación.
+            latency: Latencias medidas (ver model_benchmark).
+            source_path: Modelo .pt del que se exportó.
+            run_dir: Carpeta del entrenamiento. Por defecto la del modelo de
+                     origen, la ya registrada o, si no hay ninguna, la que
+                     contiene la carpeta weights del modelo.
+        
+        Returns:
+            Información registrada del modelo (incluye 'hash' y 'run_dir').
+        """
+        model_path = Path(model_path).resolve()
+        signature = self._signature(model_path)
+        fmt = fmt or detect_format(model_path)
+        
+        source_hash = None
+        if source_path:
+            source = self.find_by_path(source_path) or self.register(source_path)
+            source_hash = source['hash']
+            run_dir = run_dir or source['run_dir']
+        
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM models WHERE path = ? AND size = ? AND mtime = ?",
+                (str(model_path), signature['size'], signature['mtime'])
+            ).fetchone()
+            model_hash = row['hash'] if row else self._content_hash(model_path)
+            
+            if run_dir is None:
+                known = conn.execute("SELECT run_dir FROM models WHERE path = ?", (str(model_path),)).fetchone()
+                if known and known['run_dir']:
+                    run_dir = known['run_dir']
+                elif model_path.parent.name == 'weights':
+                    run_dir = model_path.parent.parent
+                else:
+                    run_dir = model_path.parent
+            run_dir = Path(run_dir).resolve()
+            
+            if name is None:
+                name = f"{run_dir.parent.name}/{run_dir.name}"
+                if fmt != 'pytorch':
+                    name += f" ({fmt})"
+            
+            def encode(value):
+                return json.dumps(value) if value is not None else None
+            
+            # Los metadatos anteriores solo se conservan si el contenido es el mismo
+            def keep(column):
+                return (f"{column} = CASE WHEN hash = excluded.hash "
+                        f"THEN COALESCE(excluded.{column}, {column}) ELSE excluded.{column} END")
+            
+            conn.execute(
+                "INSERT INTO models (path, hash, name, format, source_hash, class_names, "
+                " imgsz, metrics, latency, size, mtime, created, run_dir) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET "
+                + ", ".join(keep(column) for column in ('name', 'format', 'source_hash', 'class_names',
+                                                        'imgsz', 'metrics', 'latency'))
+                + ", hash = excluded.hash, size = excluded.size, mtime = excluded.mtime, "
+                "run_dir = excluded.run_dir",
+                (str(model_path), model_hash, name, fmt,
+                 source_hash, encode(class_names), imgsz, encode(metrics), encode(latency),
+                 signature['size'], signature['mtime'], datetime.now().isoformat(timespec='seconds'),
+                 str(run_dir))
+            )
+            
+            return self._row_to_dict(conn.execute(
+                "SELECT * FROM models WHERE path = ?", (str(model_path),)
+            ).fetchone())
+    
+    def scan(self, models_dir: Path) -> int:
+        """
+        Registra todos los entrenamientos y exportaciones de una carpeta de modelos.
+        
+        Lee de cada entrenamiento args.yaml (imgsz y clases), results.csv
+        (métricas) y export_benchmark.json (latencias de cada formato).
+        
+        Args:
+            models_dir: Carpeta yolo_training/models.
+        
+        Returns:
+            Número de modelos registrados o actualizados.
+        """
+        count = 0
+        for best_path in sorted(Path(models_dir).glob('**/weights/best.pt')):
+            run_dir = best_path.parent.parent
+            
+            imgsz = None
+            class_names = None
+            args_path = run_dir / 'args.yaml'
+            if args_path.exists():
+                with open(args_path, 'r', encoding='utf-8') as f:
+                    args = yaml.safe_load(f) or {}
+                imgsz = args.get('imgsz')
+                data_path = Path(str(args.get('data', '')))
+                if data_path.is_file():
+                    with open(data_path, 'r', encoding='utf-8') as f:
+                        class_names = (yaml.safe_load(f) or {}).get('names')
+            
+            self.register(best_path, fmt='pytorch', class_names=class_names,
+                          imgsz=imgsz, metrics=read_run_metrics(run_dir), run_dir=run_dir)
+            count += 1
+            
+            benchmark_path = run_dir / 'export_benchmark.json'
+            if not benchmark_path.exists():
+                continue
+            with open(benchmark_path, 'r', encoding='utf-8') as f:
+                benchmark = json.load(f)
+            for entry in benchmark.get('results', []):
+                if entry.get('error') or not entry.get('path') or not Path(entry['path']).exists():
+                    continue
+                self.register(entry['path'], fmt=entry['format'], class_names=class_names,
+                              imgsz=benchmark.get('imgsz'),
+                              latency=dict(entry['latency'], parity=entry.get('parity')),
+                              source_path=str(best_path) if entry['format'] != 'pytorch' else None)
+                count += 1
+        
+        return count
+    
+    def list_models(self, fmt: Optional[str] = None) -> List[Dict]:
+        """
+        Lista los modelos registrados cuyo archivo sigue existiendo.
+        
+        Args:
+            fmt: Filtrar por formato.
+        
+        Returns:
+            Lista de modelos, el predeterminado primero y luego por nombre.
+        """
+        sql = "SELECT * FROM models"
+        params = []
+        if fmt:
+            sql += " WHERE format = ?"
+            params.append(fmt)
+        sql += " ORDER BY is_default DESC, name"
+        
+        with self._connect() as conn:
+            rows = [self._row_to_dict(row) for row in conn.execute(sql, params)]
+        return [row for row in rows if Path(row['path']).exists()]
+    
+    def find_by_hash(self, model_hash: str) -> List[Dict]:
+        """
+        Obtiene todas las rutas registradas con un mismo contenido.
+        
+        Args:
+            model_hash: Hash SHA-256 del modelo.
+        
+        Returns:
+            Lista de modelos cuyo archivo sigue existiendo, el más reciente primero.
+        """
+        with self._connect() as conn:
+            rows = [self._row_to_dict(row) for row in conn.execute(
+                "SELECT * FROM models WHERE hash = ? ORDER BY created DESC", (model_hash,)
+            )]
+        return [row for row in rows if Path(row['path']).exists()]
+    
+    def get(self, model_hash: str) -> Optional[Dict]:
+        """Obtiene un modelo por su hash (la ruta registrada más reciente que exista)."""
+        models = self.find_by_hash(model_hash)
+        return models[0] if models else None
+    
+    def find_by_path(self, model_path: str) -> Optional[Dict]:
+        """
+        Obtiene un modelo por su ruta, solo si no cambió desde que se registró.
+        
+        Args:
+            model_path: Ruta al modelo.
+        
+        Returns:
+            Información del modelo o None.
+        """
+        model_path = Path(model_path).resolve()
+        if not model_path.exists():
+            return None
+        signature = self._signature(model_path)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM models WHERE path = ? AND size = ? AND mtime = ?",
+                (str(model_path), signature['size'], signature['mtime'])
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+    
+    def set_default(self, model_path: str):
+        """Marca un modelo (por su ruta) como predeterminado y desmarca el anterior."""
+        with self._connect() as conn:
+            conn.execute("UPDATE models SET is_default = 0 WHERE is_default = 1")
+            conn.execute("UPDATE models SET is_default = 1 WHERE path = ?",
+                         (str(Path(model_path).resolve()),))
+    
+    def get_default(self) -> Optional[Dict]:
+        """Obtiene el modelo predeterminado si su archivo sigue existiendo."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM models WHERE is_default = 1").fetchone()
+        if row is None:
+            return None
+        info = self._row_to_dict(row)
+        return info if Path(info['path']).exists() else None
+
+
+def describe_model(info: Dict) -> str:
+    """
+    Texto corto para mostrar un modelo en la interfaz.
+    
+    Args:
+        info: Modelo registrado.
+    
+    Returns:
+        Cadena con nombre, versión (hash abreviado), mAP y latencia.
+    """
+    parts = [info['name'] or Path(info['path']).name, f"v{info['hash'][:8]}"]
+    if info.get('metrics') and info['metrics'].get('map50_95') is not None:
+        parts.append(f"mAP50-95 {info['metrics']['map50_95']:.3f}")
+    latency = (info.get('latency') or {}).get('1') or (info.get('latency') or {}).get(1)
+    if latency and 'p50_ms' in latency:
+        parts.append(f"{latency['p50_ms']:.0f} ms")
+    if info.get('is_default'):
+        parts.append("⭐")
+    return " · ".join(parts)
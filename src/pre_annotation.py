@@ -0,0 +1,212 @@
+"""
+Módulo de pre-anotación asistida por el modelo.
+
+Ejecuta el modelo YOLO entrenado sobre las imágenes de entrenamiento (en
+lotes) y escribe un XML de PASCAL VOC por imagen con el mismo esquema que
+PascalVocWriter de LabelImg. Los XML se escriben sin el atributo
+verified="yes", de modo que en LabelImg aparecen como no verificados y el
+anotador solo tiene que corregirlos.
+
+La pre-anotación es incremental y nunca pisa trabajo humano:
+- Las imágenes con un XML verificado se omiten.
+- Las imágenes con un XML creado o guardado por una persona (LabelImg
+  reescribe el campo source/database al guardar) también se omiten.
+- Los XML pre-anotados por la misma versión del modelo se omiten; los de
+  una versión anterior se regeneran con el modelo actual.
+"""
+
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import RAW_IMAGES_DIR
+from src.annotation_index import (PRELABEL_DATABASE, STATUS_HUMAN, STATUS_MISSING,
+                                  STATUS_PRELABEL, STATUS_VERIFIED, read_annotation_status)
+from src.annotation_store import AnnotationStore
+from src.image_files import list_images
+from src.model_registry import ModelRegistry
+from src.train_yolo import YOLOTrainer
+from src.yolo_detector import get_detector
+
+
+def select_images_to_annotate(images: List[Path],
+                              annotations_dir: Path,
+                              model_version: Optional[str],
+                              force: bool = False) -> Tuple[List[Path], Dict[str, int]]:
+    """
+    Decide qué imágenes hay que pre-anotar.
+    
+    Args:
+        images: Imágenes candidatas.
+        annotations_dir: Carpeta de los XML.
+        model_version: Versión (hash abreviado) del modelo actual.
+        force: Regenerar también las pre-anotaciones de la versión actual.
+    
+    Returns:
+        Tupla (imágenes a pre-anotar, conteo de imágenes por estado).
+    """
+    pending = []
+    counts = {STATUS_MISSING: 0, STATUS_VERIFIED: 0, STATUS_HUMAN: 0,
+              STATUS_PRELABEL: 0, 'current': 0}
+    
+    for image_path in images:
+        status, version = read_annotation_status(annotations_dir / f"{image_path.stem}.xml")
+        counts[status] += 1
+        if status == STATUS_MISSING:
+            pending.append(image_path)
+        elif status == STATUS_PRELABEL:
+            if version == model_version and not force:
+                counts['current'] += 1
+            else:
+                pending.append(image_path)
+    
+    return pending, counts
+
+
+def pre_annotate(images_dir: Path = RAW_IMAGES_DIR,
+                 annotations_dir: Optional[Path] = None,
+                 model_path: Optional[str] = None,
+                 confidence_threshold: float = 0.25,
+                 iou_threshold: float = 0.45,
+                 batch_size: int = 8,
+                 force: bool = False,
+                 progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                 registry: Optional[ModelRegistry] = None) -> Dict:
+    """
+    Genera XML de LabelImg no verificados con las predicciones del modelo.
+    
+    Args:
+        images_dir: Carpeta de imágenes (por defecto data/raw_images).
+        annotations_dir: Carpeta de los XML (por defecto la de las imágenes).
+        model_path: Modelo a usar. None = modelo predeterminado del registro.
+        confidence_threshold: Confianza mínima de las predicciones.
+        iou_threshold: Umbral IoU para Non-Maximum Suppression.
+        batch_size: Imágenes por lote de inferencia.
+        force: Regenerar también las pre-anotaciones de la versión actual.
+        progress_callback: Función (procesados, total, nombre_archivo).
+        registry: Registro de modelos (por defecto el del proyecto).
+    
+    Returns:
+        Resumen con 'model', 'images', 'written', 'boxes', 'errors' y el
+        conteo de imágenes omitidas por motivo.
+    """
+    images_dir = Path(images_dir)
+    annotations_dir = Path(annotations_dir) if annotations_dir else images_dir
+    registry = registry or ModelRegistry()
+    
+    if model_path is None:
+        default = registry.get_default()
+        if default is None:
+            raise FileNotFoundError(
+                "No hay un modelo predeterminado. Entrena un modelo o indica --model."
+            )
+        model_path = default['path']
+    if not Path(model_path).exists():
+        raise FileNotFoundError(f"No existe el modelo: {model_path}")
+    
+    images = list_images(images_dir)
+    detector = get_detector(model_path, confidence_threshold=confidence_threshold,
+                            iou_threshold=iou_threshold, registry=registry)
+    pending, counts = select_images_to_annotate(images, annotations_dir,
+                                                detector.model_version, force)
+    
+    # Las clases se traducen por nombre: el orden de clases del modelo no tiene
+    # por qué coincidir con YOLOTrainer.CLASS_NAMES, y las que no estén se descartan
+    class_lookup = {int(model_id): YOLOTrainer.CLASS_NAMES.index(name)
+                    for model_id, name in detector.model.names.items()
+                    if name in YOLOTrainer.CLASS_NAMES}
+    if not class_lookup:
+        print(f"⚠️ Ninguna clase del modelo coincide con {YOLOTrainer.CLASS_NAMES}")
+    
+    database = f"{PRELABEL_DATABASE} {detector.model_name or Path(model_path).name} v{detector.model_version}"
+    summary = {
+        'model': model_path,
+        'model_version': detector.model_version,
+        'images': len(images),
+        'written': 0,
+        'boxes': 0,
+        'errors': [],
+        'skipped_verified': counts[STATUS_VERIFIED],
+        'skipped_human': counts[STATUS_HUMAN],
+        'skipped_current': counts['current'],
+    }
+    
+    print(f"🤖 Pre-anotando {len(pending)} de {len(images)} imágenes con "
+          f"{detector.model_name} (v{detector.model_version})")
+    
+    for start in range(0, len(pending), batch_size):
+        batch = []
+        for image_path in pending[start:start + batch_size]:
+            try:
+                with Image.open(image_path) as img:
+                    batch.append((image_path, img.size))
+            except Exception as e:
+                summary['errors'].append(f"{image_path.name}: {e}")
+        
+        if batch:
+            predictions = detector.predict_boxes([path for path, _ in batch], batch_size)
+            store = AnnotationStore(YOLOTrainer.CLASS_NAMES)
+            for (image_path, (width, height)), (boxes, class_ids, _) in zip(batch, predictions):
+                class_ids = np.array([class_lookup.get(int(c), -1) for c in class_ids], dtype=np.int32)
+                store.add_detections(image_path.name, width, height, class_ids, boxes,
+                                     source=str(image_path))
+            
+            # Se escribe lote a lote para no perder trabajo si se interrumpe
+            summary['written'] += store.to_voc(annotations_dir, images_dir, database=database)
+            summary['boxes'] += len(store)
+        
+        done = min(start + batch_size, len(pending))
+        if progress_callback:
+            progress_callback(done, len(pending), pending[done - 1].name)
+    
+    print(f"✅ {summary['written']} XML escritos ({summary['boxes']} cajas sin verificar)")
+    print(f"   Omitidas: {summary['skipped_verified']} verificadas, "
+          f"{summary['skipped_human']} editadas por una persona, "
+          f"{summary['skipped_current']} ya pre-anotadas con este modelo")
+    for error in summary['errors']:
+        print(f"   ⚠️ {error}")
+    
+    return summary
+
+
+def main():
+    """Función principal para pre-anotar desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Generar anotaciones de LabelImg (sin verificar) con el modelo entrenado'
+    )
+    parser.add_argument('--images', type=str, default=str(RAW_IMAGES_DIR),
+                        help='Carpeta de imágenes a pre-anotar')
+    parser.add_argument('--annotations', type=str, default=None,
+                        help='Carpeta de los XML (por defecto la de las imágenes)')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Modelo a usar (por defecto el predeterminado del registro)')
+    parser.add_argument('--conf', type=float, default=0.25,
+                        help='Confianza mínima de las predicciones')
+    parser.add_argument('--iou', type=float, default=0.45,
+                        help='Umbral IoU para NMS')
+    parser.add_argument('--batch', type=int, default=8,
+                        help='Imágenes por lote de inferencia')
+    parser.add_argument('--force', action='store_true',
+                        help='Regenerar también las pre-anotaciones del modelo actual')
+    
+    args = parser.parse_args()
+    
+    pre_annotate(
+        Path(args.images),
+        Path(args.annotations) if args.annotations else None,
+        model_path=args.model,
+        confidence_threshold=args.conf,
+        iou_threshold=args.iou,
+        batch_size=args.batch,
+        force=args.force
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,27 +3,227 @@ Módulo para gestionar resultados del análisis de microplásticos.
 
 Proporciona funcionalidades para crear respaldos, limpiar resultados
 y obtener información sobre el espacio usado.
+
+El espacio usado y el número de archivos de las carpetas de resultados se
+llevan en un registro persistente (SQLite) que actualizan los procesos que
+escriben resultados (register_output) y que un reconciliador basado en
+os.scandir corrige en segundo plano. Así el panel de resultados no necesita
+recorrer las carpetas cada vez que se abre.
 """
 
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
 from pathlib import Path
 import sys
 
 sys.path.append(str(Path(__file__).parent.parent))
-from config.config import GRAPHS_DIR, REPORTS_DIR, PROCESSED_IMAGES_DIR, PROJECT_ROOT
+from config.config import GRAPHS_DIR, REPORTS_DIR, PROCESSED_IMAGES_DIR, PROJECT_ROOT, RESULTS_DIR
+from src.backup_store import BackupStore
+
+
+# Archivos auxiliares que no cuentan como resultados
+IGNORED_FILES = [".gitkeep", "INSTRUCCIONES.md"]
 
 
 class ResultsManager:
     """Clase para gestionar los resultados del análisis."""
     
-    def __init__(self):
-        """Inicializa el gestor de resultados."""
+    LEDGER_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            folder TEXT NOT NULL,
+            name TEXT NOT NULL,
+            ext TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            PRIMARY KEY (folder, name)
+        );
+        CREATE TABLE IF NOT EXISTS totals (
+            folder TEXT NOT NULL,
+            ext TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            PRIMARY KEY (folder, ext)
+        );
+        CREATE TABLE IF NOT EXISTS folders (
+            folder TEXT PRIMARY KEY,
+            reconciled REAL NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+            INSERT OR IGNORE INTO totals VALUES (new.folder, new.ext, 0, 0);
+            UPDATE totals SET count = count + 1, bytes = bytes + new.size
+                WHERE folder = new.folder AND ext = new.ext;
+        END;
+        CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+            UPDATE totals SET count = count - 1, bytes = bytes - old.size
+                WHERE folder = old.folder AND ext = old.ext;
+        END;
+        CREATE TRIGGER IF NOT EXISTS files_update AFTER UPDATE OF size ON files BEGIN
+            UPDATE totals SET bytes = bytes - old.size + new.size
+                WHERE folder = new.folder AND ext = new.ext;
+        END;
+    """
+    
+    def __init__(self, ledger_path: Path = None):
+        """
+        Inicializa el gestor de resultados.
+        
+        Args:
+            ledger_path: Ruta al registro de uso de disco. Por defecto
+                         results/usage_ledger.sqlite.
+        """
         self.graphs_dir = GRAPHS_DIR
         self.reports_dir = REPORTS_DIR
         self.processed_dir = PROCESSED_IMAGES_DIR
         self.backups_dir = PROJECT_ROOT / "backups"
+        self.ledger_path = Path(ledger_path) if ledger_path else RESULTS_DIR / "usage_ledger.sqlite"
         
         # Crear directorios si no existen
         self.backups_dir.mkdir(parents=True, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.LEDGER_SCHEMA)
+    
+    @property
+    def tracked_folders(self) -> list:
+        """Carpetas de resultados cuyo uso se lleva en el registro."""
+        return [self.graphs_dir, self.reports_dir, self.processed_dir]
+    
+    @contextmanager
+    def _connect(self):
+        """Abre una conexión al registro (una por llamada, apta para hilos); confirma y la cierra al salir."""
+        with closing(sqlite3.connect(str(self.ledger_path), timeout=30)) as conn, conn:
+            yield conn
+    
+    @staticmethod
+    def _folder_key(folder_path: Path) -> str:
+        """Clave normalizada de una carpeta en el registro."""
+        return str(Path(folder_path).resolve())
+    
+    @staticmethod
+    def _extension(name: str) -> str:
+        """Extensión en minúsculas sin punto ('' si no tiene)."""
+        return Path(name).suffix.lower().lstrip('.')
+    
+    def register_output(self, file_path: Path):
+        """
+        Registra (o actualiza) un archivo de resultados recién escrito.
+        
+        Args:
+            file_path: Ruta al archivo escrito.
+        """
+        file_path = Path(file_path)
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return
+        
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO files (folder, name, ext, size, mtime) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (folder, name) DO UPDATE SET size = excluded.size, mtime = excluded.mtime",
+                (self._folder_key(file_path.parent), file_path.name,
+                 self._extension(file_path.name), stat.st_size, stat.st_mtime)
+            )
+    
+    def unregister_output(self, file_path: Path):
+        """
+        Elimina del registro un archivo de resultados borrado.
+        
+        Args:
+            file_path: Ruta al archivo eliminado.
+        """
+        file_path = Path(file_path)
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM files WHERE folder = ? AND name = ?",
+                (self._folder_key(file_path.parent), file_path.name)
+            )
+    
+    def reconcile(self, folder_path: Path) -> dict:
+        """
+        Sincroniza el registro con el contenido real de una carpeta.
+        
+        Recorre la carpeta con os.scandir (un solo stat por archivo) y
+        aplica solo las diferencias. Se consideran los archivos del primer
+        nivel, ya que las carpetas de resultados son planas.
+        
+        Args:
+            folder_path: Ruta a la carpeta.
+            
+        Returns:
+            Diccionario con el número de archivos 'added', 'updated' y 'removed'.
+        """
+        folder_key = self._folder_key(folder_path)
+        
+        on_disk = {}
+        if Path(folder_path).exists():
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        on_disk[entry.name] = (stat.st_size, stat.st_mtime)
+        
+        with self._connect() as conn:
+            known = {name: (size, mtime) for name, size, mtime in conn.execute(
+                "SELECT name, size, mtime FROM files WHERE folder = ?", (folder_key,)
+            )}
+            
+            added = [name for name in on_disk if name not in known]
+            updated = [name for name in on_disk if name in known and on_disk[name] != known[name]]
+            removed = [name for name in known if name not in on_disk]
+            
+            conn.executemany(
+                "INSERT INTO files (folder, name, ext, size, mtime) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (folder, name) DO UPDATE SET size = excluded.size, mtime = excluded.mtime",
+                [(folder_key, name, self._extension(name), *on_disk[name]) for name in added + updated]
+            )
+            conn.executemany(
+                "DELETE FROM files WHERE folder = ? AND name = ?",
+                [(folder_key, name) for name in removed]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO folders (folder, reconciled) VALUES (?, ?)",
+                (folder_key, time.time())
+            )
+        
+        return {'added': len(added), 'updated': len(updated), 'removed': len(removed)}
+    
+    def start_background_reconcile(self, callback=None) -> threading.Thread:
+        """
+        Reconcilia las carpetas de resultados en un hilo en segundo plano.
+        
+        Args:
+            callback: Función opcional que se llama al terminar si hubo cambios.
+            
+        Returns:
+            Hilo lanzado.
+        """
+        def worker():
+            changed = False
+            for folder in self.tracked_folders:
+                try:
+                    counts = self.reconcile(folder)
+                    changed = changed or any(counts.values())
+                except Exception as e:
+                    print(f"⚠️ Error al reconciliar {folder}: {e}")
+            if changed and callback:
+                callback()
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+    
+    def _ensure_reconciled(self, conn: sqlite3.Connection, folder_path: Path):
+        """Reconcilia una carpeta la primera vez que se consulta."""
+        row = conn.execute(
+            "SELECT 1 FROM folders WHERE folder = ?", (self._folder_key(folder_path),)
+        ).fetchone()
+        if row is None:
+            self.reconcile(folder_path)
     
     def get_folder_size(self, folder_path: Path) -> float:
         """
@@ -38,10 +238,12 @@ class ResultsManager:
         if not folder_path.exists():
             return 0.0
         
-        total_size = 0
-        for file in folder_path.rglob('*'):
-            if file.is_file():
-                total_size += file.stat().st_size
+        with self._connect() as conn:
+            self._ensure_reconciled(conn, folder_path)
+            total_size = conn.execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM totals WHERE folder = ?",
+                (self._folder_key(folder_path),)
+            ).fetchone()[0]
         
         return total_size / (1024 * 1024)  # Convertir a MB
     
@@ -59,8 +261,56 @@ class ResultsManager:
         if not folder_path.exists():
             return 0
         
-        if extension:
-            return len(list(folder_path.glob(f"*.{extension}")))
-        else:
-            return len([f for f in folder_path.iterdir() 
-                       if f.is_file() and f.name not in [".gitkeep", "INSTRUCCIONES.md"]])
+        folder_key = self._folder_key(folder_path)
+        with self._connect() as conn:
+            self._ensure_reconciled(conn, folder_path)
+            
+            if extension:
+                row = conn.execute(
+                    "SELECT count FROM totals WHERE folder = ? AND ext = ?",
+                    (folder_key, extension.lower())
+                ).fetchone()
+                return row[0] if row else 0
+            
+            total = conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM totals WHERE folder = ?", (folder_key,)
+            ).fetchone()[0]
+            ignored = conn.execute(
+                f"SELECT COUNT(*) FROM files WHERE folder = ? AND name IN "
+                f"({', '.join('?' * len(IGNORED_FILES))})",
+                (folder_key, *IGNORED_FILES)
+            ).fetchone()[0]
+            return total - ignored
+    
+    def get_backup_sources(self) -> dict:
+        """
+        Obtiene los archivos de resultados a respaldar, agrupados por carpeta.
+        
+        Returns:
+            Diccionario {subcarpeta del respaldo: lista de archivos}.
+        """
+        sources = {
+            'graphs': sorted(self.graphs_dir.glob("*.png")),
+            'reports': sorted(f for f in self.reports_dir.glob("*")
+                              if f.suffix in ['.xlsx', '.txt']),
+            'processed_images': sorted(f for f in self.processed_dir.glob("*")
+                                       if f.is_file() and f.name not in IGNORED_FILES),
+        }
+        return {section: files for section, files in sources.items() if files}
+    
+    def create_backup(self, compress: bool = False, progress_callback=None) -> dict:
+        """
+        Crea un respaldo incremental deduplicado de los resultados actuales.
+        
+        Args:
+            compress: Si True, comprime los objetos nuevos con zstd.
+            progress_callback: Función (procesados, total, nombre_archivo).
+            
+        Returns:
+            Resumen del respaldo (ver BackupStore.create_snapshot).
+        """
+        store = BackupStore(self.backups_dir, compress=compress)
+        return store.create_snapshot(
+            self.get_backup_sources(),
+            progress_callback=progress_callback
+        )
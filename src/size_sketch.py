@@ -0,0 +1,402 @@
+"""
+Módulo de resúmenes de tamaño (histogramas logarítmicos) por muestra y clase.
+
+Para resumir lotes de miles de imágenes no hace falta guardar cada
+partícula: basta un histograma de tamaño fijo por clase, con intervalos
+logarítmicos (los tamaños de microplásticos abarcan varios órdenes de
+magnitud), más los momentos exactos (número, suma, suma de cuadrados,
+mínimo y máximo) y el recuento exacto por categoría de tamaño y forma.
+
+Los resúmenes se construyen a medida que salen las partículas del
+detector, se guardan en JSON junto a los resultados y se pueden sumar
+entre muestras y ejecuciones. Los percentiles se estiman dentro del
+intervalo (error menor que el ancho de un intervalo, ~12 % con 20
+intervalos por década); medias, desviaciones y porcentajes son exactos.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import MORPHOLOGY_PARAMS
+
+
+SKETCH_VERSION = 1
+SKETCH_SUFFIX = ".sketch.json"
+BINS_PER_DECADE = 20
+
+# Magnitud -> (columna de la partícula, límite inferior, límite superior)
+QUANTITIES = {
+    'diameter': ('equivalent_diameter_um', 1e-1, 1e4),
+    'area': ('area_um2', 1e-2, 1e8),
+}
+
+
+def _categorize(values: np.ndarray, categories: Dict) -> Dict[str, int]:
+    """Recuento por categoría con los mismos rangos [min, max) que StatisticalAnalyzer."""
+    counts = {}
+    assigned = np.zeros(len(values), dtype=bool)
+    for category, (min_val, max_val) in categories.items():
+        inside = (values >= min_val) & (values < max_val) & ~assigned
+        assigned |= inside
+        if inside.any():
+            counts[category] = int(inside.sum())
+    if not assigned.all():
+        counts['indefinido'] = int((~assigned).sum())
+    return counts
+
+
+class SizeSketch:
+    """Histogramas logarítmicos de tamaño por clase, combinables entre muestras."""
+    
+    def __init__(self, bins_per_decade: int = BINS_PER_DECADE):
+        """
+        Crea un resumen vacío.
+        
+        Args:
+            bins_per_decade: Intervalos por década de cada histograma.
+        """
+        self.bins_per_decade = bins_per_decade
+        # Clase -> magnitud -> {'counts', 'n', 'sum', 'sumsq', 'min', 'max'}
+        self._classes: Dict[str, Dict[str, Dict]] = {}
+        # Clase -> {'size': {categoría: n}, 'shape': {categoría: n}}
+        self._categories: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.samples: List[str] = []
+    
+    def edges(self, quantity: str = 'diameter') -> np.ndarray:
+        """
+        Límites de los intervalos de una magnitud.
+        
+        Además de estos, el histograma tiene un intervalo inicial para los
+        valores por debajo del primero y otro final para los de encima.
+        """
+        _, low, high = QUANTITIES[quantity]
+        n_bins = int(round(np.log10(high / low) * self.bins_per_decade))
+        return np.logspace(np.log10(low), np.log10(high), n_bins + 1)
+    
+    def _empty_quantity(self, quantity: str) -> Dict:
+        return {
+            'counts': np.zeros(len(self.edges(quantity)) + 1, dtype=np.int64),
+            'n': 0, 'sum': 0.0, 'sumsq': 0.0, 'min': float('inf'), 'max': float('-inf'),
+        }
+    
+    def add_particles(self, particles: Iterable[Dict], sample_id: Optional[str] = None) -> None:
+        """
+        Añade partículas (diccionarios del detector o filas de un DataFrame).
+        
+        Args:
+            particles: Partículas con 'class_name', 'equivalent_diameter_um',
+                       'area_um2' y 'aspect_ratio' (las que falten se ignoran
+                       en esa magnitud).
+            sample_id: Muestra de la que vienen, para el registro del resumen.
+        """
+        by_class: Dict[str, List[Dict]] = {}
+        for particle in particles:
+            by_class.setdefault(str(particle.get('class_name') or 'sin_clase'), []).append(particle)
+        
+        for class_name, rows in by_class.items():
+            self.add_values(
+                class_name,
+                diameter=[p.get('equivalent_diameter_um') for p in rows],
+                area=[p.get('area_um2') for p in rows],
+                aspect_ratio=[p.get('aspect_ratio') for p in rows],
+            )
+        if sample_id and sample_id not in self.samples:
+            self.samples.append(sample_id)
+    
+    def add_values(self, class_name: str,
+                   diameter: Iterable[Optional[float]],
+                   area: Iterable[Optional[float]],
+                   aspect_ratio: Optional[Iterable[Optional[float]]] = None) -> None:
+        """
+        Añade los valores de varias partículas de una misma clase.
+        
+        Args:
+            class_name: Clase de las partículas.
+            diameter: Diámetros equivalentes en μm.
+            area: Áreas en μm².
+            aspect_ratio: Relaciones de aspecto (para las categorías de forma).
+        """
+        quantities = self._classes.setdefault(class_name, {})
+        categories = self._categories.setdefault(class_name, {'size': {}, 'shape': {}})
+        
+        for quantity, values in (('diameter', diameter), ('area', area)):
+            values = np.array([v for v in values if v is not None], dtype=np.float64)
+            values = values[np.isfinite(values)]
+            if not len(values):
+                continue
+            entry = quantities.setdefault(quantity, self._empty_quantity(quantity))
+            # searchsorted con side='right': intervalo [límite_i, límite_i+1)
+            bins = np.searchsorted(self.edges(quantity), values, side='right')
+            entry['counts'] += np.bincount(bins, minlength=len(entry['counts']))
+            entry['n'] += len(values)
+            entry['sum'] += float(values.sum())
+            entry['sumsq'] += float(np.square(values).sum())
+            entry['min'] = min(entry['min'], float(values.min()))
+            entry['max'] = max(entry['max'], float(values.max()))
+            
+            if quantity == 'diameter':
+                size_counts = _categorize(values, MORPHOLOGY_PARAMS['size_categories'])
+                for category, count in size_counts.items():
+                    categories['size'][category] = categories['size'].get(category, 0) + count
+        
+        if aspect_ratio is not None:
+            values = np.array([v for v in aspect_ratio if v is not None], dtype=np.float64)
+            shape_counts = _categorize(values, MORPHOLOGY_PARAMS['aspect_ratio_categories'])
+            for category, count in shape_counts.items():
+                categories['shape'][category] = categories['shape'].get(category, 0) + count
+    
+    def merge(self, other: "SizeSketch") -> "SizeSketch":
+        """
+        Suma otro resumen a este (el resultado es el mismo que añadir sus partículas).
+        
+        Args:
+            other: Resumen con los mismos intervalos por década.
+        
+        Returns:
+            Este mismo resumen, para encadenar.
+        """
+        if other.bins_per_decade != self.bins_per_decade:
+            raise ValueError("No se pueden combinar resúmenes con intervalos distintos")
+        
+        for class_name, quantities in other._classes.items():
+            mine = self._classes.setdefault(class_name, {})
+            for quantity, entry in quantities.items():
+                target = mine.setdefault(quantity, self._empty_quantity(quantity))
+                target['counts'] += entry['counts']
+                target['n'] += entry['n']
+                target['sum'] += entry['sum']
+                target['sumsq'] += entry['sumsq']
+                target['min'] = min(target['min'], entry['min'])
+                target['max'] = max(target['max'], entry['max'])
+        
+        for class_name, groups in other._categories.items():
+            mine = self._categories.setdefault(class_name, {'size': {}, 'shape': {}})
+            for group, counts in groups.items():
+                for category, count in counts.items():
+                    mine[group][category] = mine[group].get(category, 0) + count
+        
+        self.samples.extend(s for s in other.samples if s not in self.samples)
+        return self
+    
+    def __iadd__(self, other: "SizeSketch") -> "SizeSketch":
+        return self.merge(other)
+    
+    def classes(self) -> List[str]:
+        """Clases presentes, de más a menos partículas."""
+        return sorted(self._classes, key=lambda c: (-self.count(c), c))
+    
+    def count(self, class_name: Optional[str] = None) -> int:
+        """Número de partículas (de una clase o de todas)."""
+        names = [class_name] if class_name else list(self._categories)
+        return sum(sum(self._categories.get(name, {}).get('size', {}).values()) for name in names)
+    
+    def _combined(self, quantity: str, class_name: Optional[str] = None) -> Dict:
+        """Histograma y momentos de una magnitud, de una clase o de todas juntas."""
+        combined = self._empty_quantity(quantity)
+        names = [class_name] if class_name else list(self._classes)
+        for name in names:
+            entry = self._classes.get(name, {}).get(quantity)
+            if entry is None:
+                continue
+            combined['counts'] += entry['counts']
+            combined['n'] += entry['n']
+            combined['sum'] += entry['sum']
+            combined['sumsq'] += entry['sumsq']
+            combined['min'] = min(combined['min'], entry['min'])
+            combined['max'] = max(combined['max'], entry['max'])
+        return combined
+    
+    def histogram(self, quantity: str = 'diameter',
+                  class_name: Optional[str] = None) -> np.ndarray:
+        """
+        Recuento por intervalo.
+        
+        Returns:
+            Array de len(edges) + 1: [por debajo, intervalo 0, ..., por encima].
+        """
+        return self._combined(quantity, class_name)['counts'].copy()
+    
+    def quantile(self, q, quantity: str = 'diameter',
+                 class_name: Optional[str] = None):
+        """
+        Estima uno o varios cuantiles (0-1) interpolando en escala logarítmica.
+        
+        Los intervalos de los extremos se acotan con el mínimo y el máximo
+        exactos, así que q=0 y q=1 devuelven esos valores.
+        """
+        entry = self._combined(quantity, class_name)
+        scalar = np.isscalar(q)
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if entry['n'] == 0:
+            result = np.full(len(q), np.nan)
+            return float(result[0]) if scalar else result
+        
+        edges = self.edges(quantity)
+        lower = np.clip(np.r_[entry['min'], edges], entry['min'], entry['max'])
+        upper = np.clip(np.r_[edges, entry['max']], entry['min'], entry['max'])
+        cumulative = np.cumsum(entry['counts'])
+        rank = q * entry['n']
+        
+        index = np.minimum(np.searchsorted(cumulative, rank, side='left'), len(cumulative) - 1)
+        before = np.where(index > 0, cumulative[np.maximum(index - 1, 0)], 0)
+        fraction = np.clip((rank - before) / np.maximum(entry['counts'][index], 1), 0, 1)
+        low, high = lower[index], upper[index]
+        if (low > 0).all():
+            result = np.exp(np.log(low) + fraction * (np.log(high) - np.log(low)))
+        else:
+            result = low + fraction * (high - low)
+        return float(result[0]) if scalar else result
+    
+    def descriptive_stats(self, quantity: str = 'diameter',
+                          class_name: Optional[str] = None) -> Dict:
+        """
+        Estadísticos con las mismas claves que StatisticalAnalyzer.calculate_descriptive_stats.
+        
+        Número, media, desviación (muestral), mínimo, máximo y CV son
+        exactos; mediana y cuartiles se estiman con el histograma.
+        """
+        entry = self._combined(quantity, class_name)
+        n = entry['n']
+        if n == 0:
+            nan = float('nan')
+            return {'count': 0, 'mean': nan, 'median': nan, 'std': nan, 'min': nan,
+                    'max': nan, 'q25': nan, 'q75': nan, 'iqr': nan, 'cv': 0}
+        
+        mean = entry['sum'] / n
+        variance = (entry['sumsq'] - n * mean ** 2) / (n - 1) if n > 1 else float('nan')
+        std = float(np.sqrt(max(variance, 0.0))) if n > 1 else float('nan')
+        q25, median, q75 = self.quantile([0.25, 0.5, 0.75], quantity, class_name)
+        return {
+            'count': n,
+            'mean': mean,
+            'median': float(median),
+            'std': std,
+            'min': entry['min'],
+            'max': entry['max'],
+            'q25': float(q25),
+            'q75': float(q75),
+            'iqr': float(q75 - q25),
+            'cv': (std / mean * 100) if mean != 0 and n > 1 else 0,
+        }
+    
+    def category_counts(self, group: str = 'size',
+                        class_name: Optional[str] = None) -> Dict[str, int]:
+        """
+        Recuento exacto por categoría de tamaño ('size') o de forma ('shape').
+        """
+        counts: Dict[str, int] = {}
+        names = [class_name] if class_name else list(self._categories)
+        for name in names:
+            for category, count in self._categories.get(name, {}).get(group, {}).items():
+                counts[category] = counts.get(category, 0) + count
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+    
+    def to_dict(self) -> Dict:
+        """Representación serializable en JSON."""
+        def encode(entry):
+            return dict(entry, counts=entry['counts'].tolist())
+        
+        return {
+            'version': SKETCH_VERSION,
+            'bins_per_decade': self.bins_per_decade,
+            'samples': self.samples,
+            'classes': {
+                class_name: {quantity: encode(entry) for quantity, entry in quantities.items()}
+                for class_name, quantities in self._classes.items()
+            },
+            'categories': self._categories,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SizeSketch":
+        """Reconstruye un resumen guardado con to_dict."""
+        if data.get('version') != SKETCH_VERSION:
+            raise ValueError(f"Versión de resumen no soportada: {data.get('version')}")
+        sketch = cls(data['bins_per_decade'])
+        sketch.samples = list(data.get('samples', []))
+        for class_name, quantities in data['classes'].items():
+            sketch._classes[class_name] = {
+                quantity: dict(entry, counts=np.asarray(entry['counts'], dtype=np.int64))
+                for quantity, entry in quantities.items()
+            }
+        sketch._categories = {name: {group: dict(counts) for group, counts in groups.items()}
+                              for name, groups in data['categories'].items()}
+        return sketch
+    
+    def save(self, path: Path) -> None:
+        """Guarda el resumen en JSON de forma atómica."""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: Path) -> "SizeSketch":
+        """Carga un resumen guardado con save."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+    
+    @classmethod
+    def merge_files(cls, paths: Iterable[Path]) -> "SizeSketch":
+        """
+        Suma los resúmenes de varios archivos (muestras o ejecuciones).
+        
+        Args:
+            paths: Archivos .sketch.json.
+        
+        Returns:
+            Resumen combinado (vacío si no hay archivos).
+        """
+        merged = None
+        for path in paths:
+            sketch = cls.load(path)
+            merged = sketch if merged is None else merged.merge(sketch)
+        return merged if merged is not None else cls()
+
+
+def main():
+    """Función principal para combinar resúmenes y mostrar el informe desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Combinar resúmenes de tamaño (.sketch.json) y mostrar su informe'
+    )
+    parser.add_argument('sketches', type=str, nargs='+',
+                        help='Archivos .sketch.json o carpetas que los contienen')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Guardar el resumen combinado en este archivo')
+    parser.add_argument('--plot', type=str, default=None,
+                        help='Guardar el gráfico de distribución de tamaños en esta ruta')
+    
+    args = parser.parse_args()
+    
+    paths = []
+    for item in map(Path, args.sketches):
+        paths.extend(sorted(item.glob(f"*{SKETCH_SUFFIX}")) if item.is_dir() else [item])
+    sketch = SizeSketch.merge_files(paths)
+    
+    from src.statistical_analysis import StatisticalAnalyzer
+    
+    print(StatisticalAnalyzer().generate_summary_report(
+        None, f"{len(sketch.samples)} muestras", sketch=sketch
+    ))
+    
+    if args.output:
+        sketch.save(Path(args.output))
+        print(f"✅ Resumen combinado guardado: {args.output}")
+    if args.plot:
+        from src.visualization import DataVisualizer
+        
+        DataVisualizer().plot_sketch_size_distribution(sketch, save_path=args.plot)
+        print(f"✅ Gráfico guardado: {args.plot}")
+
+
+if __name__ == "__main__":
+    main()
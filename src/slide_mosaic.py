@@ -0,0 +1,520 @@
+"""
+Módulo de mosaico de la muestra completa con almacenamiento piramidal.
+
+El microscopio exporta una cuadrícula de campos por portaobjetos. Este
+módulo los une en una sola imagen de la muestra (con las posiciones de
+slide_registration) y la guarda en disco por trozos, al estilo de zarr:
+
+    <muestra>.mosaic/
+        mosaic.json        # tamaño, niveles, tamaño de trozo y campos
+        0/<fila>_<col>.png # resolución completa
+        1/<fila>_<col>.png # 1/2
+        ...
+
+Los trozos sin ningún campo no se escriben (se leen como fondo). Tanto
+la construcción como la lectura y la detección trabajan trozo a trozo,
+así que la memoria no depende del tamaño de la muestra: al construir solo
+se guarda la franja de los campos que cruzan el trozo actual, y al leer
+una caché LRU de trozos.
+
+La detección recorre el mosaico por teselas solapadas y cada partícula
+se asigna a la única tesela que contiene su centro en la zona central,
+de modo que no se cuenta dos veces y sus coordenadas ya son las de la
+muestra completa.
+"""
+
+import json
+import math
+import os
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import MOSAICS_DIR
+from src.image_files import list_images
+from src.slide_registration import (LAYOUT_FILENAME, frame_grid_positions, load_layout,
+                                    register_frames, save_layout)
+
+
+MOSAIC_VERSION = 1
+MANIFEST_NAME = "mosaic.json"
+CHUNK_SIZE = 1024
+# Color de las zonas sin campos (BGR)
+FILL_VALUE = 0
+
+
+def _chunk_path(root: Path, level: int, row: int, col: int) -> Path:
+    """Ruta del trozo (fila, columna) de un nivel."""
+    return root / str(level) / f"{row}_{col}.png"
+
+
+def _border_distance(start: int, stop: int, origin: int, size: int) -> np.ndarray:
+    """Distancia de cada píxel [start, stop) al borde más cercano de un campo en un eje."""
+    local = np.arange(start, stop) - origin + 0.5
+    return np.minimum(local, size - local)
+
+
+def _read_band(path: str, y0: int, y1: int) -> Optional[np.ndarray]:
+    """Lee un campo y conserva solo sus filas [y0, y1) (copia, para liberar el resto)."""
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    return None if image is None else image[y0:y1].copy()
+
+
+class SlideMosaic:
+    """Lector de un mosaico piramidal guardado por trozos, con caché LRU."""
+    
+    def __init__(self, path: Path, max_cached_chunks: int = 64):
+        """
+        Abre un mosaico.
+        
+        Args:
+            path: Carpeta del mosaico (la que contiene mosaic.json).
+            max_cached_chunks: Número máximo de trozos decodificados en memoria.
+        """
+        self.path = Path(path)
+        with open(self.path / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != MOSAIC_VERSION:
+            raise ValueError(f"Versión de mosaico no soportada: {self.manifest.get('version')}")
+        
+        self.name = self.manifest['name']
+        self.width = self.manifest['width']
+        self.height = self.manifest['height']
+        self.chunk_size = self.manifest['chunk_size']
+        self.fill_value = self.manifest['fill_value']
+        self.levels: List[Tuple[int, int]] = [tuple(size) for size in self.manifest['levels']]
+        self.max_cached_chunks = max_cached_chunks
+        self._chunk_cache: "OrderedDict[Tuple[int, int, int], Optional[np.ndarray]]" = OrderedDict()
+    
+    @property
+    def frames(self) -> Dict[str, Dict]:
+        """Posición de cada campo en la muestra (ver slide_registration.register_frames)."""
+        return self.manifest['frames']
+    
+    def level_for_scale(self, scale: float) -> int:
+        """
+        Nivel más pequeño con resolución suficiente para una escala.
+        
+        Args:
+            scale: Escala deseada respecto a la resolución completa (1.0, 0.5...).
+        
+        Returns:
+            Índice del nivel (0 = resolución completa).
+        """
+        level = 0
+        while level + 1 < len(self.levels) and 0.5 ** (level + 1) >= scale:
+            level += 1
+        return level
+    
+    def read_chunk(self, level: int, row: int, col: int) -> Optional[np.ndarray]:
+        """
+        Lee un trozo (usando la caché si existe).
+        
+        Returns:
+            Trozo BGR, o None si no contiene ningún campo.
+        """
+        key = (level, row, col)
+        if key in self._chunk_cache:
+            self._chunk_cache.move_to_end(key)
+            return self._chunk_cache[key]
+        
+        path = _chunk_path(self.path, level, row, col)
+        chunk = cv2.imread(str(path), cv2.IMREAD_COLOR) if path.exists() else None
+        
+        self._chunk_cache[key] = chunk
+        if len(self._chunk_cache) > self.max_cached_chunks:
+            self._chunk_cache.popitem(last=False)
+        return chunk
+    
+    def read_region(self, x: int, y: int, width: int, height: int,
+                    level: int = 0) -> np.ndarray:
+        """
+        Lee un rectángulo del mosaico.
+        
+        Args:
+            x, y: Esquina superior izquierda en píxeles del nivel.
+            width, height: Tamaño del rectángulo en píxeles del nivel.
+            level: Nivel de la pirámide.
+        
+        Returns:
+            Imagen BGR de tamaño (height, width); lo que queda fuera del
+            mosaico o sin campos se rellena con el color de fondo.
+        """
+        level_w, level_h = self.levels[level]
+        region = np.full((height, width, 3), self.fill_value, dtype=np.uint8)
+        
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, level_w), min(y + height, level_h)
+        if x0 >= x1 or y0 >= y1:
+            return region
+        
+        size = self.chunk_size
+        for row in range(y0 // size, (y1 - 1) // size + 1):
+            for col in range(x0 // size, (x1 - 1) // size + 1):
+                chunk = self.read_chunk(level, row, col)
+                if chunk is None:
+                    continue
+                # Intersección del trozo con el rectángulo pedido
+                cx0, cy0 = max(x0, col * size), max(y0, row * size)
+                cx1, cy1 = min(x1, col * size + chunk.shape[1]), min(y1, row * size + chunk.shape[0])
+                region[cy0 - y:cy1 - y, cx0 - x:cx1 - x] = \
+                    chunk[cy0 - row * size:cy1 - row * size, cx0 - col * size:cx1 - col * size]
+        return region
+    
+    def iter_tiles(self, tile_size: int = 1024,
+                   overlap: int = 128) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """
+        Recorre el nivel 0 por teselas solapadas, fila a fila.
+        
+        Args:
+            tile_size: Lado de cada tesela en píxeles.
+            overlap: Solape entre teselas vecinas (mayor que la partícula más grande).
+        
+        Yields:
+            Tuplas (x, y, tesela BGR).
+        """
+        step = tile_size - overlap
+        if step <= 0:
+            raise ValueError("overlap debe ser menor que tile_size")
+        for y in range(0, max(self.height - overlap, 1), step):
+            for x in range(0, max(self.width - overlap, 1), step):
+                yield x, y, self.read_region(x, y, min(tile_size, self.width - x),
+                                             min(tile_size, self.height - y))
+    
+    def clear_cache(self):
+        """Vacía la caché de trozos."""
+        self._chunk_cache.clear()
+
+
+def build_mosaic(layout: Dict[str, Dict],
+                 output_dir: Path,
+                 name: Optional[str] = None,
+                 chunk_size: int = CHUNK_SIZE,
+                 workers: int = 4,
+                 progress_callback: Optional[Callable[[int, int, str], None]] = None) -> SlideMosaic:
+    """
+    Une los campos de una muestra en un mosaico piramidal.
+    
+    En las zonas de solape se toma cada píxel del campo en el que está más
+    lejos del borde (el mismo criterio que usa la eliminación de
+    duplicados), así las costuras quedan en mitad del solape.
+    
+    Cada fila de trozos se recorre de izquierda a derecha: un campo se lee
+    (solo la franja de la fila) justo antes de que el recorrido llegue a él
+    y se libera al pasar su borde derecho, y las escrituras pendientes se
+    limitan, de modo que la memoria no crece con el ancho de la muestra.
+    Un campo alto se lee una vez por cada fila de trozos que cruza.
+    
+    Args:
+        layout: Posición de los campos (ver slide_registration.register_frames).
+        output_dir: Carpeta del mosaico (se crea; los trozos previos se sobrescriben).
+        name: Nombre de la muestra (por defecto el de la carpeta sin '.mosaic').
+        chunk_size: Lado de los trozos en píxeles.
+        workers: Hilos para leer campos y escribir trozos.
+        progress_callback: Función (filas hechas, filas totales, nivel) para la interfaz.
+    
+    Returns:
+        Mosaico abierto para lectura.
+    """
+    output_dir = Path(output_dir)
+    name = name or output_dir.name.replace('.mosaic', '')
+    
+    frames = [dict(frame, sample_id=sample_id, x=int(round(frame['x'])), y=int(round(frame['y'])))
+              for sample_id, frame in layout.items()]
+    width = max(f['x'] + f['width'] for f in frames)
+    height = max(f['y'] + f['height'] for f in frames)
+    n_rows, n_cols = math.ceil(height / chunk_size), math.ceil(width / chunk_size)
+    
+    levels = [(width, height)]
+    while max(levels[-1]) > chunk_size:
+        levels.append(((levels[-1][0] + 1) // 2, (levels[-1][1] + 1) // 2))
+    total_rows = sum(math.ceil(h / chunk_size) for _, h in levels)
+    done_rows = 0
+    
+    for level in range(len(levels)):
+        (output_dir / str(level)).mkdir(parents=True, exist_ok=True)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Nivel 0: cada fila de trozos solo necesita los campos que la cruzan
+        for row in range(n_rows):
+            top, bottom = row * chunk_size, min((row + 1) * chunk_size, height)
+            band = [f for f in frames if f['y'] < bottom and f['y'] + f['height'] > top]
+            by_left = sorted(band, key=lambda f: f['x'])
+            
+            active: Dict[str, object] = {}
+            next_frame = 0
+            writes = deque()
+            for col in range(n_cols):
+                left, right = col * chunk_size, min((col + 1) * chunk_size, width)
+                
+                # Empezar a leer los campos que llegan hasta el trozo siguiente,
+                # así los hilos decodifican mientras se compone este
+                while next_frame < len(by_left) and by_left[next_frame]['x'] < right + chunk_size:
+                    f = by_left[next_frame]
+                    band_y0 = max(top, f['y']) - f['y']
+                    band_y1 = min(bottom, f['y'] + f['height']) - f['y']
+                    active[f['sample_id']] = executor.submit(_read_band, f['path'], band_y0, band_y1)
+                    next_frame += 1
+                
+                chunk = np.full((bottom - top, right - left, 3), FILL_VALUE, dtype=np.uint8)
+                best = np.zeros((bottom - top, right - left), dtype=np.float32)
+                covered = False
+                
+                # En el orden del layout, para que los empates se resuelvan siempre igual
+                for f in band:
+                    x0, x1 = max(left, f['x']), min(right, f['x'] + f['width'])
+                    if x0 >= x1:
+                        continue
+                    image = active[f['sample_id']].result()
+                    if image is None:
+                        raise FileNotFoundError(f"No se pudo cargar el campo: {f['sample_id']}")
+                    y0, y1 = max(top, f['y']), min(bottom, f['y'] + f['height'])
+                    covered = True
+                    distance = np.minimum.outer(_border_distance(y0, y1, f['y'], f['height']),
+                                                _border_distance(x0, x1, f['x'], f['width']))
+                    target = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+                    closer = distance > best[target]
+                    source = image[:, x0 - f['x']:x1 - f['x']]
+                    chunk[target][closer] = source[closer]
+                    best[target][closer] = distance[closer]
+                
+                # Liberar los campos que terminan en este trozo
+                for f in band:
+                    if f['x'] + f['width'] <= right:
+                        active.pop(f['sample_id'], None)
+                
+                if covered:
+                    writes.append(executor.submit(cv2.imwrite, str(_chunk_path(output_dir, 0, row, col)), chunk))
+                # No acumular trozos en memoria a la espera de escribirse
+                while len(writes) > 2 * workers:
+                    writes.popleft().result()
+            
+            for future in writes:
+                future.result()
+            done_rows += 1
+            if progress_callback:
+                progress_callback(done_rows, total_rows, '0')
+        
+        # Niveles superiores: cada trozo es la reducción de 2×2 trozos del nivel anterior
+        for level in range(1, len(levels)):
+            prev_w, prev_h = levels[level - 1]
+            level_w, level_h = levels[level]
+            for row in range(math.ceil(level_h / chunk_size)):
+                writes = []
+                for col in range(math.ceil(level_w / chunk_size)):
+                    left, top = 2 * col * chunk_size, 2 * row * chunk_size
+                    span_w = min(2 * chunk_size, prev_w - left)
+                    span_h = min(2 * chunk_size, prev_h - top)
+                    canvas = np.full((span_h, span_w, 3), FILL_VALUE, dtype=np.uint8)
+                    covered = False
+                    for dr in (0, 1):
+                        for dc in (0, 1):
+                            path = _chunk_path(output_dir, level - 1, 2 * row + dr, 2 * col + dc)
+                            if not path.exists():
+                                continue
+                            part = cv2.imread(str(path), cv2.IMREAD_COLOR)
+                            canvas[dr * chunk_size:dr * chunk_size + part.shape[0],
+                                   dc * chunk_size:dc * chunk_size + part.shape[1]] = part
+                            covered = True
+                    if covered:
+                        small = cv2.resize(canvas, ((span_w + 1) // 2, (span_h + 1) // 2),
+                                           interpolation=cv2.INTER_AREA)
+                        writes.append(executor.submit(cv2.imwrite,
+                                                      str(_chunk_path(output_dir, level, row, col)), small))
+                for future in writes:
+                    future.result()
+                done_rows += 1
+                if progress_callback:
+                    progress_callback(done_rows, total_rows, str(level))
+    
+    manifest = {
+        'version': MOSAIC_VERSION,
+        'name': name,
+        'width': width,
+        'height': height,
+        'chunk_size': chunk_size,
+        'fill_value': FILL_VALUE,
+        'levels': levels,
+        'frames': layout,
+    }
+    tmp_path = output_dir / (MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, output_dir / MANIFEST_NAME)
+    
+    return SlideMosaic(output_dir)
+
+
+def detect_mosaic(mosaic: SlideMosaic,
+                  detector,
+                  tile_size: int = 1024,
+                  overlap: int = 128,
+                  progress_callback: Optional[Callable[[int, int, str], None]] = None) -> List[Dict]:
+    """
+    Detecta partículas en todo el mosaico, tesela a tesela.
+    
+    Cada partícula se queda solo en la tesela cuya zona central (la tesela
+    menos medio solape por cada lado interior) contiene su centro, así que
+    las del solape no se cuentan dos veces.
+    
+    Args:
+        mosaic: Mosaico abierto.
+        detector: Detector con detect_particles (ver yolo_detector.get_detector).
+        tile_size: Lado de las teselas en píxeles.
+        overlap: Solape entre teselas; debe superar la partícula más grande.
+        progress_callback: Función (teselas hechas, teselas totales, nombre de la tesela).
+    
+    Returns:
+        Lista de partículas con bbox y centroide en coordenadas de la muestra
+        completa (también en 'slide_x' y 'slide_y', como slide_registration).
+    """
+    step = tile_size - overlap
+    n_tiles = len(range(0, max(mosaic.width - overlap, 1), step)) * \
+              len(range(0, max(mosaic.height - overlap, 1), step))
+    half = overlap / 2
+    
+    particles = []
+    for done, (x, y, tile) in enumerate(mosaic.iter_tiles(tile_size, overlap), 1):
+        # Zona central de la tesela: los bordes de la muestra son de la tesela que los toca
+        core_x0 = x + half if x > 0 else 0
+        core_y0 = y + half if y > 0 else 0
+        core_x1 = x + tile_size - half if x + tile_size < mosaic.width else mosaic.width
+        core_y1 = y + tile_size - half if y + tile_size < mosaic.height else mosaic.height
+        
+        if tile.any():
+            tile_particles, _ = detector.detect_particles(tile, return_annotated=False)
+        else:
+            tile_particles = []
+        
+        for particle in tile_particles:
+            centroid_x = particle['centroid_x'] + x
+            centroid_y = particle['centroid_y'] + y
+            if not (core_x0 <= centroid_x < core_x1 and core_y0 <= centroid_y < core_y1):
+                continue
+            x1, y1, x2, y2 = particle['bbox']
+            particle.update({
+                'particle_id': len(particles) + 1,
+                'bbox': [x1 + x, y1 + y, x2 + x, y2 + y],
+                'centroid_x': centroid_x,
+                'centroid_y': centroid_y,
+                'slide_x': centroid_x,
+                'slide_y': centroid_y,
+            })
+            particles.append(particle)
+        
+        if progress_callback:
+            progress_callback(done, n_tiles, f"{x}_{y}")
+    
+    return particles
+
+
+def draw_particles(image: np.ndarray, particles: List[Dict],
+                   x: int, y: int, level: int = 0) -> np.ndarray:
+    """
+    Dibuja las partículas sobre un rectángulo leído con read_region.
+    
+    Args:
+        image: Rectángulo del mosaico (se modifica).
+        particles: Partículas de detect_mosaic.
+        x, y: Esquina del rectángulo en píxeles del nivel.
+        level: Nivel del rectángulo.
+    
+    Returns:
+        La misma imagen, con las cajas de las partículas visibles.
+    """
+    scale = 0.5 ** level
+    height, width = image.shape[:2]
+    for particle in particles:
+        x1, y1, x2, y2 = [int(round(v * scale)) for v in particle['bbox']]
+        if x2 < x or y2 < y or x1 > x + width or y1 > y + height:
+            continue
+        cv2.rectangle(image, (x1 - x, y1 - y), (x2 - x, y2 - y), (0, 255, 0), 1 if level else 2)
+    return image
+
+
+def main():
+    """Función principal para crear el mosaico de una muestra desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Unir los campos de una muestra en un mosaico piramidal y analizarlo'
+    )
+    parser.add_argument('frames', type=str,
+                        help='Carpeta con las imágenes de los campos')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Carpeta del mosaico (por defecto data/mosaics/<carpeta>.mosaic)')
+    parser.add_argument('--columns', type=int, default=None,
+                        help='Campos por fila (si los nombres no indican r<fila>_c<columna>)')
+    parser.add_argument('--overlap', type=float, default=0.2,
+                        help='Fracción nominal de solape entre campos vecinos')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Lado de los trozos del mosaico en píxeles')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Modelo YOLO para detectar partículas en el mosaico')
+    parser.add_argument('--tile-size', type=int, default=1024,
+                        help='Lado de las teselas de detección')
+    parser.add_argument('--region', type=int, nargs=4, metavar=('X', 'Y', 'ANCHO', 'ALTO'),
+                        help='Exportar un rectángulo (píxeles del nivel) con las partículas')
+    parser.add_argument('--level', type=int, default=0,
+                        help='Nivel de la pirámide para --region (0 = resolución completa)')
+    
+    args = parser.parse_args()
+    
+    frames_dir = Path(args.frames)
+    output_dir = Path(args.output) if args.output else MOSAICS_DIR / f"{frames_dir.name}.mosaic"
+    
+    if (output_dir / MANIFEST_NAME).exists():
+        mosaic = SlideMosaic(output_dir)
+        print(f"📂 Mosaico existente: {output_dir}")
+    else:
+        layout_path = frames_dir / LAYOUT_FILENAME
+        if layout_path.exists():
+            layout = load_layout(layout_path)
+        else:
+            frame_paths = list_images(frames_dir)
+            grid = frame_grid_positions(frame_paths, args.columns)
+            print(f"🧭 Registrando {len(frame_paths)} campos...")
+            layout = register_frames(frame_paths, grid, args.overlap)
+            save_layout(layout, layout_path)
+        
+        print(f"🧩 Construyendo mosaico de {len(layout)} campos...")
+        mosaic = build_mosaic(
+            layout, output_dir, name=frames_dir.name, chunk_size=args.chunk_size,
+            progress_callback=lambda done, total, level: print(f"   Nivel {level}: {done}/{total}", end='\r')
+        )
+        print(f"\n✅ Mosaico {mosaic.width}×{mosaic.height} px, {len(mosaic.levels)} niveles: {output_dir}")
+    
+    particles = []
+    particles_path = output_dir / "particles.json"
+    if args.model:
+        from src.yolo_detector import get_detector
+        
+        detector = get_detector(args.model)
+        particles = detect_mosaic(
+            mosaic, detector, tile_size=args.tile_size,
+            progress_callback=lambda done, total, _: print(f"   Teselas: {done}/{total}", end='\r')
+        )
+        with open(particles_path, 'w', encoding='utf-8') as f:
+            json.dump(particles, f, default=float)
+        print(f"\n✅ {len(particles)} partículas en la muestra: {particles_path}")
+    elif particles_path.exists():
+        with open(particles_path, 'r', encoding='utf-8') as f:
+            particles = json.load(f)
+    
+    if args.region:
+        x, y, width, height = args.region
+        image = draw_particles(mosaic.read_region(x, y, width, height, args.level),
+                               particles, x, y, args.level)
+        region_path = output_dir / f"region_L{args.level}_{x}_{y}_{width}x{height}.png"
+        cv2.imwrite(str(region_path), image)
+        print(f"🖼️ Región guardada: {region_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""
+Módulo de registro de campos solapados y eliminación de partículas duplicadas.
+
+Cuando una muestra se captura como una cuadrícula de campos que se
+solapan, la misma partícula aparece en dos o más imágenes y se cuenta
+varias veces, lo que infla la concentración (particles_per_ml).
+
+Este módulo:
+1. Estima el desplazamiento real entre campos vecinos con correlación de
+   fase sobre las franjas de solape, leídas a escala reducida.
+2. Resuelve la posición de todos los campos en coordenadas de la muestra
+   completa con mínimos cuadrados dispersos (pondera cada pareja por la
+   calidad de su correlación; las parejas sin textura usan la posición
+   nominal de la cuadrícula).
+3. Lleva las detecciones a coordenadas de la muestra y une las que caen
+   en el mismo punto desde campos distintos con un join espacial por
+   celdas (hash de cuadrícula), de modo que cada partícula cuente una vez.
+
+Solo se guardan en memoria las miniaturas de la fila actual y la
+anterior, así que escala a miles de campos por muestra.
+"""
+
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import pandas as pd
+from PIL import Image
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import lsqr
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.image_files import list_images
+
+
+# Factor de reducción para el registro -> bandera de lectura reducida de OpenCV
+DOWNSCALE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Respuesta mínima de la correlación de fase para fiarse del desplazamiento
+MIN_RESPONSE = 0.05
+# Peso de la posición nominal (ancla las zonas sin textura y los campos sueltos)
+NOMINAL_WEIGHT = 0.01
+# Distancia máxima (píxeles de imagen) para considerar dos detecciones la misma partícula
+MERGE_RADIUS_PX = 15.0
+
+# Nombres como muestra_r03_c12.jpg o muestra-R3C12.tif
+GRID_NAME_PATTERN = re.compile(r'r(\d+)[_\-]?c(\d+)', re.IGNORECASE)
+
+LAYOUT_FILENAME = "slide_layout.json"
+
+
+def frame_grid_positions(frame_paths: List[Path],
+                         columns: Optional[int] = None,
+                         serpentine: bool = False) -> List[Tuple[int, int]]:
+    """
+    Fila y columna de cada campo en la cuadrícula.
+    
+    Si los nombres contienen la posición (r03_c12) se usa; si no, los
+    campos se toman en el orden dado, de izquierda a derecha y fila a fila.
+    
+    Args:
+        frame_paths: Imágenes de los campos.
+        columns: Campos por fila (obligatorio si los nombres no dicen la posición).
+        serpentine: Si las filas impares se capturaron de derecha a izquierda.
+    
+    Returns:
+        Lista de tuplas (fila, columna), en el mismo orden que frame_paths.
+    """
+    matches = [GRID_NAME_PATTERN.search(Path(p).stem) for p in frame_paths]
+    if all(matches):
+        return [(int(m.group(1)), int(m.group(2))) for m in matches]
+    
+    if not columns:
+        raise ValueError("Los nombres no indican fila/columna: indica el número de columnas")
+    
+    positions = []
+    for index in range(len(frame_paths)):
+        row, col = divmod(index, columns)
+        if serpentine and row % 2 == 1:
+            col = columns - 1 - col
+        positions.append((row, col))
+    return positions
+
+
+def _read_small(path: Path, downscale: int) -> np.ndarray:
+    """Lee un campo en gris a escala reducida (JPEG se decodifica ya reducido)."""
+    image = cv2.imread(str(path), DOWNSCALE_FLAGS[downscale])
+    if image is None:
+        raise FileNotFoundError(f"No se pudo cargar la imagen: {path}")
+    return image.astype(np.float32)
+
+
+def strip_offset(image_a: np.ndarray, image_b: np.ndarray,
+                 nominal: Tuple[float, float]) -> Tuple[float, float, float]:
+    """
+    Desplazamiento de image_b respecto a image_a a partir de su zona de solape.
+    
+    Se recorta la misma zona de la muestra en ambas imágenes según la
+    posición nominal y la correlación de fase mide el error residual, que
+    es pequeño y no sufre el "enrollado" de correlacionar campos completos.
+    
+    Args:
+        image_a: Campo de referencia (gris, float32).
+        image_b: Campo vecino, mismo tamaño.
+        nominal: Desplazamiento nominal (dx, dy) de b respecto a a, en
+                 píxeles de estas imágenes.
+    
+    Returns:
+        Tupla (dx, dy, respuesta) con el desplazamiento estimado y la
+        calidad de la correlación (0-1). Sin solape, la respuesta es 0.
+    """
+    height, width = image_a.shape
+    dx, dy = int(round(nominal[0])), int(round(nominal[1]))
+    overlap_w, overlap_h = width - abs(dx), height - abs(dy)
+    if overlap_w < 8 or overlap_h < 8:
+        return float(nominal[0]), float(nominal[1]), 0.0
+    
+    # La zona común en coordenadas de cada imagen
+    strip_a = image_a[max(dy, 0):max(dy, 0) + overlap_h, max(dx, 0):max(dx, 0) + overlap_w]
+    strip_b = image_b[max(-dy, 0):max(-dy, 0) + overlap_h, max(-dx, 0):max(-dx, 0) + overlap_w]
+    
+    window = cv2.createHanningWindow((overlap_w, overlap_h), cv2.CV_32F)
+    (shift_x, shift_y), response = cv2.phaseCorrelate(strip_a, strip_b, window)
+    return dx - shift_x, dy - shift_y, float(response)
+
+
+def _solve_axis(edges: np.ndarray, values: np.ndarray, weights: np.ndarray,
+                nominal: np.ndarray) -> np.ndarray:
+    """Mínimos cuadrados dispersos de una coordenada: x_b - x_a = valor, x_i ≈ nominal_i."""
+    n_edges, n_frames = len(edges), len(nominal)
+    sqrt_w = np.sqrt(weights)
+    rows = np.r_[np.arange(n_edges), np.arange(n_edges), n_edges + np.arange(n_frames)]
+    cols = np.r_[edges[:, 1], edges[:, 0], np.arange(n_frames)]
+    data = np.r_[sqrt_w, -sqrt_w, np.full(n_frames, np.sqrt(NOMINAL_WEIGHT))]
+    matrix = sparse.csr_matrix((data, (rows, cols)), shape=(n_edges + n_frames, n_frames))
+    target = np.r_[sqrt_w * values, np.sqrt(NOMINAL_WEIGHT) * nominal]
+    # Partir de la posición nominal acelera la convergencia
+    solution = lsqr(matrix, target - matrix @ nominal, atol=1e-10, btol=1e-10)[0]
+    return nominal + solution
+
+
+def register_frames(frame_paths: List[Path],
+                    grid: List[Tuple[int, int]],
+                    overlap: float = 0.2,
+                    downscale: int = 4,
+                    workers: int = 4) -> Dict[str, Dict]:
+    """
+    Posición de cada campo en coordenadas de la muestra completa.
+    
+    Args:
+        frame_paths: Imágenes de los campos (todas del mismo tamaño).
+        grid: (fila, columna) de cada campo (ver frame_grid_positions).
+        overlap: Fracción nominal de solape entre campos vecinos (0-1).
+        downscale: Reducción para la correlación (1, 2, 4 u 8).
+        workers: Hilos de lectura de imágenes.
+    
+    Returns:
+        Diccionario {sample_id: {'path', 'row', 'col', 'x', 'y', 'width',
+        'height', 'response'}} con la esquina superior izquierda (x, y) en
+        píxeles de la imagen original y la mejor respuesta de sus parejas.
+    """
+    if downscale not in DOWNSCALE_FLAGS:
+        raise ValueError(f"downscale debe ser uno de {sorted(DOWNSCALE_FLAGS)}")
+    
+    frame_paths = [Path(p) for p in frame_paths]
+    with Image.open(frame_paths[0]) as img:
+        width, height = img.size
+    step_x, step_y = width * (1 - overlap), height * (1 - overlap)
+    
+    # Orden por filas: cada campo solo se compara con el de la izquierda y el de arriba
+    order = sorted(range(len(frame_paths)), key=lambda i: grid[i])
+    index_of = {grid[i]: i for i in order}
+    nominal = np.array([[grid[i][1] * step_x, grid[i][0] * step_y] for i in range(len(frame_paths))])
+    
+    edges, offsets, weights = [], [], []
+    response_of = np.zeros(len(frame_paths))
+    small = {}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Lectura anticipada en hilos (OpenCV libera el GIL al decodificar)
+        futures = {i: executor.submit(_read_small, frame_paths[i], downscale) for i in order[:2 * workers]}
+        for position, i in enumerate(order):
+            ahead = position + 2 * workers
+            if ahead < len(order):
+                futures[order[ahead]] = executor.submit(_read_small, frame_paths[order[ahead]], downscale)
+            small[i] = futures.pop(i).result()
+            scale = small[i].shape[1] / width
+            
+            row, col = grid[i]
+            for neighbour, nominal_offset in (((row, col - 1), (step_x, 0.0)), ((row - 1, col), (0.0, step_y))):
+                j = index_of.get(neighbour)
+                if j is None or j not in small:
+                    continue
+                dx, dy, response = strip_offset(small[j], small[i],
+                                                (nominal_offset[0] * scale, nominal_offset[1] * scale))
+                if response >= MIN_RESPONSE:
+                    offsets.append((dx / scale, dy / scale))
+                    weights.append(response)
+                else:
+                    # Sin textura en el solape: se confía en la cuadrícula
+                    offsets.append(nominal_offset)
+                    weights.append(NOMINAL_WEIGHT)
+                edges.append((j, i))
+                response_of[i] = max(response_of[i], response)
+                response_of[j] = max(response_of[j], response)
+            
+            # Liberar las miniaturas que ya no tienen vecinos pendientes
+            for k in [k for k in small if grid[k][0] < row - 1 or (grid[k][0] == row - 1 and grid[k][1] < col)]:
+                del small[k]
+    
+    if edges:
+        edges = np.array(edges)
+        offsets = np.array(offsets)
+        weights = np.array(weights)
+        x = _solve_axis(edges, offsets[:, 0], weights, nominal[:, 0])
+        y = _solve_axis(edges, offsets[:, 1], weights, nominal[:, 1])
+    else:
+        x, y = nominal[:, 0], nominal[:, 1]
+    
+    # Llevar el campo de arriba a la izquierda al origen
+    x -= x.min()
+    y -= y.min()
+    
+    return {
+        path.stem: {
+            'path': str(path),
+            'row': grid[i][0],
+            'col': grid[i][1],
+            'x': round(float(x[i]), 2),
+            'y': round(float(y[i]), 2),
+            'width': width,
+            'height': height,
+            'response': round(float(response_of[i]), 4),
+        }
+        for i, path in enumerate(frame_paths)
+    }
+
+
+def save_layout(layout: Dict[str, Dict], path: Path) -> None:
+    """Guarda la posición de los campos (JSON) junto a las imágenes o los resultados."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(layout, f, indent=1)
+
+
+def load_layout(path: Path) -> Dict[str, Dict]:
+    """Carga la posición de los campos guardada con save_layout."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _candidate_pairs(cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parejas de puntos en la misma celda o en celdas vecinas (join por hash de cuadrícula).
+    
+    Args:
+        cells: Celda (cx, cy) de cada punto, enteros (N, 2).
+    
+    Returns:
+        Tupla (i, j) de arrays de índices con i < j en la misma celda.
+    """
+    cells = cells - cells.min(axis=0) + 1
+    span = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * span + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    
+    pairs_i, pairs_j = [], []
+    # Media vecindad: cada pareja de celdas vecinas se visita una sola vez
+    for ox, oy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        target = keys + ox * span + oy
+        lo = np.searchsorted(sorted_keys, target, 'left')
+        hi = np.searchsorted(sorted_keys, target, 'right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(len(keys)), counts)
+        first = np.repeat(lo, counts)
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[first + offset]
+        if (ox, oy) == (0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(i)
+        pairs_j.append(j)
+    
+    if not pairs_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def deduplicate_particles(df: pd.DataFrame,
+                          layout: Dict[str, Dict],
+                          merge_radius_px: float = MERGE_RADIUS_PX,
+                          match_class: bool = True) -> pd.DataFrame:
+    """
+    Marca las partículas contadas más de una vez en campos solapados.
+    
+    Args:
+        df: Partículas de todos los campos, con 'sample_id' (nombre del
+            campo), 'centroid_x' y 'centroid_y' en píxeles del campo.
+        layout: Posición de los campos (ver register_frames).
+        merge_radius_px: Distancia máxima entre centroides para unirlas.
+        match_class: Unir solo partículas de la misma clase.
+    
+    Returns:
+        Copia de df con 'slide_x', 'slide_y' (coordenadas de la muestra),
+        'slide_particle_id' (igual para todas las copias de una partícula) e
+        'is_duplicate' (True en todas las copias menos una: la más alejada
+        del borde de su campo, que es la que se ve completa).
+    """
+    df = df.copy()
+    n = len(df)
+    if n == 0:
+        for column in ('slide_x', 'slide_y', 'slide_particle_id'):
+            df[column] = pd.Series(dtype=float)
+        df['is_duplicate'] = pd.Series(dtype=bool)
+        return df
+    
+    frames = df['sample_id'].astype(str)
+    missing = sorted(set(frames) - set(layout))
+    if missing:
+        raise KeyError(f"Campos sin posición en la muestra: {', '.join(missing[:5])}")
+    
+    frame_x = frames.map(lambda f: layout[f]['x']).to_numpy(dtype=np.float64)
+    frame_y = frames.map(lambda f: layout[f]['y']).to_numpy(dtype=np.float64)
+    frame_w = frames.map(lambda f: layout[f]['width']).to_numpy(dtype=np.float64)
+    frame_h = frames.map(lambda f: layout[f]['height']).to_numpy(dtype=np.float64)
+    local_x = df['centroid_x'].to_numpy(dtype=np.float64)
+    local_y = df['centroid_y'].to_numpy(dtype=np.float64)
+    slide_x, slide_y = frame_x + local_x, frame_y + local_y
+    
+    # Join espacial: celdas del tamaño del radio, así cada vecino está en las 9 celdas de alrededor
+    cells = np.floor(np.column_stack([slide_x, slide_y]) / merge_radius_px).astype(np.int64)
+    i, j = _candidate_pairs(cells)
+    
+    frame_codes = pd.factorize(frames)[0]
+    keep = (frame_codes[i] != frame_codes[j]) & \
+           ((slide_x[i] - slide_x[j]) ** 2 + (slide_y[i] - slide_y[j]) ** 2 <= merge_radius_px ** 2)
+    if match_class and 'class_name' in df.columns:
+        class_codes = pd.factorize(df['class_name'].astype(str))[0]
+        keep &= class_codes[i] == class_codes[j]
+    i, j = i[keep], j[keep]
+    
+    graph = sparse.coo_matrix((np.ones(len(i)), (i, j)), shape=(n, n))
+    _, groups = connected_components(graph, directed=False)
+    
+    # Representante: la copia más alejada del borde de su campo
+    border = np.minimum.reduce([local_x, local_y, frame_w - local_x, frame_h - local_y])
+    order = np.lexsort((-border, groups))
+    first = np.r_[True, groups[order][1:] != groups[order][:-1]]
+    is_duplicate = np.ones(n, dtype=bool)
+    is_duplicate[order[first]] = False
+    
+    df['slide_x'] = np.round(slide_x, 1)
+    df['slide_y'] = np.round(slide_y, 1)
+    df['slide_particle_id'] = groups
+    df['is_duplicate'] = is_duplicate
+    return df
+
+
+def mark_slide_duplicates(df: pd.DataFrame,
+                          frames_dir: Path,
+                          merge_radius_px: float = MERGE_RADIUS_PX) -> Optional[pd.DataFrame]:
+    """
+    Marca las partículas duplicadas de los campos de una carpeta registrada.
+    
+    Carga slide_layout.json de la carpeta de los campos y aplica
+    deduplicate_particles a las filas de los campos que aparecen en él;
+    las de otros campos se conservan sin marcar (is_duplicate = False).
+    
+    Args:
+        df: Partículas con 'sample_id', 'centroid_x' y 'centroid_y'.
+        frames_dir: Carpeta con las imágenes de los campos.
+        merge_radius_px: Distancia máxima entre centroides para unirlas.
+    
+    Returns:
+        Copia de df con las columnas de deduplicate_particles, o None si la
+        carpeta no tiene slide_layout.json.
+    """
+    layout_path = Path(frames_dir) / LAYOUT_FILENAME
+    if not layout_path.exists():
+        return None
+    layout = load_layout(layout_path)
+    
+    in_layout = df['sample_id'].astype(str).isin(layout.keys())
+    marked = deduplicate_particles(df[in_layout], layout, merge_radius_px)
+    rest = df[~in_layout].copy()
+    rest['is_duplicate'] = False
+    return pd.concat([marked, rest]).loc[df.index]
+
+
+def _read_particles(path: Path) -> pd.DataFrame:
+    """Lee las partículas exportadas por el análisis (Excel o CSV)."""
+    if path.suffix.lower() in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+
+def main():
+    """Función principal para registrar los campos de una muestra desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Estimar la posición de campos solapados de una muestra'
+    )
+    parser.add_argument('frames', type=str,
+                        help='Carpeta con las imágenes de los campos')
+    parser.add_argument('--columns', type=int, default=None,
+                        help='Campos por fila (si los nombres no indican r<fila>_c<columna>)')
+    parser.add_argument('--serpentine', action='store_true',
+                        help='Las filas impares se capturaron de derecha a izquierda')
+    parser.add_argument('--overlap', type=float, default=0.2,
+                        help='Fracción nominal de solape entre campos vecinos')
+    parser.add_argument('--downscale', type=int, default=4, choices=sorted(DOWNSCALE_FLAGS),
+                        help='Reducción de las imágenes para la correlación')
+    parser.add_argument('--particles', type=str, default=None,
+                        help='Partículas exportadas por el análisis (.xlsx o .csv) a deduplicar')
+    parser.add_argument('--volume-ml', type=float, default=None,
+                        help='Volumen de la muestra en mL para calcular la concentración')
+    parser.add_argument('--dilution', type=float, default=1.0,
+                        help='Factor de dilución aplicado a la muestra')
+    
+    args = parser.parse_args()
+    
+    frames_dir = Path(args.frames)
+    layout_path = frames_dir / LAYOUT_FILENAME
+    if args.particles and layout_path.exists():
+        # Los campos ya están registrados: basta con deduplicar
+        print(f"📐 Usando la posición de los campos guardada: {layout_path}")
+    else:
+        frame_paths = list_images(frames_dir)
+        grid = frame_grid_positions(frame_paths, args.columns, args.serpentine)
+        layout = register_frames(frame_paths, grid, args.overlap, args.downscale)
+        
+        save_layout(layout, layout_path)
+        weak = [name for name, frame in layout.items() if frame['response'] < MIN_RESPONSE]
+        print(f"✅ {len(layout)} campos registrados: {layout_path}")
+        if weak:
+            print(f"   ⚠️ {len(weak)} campos sin textura suficiente (posición nominal): {', '.join(weak[:10])}")
+    
+    if not args.particles:
+        return
+    
+    from src.statistical_analysis import StatisticalAnalyzer
+    
+    particles_path = Path(args.particles)
+    df = mark_slide_duplicates(_read_particles(particles_path), frames_dir)
+    output_path = particles_path.with_name(f"{particles_path.stem}_dedup.csv")
+    df.to_csv(output_path, index=False)
+    n_duplicates = int(df['is_duplicate'].sum())
+    print(f"✅ {len(df) - n_duplicates} partículas únicas ({n_duplicates} copias en campos solapados): {output_path}")
+    
+    if args.volume_ml:
+        concentration = StatisticalAnalyzer().calculate_concentration(df, args.volume_ml, args.dilution)
+        print(f"   Concentración: {concentration['particles_per_ml']:.2f} partículas/mL")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,13 @@ las propiedades morfológicas de microplásticos detectados.
 
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from scipy import stats
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from config.config import MORPHOLOGY_PARAMS
+from src.size_sketch import SizeSketch
 
 
 class StatisticalAnalyzer:
@@ -209,6 +210,83 @@ class StatisticalAnalyzer:
         
         return class_stats
     
+    def analyze_size_distribution_sketch(self, sketch: SizeSketch) -> Dict:
+        """
+        Analiza la distribución de tamaños a partir de un resumen, sin filas de partículas.
+        
+        Args:
+            sketch: Resumen de tamaños (ver size_sketch.SizeSketch).
+            
+        Returns:
+            Diccionario con las mismas claves que analyze_size_distribution
+            (salvo el perímetro, que no se resume).
+        """
+        size_stats = {
+            'area': sketch.descriptive_stats('area'),
+            'diameter': sketch.descriptive_stats('diameter'),
+        }
+        
+        size_distribution = sketch.category_counts('size')
+        size_stats['category_distribution'] = size_distribution
+        
+        total = sum(size_distribution.values())
+        size_stats['category_percentages'] = {
+            cat: (count / total * 100) for cat, count in size_distribution.items()
+        }
+        
+        return size_stats
+    
+    def analyze_shape_distribution_sketch(self, sketch: SizeSketch) -> Dict:
+        """
+        Analiza la distribución de formas a partir de un resumen.
+        
+        Args:
+            sketch: Resumen de tamaños (ver size_sketch.SizeSketch).
+            
+        Returns:
+            Diccionario con 'category_distribution' y 'category_percentages'.
+        """
+        shape_distribution = sketch.category_counts('shape')
+        total = sum(shape_distribution.values())
+        
+        return {
+            'category_distribution': shape_distribution,
+            'category_percentages': {
+                cat: (count / total * 100) for cat, count in shape_distribution.items()
+            },
+        }
+    
+    def analyze_class_distribution_sketch(self, sketch: SizeSketch) -> Dict:
+        """
+        Analiza la distribución de tipos de microplásticos a partir de un resumen.
+        
+        Args:
+            sketch: Resumen de tamaños (ver size_sketch.SizeSketch).
+            
+        Returns:
+            Diccionario con las mismas claves que analyze_class_distribution
+            (salvo las estadísticas de relación de aspecto).
+        """
+        total = sketch.count()
+        class_distribution = {cls: sketch.count(cls) for cls in sketch.classes()}
+        
+        class_stats = {
+            'distribution': class_distribution,
+            'percentages': {
+                cls: (count / total * 100) for cls, count in class_distribution.items()
+            },
+            'by_class': {},
+        }
+        for class_name, count in class_distribution.items():
+            class_stats['by_class'][class_name] = {
+                'count': count,
+                'percentage': count / total * 100,
+                'area_stats': sketch.descriptive_stats('area', class_name),
+                'diameter_stats': sketch.descriptive_stats('diameter', class_name),
+            }
+        
+        return class_stats
+    
     def compare_samples(self, dfs: Dict[str, pd.DataFrame],
                        parameter: str = 'area_um2') -> Dict:
         """
@@ -293,6 +371,10 @@ class StatisticalAnalyzer:
         """
         Calcula la concentración de microplásticos en la muestra.
         
+        Si df viene de slide_registration.deduplicate_particles, las copias
+        de una partícula vista en varios campos solapados (is_duplicate) se
+        cuentan una sola vez.
+        
         Args:
             df: DataFrame con datos de partículas.
             sample_volume_ml: Volumen de la muestra en mililitros.
@@ -301,6 +383,8 @@ class StatisticalAnalyzer:
         Returns:
             Diccionario con concentraciones calculadas.
         """
+        if 'is_duplicate' in df.columns:
+            df = df[~df['is_duplicate'].astype(bool)]
         n_particles = len(df)
         
         concentration = {
@@ -311,18 +395,40 @@ class StatisticalAnalyzer:
         
         return concentration
     
-    def generate_summary_report(self, df: pd.DataFrame,
-                               sample_id: str = None) -> str:
+    def generate_summary_report(self, df: Optional[pd.DataFrame],
+                               sample_id: str = None,
+                               sketch: Optional[SizeSketch] = None) -> str:
         """
         Genera un reporte de resumen textual.
         
+        Con sketch, el reporte se calcula a partir del resumen de tamaños
+        (df puede ser None), así un lote grande no necesita cargar todas
+        las partículas; las medianas son estimaciones del histograma.
+        
+        Como en calculate_concentration, las filas marcadas is_duplicate
+        no entran en el total ni en las distribuciones.
+        
         Args:
             df: DataFrame con datos de partículas.
             sample_id: Identificador de la muestra.
+            sketch: Resumen de tamaños (ver size_sketch.SizeSketch).
             
         Returns:
             Reporte de resumen como string.
         """
+        if sketch is not None:
+            total = sketch.count()
+            class_analysis = self.analyze_class_distribution_sketch(sketch)
+            size_analysis = self.analyze_size_distribution_sketch(sketch)
+            shape_analysis = self.analyze_shape_distribution_sketch(sketch)
+        else:
+            if 'is_duplicate' in df.columns:
+                df = df[~df['is_duplicate'].astype(bool)]
+            total = len(df)
+            class_analysis = self.analyze_class_distribution(df) if 'class_name' in df.columns else None
+            size_analysis = self.analyze_size_distribution(df)
+            shape_analysis = self.analyze_shape_distribution(df)
+        
         report = []
         report.append("=" * 60)
         report.append(f"REPORTE DE ANÁLISIS DE MICROPLÁSTICOS")
@@ -332,26 +438,23 @@ class StatisticalAnalyzer:
         report.append("")
         
         # Información general
-        report.append(f"Número total de partículas detectadas: {len(df)}")
+        report.append(f"Número total de partículas detectadas: {total}")
         report.append("")
         
         # Análisis por tipo de microplástico (si está disponible)
-        if 'class_name' in df.columns:
-            class_analysis = self.analyze_class_distribution(df)
-            if 'error' not in class_analysis:
-                report.append(f"DISTRIBUCIÓN POR TIPO DE MICROPLÁSTICO")
-                report.append("-" * 60)
-                for class_name, stats in class_analysis['by_class'].items():
-                    report.append(f"{class_name}:")
-                    report.append(f"  Cantidad: {stats['count']} ({stats['percentage']:.1f}%)")
-                    report.append(f"  Área promedio: {stats['area_stats']['mean']:.2f} ± {stats['area_stats']['std']:.2f} μm²")
-                    report.append(f"  Diámetro promedio: {stats['diameter_stats']['mean']:.2f} ± {stats['diameter_stats']['std']:.2f} μm")
-                    report.append("")
+        if class_analysis and 'error' not in class_analysis:
+            report.append(f"DISTRIBUCIÓN POR TIPO DE MICROPLÁSTICO")
+            report.append("-" * 60)
+            for class_name, stats in class_analysis['by_class'].items():
+                report.append(f"{class_name}:")
+                report.append(f"  Cantidad: {stats['count']} ({stats['percentage']:.1f}%)")
+                report.append(f"  Área promedio: {stats['area_stats']['mean']:.2f} ± {stats['area_stats']['std']:.2f} μm²")
+                report.append(f"  Diámetro promedio: {stats['diameter_stats']['mean']:.2f} ± {stats['diameter_stats']['std']:.2f} μm")
+                report.append("")
         
         # Análisis de tamaño
         report.append("DISTRIBUCIÓN DE TAMAÑOS:")
         report.append("-" * 40)
-        size_analysis = self.analyze_size_distribution(df)
         for category, percentage in size_analysis['category_percentages'].items():
             count = size_analysis['category_distribution'][category]
             report.append(f"  {category.capitalize()}: {count} partículas ({percentage:.1f}%)")
@@ -371,7 +474,6 @@ class StatisticalAnalyzer:
         # Análisis de forma
         report.append("DISTRIBUCIÓN DE FORMAS:")
         report.append("-" * 40)
-        shape_analysis = self.analyze_shape_distribution(df)
         for category, percentage in shape_analysis['category_percentages'].items():
             count = shape_analysis['category_distribution'][category]
             report.append(f"  {category.capitalize()}: {count} partículas ({percentage:.1f}%)")
@@ -0,0 +1,332 @@
+"""
+Módulo de autoajuste de batch y workers para entrenar YOLOv8 en CPU.
+
+En lugar de fijar batch=2 y workers=1, se ejecutan unas pocas iteraciones
+de entrenamiento cronometradas (forward + backward + paso del optimizador)
+con distintas combinaciones de tamaño de batch y procesos del dataloader,
+se descartan las que superan el presupuesto de memoria y se elige la que
+procesa más imágenes por segundo en la CPU actual.
+
+El resultado se guarda en yolo_training/autotune.json indexado por modelo,
+tamaño de imagen, dataset y CPU, de modo que no se repiten las pruebas
+mientras nada de eso cambie.
+"""
+
+import json
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import torch
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_dataloader, build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+    from ultralytics.nn.tasks import DetectionModel
+    from ultralytics.utils import DEFAULT_CFG
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from src.image_files import list_images
+from src.train_cache import TrainingImageCache
+
+if YOLO_AVAILABLE:
+    from src.train_cache import CachedYOLODataset
+
+
+# Combinaciones a probar (de menor a mayor consumo de memoria)
+DEFAULT_BATCH_SIZES = [2, 4, 8, 16, 32]
+DEFAULT_WORKER_COUNTS = [0, 1, 2, 4, 8]
+
+
+def _process_memory_mb() -> float:
+    """Memoria residente del proceso y sus hijos (workers del dataloader) en MB."""
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss / (1024 * 1024)
+
+
+def autotune_key(model_size: str, imgsz: int, num_images: int, memory_budget_mb: float) -> str:
+    """
+    Clave que identifica un resultado de autoajuste reutilizable.
+    
+    Args:
+        model_size: Tamaño del modelo ('n', 's', ...).
+        imgsz: Tamaño de entrenamiento.
+        num_images: Número de imágenes de entrenamiento.
+        memory_budget_mb: Presupuesto de memoria.
+    
+    Returns:
+        Cadena con modelo, imgsz, dataset, presupuesto y CPU.
+    """
+    cpu = f"{platform.processor() or platform.machine()}x{os.cpu_count()}"
+    return f"yolov8{model_size}|{imgsz}|{num_images}|{memory_budget_mb:.0f}|{cpu}"
+
+
+class BatchAutotuner:
+    """Prueba combinaciones de batch/workers y elige la de mayor rendimiento."""
+    
+    def __init__(self,
+                 data_yaml: str,
+                 model_size: str = 'n',
+                 imgsz: int = 320,
+                 memory_budget_mb: float = 4096,
+                 image_cache: Optional[TrainingImageCache] = None,
+                 warmup_iters: int = 2,
+                 timed_iters: int = 5):
+        """
+        Inicializa el autoajuste.
+        
+        Args:
+            data_yaml: Ruta al archivo data.yaml del dataset.
+            model_size: Tamaño del modelo ('n', 's', 'm', 'l', 'x').
+            imgsz: Tamaño de imagen de entrenamiento.
+            memory_budget_mb: Memoria máxima (proceso + workers) que puede
+                              usar el entrenamiento.
+            image_cache: Caché de imágenes de train (para medir en las mismas
+                         condiciones que el entrenamiento real).
+            warmup_iters: Iteraciones iniciales que no se cronometran.
+            timed_iters: Iteraciones cronometradas por combinación.
+        """
+        if not YOLO_AVAILABLE:
+            raise ImportError(
+                "ultralytics no está instalado. "
+                "Ejecuta: pip install ultralytics torch torchvision"
+            )
+        
+        self.data_yaml = data_yaml
+        self.model_size = model_size
+        self.imgsz = imgsz
+        self.memory_budget_mb = memory_budget_mb
+        self.image_cache = image_cache
+        self.warmup_iters = warmup_iters
+        self.timed_iters = timed_iters
+        
+        if not PSUTIL_AVAILABLE:
+            print("⚠️ psutil no está instalado; no se podrá verificar el presupuesto de memoria.")
+            print("   Ejecuta: pip install psutil")
+    
+    def _build_dataset(self, cfg, data: Dict, batch: int):
+        """
+        Construye el dataset de train igual que DetectionTrainer.
+        
+        Conserva el mosaico para medir el mismo coste por imagen que el
+        entrenamiento real; CachedYOLODataset mantiene el buffer que necesita.
+        """
+        dataset = build_yolo_dataset(cfg, data['train'], batch, data, mode='train', stride=32)
+        if self.image_cache is not None and type(dataset).__name__ == 'YOLODataset':
+            dataset.__class__ = CachedYOLODataset
+            dataset.image_cache = self.image_cache
+        return dataset
+    
+    def _run_trial(self, model, dataset, batch: int, workers: int) -> Dict:
+        """
+        Ejecuta iteraciones de entrenamiento con una combinación.
+        
+        Args:
+            model: DetectionModel en modo entrenamiento.
+            dataset: Dataset de train.
+            batch: Tamaño del batch.
+            workers: Procesos del dataloader (0 = en el proceso principal).
+        
+        Returns:
+            Diccionario con 'batch', 'workers', 'images_per_second',
+            'memory_mb' y 'error' (cualquier excepción cuenta como fallo).
+        """
+        result = {'batch': batch, 'workers': workers, 'images_per_second': 0.0,
+                  'memory_mb': None, 'error': None}
+        
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.0, momentum=0.9)
+        baseline_mb = _process_memory_mb() if PSUTIL_AVAILABLE else 0.0
+        peak_mb = baseline_mb
+        loader = None
+        
+        try:
+            loader = build_dataloader(dataset, batch, workers, shuffle=True)
+            iterator = iter(loader)
+            images = 0
+            start = None
+            
+            for step in range(self.warmup_iters + self.timed_iters):
+                if step == self.warmup_iters:
+                    start = time.perf_counter()
+                    images = 0
+                
+                try:
+                    batch_data = next(iterator)
+                except StopIteration:
+                    iterator = iter(loader)
+                    batch_data = next(iterator)
+                
+                batch_data['img'] = batch_data['img'].float() / 255
+                loss, _ = model.loss(batch_data)
+                
+                # Las activaciones guardadas están en su máximo justo antes de backward
+                if PSUTIL_AVAILABLE:
+                    peak_mb = max(peak_mb, _process_memory_mb())
+                
+                loss.sum().backward()
+                optimizer.step()
+                optimizer.zero_grad()
+                images += batch_data['img'].shape[0]
+            
+            elapsed = time.perf_counter() - start
+            result['images_per_second'] = images / elapsed if elapsed > 0 else 0.0
+        
+        except Exception as e:
+            # Cualquier fallo (memoria, workers que mueren, datos) descarta la combinación
+            result['error'] = f"{type(e).__name__}: {str(e).splitlines()[0]}" if str(e) else type(e).__name__
+        
+        finally:
+            # Cerrar los workers antes de la siguiente prueba
+            del loader
+            optimizer.zero_grad(set_to_none=True)
+        
+        if PSUTIL_AVAILABLE:
+            result['memory_mb'] = peak_mb
+            if peak_mb > self.memory_budget_mb and result['error'] is None:
+                result['error'] = f"supera el presupuesto de memoria ({peak_mb:.0f} MB)"
+        
+        return result
+    
+    def run(self,
+            batch_sizes: Optional[List[int]] = None,
+            worker_counts: Optional[List[int]] = None) -> Dict:
+        """
+        Prueba las combinaciones y devuelve la más rápida.
+        
+        Para cada número de workers se prueban los batch de menor a mayor y
+        se deja de aumentar en cuanto uno falla o supera el presupuesto.
+        
+        Args:
+            batch_sizes: Tamaños de batch a probar.
+            worker_counts: Números de workers a probar (se limitan a las CPUs).
+        
+        Returns:
+            Diccionario con 'batch', 'workers', 'images_per_second' y
+            'trials' (todas las pruebas).
+        """
+        batch_sizes = sorted(batch_sizes or DEFAULT_BATCH_SIZES)
+        cpu_count = os.cpu_count() or 1
+        worker_counts = sorted({w for w in (worker_counts or DEFAULT_WORKER_COUNTS) if w <= cpu_count})
+        
+        print(f"\n⚙️ Autoajustando batch y workers (YOLOv8{self.model_size}, {self.imgsz}px, "
+              f"máx. {self.memory_budget_mb:.0f} MB)...")
+        
+        data = check_det_dataset(self.data_yaml)
+        cfg = get_cfg(DEFAULT_CFG, {'imgsz': self.imgsz, 'cache': False, 'plots': False})
+        
+        # Mismo modelo que se entrenará (la arquitectura basta: los pesos no afectan la velocidad)
+        model = DetectionModel(f'yolov8{self.model_size}.yaml', nc=data['nc'], verbose=False)
+        model.args = cfg
+        model.train()
+        
+        dataset = self._build_dataset(cfg, data, max(batch_sizes))
+        
+        trials = []
+        for workers in worker_counts:
+            for batch in batch_sizes:
+                # No tiene sentido un batch mayor que el dataset
+                if batch > len(dataset) and batch != batch_sizes[0]:
+                    break
+                
+                trial = self._run_trial(model, dataset, batch, workers)
+                trials.append(trial)
+                
+                memory_text = f", {trial['memory_mb']:.0f} MB" if trial['memory_mb'] is not None else ""
+                if trial['error']:
+                    print(f"   batch={batch:>3} workers={workers}: ❌ {trial['error']}")
+                    break
+                print(f"   batch={batch:>3} workers={workers}: "
+                      f"{trial['images_per_second']:.2f} img/s{memory_text}")
+        
+        valid = [t for t in trials if t['error'] is None]
+        if not valid:
+            raise RuntimeError(
+                "Ninguna combinación de batch/workers cabe en el presupuesto de memoria. "
+                "Reduce el tamaño de imagen o aumenta el presupuesto."
+            )
+        
+        best = max(valid, key=lambda t: t['images_per_second'])
+        print(f"   ✅ Elegido: batch={best['batch']}, workers={best['workers']} "
+              f"({best['images_per_second']:.2f} img/s)")
+        
+        return {
+            'batch': best['batch'],
+            'workers': best['workers'],
+            'images_per_second': best['images_per_second'],
+            'memory_budget_mb': self.memory_budget_mb,
+            'imgsz': self.imgsz,
+            'model_size': self.model_size,
+            'cpu_count': cpu_count,
+            'trials': trials,
+        }
+
+
+def autotune_training(data_yaml: str,
+                      results_path: Path,
+                      model_size: str = 'n',
+                      imgsz: int = 320,
+                      memory_budget_mb: float = 4096,
+                      image_cache: Optional[TrainingImageCache] = None,
+                      train_images_dir: Optional[Path] = None,
+                      force: bool = False) -> Dict:
+    """
+    Obtiene la mejor combinación batch/workers, reutilizando resultados previos.
+    
+    Args:
+        data_yaml: Ruta al archivo data.yaml.
+        results_path: Archivo JSON donde se guardan los resultados por clave.
+        model_size: Tamaño del modelo.
+        imgsz: Tamaño de imagen.
+        memory_budget_mb: Presupuesto de memoria en MB.
+        image_cache: Caché de imágenes de train (opcional).
+        train_images_dir: Carpeta de imágenes de train (para la clave).
+        force: Si True, repite las pruebas aunque haya un resultado guardado.
+    
+    Returns:
+        Resultado de BatchAutotuner.run (con 'reused' indicando si se reutilizó).
+    """
+    results_path = Path(results_path)
+    num_images = len(list_images(train_images_dir)) if train_images_dir else 0
+    key = autotune_key(model_size, imgsz, num_images, memory_budget_mb)
+    
+    saved = {}
+    if results_path.exists():
+        try:
+            with open(results_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+    
+    if not force and key in saved:
+        result = dict(saved[key], reused=True)
+        print(f"\n⚙️ Autoajuste reutilizado: batch={result['batch']}, workers={result['workers']} "
+              f"({result['images_per_second']:.2f} img/s)")
+        return result
+    
+    tuner = BatchAutotuner(data_yaml, model_size, imgsz, memory_budget_mb, image_cache)
+    result = tuner.run()
+    result['tuned_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    
+    saved[key] = result
+    tmp_path = results_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp_path, results_path)
+    
+    return dict(result, reused=False)
@@ -0,0 +1,382 @@
+"""
+Módulo de caché de imágenes de entrenamiento preprocesadas.
+
+Las imágenes de microscopio suelen medir varios megapíxeles, pero YOLO se
+entrena con imgsz=320. Sin caché, cada época vuelve a decodificar cada
+imagen a tamaño completo solo para reducirla. Este módulo decodifica y
+redimensiona cada imagen una única vez y guarda el resultado en un
+fragmento NPY (``images_<imgsz>.npy``) que se abre con memoria mapeada,
+de modo que los procesos del dataloader comparten las páginas del sistema
+operativo en lugar de copiar datos.
+
+Cada imagen ocupa una celda de imgsz×imgsz: se redimensiona manteniendo la
+proporción (lado mayor = imgsz, igual que ultralytics) y se coloca en la
+esquina superior izquierda; el resto de la celda queda como relleno. Así
+las etiquetas YOLO normalizadas siguen siendo válidas sin modificarlas.
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import YOLODataset, build_dataloader, build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+    from ultralytics.models.yolo.detect import DetectionTrainer
+    from ultralytics.utils import DEFAULT_CFG
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO_AVAILABLE = False
+
+
+def resize_keep_ratio(image: np.ndarray, imgsz: int) -> np.ndarray:
+    """
+    Redimensiona una imagen para que su lado mayor mida imgsz.
+    
+    Args:
+        image: Imagen BGR.
+        imgsz: Tamaño objetivo del lado mayor.
+    
+    Returns:
+        Imagen redimensionada (o la original si ya mide imgsz).
+    """
+    h0, w0 = image.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r == 1:
+        return image
+    w = min(math.ceil(w0 * r), imgsz)
+    h = min(math.ceil(h0 * r), imgsz)
+    interpolation = cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR
+    return cv2.resize(image, (w, h), interpolation=interpolation)
+
+
+class TrainingImageCache:
+    """Caché de imágenes redimensionadas en un fragmento NPY con memoria mapeada."""
+    
+    def __init__(self,
+                 cache_dir: str,
+                 imgsz: int = 320,
+                 mode: str = 'disk'):
+        """
+        Inicializa la caché.
+        
+        Args:
+            cache_dir: Carpeta donde se guardan el fragmento y su índice.
+            imgsz: Tamaño de entrenamiento (lado de cada celda).
+            mode: 'disk' (memoria mapeada, la RAM la gestiona el sistema
+                  operativo) o 'ram' (el fragmento se carga completo en memoria).
+        """
+        if mode not in ('disk', 'ram'):
+            raise ValueError(f"Modo de caché no válido: {mode} (usa 'disk' o 'ram')")
+        
+        self.cache_dir = Path(cache_dir)
+        self.imgsz = imgsz
+        self.mode = mode
+        self.shard_path = self.cache_dir / f"images_{imgsz}.npy"
+        self.index_path = self.cache_dir / f"index_{imgsz}.json"
+        
+        self._index: Dict[str, Dict] = {}
+        # Imágenes que no se pudieron decodificar (firma), para no reconstruir por ellas
+        self._failed: Dict[str, Dict] = {}
+        self._shard: Optional[np.ndarray] = None
+        
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+    
+    def __getstate__(self):
+        """Al enviarse a otro proceso no se copia el fragmento (se reabre allí)."""
+        state = self.__dict__.copy()
+        state['_shard'] = None
+        return state
+    
+    @staticmethod
+    def _key(image_path) -> str:
+        """Clave normalizada de una imagen."""
+        return os.path.normcase(os.path.abspath(str(image_path)))
+    
+    @staticmethod
+    def _signature(image_path: Path) -> Tuple[int, float]:
+        """Tamaño y fecha de modificación de una imagen."""
+        stat = Path(image_path).stat()
+        return stat.st_size, stat.st_mtime
+    
+    def _load_index(self):
+        """Carga el índice si existe y corresponde a un fragmento válido."""
+        if not (self.index_path.exists() and self.shard_path.exists()):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self._index = saved['images']
+            self._failed = saved.get('failed', {})
+        except (OSError, ValueError, KeyError):
+            self._index = {}
+            self._failed = {}
+    
+    def _open_shard(self) -> np.ndarray:
+        """Abre el fragmento (una vez por proceso)."""
+        if self._shard is None:
+            if self.mode == 'ram':
+                self._shard = np.load(self.shard_path)
+            else:
+                self._shard = np.load(self.shard_path, mmap_mode='r')
+        return self._shard
+    
+    def slot_bytes(self) -> int:
+        """Bytes que ocupa cada imagen en el fragmento."""
+        return self.imgsz * self.imgsz * 3
+    
+    def is_current(self, image_paths: List[Path]) -> bool:
+        """
+        Indica si la caché contiene exactamente estas imágenes sin cambios.
+        
+        Las imágenes que no se pudieron decodificar al construirla cuentan
+        como vigentes mientras no cambien en disco.
+        
+        Args:
+            image_paths: Imágenes del dataset.
+        
+        Returns:
+            True si no hace falta reconstruir la caché.
+        """
+        if not self._index or len(self._index) + len(self._failed) != len(image_paths):
+            return False
+        for path in image_paths:
+            key = self._key(path)
+            entry = self._index.get(key) or self._failed.get(key)
+            if entry is None:
+                return False
+            size, mtime = self._signature(path)
+            if entry['size'] != size or entry['mtime'] != mtime:
+                return False
+        return True
+    
+    def build(self,
+              image_paths: List[Path],
+              budget_mb: Optional[float] = None,
+              workers: Optional[int] = None) -> Dict:
+        """
+        Construye (o reutiliza) la caché para un conjunto de imágenes.
+        
+        Args:
+            image_paths: Imágenes a cachear.
+            budget_mb: Tamaño máximo del fragmento en MB. Las imágenes que
+                       no quepan se siguen leyendo desde disco. None = sin límite.
+            workers: Hilos para decodificar (None = número de CPUs).
+        
+        Returns:
+            Diccionario con 'cached', 'total', 'size_mb', 'seconds' y 'reused'.
+        """
+        start = time.perf_counter()
+        image_paths = sorted(Path(p) for p in image_paths)
+        
+        # Respetar el presupuesto de memoria/disco
+        max_images = len(image_paths)
+        if budget_mb is not None:
+            max_images = min(max_images, int(budget_mb * 1024 * 1024 // self.slot_bytes()))
+        selected = image_paths[:max_images]
+        
+        if selected and self.is_current(selected):
+            return {
+                'cached': len(self._index),
+                'total': len(image_paths),
+                'size_mb': self.shard_path.stat().st_size / (1024 * 1024),
+                'seconds': time.perf_counter() - start,
+                'reused': True,
+            }
+        
+        self._shard = None
+        self._index = {}
+        self._failed = {}
+        if not selected:
+            return {'cached': 0, 'total': len(image_paths), 'size_mb': 0.0,
+                    'seconds': time.perf_counter() - start, 'reused': False}
+        
+        tmp_path = self.shard_path.with_name(self.shard_path.stem + '_tmp.npy')
+        shard = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.uint8,
+            shape=(len(selected), self.imgsz, self.imgsz, 3)
+        )
+        
+        def process(slot_and_path):
+            slot, path = slot_and_path
+            image = cv2.imread(str(path))
+            size, mtime = self._signature(path)
+            if image is None:
+                return self._key(path), {'size': size, 'mtime': mtime}
+            h0, w0 = image.shape[:2]
+            resized = resize_keep_ratio(image, self.imgsz)
+            h, w = resized.shape[:2]
+            shard[slot, :h, :w] = resized
+            return self._key(path), {
+                'slot': slot, 'h': h, 'w': w, 'h0': h0, 'w0': w0,
+                'size': size, 'mtime': mtime
+            }
+        
+        # cv2 libera el GIL al decodificar y redimensionar: los hilos escalan
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            for key, entry in executor.map(process, enumerate(selected)):
+                if 'slot' in entry:
+                    self._index[key] = entry
+                else:
+                    self._failed[key] = entry
+        
+        shard.flush()
+        del shard
+        os.replace(tmp_path, self.shard_path)
+        
+        tmp_index = self.index_path.with_suffix('.tmp')
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump({'imgsz': self.imgsz, 'images': self._index, 'failed': self._failed}, f)
+        os.replace(tmp_index, self.index_path)
+        
+        return {
+            'cached': len(self._index),
+            'total': len(image_paths),
+            'size_mb': self.shard_path.stat().st_size / (1024 * 1024),
+            'seconds': time.perf_counter() - start,
+            'reused': False,
+        }
+    
+    def load(self, image_path) -> Optional[Tuple[np.ndarray, Tuple[int, int], Tuple[int, int]]]:
+        """
+        Obtiene una imagen de la caché con la misma firma que ultralytics.
+        
+        Args:
+            image_path: Ruta de la imagen original.
+        
+        Returns:
+            Tupla (imagen, (alto, ancho) original, (alto, ancho) redimensionado),
+            o None si la imagen no está en la caché.
+        """
+        entry = self._index.get(self._key(image_path))
+        if entry is None:
+            return None
+        
+        h, w = entry['h'], entry['w']
+        # Copia: las aumentaciones de ultralytics modifican la imagen en el sitio
+        image = np.array(self._open_shard()[entry['slot'], :h, :w])
+        return image, (entry['h0'], entry['w0']), (h, w)
+
+
+if YOLO_AVAILABLE:
+    class CachedYOLODataset(YOLODataset):
+        """
+        YOLODataset que sirve las imágenes desde TrainingImageCache.
+        
+        Se define a nivel de módulo para que el dataset pueda enviarse a los
+        procesos del dataloader (pickle) en Windows.
+        """
+        
+        image_cache: Optional[TrainingImageCache] = None
+        
+        def load_image(self, i, rect_mode=True):
+            # Ya en el buffer de aumentación (o sin caché): lo resuelve la clase base
+            if self.image_cache is None or self.ims[i] is not None:
+                return super().load_image(i, rect_mode)
+            
+            cached = self.image_cache.load(self.im_files[i])
+            if cached is None:
+                return super().load_image(i, rect_mode)
+            
+            image, hw0, hw = cached
+            # Misma contabilidad que BaseDataset.load_image: Mosaic elige sus
+            # imágenes adicionales del buffer, que no puede quedar vacío
+            if self.augment:
+                self.ims[i], self.im_hw0[i], self.im_hw[i] = image, hw0, hw
+                self.buffer.append(i)
+                if 1 < len(self.buffer) >= self.max_buffer_length:
+                    j = self.buffer.pop(0)
+                    if self.cache != "ram":
+                        self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+            return image, hw0, hw
+
+
+def make_cached_trainer(caches: Dict[str, TrainingImageCache]):
+    """
+    Crea un DetectionTrainer de ultralytics que lee las imágenes desde la caché.
+    
+    Args:
+        caches: Diccionario {carpeta de imágenes: caché} (train y val).
+        
+    Returns:
+        Clase de trainer para pasar a YOLO.train(trainer=...).
+    """
+    cache_by_dir = {os.path.normcase(os.path.abspath(str(d))): c for d, c in caches.items()}
+    
+    class CachedDetectionTrainer(DetectionTrainer):
+        """DetectionTrainer cuyos datasets leen desde TrainingImageCache."""
+        
+        def build_dataset(self, img_path, mode="train", batch=None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            cache = cache_by_dir.get(os.path.normcase(os.path.abspath(str(img_path))))
+            if cache is not None and cache.imgsz == dataset.imgsz and type(dataset) is YOLODataset:
+                dataset.__class__ = CachedYOLODataset
+                dataset.image_cache = cache
+            return dataset
+    
+    return CachedDetectionTrainer
+
+
+def compare_dataloader_time(data_yaml: str,
+                            cache: TrainingImageCache,
+                            batch: int = 8,
+                            max_batches: Optional[int] = 8) -> Dict[str, float]:
+    """
+    Mide una pasada del dataloader de entrenamiento con y sin caché.
+    
+    Se recorre el dataloader real de ultralytics (lectura, mosaico y demás
+    aumentaciones, letterbox y collate) en el proceso principal, que es lo
+    que paga cada época, y no solo la lectura de las imágenes.
+    
+    Args:
+        data_yaml: Ruta al archivo data.yaml del dataset.
+        cache: Caché de las imágenes de train.
+        batch: Tamaño del batch.
+        max_batches: Batches a recorrer en cada pasada (None = época completa).
+    
+    Returns:
+        Diccionario con 'decode_seconds', 'cache_seconds', 'speedup' e
+        'images' (imágenes recorridas en cada pasada).
+    """
+    if not YOLO_AVAILABLE:
+        raise ImportError(
+            "ultralytics no está instalado. "
+            "Ejecuta: pip install ultralytics torch torchvision"
+        )
+    
+    data = check_det_dataset(data_yaml)
+    cfg = get_cfg(DEFAULT_CFG, {'imgsz': cache.imgsz, 'cache': False, 'plots': False})
+    
+    timings = {}
+    images = 0
+    for label, use_cache in (('decode_seconds', False), ('cache_seconds', True)):
+        dataset = build_yolo_dataset(cfg, data['train'], batch, data, mode='train', stride=32)
+        if use_cache and type(dataset) is YOLODataset:
+            dataset.__class__ = CachedYOLODataset
+            dataset.image_cache = cache
+        loader = build_dataloader(dataset, batch, 0, shuffle=False)
+        
+        images = 0
+        start = time.perf_counter()
+        for step, batch_data in enumerate(loader):
+            images += batch_data['img'].shape[0]
+            if max_batches is not None and step + 1 >= max_batches:
+                break
+        timings[label] = time.perf_counter() - start
+    
+    return {
+        'decode_seconds': timings['decode_seconds'],
+        'cache_seconds': timings['cache_seconds'],
+        'speedup': (timings['decode_seconds'] / timings['cache_seconds']
+                    if timings['cache_seconds'] > 0 else float('inf')),
+        'images': images,
+    }
@@ -0,0 +1,517 @@
+"""
+Módulo de búsqueda de hiperparámetros (sweep) para YOLOv8.
+
+Ejecuta varios entrenamientos ("trials") con distintas combinaciones de
+tamaño de modelo, tamaño de imagen, épocas y aumentaciones, en búsqueda
+en rejilla (grid) o aleatoria (random). Cuando hay núcleos suficientes los
+trials se ejecutan en paralelo, cada uno en su propio proceso fijado
+(afinidad de CPU) a un grupo de núcleos distinto para que no compitan
+entre sí. Los trials que van claramente peor que el resto se detienen
+antes de tiempo (regla de la mediana).
+
+Al terminar se mide la latencia de inferencia de cada modelo y se genera
+una tabla comparativa (mAP vs. latencia) marcando el frente de Pareto:
+los modelos para los que no existe otro más preciso y a la vez más rápido.
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.image_files import list_images
+
+
+# Parámetros que train_model recibe directamente; el resto se pasa como override
+TRAIN_MODEL_PARAMS = {'model_size', 'imgsz', 'epochs', 'batch'}
+
+# Espacio de búsqueda por defecto
+DEFAULT_SEARCH_SPACE = {
+    'model_size': ['n', 's'],
+    'imgsz': [320, 416],
+    'epochs': [30],
+    'fliplr': [0.5],
+    'degrees': [0.0, 15.0],
+}
+
+
+def build_trials(search_space: Dict[str, List],
+                 mode: str = 'grid',
+                 num_trials: Optional[int] = None,
+                 seed: int = 0) -> List[Dict]:
+    """
+    Genera las combinaciones de hiperparámetros a probar.
+    
+    Args:
+        search_space: Diccionario {parámetro: lista de valores}.
+        mode: 'grid' (todas las combinaciones) o 'random' (muestreo sin repetición).
+        num_trials: Máximo de trials (obligatorio en modo 'random').
+        seed: Semilla del muestreo aleatorio.
+    
+    Returns:
+        Lista de diccionarios {'trial_id', 'params'}.
+    """
+    keys = sorted(search_space)
+    combinations = [dict(zip(keys, values))
+                    for values in itertools.product(*(search_space[k] for k in keys))]
+    
+    if mode == 'random':
+        if not num_trials:
+            raise ValueError("El modo 'random' requiere num_trials")
+        combinations = random.Random(seed).sample(combinations, min(num_trials, len(combinations)))
+    elif mode != 'grid':
+        raise ValueError(f"Modo de búsqueda no válido: {mode} (usa 'grid' o 'random')")
+    elif num_trials:
+        combinations = combinations[:num_trials]
+    
+    return [{'trial_id': f"trial_{i:03d}", 'params': params}
+            for i, params in enumerate(combinations, 1)]
+
+
+def should_stop_early(trial_id: str,
+                      history: Dict[str, List[float]],
+                      grace_epochs: int = 5,
+                      min_trials: int = 3) -> bool:
+    """
+    Regla de la mediana: detiene un trial si va peor que la mediana del resto.
+    
+    Args:
+        trial_id: Trial a evaluar.
+        history: {trial_id: [mAP50 por época]} de todos los trials.
+        grace_epochs: Épocas mínimas antes de poder detener un trial.
+        min_trials: Trials con la misma época necesarios para comparar.
+    
+    Returns:
+        True si el mejor mAP50 del trial hasta ahora es menor que la
+        mediana de los mejores mAP50 de los demás en la misma época.
+    """
+    own = history.get(trial_id, [])
+    epoch = len(own)
+    if epoch < grace_epochs:
+        return False
+    
+    others = [max(values[:epoch]) for other_id, values in history.items()
+              if other_id != trial_id and len(values) >= epoch]
+    if len(others) < min_trials - 1:
+        return False
+    
+    return max(own) < statistics.median(others)
+
+
+def pareto_front(rows: List[Dict],
+                 quality: str = 'map50_95',
+                 cost: str = 'latency_ms') -> List[str]:
+    """
+    Obtiene los trials del frente de Pareto (más calidad, menos coste).
+    
+    Args:
+        rows: Resultados de los trials (con 'trial_id', quality y cost).
+        quality: Métrica a maximizar.
+        cost: Métrica a minimizar.
+    
+    Returns:
+        Lista de trial_id no dominados.
+    """
+    valid = [r for r in rows if r.get(quality) is not None and r.get(cost) is not None]
+    front = []
+    for row in valid:
+        dominated = any(
+            other[quality] >= row[quality] and other[cost] <= row[cost]
+            and (other[quality] > row[quality] or other[cost] < row[cost])
+            for other in valid
+        )
+        if not dominated:
+            front.append(row['trial_id'])
+    return front
+
+
+def pin_to_cores(cores: List[int]) -> bool:
+    """
+    Fija el proceso actual (y los que cree después) a un grupo de núcleos.
+    
+    Args:
+        cores: Índices de CPU.
+    
+    Returns:
+        True si se pudo aplicar la afinidad.
+    """
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+            return True
+        if PSUTIL_AVAILABLE:
+            psutil.Process().cpu_affinity(list(cores))
+            return True
+    except (OSError, ValueError):
+        pass
+    return False
+
+
+def run_trial(trial: Dict, cores: List[int], config: Dict, history) -> Dict:
+    """
+    Ejecuta un trial de entrenamiento (en un proceso independiente).
+    
+    Args:
+        trial: Diccionario {'trial_id', 'params'}.
+        cores: Núcleos asignados al trial.
+        config: Configuración común del sweep (rutas, proyecto, data.yaml,
+                cachés de imágenes por imgsz...).
+        history: Diccionario compartido {trial_id: [mAP50 por época]}.
+    
+    Returns:
+        Resultado del trial con métricas, modelo y estado.
+    """
+    trial_id = trial['trial_id']
+    params = dict(trial['params'])
+    pinned = pin_to_cores(cores)
+    
+    import torch
+    torch.set_num_threads(len(cores))
+    
+    from src.train_yolo import YOLOTrainer
+    
+    result = {
+        'trial_id': trial_id,
+        'params': params,
+        'cores': list(cores),
+        'pinned': pinned,
+        'status': 'ok',
+        'epochs_run': 0,
+        'map50': None,
+        'map50_95': None,
+        'model_path': None,
+        'train_seconds': None,
+        'error': None,
+    }
+    stopped = {'early': False}
+    
+    def on_epoch(metrics):
+        result['epochs_run'] = metrics['epoch']
+        if metrics['map50'] is not None:
+            result['map50'] = max(result['map50'] or 0.0, metrics['map50'])
+        if metrics['map50_95'] is not None:
+            result['map50_95'] = max(result['map50_95'] or 0.0, metrics['map50_95'])
+        
+        history[trial_id] = list(history.get(trial_id, [])) + [metrics['map50'] or 0.0]
+        if should_stop_early(trial_id, dict(history), config['grace_epochs']):
+            stopped['early'] = True
+            return True
+        return False
+    
+    start = time.perf_counter()
+    try:
+        trainer = YOLOTrainer(config['annotations_dir'], config['images_dir'], config['output_dir'])
+        overrides = {k: v for k, v in params.items() if k not in TRAIN_MODEL_PARAMS}
+        imgsz = params.get('imgsz', 320)
+        best_model, _ = trainer.train_model(
+            data_yaml=config['data_yaml'],
+            model_size=params.get('model_size', 'n'),
+            epochs=params.get('epochs', 30),
+            imgsz=imgsz,
+            batch=params.get('batch', config['batch']),
+            device='cpu',
+            patience=config['patience'],
+            project_name=config['project_name'],
+            name=trial_id,
+            image_cache=config['image_cache'],
+            image_caches=config['image_caches'].get(imgsz),
+            workers=config['workers'],
+            epoch_callback=on_epoch,
+            overrides=overrides
+        )
+        result['model_path'] = best_model
+        if stopped['early']:
+            result['status'] = 'detenido'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    
+    result['train_seconds'] = time.perf_counter() - start
+    return result
+
+
+def measure_latency(model_path: str,
+                    image_paths: List[Path],
+                    imgsz: int,
+                    warmup: int = 2,
+                    max_images: int = 20) -> Optional[float]:
+    """
+    Mide la latencia mediana de inferencia (ms por imagen) en CPU.
+    
+    Args:
+        model_path: Ruta al modelo (.pt).
+        image_paths: Imágenes de validación.
+        imgsz: Tamaño de inferencia.
+        warmup: Inferencias iniciales que no se cronometran.
+        max_images: Máximo de imágenes cronometradas.
+    
+    Returns:
+        Latencia mediana en milisegundos, o None si no hay imágenes.
+    """
+    from ultralytics import YOLO
+    
+    images = [str(p) for p in image_paths[:max_images]]
+    if not images:
+        return None
+    
+    model = YOLO(model_path)
+    for path in images[:warmup]:
+        model.predict(path, imgsz=imgsz, device='cpu', verbose=False)
+    
+    timings = []
+    for path in images:
+        start = time.perf_counter()
+        model.predict(path, imgsz=imgsz, device='cpu', verbose=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    
+    return statistics.median(timings)
+
+
+class SweepRunner:
+    """Ejecuta un sweep de hiperparámetros sobre YOLOTrainer."""
+    
+    def __init__(self,
+                 annotations_dir: str,
+                 images_dir: str,
+                 output_dir: str = "yolo_training",
+                 cores_per_trial: int = 4,
+                 max_parallel: Optional[int] = None):
+        """
+        Inicializa el sweep.
+        
+        Args:
+            annotations_dir: Directorio con archivos XML de LabelImg.
+            images_dir: Directorio con imágenes correspondientes.
+            output_dir: Directorio de entrenamiento YOLO.
+            cores_per_trial: Núcleos asignados a cada trial.
+            max_parallel: Máximo de trials simultáneos (None = núcleos / cores_per_trial).
+        """
+        self.annotations_dir = annotations_dir
+        self.images_dir = images_dir
+        self.output_dir = Path(output_dir)
+        
+        cpu_count = os.cpu_count() or 1
+        self.cores_per_trial = max(1, min(cores_per_trial, cpu_count))
+        parallel = max(1, cpu_count // self.cores_per_trial)
+        self.max_parallel = min(parallel, max_parallel) if max_parallel else parallel
+    
+    def _core_groups(self) -> List[List[int]]:
+        """Reparte los núcleos en grupos disjuntos, uno por trial simultáneo."""
+        if hasattr(os, 'sched_getaffinity'):
+            available = sorted(os.sched_getaffinity(0))
+        else:
+            available = list(range(os.cpu_count() or 1))
+        size = self.cores_per_trial
+        return [available[i * size:(i + 1) * size] for i in range(self.max_parallel)]
+    
+    def run(self,
+            search_space: Optional[Dict[str, List]] = None,
+            mode: str = 'grid',
+            num_trials: Optional[int] = None,
+            batch: int = 4,
+            workers: int = 1,
+            patience: int = 20,
+            grace_epochs: int = 5,
+            image_cache: Optional[str] = 'disk',
+            seed: int = 0) -> Dict:
+        """
+        Ejecuta el sweep completo.
+        
+        Args:
+            search_space: {parámetro: valores}. Claves de train_model
+                          (model_size, imgsz, epochs, batch) o cualquier
+                          argumento de entrenamiento de ultralytics
+                          (fliplr, degrees, mosaic, hsv_v, lr0...).
+            mode: 'grid' o 'random'.
+            num_trials: Máximo de trials.
+            batch: Batch por defecto si no está en el espacio de búsqueda.
+            workers: Procesos del dataloader por trial.
+            patience: Paciencia de early stopping de ultralytics.
+            grace_epochs: Épocas antes de aplicar la regla de la mediana.
+            image_cache: Caché de imágenes ('disk', 'ram' o None).
+            seed: Semilla del modo aleatorio.
+        
+        Returns:
+            Diccionario con 'sweep_dir', 'results' y 'pareto'.
+        """
+        from src.train_yolo import YOLOTrainer
+        
+        trials = build_trials(search_space or DEFAULT_SEARCH_SPACE, mode, num_trials, seed)
+        sweep_name = f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        sweep_dir = self.output_dir / 'sweeps' / sweep_name
+        sweep_dir.mkdir(parents=True, exist_ok=True)
+        
+        print(f"\n🔬 Sweep {sweep_name}: {len(trials)} trials ({mode}), "
+              f"{self.max_parallel} en paralelo × {self.cores_per_trial} núcleos")
+        
+        # Dataset y cachés (con su medición) se preparan una sola vez antes de
+        # lanzar los trials, que reciben las cachés ya construidas
+        trainer = YOLOTrainer(self.annotations_dir, self.images_dir, str(self.output_dir))
+        data_yaml = trainer.convert_voc_to_yolo()
+        image_caches = {}
+        if image_cache:
+            for imgsz in sorted({t['params'].get('imgsz', 320) for t in trials}):
+                trainer.prepare_image_cache(imgsz, image_cache, data_yaml=data_yaml, benchmark=True)
+                image_caches[imgsz] = dict(trainer.image_caches)
+        
+        config = {
+            'annotations_dir': self.annotations_dir,
+            'images_dir': self.images_dir,
+            'output_dir': str(self.output_dir),
+            'data_yaml': data_yaml,
+            'project_name': f"sweeps/{sweep_name}",
+            'batch': batch,
+            'workers': workers,
+            'patience': patience,
+            'grace_epochs': grace_epochs,
+            'image_cache': image_cache,
+            'image_caches': image_caches,
+        }
+        
+        free_groups = queue.Queue()
+        for group in self._core_groups():
+            free_groups.put(group)
+        
+        # spawn: cada trial arranca un intérprete limpio (igual en Windows y Linux)
+        context = multiprocessing.get_context('spawn')
+        results = []
+        
+        with context.Manager() as manager:
+            history = manager.dict()
+            
+            def launch(trial):
+                cores = free_groups.get()
+                try:
+                    print(f"   ▶️ {trial['trial_id']} en núcleos {cores}: {trial['params']}")
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        return executor.submit(run_trial, trial, cores, config, history).result()
+                finally:
+                    free_groups.put(cores)
+            
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+                for result in pool.map(launch, trials):
+                    status = {'ok': '✅', 'detenido': '⏹️', 'error': '❌'}[result['status']]
+                    print(f"   {status} {result['trial_id']}: mAP50-95={result['map50_95']} "
+                          f"({result['epochs_run']} épocas)")
+                    results.append(result)
+        
+        # Latencia medida en secuencia y con todos los núcleos (como en producción)
+        val_images = list_images(trainer.dataset_dir / 'val' / 'images')
+        print("\n⏱️ Midiendo latencia de inferencia...")
+        for result in results:
+            result['latency_ms'] = None
+            if result['model_path']:
+                result['latency_ms'] = measure_latency(
+                    result['model_path'], val_images, result['params'].get('imgsz', 320)
+                )
+        
+        pareto = pareto_front(results)
+        for result in results:
+            result['pareto'] = result['trial_id'] in pareto
+        
+        self._write_results(sweep_dir, results)
+        self.print_table(results)
+        
+        return {'sweep_dir': str(sweep_dir), 'results': results, 'pareto': pareto}
+    
+    def _write_results(self, sweep_dir: Path, results: List[Dict]):
+        """Guarda los resultados en results.json y la tabla comparativa en results.csv."""
+        with open(sweep_dir / 'results.json', 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        
+        param_keys = sorted({k for r in results for k in r['params']})
+        columns = ['trial_id', 'status', 'pareto'] + param_keys + [
+            'map50', 'map50_95', 'latency_ms', 'epochs_run', 'train_seconds', 'model_path']
+        
+        with open(sweep_dir / 'results.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for r in results:
+                row = {k: r.get(k) for k in columns if k not in param_keys}
+                row.update({k: r['params'].get(k) for k in param_keys})
+                writer.writerow(row)
+        
+        print(f"\n💾 Resultados guardados en: {sweep_dir}")
+    
+    @staticmethod
+    def print_table(results: List[Dict]):
+        """Imprime la tabla comparativa ordenada por mAP50-95 (★ = frente de Pareto)."""
+        def fmt(value, digits):
+            return "-" if value is None else f"{value:.{digits}f}"
+        
+        print(f"\n{'':2}{'trial':<11}{'params':<50}{'mAP50':>8}{'mAP50-95':>10}{'ms/img':>9}")
+        ordered = sorted(results, key=lambda r: r['map50_95'] or 0.0, reverse=True)
+        for r in ordered:
+            params = ", ".join(f"{k}={v}" for k, v in sorted(r['params'].items()))
+            print(f"{'★' if r.get('pareto') else ' ':2}{r['trial_id']:<11}{params[:49]:<50}"
+                  f"{fmt(r['map50'], 3):>8}{fmt(r['map50_95'], 3):>10}{fmt(r.get('latency_ms'), 1):>9}")
+
+
+def main():
+    """Función principal para ejecutar un sweep desde la línea de comandos."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Búsqueda de hiperparámetros para YOLOv8'
+    )
+    parser.add_argument('--annotations', type=str, default='data/raw_images',
+                        help='Directorio con archivos XML de LabelImg')
+    parser.add_argument('--images', type=str, default='data/raw_images',
+                        help='Directorio con imágenes')
+    parser.add_argument('--output', type=str, default='yolo_training',
+                        help='Directorio de salida')
+    parser.add_argument('--space', type=str, default=None,
+                        help='Archivo JSON con el espacio de búsqueda {parámetro: [valores]}')
+    parser.add_argument('--mode', type=str, default='grid', choices=['grid', 'random'],
+                        help='Tipo de búsqueda')
+    parser.add_argument('--trials', type=int, default=None,
+                        help='Máximo de trials')
+    parser.add_argument('--cores-per-trial', type=int, default=4,
+                        help='Núcleos asignados a cada trial')
+    parser.add_argument('--max-parallel', type=int, default=None,
+                        help='Máximo de trials simultáneos')
+    parser.add_argument('--grace-epochs', type=int, default=5,
+                        help='Épocas antes de poder detener un trial que va peor que la mediana')
+    
+    args = parser.parse_args()
+    
+    search_space = None
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            search_space = json.load(f)
+    
+    runner = SweepRunner(
+        annotations_dir=args.annotations,
+        images_dir=args.images,
+        output_dir=args.output,
+        cores_per_trial=args.cores_per_trial,
+        max_parallel=args.max_parallel
+    )
+    runner.run(
+        search_space=search_space,
+        mode=args.mode,
+        num_trials=args.trials,
+        grace_epochs=args.grace_epochs
+    )
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -6,12 +6,26 @@ al formato YOLO y entrena un modelo personalizado de YOLOv8.
 """
 
 import os
+import sys
+import re
+import csv
+import json
+import time
+import hashlib
 import yaml
-import shutil
-import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import List, Dict, Tuple
-import random
+from typing import Callable, List, Dict, Tuple, Optional
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.voc_conversion import link_or_copy
+from src.annotation_index import STATUS_PRELABEL, read_annotation_status
+from src.annotation_store import AnnotationStore
+from src.duplicate_index import ImageHashIndex
+from src.image_files import list_images
+from src.train_cache import TrainingImageCache, compare_dataloader_time, make_cached_trainer
+from src.train_autotune import autotune_training
+from src.model_benchmark import EXPORT_FORMATS, export_and_benchmark
+from src.model_registry import ModelRegistry, read_run_metrics
 
 try:
     from ultralytics import YOLO
@@ -34,6 +48,10 @@ class YOLOTrainer:
         'aglomerado'
     ]
     
+    # Versión del formato de dataset/manifest.json
+    # 2: las pre-anotaciones sin revisar ya no se convierten
+    MANIFEST_VERSION = 2
+    
     def __init__(self,
                  annotations_dir: str,
                  images_dir: str,
@@ -63,8 +81,14 @@ class YOLOTrainer:
         self.dataset_dir.mkdir(parents=True, exist_ok=True)
         self.models_dir.mkdir(parents=True, exist_ok=True)
         
+        # Manifiesto de la conversión incremental
+        self.manifest_path = self.dataset_dir / "manifest.json"
+        
         # Almacenar información sobre splits
         self.has_test_split = False
+        
+        # Cachés de imágenes por carpeta (las llena prepare_image_cache)
+        self.image_caches: Dict[Path, TrainingImageCache] = {}
     
     def _get_next_training_number(self, project_name: str) -> int:
         """
@@ -81,7 +105,6 @@ class YOLOTrainer:
             return 1
         
         # Buscar carpetas que sigan el patrón yolov8_N
-        import re
         max_num = 0
         for folder in project_dir.iterdir():
             if folder.is_dir():
@@ -92,16 +115,229 @@ class YOLOTrainer:
         
         return max_num + 1
     
+    def _load_manifest(self) -> Dict:
+        """
+        Carga el manifiesto de la última conversión del dataset.
+        
+        Returns:
+            Diccionario con 'version' y 'entries' (vacío si no existe o es inválido).
+        """
+        if not self.manifest_path.exists():
+            return {'version': self.MANIFEST_VERSION, 'entries': {}}
+        
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {'version': self.MANIFEST_VERSION, 'entries': {}}
+        
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            return {'version': self.MANIFEST_VERSION, 'entries': {}}
+        
+        return manifest
+    
+    def _save_manifest(self, entries: Dict):
+        """
+        Guarda el manifiesto del dataset de forma atómica.
+        
+        Args:
+            entries: Entradas por nombre de anotación (sin extensión).
+        """
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.MANIFEST_VERSION, 'entries': entries}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+    
+    @staticmethod
+    def _file_hash(file_path: Path) -> str:
+        """Calcula el SHA-1 del contenido de un archivo."""
+        with open(file_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    
+    @staticmethod
+    def _split_fraction(key: str) -> float:
+        """Posición estable en [0, 1) de una anotación, derivada de su nombre."""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return int(digest[:15], 16) / float(16 ** 15)
+    
+    def _assign_splits(self,
+                       keys: List[str],
+                       train_split: float,
+                       val_split: float,
+                       groups: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Asigna cada anotación a un split de forma determinista.
+        
+        La asignación depende solo del hash del nombre, así que una
+        imagen permanece en el mismo split entre ejecuciones aunque se
+        agreguen o eliminen otras. Las imágenes casi duplicadas usan el
+        nombre de su grupo, de modo que todas caen en el mismo split.
+        
+        Única excepción: si por hash train o val quedan vacíos (solo pasa
+        con muy pocos grupos), se mueve el grupo más cercano a ese split
+        (ver _fill_empty_split). Esa corrección sí depende de los demás
+        grupos y desaparece sola en cuanto el split recibe algún grupo
+        por su hash.
+        
+        Args:
+            keys: Nombres de las anotaciones (sin extensión).
+            train_split: Proporción de datos para entrenamiento (0-1).
+            val_split: Proporción de datos para validación (0-1).
+            groups: Diccionario {nombre: nombre del grupo} de los casi
+                    duplicados (ver ImageHashIndex.split_groups).
+        
+        Returns:
+            Diccionario {nombre: 'train' | 'val' | 'test'}.
+        """
+        groups = groups or {}
+        
+        group_split = {}
+        for group in {groups.get(key, key) for key in keys}:
+            fraction = self._split_fraction(group)
+            if fraction < train_split:
+                group_split[group] = 'train'
+            elif fraction < train_split + val_split:
+                group_split[group] = 'val'
+            else:
+                group_split[group] = 'test'
+        
+        # Mínimos para datasets pequeños: train y val con al menos un grupo
+        if group_split:
+            self._fill_empty_split(group_split, 'train')
+        if len(group_split) > 1:
+            self._fill_empty_split(group_split, 'val')
+        
+        return {key: group_split[groups.get(key, key)] for key in keys}
+    
+    def _fill_empty_split(self, group_split: Dict[str, str], split: str):
+        """
+        Mueve un grupo a un split que quedó vacío por hash.
+        
+        Para train se toma el grupo de menor fracción (el más cercano a
+        la banda de train). Para val se toma el de menor fracción de test
+        o, si test está vacío, el de mayor fracción de train, sin dejar
+        train vacío.
+        
+        Args:
+            group_split: Diccionario {grupo: split}; se modifica en el sitio.
+            split: 'train' o 'val'.
+        """
+        if split in group_split.values():
+            return
+        
+        by_split = {}
+        for group, assigned in group_split.items():
+            by_split.setdefault(assigned, []).append(group)
+        
+        if split == 'train':
+            moved = min(group_split, key=self._split_fraction)
+        elif by_split.get('test'):
+            moved = min(by_split['test'], key=self._split_fraction)
+        elif len(by_split.get('train', [])) > 1:
+            moved = max(by_split['train'], key=self._split_fraction)
+        else:
+            return
+        group_split[moved] = split
+    
+    def _duplicate_groups(self, keys: List[str], workers: Optional[int] = None) -> Dict[str, str]:
+        """
+        Agrupa las anotaciones cuyas imágenes son casi duplicadas.
+        
+        Args:
+            keys: Nombres de las anotaciones (sin extensión).
+            workers: Procesos para calcular los hashes de imágenes nuevas.
+        
+        Returns:
+            Diccionario {nombre: nombre del grupo} (solo las que tienen copias).
+        """
+        index = ImageHashIndex([self.images_dir])
+        index.refresh(workers)
+        groups = index.split_groups(keys)
+        
+        if groups:
+            n_groups = len(set(groups.values()))
+            print(f"   🔁 {len(groups)} imágenes casi duplicadas en {n_groups} grupos "
+                  f"(cada grupo va completo a un mismo split)")
+        return groups
+    
+    def _entry_is_current(self, entry: Dict, split: str) -> bool:
+        """
+        Verifica que la salida registrada de una anotación siga vigente.
+        
+        Args:
+            entry: Entrada del manifiesto.
+            split: Split asignado en esta ejecución.
+        
+        Returns:
+            True si el split, la imagen de origen y los archivos de salida no cambiaron.
+        """
+        if entry.get('split') != split or not entry.get('image'):
+            return False
+        
+        image_path = self.images_dir / entry['image']
+        try:
+            stat = image_path.stat()
+        except OSError:
+            return False
+        if stat.st_size != entry.get('image_size') or stat.st_mtime != entry.get('image_mtime'):
+            return False
+        
+        split_dir = self.dataset_dir / split
+        if not (split_dir / 'images' / entry['image']).exists():
+            return False
+        if entry.get('label') and not (split_dir / 'labels' / f"{Path(entry['image']).stem}.txt").exists():
+            return False
+        
+        return True
+    
+    def _prune_stale_files(self, entries: Dict) -> int:
+        """
+        Elimina del dataset los archivos que no corresponden al manifiesto.
+        
+        Cubre anotaciones eliminadas, imágenes que cambiaron de split y
+        restos de conversiones anteriores al manifiesto.
+        
+        Args:
+            entries: Entradas vigentes del manifiesto.
+        
+        Returns:
+            Número de archivos eliminados.
+        """
+        expected = {split: {'images': set(), 'labels': set()} for split in ['train', 'val', 'test']}
+        for entry in entries.values():
+            expected[entry['split']]['images'].add(entry['image'])
+            if entry.get('label'):
+                expected[entry['split']]['labels'].add(f"{Path(entry['image']).stem}.txt")
+        
+        removed = 0
+        for split, kinds in expected.items():
+            for kind, names in kinds.items():
+                folder = self.dataset_dir / split / kind
+                with os.scandir(folder) as scan:
+                    for item in scan:
+                        if item.name not in names:
+                            os.unlink(item.path)
+                            removed += 1
+        
+        return removed
+    
     def convert_voc_to_yolo(self,
                            train_split: float = 0.8,
-                           val_split: float = 0.15) -> str:
+                           val_split: float = 0.15,
+                           workers: Optional[int] = None) -> str:
         """
         Convierte anotaciones PASCAL VOC (XML) a formato YOLO (TXT).
         
+        La conversión es incremental: un manifiesto (dataset/manifest.json)
+        registra la fecha, tamaño y hash de cada XML y la fecha y tamaño de
+        su imagen, de modo que solo se reconvierten las anotaciones nuevas o
+        modificadas. Los archivos cuya anotación se eliminó se borran.
+        
         Args:
             train_split: Proporción de datos para entrenamiento (0-1).
             val_split: Proporción de datos para validación (0-1).
-            
+            workers: Procesos para la conversión (None = número de CPUs).
+        
         Returns:
             Ruta al archivo data.yaml generado.
         """
@@ -114,7 +350,7 @@ class YOLOTrainer:
             (self.dataset_dir / split / 'labels').mkdir(parents=True, exist_ok=True)
         
         # Obtener lista de archivos XML
-        xml_files = list(self.annotations_dir.glob('*.xml'))
+        xml_files = sorted(self.annotations_dir.glob('*.xml'))
         
         if not xml_files:
             raise FileNotFoundError(
@@ -123,42 +359,78 @@ class YOLOTrainer:
         
         print(f"   Encontrados {len(xml_files)} archivos de anotaciones")
         
-        # Dividir en train/val/test
-        random.shuffle(xml_files)
-        total_files = len(xml_files)
+        # Dividir en train/val/test (determinista, por hash del nombre; los
+        # casi duplicados van juntos para que no se filtren entre splits)
+        keys = [f.stem for f in xml_files]
+        split_of = self._assign_splits(keys, train_split, val_split,
+                                       self._duplicate_groups(keys, workers))
+        
+        old_entries = self._load_manifest()['entries']
+        entries = {}
+        to_convert = {split: [] for split in splits}
+        unchanged = 0
         
-        # Ajustar splits para datasets pequeños
-        if total_files <= 10:
-            # Para datasets muy pequeños, asegurar al menos 1 imagen en val
-            n_val = max(1, int(total_files * 0.2))  # Al menos 1 para validación
-            n_test = max(0, int(total_files * 0.1))  # Puede ser 0 si es muy pequeño
-            n_train = total_files - n_val - n_test
+        for xml_file in xml_files:
+            key = xml_file.stem
+            split = split_of[key]
+            stat = xml_file.stat()
+            old = old_entries.get(key)
             
-            train_files = xml_files[:n_train]
-            val_files = xml_files[n_train:n_train + n_val]
-            test_files = xml_files[n_train + n_val:] if n_test > 0 else []
-        else:
-            # División normal para datasets más grandes
-            n_train = int(total_files * train_split)
-            n_val = int(total_files * val_split)
+            # Sin cambios: misma fecha y tamaño del XML
+            if (old and old.get('xml_size') == stat.st_size
+                    and old.get('xml_mtime') == stat.st_mtime
+                    and self._entry_is_current(old, split)):
+                entries[key] = old
+                unchanged += 1
+                continue
             
-            train_files = xml_files[:n_train]
-            val_files = xml_files[n_train:n_train + n_val]
-            test_files = xml_files[n_train + n_val:]
+            # Fecha distinta pero mismo contenido (ej. guardado sin cambios en LabelImg)
+            xml_hash = self._file_hash(xml_file)
+            if old and old.get('xml_sha1') == xml_hash and self._entry_is_current(old, split):
+                old.update({'xml_size': stat.st_size, 'xml_mtime': stat.st_mtime})
+                entries[key] = old
+                unchanged += 1
+                continue
+            
+            entries[key] = {
+                'xml_size': stat.st_size,
+                'xml_mtime': stat.st_mtime,
+                'xml_sha1': xml_hash,
+                'split': split,
+            }
+            to_convert[split].append(xml_file)
         
-        print(f"   Train: {len(train_files)}, Val: {len(val_files)}, Test: {len(test_files)}")
+        deleted = len([key for key in old_entries if key not in entries])
+        pending = sum(len(files) for files in to_convert.values())
+        print(f"   Sin cambios: {unchanged}, a convertir: {pending}, anotaciones eliminadas: {deleted}")
         
-        # Marcar si hay imágenes de test
-        self.has_test_split = len(test_files) > 0
+        # Convertir solo las anotaciones nuevas o modificadas
+        for split_name, split_files in to_convert.items():
+            if not split_files:
+                continue
+            converted = self._convert_split(split_files, split_name, workers)
+            for xml_file in split_files:
+                info = converted.get(xml_file.name)
+                if info is None:
+                    # Falló la conversión: se reintentará en la próxima ejecución
+                    entries.pop(xml_file.stem)
+                else:
+                    entries[xml_file.stem].update(info)
+        
+        # Eliminar imágenes/etiquetas huérfanas o que cambiaron de split
+        removed_files = self._prune_stale_files(entries)
+        if removed_files:
+            print(f"   🧹 Eliminados {removed_files} archivos obsoletos del dataset")
+        
+        self._save_manifest(entries)
         
-        # Convertir cada split
-        for split_name, split_files in [
-            ('train', train_files),
-            ('val', val_files),
-            ('test', test_files)
-        ]:
-            if split_files:
-                self._convert_split(split_files, split_name)
+        counts = {split: 0 for split in splits}
+        for entry in entries.values():
+            counts[entry['split']] += 1
+        print(f"   Train: {counts['train']}, Val: {counts['val']}, Test: {counts['test']}")
+        
+        # Marcar si hay imágenes de test
+        self.has_test_split = counts['test'] > 0
         
         # Crear archivo data.yaml
         data_yaml_path = self._create_data_yaml()
@@ -168,90 +440,100 @@ class YOLOTrainer:
         
         return data_yaml_path
     
-    def _convert_split(self, xml_files: List[Path], split_name: str):
+    def _convert_split(self, xml_files: List[Path], split_name: str,
+                       workers: Optional[int] = None):
         """
         Convierte un conjunto de archivos XML a formato YOLO.
         
+        Los XML se leen en un pool de procesos a un AnnotationStore y la
+        normalización a YOLO se hace sobre sus arrays; las imágenes se
+        enlazan (enlace duro o simbólico) en lugar de copiarse y las
+        etiquetas se escriben al final en una sola pasada.
+        
+        Las pre-anotaciones del modelo sin revisar se omiten: no son
+        etiquetas fiables y se reintentan cuando una persona las guarda.
+        
         Args:
             xml_files: Lista de archivos XML a convertir.
             split_name: Nombre del split ('train', 'val', 'test').
+            workers: Número de procesos (None = número de CPUs).
+            
+        Returns:
+            Diccionario {nombre del XML: datos de la imagen y etiqueta} con
+            los archivos convertidos correctamente.
         """
         images_out = self.dataset_dir / split_name / 'images'
         labels_out = self.dataset_dir / split_name / 'labels'
         
         converted = 0
         skipped = 0
+        link_modes = {}
+        labels = {}
+        outputs = {}
         
-        for xml_file in xml_files:
+        prelabels = [f for f in xml_files if read_annotation_status(f)[0] == STATUS_PRELABEL]
+        if prelabels:
+            skipped += len(prelabels)
+            print(f"   ⏭️ {split_name}: {len(prelabels)} pre-anotaciones sin revisar omitidas")
+            prelabels = set(prelabels)
+            xml_files = [f for f in xml_files if f not in prelabels]
+        
+        store = AnnotationStore.from_voc(xml_files, self.CLASS_NAMES, workers)
+        label_lines = store.yolo_label_lines()
+        
+        for image_id, image in enumerate(store.images):
+            xml_name = Path(image['source']).name
+            
+            if image['error'] is not None:
+                print(f"   ❌ Error procesando {xml_name}: {image['error']}")
+                skipped += 1
+                continue
+            
+            for class_name in image['unknown_classes']:
+                print(f"   ⚠️ Clase desconocida: {class_name}")
+            
+            filename = image['filename']
+            lines = label_lines.get(image_id, [])
+            image_path = self.images_dir / filename
+            
+            if not image_path.exists():
+                print(f"   ⚠️ Imagen no encontrada: {filename}")
+                skipped += 1
+                continue
+            
+            # Enlazar imagen (sin duplicar espacio en disco)
             try:
-                # Parsear XML
-                tree = ET.parse(xml_file)
-                root = tree.getroot()
-                
-                # Obtener dimensiones de imagen
-                size = root.find('size')
-                img_width = int(size.find('width').text)
-                img_height = int(size.find('height').text)
-                
-                # Obtener nombre de archivo de imagen
-                filename = root.find('filename').text
-                image_path = self.images_dir / filename
-                
-                if not image_path.exists():
-                    print(f"   ⚠️ Imagen no encontrada: {filename}")
-                    skipped += 1
-                    continue
-                
-                # Copiar imagen
-                shutil.copy(image_path, images_out / filename)
-                
-                # Convertir anotaciones
-                yolo_annotations = []
-                for obj in root.findall('object'):
-                    class_name = obj.find('name').text.lower()
-                    
-                    # Obtener ID de clase
-                    if class_name not in self.CLASS_NAMES:
-                        print(f"   ⚠️ Clase desconocida: {class_name}")
-                        continue
-                    
-                    class_id = self.CLASS_NAMES.index(class_name)
-                    
-                    # Obtener bounding box
-                    bbox = obj.find('bndbox')
-                    xmin = float(bbox.find('xmin').text)
-                    ymin = float(bbox.find('ymin').text)
-                    xmax = float(bbox.find('xmax').text)
-                    ymax = float(bbox.find('ymax').text)
-                    
-                    # Convertir a formato YOLO (normalizado)
-                    x_center = ((xmin + xmax) / 2) / img_width
-                    y_center = ((ymin + ymax) / 2) / img_height
-                    width = (xmax - xmin) / img_width
-                    height = (ymax - ymin) / img_height
-                    
-                    # Validar valores
-                    if (0 <= x_center <= 1 and 0 <= y_center <= 1 and
-                        0 < width <= 1 and 0 < height <= 1):
-                        yolo_annotations.append(
-                            f"{class_id} {x_center:.6f} {y_center:.6f} "
-                            f"{width:.6f} {height:.6f}"
-                        )
-                
-                # Guardar archivo de etiquetas YOLO
-                if yolo_annotations:
-                    label_file = labels_out / f"{Path(filename).stem}.txt"
-                    with open(label_file, 'w') as f:
-                        f.write('\n'.join(yolo_annotations))
-                    converted += 1
-                else:
-                    skipped += 1
-                    
-            except Exception as e:
-                print(f"   ❌ Error procesando {xml_file.name}: {e}")
+                mode = link_or_copy(image_path, images_out / filename)
+                link_modes[mode] = link_modes.get(mode, 0) + 1
+            except OSError as e:
+                print(f"   ❌ Error procesando {xml_name}: {e}")
                 skipped += 1
+                continue
+            
+            image_stat = image_path.stat()
+            outputs[xml_name] = {
+                'image': filename,
+                'image_size': image_stat.st_size,
+                'image_mtime': image_stat.st_mtime,
+                'label': bool(lines),
+            }
+            
+            if lines:
+                labels[labels_out / f"{Path(filename).stem}.txt"] = '\n'.join(lines)
+                converted += 1
+            else:
+                skipped += 1
+        
+        # Guardar archivos de etiquetas YOLO
+        for label_file, content in labels.items():
+            with open(label_file, 'w') as f:
+                f.write(content)
+        
+        modes_text = ", ".join(f"{count} {mode}" for mode, count in link_modes.items())
+        print(f"   {split_name}: {converted} convertidos, {skipped} omitidos"
+              + (f" (imágenes: {modes_text})" if modes_text else ""))
         
-        print(f"   {split_name}: {converted} convertidos, {skipped} omitidos")
+        return outputs
     
     def _create_data_yaml(self) -> str:
         """
@@ -289,6 +571,108 @@ val: val/images
         
         return str(data_yaml_path)
     
+    def prepare_image_cache(self,
+                            imgsz: int,
+                            mode: str = 'disk',
+                            budget_mb: float = 2048,
+                            data_yaml: Optional[str] = None,
+                            benchmark: bool = False):
+        """
+        Prepara la caché de imágenes redimensionadas de train y val.
+        
+        Las imágenes se decodifican y redimensionan una sola vez a imgsz y se
+        guardan en yolo_training/cache/<split>/images_<imgsz>.npy. Solo si se
+        pide (benchmark y data_yaml), además se mide cuánto tarda una pasada
+        del dataloader de train con y sin caché; la medición construye dos
+        datasets, así que no se hace en cada entrenamiento.
+        
+        Args:
+            imgsz: Tamaño de entrenamiento.
+            mode: 'disk' (memoria mapeada) o 'ram'.
+            budget_mb: Presupuesto total en MB (se reparte primero a train).
+            data_yaml: Ruta al archivo data.yaml (para medir el dataloader).
+            benchmark: Si True, mide el dataloader y guarda el resultado en
+                       cache/train/benchmark_<imgsz>.json.
+            
+        Returns:
+            Clase de trainer de ultralytics que lee desde la caché.
+        """
+        print(f"\n🗃️ Preparando caché de imágenes ({imgsz}px, modo {mode}, máx. {budget_mb:.0f} MB)...")
+        
+        caches = {}
+        remaining_mb = budget_mb
+        for split in ['train', 'val']:
+            images_dir = self.dataset_dir / split / 'images'
+            image_paths = list_images(images_dir)
+            if not image_paths:
+                continue
+            
+            cache = TrainingImageCache(self.output_dir / 'cache' / split, imgsz=imgsz, mode=mode)
+            info = cache.build(image_paths, budget_mb=remaining_mb)
+            remaining_mb = max(0.0, remaining_mb - info['size_mb'])
+            caches[images_dir] = cache
+            
+            status = "reutilizada" if info['reused'] else f"creada en {info['seconds']:.1f}s"
+            print(f"   {split}: {info['cached']}/{info['total']} imágenes en caché "
+                  f"({info['size_mb']:.1f} MB, {status})")
+            
+            # Comparar el dataloader por época (sobre los primeros batches)
+            if split == 'train' and benchmark and data_yaml:
+                timing = compare_dataloader_time(data_yaml, cache)
+                scale = len(image_paths) / max(timing['images'], 1)
+                timing.update({
+                    'images': len(image_paths),
+                    'epoch_decode_seconds': timing['decode_seconds'] * scale,
+                    'epoch_cache_seconds': timing['cache_seconds'] * scale,
+                })
+                # Escritura atómica: otro proceso puede estar leyendo el archivo
+                benchmark_path = cache.cache_dir / f"benchmark_{imgsz}.json"
+                tmp_path = benchmark_path.with_name(f"{benchmark_path.stem}_{os.getpid()}.tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(timing, f, indent=2)
+                os.replace(tmp_path, benchmark_path)
+                print(f"   ⏱️ Dataloader por época: {timing['epoch_decode_seconds']:.2f}s sin caché "
+                      f"vs {timing['epoch_cache_seconds']:.2f}s con caché (x{timing['speedup']:.1f})")
+        
+        self.image_caches = caches
+        return make_cached_trainer(caches)
+    
+    def autotune(self,
+                 data_yaml: str,
+                 model_size: str = 'n',
+                 imgsz: int = 320,
+                 memory_budget_mb: float = 4096,
+                 force: bool = False) -> Dict:
+        """
+        Elige el batch y los workers que dan más imágenes/s en esta CPU.
+        
+        Ejecuta iteraciones de entrenamiento cortas y cronometradas con
+        varias combinaciones dentro del presupuesto de memoria. El resultado
+        se guarda en yolo_training/autotune.json y se reutiliza mientras no
+        cambien el modelo, el tamaño de imagen, el dataset o la CPU.
+        
+        Args:
+            data_yaml: Ruta al archivo data.yaml.
+            model_size: Tamaño del modelo.
+            imgsz: Tamaño de imagen para entrenamiento.
+            memory_budget_mb: Memoria máxima para el entrenamiento en MB.
+            force: Si True, repite las pruebas aunque haya un resultado guardado.
+            
+        Returns:
+            Diccionario con 'batch', 'workers', 'images_per_second' y 'trials'.
+        """
+        train_images = self.dataset_dir / 'train' / 'images'
+        return autotune_training(
+            data_yaml,
+            self.output_dir / 'autotune.json',
+            model_size=model_size,
+            imgsz=imgsz,
+            memory_budget_mb=memory_budget_mb,
+            image_cache=self.image_caches.get(train_images),
+            train_images_dir=train_images,
+            force=force
+        )
+    
     def train_model(self,
                    data_yaml: str,
                    model_size: str = 'n',
@@ -298,7 +682,17 @@ val: val/images
                    device: str = 'cpu',
                    patience: int = 50,
                    project_name: str = 'microplasticos',
-                   name: str = None) -> tuple:
+                   name: str = None,
+                   image_cache: Optional[str] = 'disk',
+                   cache_budget_mb: float = 2048,
+                   benchmark_cache: bool = False,
+                   image_caches: Optional[Dict] = None,
+                   workers: int = 1,
+                   autotune: bool = False,
+                   memory_budget_mb: float = 4096,
+                   save_period: int = -1,
+                   epoch_callback: Optional[Callable[[Dict], Optional[bool]]] = None,
+                   overrides: Optional[Dict] = None) -> tuple:
         """
         Entrena un modelo YOLOv8.
         
@@ -312,6 +706,26 @@ val: val/images
             patience: Épocas sin mejora antes de early stopping.
             project_name: Nombre del proyecto.
             name: Nombre del experimento (opcional, se auto-genera si es None).
+            image_cache: Caché de imágenes redimensionadas: 'disk' (memoria
+                        mapeada), 'ram' o None para leer siempre desde archivo.
+            cache_budget_mb: Tamaño máximo de la caché de imágenes en MB.
+            benchmark_cache: Si True, mide el dataloader con y sin caché antes
+                             de entrenar (ver prepare_image_cache).
+            image_caches: Cachés ya preparadas {carpeta de imágenes:
+                          TrainingImageCache} para este imgsz; si se indican
+                          no se vuelve a preparar la caché (ej. trials de un sweep).
+            workers: Procesos del dataloader.
+            autotune: Si True, batch y workers se eligen automáticamente
+                      (ver autotune) y los valores recibidos se ignoran.
+            memory_budget_mb: Presupuesto de memoria para el autoajuste en MB.
+            save_period: Guardar además weights/epochN.pt cada N épocas
+                         (-1 = solo last.pt y best.pt, que se guardan en cada época).
+            epoch_callback: Función llamada al final de cada época con las
+                            métricas (ver _attach_epoch_callback). Se ejecuta
+                            en el hilo del entrenamiento; si devuelve True, el
+                            entrenamiento se detiene tras esa época.
+            overrides: Argumentos adicionales para model.train (ej.
+                       aumentaciones: {'fliplr': 0.5, 'degrees': 10}).
             
         Returns:
             Tupla con (ruta al mejor modelo, número de entrenamiento).
@@ -321,17 +735,36 @@ val: val/images
         if name is None:
             name = f'yolov8_{training_number}'
         
+        # Preparar caché de imágenes preprocesadas (una vez por dataset/imgsz)
+        trainer_class = None
+        if image_caches:
+            self.image_caches = image_caches
+            trainer_class = make_cached_trainer(image_caches)
+        elif image_cache:
+            trainer_class = self.prepare_image_cache(imgsz, image_cache, cache_budget_mb,
+                                                     data_yaml, benchmark=benchmark_cache)
+        
+        # Elegir batch y workers midiendo el rendimiento real en esta CPU
+        autotune_result = None
+        if autotune:
+            autotune_result = self.autotune(data_yaml, model_size, imgsz, memory_budget_mb)
+            batch = autotune_result['batch']
+            workers = autotune_result['workers']
+        
         print(f"\n🚀 Iniciando entrenamiento YOLOv8{model_size} - Entrenamiento #{training_number}")
         print(f"   Épocas: {epochs}")
         print(f"   Tamaño imagen: {imgsz}")
         print(f"   Batch size: {batch}")
+        print(f"   Workers: {workers}")
         print(f"   Dispositivo: {device}")
         
         # Cargar modelo base
         model = YOLO(f'yolov8{model_size}.pt')
+        if epoch_callback:
+            self._attach_epoch_callback(model, epoch_callback)
         
         # Entrenar con configuración optimizada para poca memoria
-        results = model.train(
+        model.train(
             data=data_yaml,
             epochs=epochs,
             imgsz=imgsz,
@@ -345,10 +778,95 @@ val: val/images
             save=True,
             plots=True,
             val=True,
-            workers=1,
-            cache=False
+            workers=workers,
+            cache=False,  # La caché propia (image_cache) reemplaza a la de ultralytics
+            save_period=save_period,
+            trainer=trainer_class,
+            **(overrides or {})
         )
         
+        # Registrar junto al entrenamiento la configuración usada
+        training_settings = {
+            'model_size': model_size,
+            'epochs': epochs,
+            'imgsz': imgsz,
+            'batch': batch,
+            'workers': workers,
+            'device': device,
+            'image_cache': image_cache,
+            'autotune': autotune_result,
+            'overrides': overrides or {},
+        }
+        best_model_path = self._finish_training(model, training_settings)
+        
+        print(f"\n✅ Entrenamiento #{training_number} completado")
+        print(f"   Mejor modelo: {best_model_path}")
+        
+        return str(best_model_path), training_number
+    
+    def _attach_epoch_callback(self, model, epoch_callback: Callable[[Dict], Optional[bool]]):
+        """
+        Registra en el modelo un callback de ultralytics que informa cada época.
+        
+        Args:
+            model: Modelo YOLO antes de llamar a train().
+            epoch_callback: Función que recibe un diccionario con 'epoch',
+                            'epochs', 'loss', 'box_loss', 'cls_loss',
+                            'dfl_loss', 'map50', 'map50_95', 'epoch_seconds'
+                            (con validación), 'images_per_second' (solo la
+                            fase de entrenamiento) y 'save_dir'. Si devuelve
+                            True, se detiene el entrenamiento.
+        """
+        epoch_start = {}
+        
+        def on_train_epoch_start(trainer):
+            epoch_start['time'] = time.perf_counter()
+        
+        def on_train_epoch_end(trainer):
+            # Fase de entrenamiento sola: la validación viene después
+            epoch_start['train_seconds'] = time.perf_counter() - epoch_start.get('time', time.perf_counter())
+        
+        def on_fit_epoch_end(trainer):
+            elapsed = time.perf_counter() - epoch_start.get('time', time.perf_counter())
+            train_seconds = epoch_start.get('train_seconds', elapsed)
+            losses = trainer.label_loss_items(trainer.tloss, prefix='train') if trainer.tloss is not None else {}
+            metrics = trainer.metrics or {}
+            num_images = len(trainer.train_loader.dataset)
+            
+            stop = epoch_callback({
+                'epoch': trainer.epoch + 1,
+                'epochs': trainer.epochs,
+                'loss': float(sum(losses.values())) if losses else None,
+                'box_loss': losses.get('train/box_loss'),
+                'cls_loss': losses.get('train/cls_loss'),
+                'dfl_loss': losses.get('train/dfl_loss'),
+                'map50': metrics.get('metrics/mAP50(B)'),
+                'map50_95': metrics.get('metrics/mAP50-95(B)'),
+                'epoch_seconds': elapsed,
+                'images_per_second': num_images / train_seconds if train_seconds > 0 else 0.0,
+                'save_dir': str(trainer.save_dir),
+            })
+            if stop:
+                trainer.stop = True
+        
+        model.add_callback('on_train_epoch_start', on_train_epoch_start)
+        model.add_callback('on_train_epoch_end', on_train_epoch_end)
+        model.add_callback('on_fit_epoch_end', on_fit_epoch_end)
+    
+    def _finish_training(self, model, training_settings: Dict) -> Path:
+        """
+        Localiza el mejor modelo, guarda training_settings.json y lo registra en el registro de modelos.
+        
+        training_settings.json se escribe solo al terminar, por lo que su
+        ausencia junto a weights/last.pt indica un entrenamiento interrumpido.
+        
+        Args:
+            model: Modelo YOLO ya entrenado.
+            training_settings: Configuración usada en el entrenamiento.
+            
+        Returns:
+            Ruta a weights/best.pt.
+        """
         # Obtener el path real del modelo desde el objeto trainer
         # YOLO guarda el path en model.trainer.save_dir
         save_dir = Path(model.trainer.save_dir)
@@ -361,6 +879,161 @@ val: val/images
                 f"Directorio de guardado: {save_dir}"
             )
         
+        with open(save_dir / 'training_settings.json', 'w', encoding='utf-8') as f:
+            json.dump(training_settings, f, indent=2)
+        
+        # Registrar el modelo con su versión (hash), clases y métricas
+        model_info = ModelRegistry().register(
+            best_model_path,
+            fmt='pytorch',
+            class_names=self.CLASS_NAMES,
+            imgsz=training_settings.get('imgsz'),
+            metrics=read_run_metrics(save_dir),
+            run_dir=save_dir
+        )
+        print(f"   Registrado como {model_info['name']} (v{model_info['hash'][:12]})")
+        
+        return best_model_path
+    
+    @staticmethod
+    def _stopped_early(run_dir: Path) -> bool:
+        """
+        Indica si un entrenamiento se detuvo antes de completar sus épocas.
+        
+        Solo lee archivos de texto pequeños (no se deserializa weights/last.pt):
+        - training_settings.json solo se escribe al terminar (_finish_training).
+        - results.csv tiene una fila por época completada; se compara con las
+          épocas de args.yaml.
+        - Una parada temprana por patience también deja menos filas que
+          épocas: se reconoce porque las últimas 'patience' épocas no
+          mejoraron el fitness (0.1·mAP50 + 0.9·mAP50-95, como ultralytics).
+        
+        Args:
+            run_dir: Carpeta del entrenamiento.
+        
+        Returns:
+            True si quedan épocas por entrenar.
+        """
+        args_path = run_dir / 'args.yaml'
+        if not ((run_dir / 'weights' / 'last.pt').exists() and args_path.exists()):
+            return False
+        if (run_dir / 'training_settings.json').exists():
+            return False
+        
+        try:
+            with open(args_path, 'r', encoding='utf-8') as f:
+                args = yaml.safe_load(f) or {}
+            epochs = int(args.get('epochs') or 0)
+            patience = int(args.get('patience') or 0)
+        except (OSError, ValueError, yaml.YAMLError):
+            return False
+        
+        results_path = run_dir / 'results.csv'
+        if not results_path.exists():
+            return epochs > 0
+        try:
+            with open(results_path, 'r', encoding='utf-8', newline='') as f:
+                rows = [{key.strip(): value for key, value in row.items()} for row in csv.DictReader(f)]
+        except (OSError, csv.Error):
+            return False
+        
+        if len(rows) >= epochs:
+            return False
+        
+        if patience and len(rows) > patience:
+            try:
+                fitness = [0.1 * float(row['metrics/mAP50(B)']) + 0.9 * float(row['metrics/mAP50-95(B)'])
+                           for row in rows]
+            except (KeyError, TypeError, ValueError):
+                return True
+            best_epoch = max(range(len(fitness)), key=lambda i: fitness[i])
+            if len(rows) - 1 - best_epoch >= patience:
+                return False
+        return True
+    
+    def find_interrupted_run(self, project_name: str = 'microplasticos') -> Optional[Path]:
+        """
+        Busca el entrenamiento interrumpido más reciente del proyecto.
+        
+        Args:
+            project_name: Nombre del proyecto.
+            
+        Returns:
+            Carpeta yolov8_N cuyo entrenamiento se detuvo antes de completar
+            las épocas de args.yaml (ver _stopped_early), o None si no hay
+            ninguno.
+        """
+        project_dir = self.models_dir / project_name
+        if not project_dir.exists():
+            return None
+        
+        candidates = [
+            folder for folder in project_dir.iterdir()
+            if folder.is_dir()
+            and re.match(r'yolov8_(\d+)', folder.name)
+            and self._stopped_early(folder)
+        ]
+        if not candidates:
+            return None
+        
+        return max(candidates, key=lambda folder: (folder / 'weights' / 'last.pt').stat().st_mtime)
+    
+    def resume_training(self,
+                        run_dir: str,
+                        image_cache: Optional[str] = 'disk',
+                        cache_budget_mb: float = 2048,
+                        epoch_callback: Optional[Callable[[Dict], None]] = None) -> tuple:
+        """
+        Reanuda un entrenamiento interrumpido desde su weights/last.pt.
+        
+        ultralytics restaura del checkpoint la época, el optimizador y los
+        argumentos originales (args.yaml), así que el entrenamiento continúa
+        en la misma carpeta como si no se hubiera detenido.
+        
+        Args:
+            run_dir: Carpeta del entrenamiento (models/<proyecto>/yolov8_N).
+            image_cache: Caché de imágenes redimensionadas ('disk', 'ram' o None).
+            cache_budget_mb: Tamaño máximo de la caché de imágenes en MB.
+            epoch_callback: Función llamada al final de cada época con las métricas.
+            
+        Returns:
+            Tupla con (ruta al mejor modelo, número de entrenamiento).
+        """
+        run_dir = Path(run_dir)
+        last_path = run_dir / 'weights' / 'last.pt'
+        if not last_path.exists():
+            raise FileNotFoundError(f"No se encontró el checkpoint {last_path}")
+        
+        with open(run_dir / 'args.yaml', 'r', encoding='utf-8') as f:
+            args = yaml.safe_load(f)
+        
+        match = re.match(r'yolov8_(\d+)', run_dir.name)
+        training_number = int(match.group(1)) if match else 0
+        
+        print(f"\n⏯️ Reanudando entrenamiento #{training_number} desde {last_path}")
+        
+        trainer_class = None
+        if image_cache:
+            trainer_class = self.prepare_image_cache(args['imgsz'], image_cache, cache_budget_mb)
+        
+        model = YOLO(str(last_path))
+        if epoch_callback:
+            self._attach_epoch_callback(model, epoch_callback)
+        
+        model.train(resume=True, trainer=trainer_class)
+        
+        training_settings = {
+            'model_size': Path(str(args.get('model', ''))).stem.replace('yolov8', ''),
+            'epochs': args.get('epochs'),
+            'imgsz': args.get('imgsz'),
+            'batch': args.get('batch'),
+            'workers': args.get('workers'),
+            'device': args.get('device'),
+            'image_cache': image_cache,
+            'resumed': True,
+        }
+        best_model_path = self._finish_training(model, training_settings)
+        
         print(f"\n✅ Entrenamiento #{training_number} completado")
         print(f"   Mejor modelo: {best_model_path}")
         
@@ -420,6 +1093,37 @@ val: val/images
         print(f"✅ Modelo exportado: {exported_path}")
         
         return exported_path
+    
+    def export_and_benchmark(self,
+                             model_path: str,
+                             formats: Optional[List[str]] = None,
+                             batch_sizes: Optional[List[int]] = None,
+                             register_default: bool = True) -> Dict:
+        """
+        Exporta el modelo a varios formatos y compara su velocidad y paridad.
+        
+        Cada exportación se verifica contra el modelo original sobre el
+        split de validación y se mide su latencia p50/p95 y rendimiento
+        por tamaño de batch. El informe se guarda en export_benchmark.json
+        en la carpeta del entrenamiento.
+        
+        Args:
+            model_path: Ruta al modelo entrenado (.pt).
+            formats: Formatos ('torchscript', 'onnx', 'openvino' por defecto).
+            batch_sizes: Tamaños de batch a medir (por defecto [1, 4, 8]).
+            register_default: Registrar el formato más rápido que pasa la
+                              verificación como modelo por defecto del detector.
+            
+        Returns:
+            Informe del benchmark.
+        """
+        return export_and_benchmark(
+            model_path,
+            self.dataset_dir / 'val' / 'images',
+            formats=formats or EXPORT_FORMATS,
+            batch_sizes=batch_sizes,
+            register_default=register_default
+        )
 
 
 def main():
@@ -478,6 +1182,57 @@ def main():
         default='0',
         help='Dispositivo (0 para GPU, cpu para CPU)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Procesos del dataloader'
+    )
+    parser.add_argument(
+        '--autotune',
+        action='store_true',
+        help='Elegir batch y workers automáticamente (ignora --batch y --workers)'
+    )
+    parser.add_argument(
+        '--memory-budget-mb',
+        type=float,
+        default=4096,
+        help='Memoria máxima para el autoajuste en MB'
+    )
+    parser.add_argument(
+        '--benchmark-exports',
+        action='store_true',
+        help='Exportar a TorchScript/ONNX/OpenVINO, medir latencia y registrar el más rápido'
+    )
+    parser.add_argument(
+        '--save-period',
+        type=int,
+        default=-1,
+        help='Guardar un checkpoint adicional cada N épocas (-1 = desactivado)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Reanudar el último entrenamiento interrumpido'
+    )
+    parser.add_argument(
+        '--image-cache',
+        type=str,
+        default='disk',
+        choices=['disk', 'ram', 'none'],
+        help='Caché de imágenes redimensionadas (disk=memoria mapeada)'
+    )
+    parser.add_argument(
+        '--cache-budget-mb',
+        type=float,
+        default=2048,
+        help='Tamaño máximo de la caché de imágenes en MB'
+    )
+    parser.add_argument(
+        '--benchmark-cache',
+        action='store_true',
+        help='Medir el dataloader con y sin caché de imágenes antes de entrenar'
+    )
     
     args = parser.parse_args()
     
@@ -493,6 +1248,23 @@ def main():
         output_dir=args.output
     )
     
+    image_cache = None if args.image_cache == 'none' else args.image_cache
+    
+    # Reanudar un entrenamiento interrumpido
+    if args.resume:
+        run_dir = trainer.find_interrupted_run()
+        if run_dir is None:
+            print("❌ No hay entrenamientos interrumpidos para reanudar.")
+            return
+        best_model, training_number = trainer.resume_training(
+            str(run_dir),
+            image_cache=image_cache,
+            cache_budget_mb=args.cache_budget_mb
+        )
+        print(f"\n🎉 Entrenamiento #{training_number} completado exitosamente!")
+        print(f"   Modelo guardado en: {best_model}")
+        return
+    
     # Convertir dataset
     data_yaml = trainer.convert_voc_to_yolo()
     
@@ -503,12 +1275,23 @@ def main():
         epochs=args.epochs,
         batch=args.batch,
         imgsz=args.imgsz,
-        device=args.device
+        device=args.device,
+        image_cache=image_cache,
+        cache_budget_mb=args.cache_budget_mb,
+        benchmark_cache=args.benchmark_cache,
+        workers=args.workers,
+        autotune=args.autotune,
+        memory_budget_mb=args.memory_budget_mb,
+        save_period=args.save_period
     )
     
     # Evaluar modelo
     trainer.evaluate_model(best_model, data_yaml)
     
+    # Exportar y medir formatos de inferencia
+    if args.benchmark_exports:
+        trainer.export_and_benchmark(best_model)
+    
     print(f"\n🎉 Entrenamiento #{training_number} completado exitosamente!")
     print(f"   Modelo guardado en: {best_model}")
     print(f"\n💡 Para usar el modelo en la aplicación:")
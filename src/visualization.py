@@ -321,6 +321,88 @@ class DataVisualizer:
         
         return fig
     
+    def plot_sketch_size_distribution(self, sketch,
+                                      sample_id: str = None,
+                                      save_path: str = None) -> plt.Figure:
+        """
+        Genera la distribución de tamaños a partir de un resumen, sin filas de partículas.
+        
+        Args:
+            sketch: Resumen de tamaños (ver size_sketch.SizeSketch), de una
+                    muestra o combinado de un lote.
+            sample_id: Identificador de la muestra o del lote.
+            save_path: Ruta para guardar la figura.
+            
+        Returns:
+            Figura de matplotlib.
+        """
+        fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+        
+        # Histograma logarítmico de diámetros, apilado por clase
+        edges = sketch.edges('diameter')
+        used = np.flatnonzero(sketch.histogram('diameter')[1:-1])
+        if len(used):
+            lo, hi = used[0], used[-1] + 1
+            bottom = np.zeros(hi - lo)
+            for class_name in sketch.classes():
+                counts = sketch.histogram('diameter', class_name)[1:-1][lo:hi]
+                axes[0, 0].bar(edges[lo:hi], counts, width=np.diff(edges)[lo:hi], bottom=bottom,
+                               align='edge', edgecolor='black', linewidth=0.5, alpha=0.7,
+                               label=class_name)
+                bottom += counts
+            axes[0, 0].set_xscale('log')
+            axes[0, 0].legend(fontsize=8)
+        axes[0, 0].set_xlabel('Diámetro Equivalente (μm)')
+        axes[0, 0].set_ylabel('Frecuencia')
+        axes[0, 0].set_title('Distribución de Diámetros por Tipo')
+        axes[0, 0].grid(True, alpha=0.3)
+        
+        # Frecuencia acumulada (en los límites de los intervalos)
+        counts = sketch.histogram('diameter')
+        if counts.sum():
+            cumulative = np.cumsum(counts)[:-1] / counts.sum() * 100
+            axes[0, 1].plot(edges, cumulative, linewidth=2)
+            axes[0, 1].set_xscale('log')
+        axes[0, 1].set_xlabel('Diámetro Equivalente (μm)')
+        axes[0, 1].set_ylabel('Frecuencia Acumulada (%)')
+        axes[0, 1].set_title('Curva de Frecuencia Acumulada')
+        axes[0, 1].grid(True, alpha=0.3)
+        
+        # Percentiles estimados
+        percentiles = [10, 25, 50, 75, 90]
+        percentile_values = sketch.quantile([p / 100 for p in percentiles], 'diameter')
+        axes[1, 0].bar(range(len(percentiles)), np.nan_to_num(percentile_values),
+                      tick_label=[f'P{p}' for p in percentiles],
+                      edgecolor='black', alpha=0.7)
+        axes[1, 0].set_ylabel('Diámetro Equivalente (μm)')
+        axes[1, 0].set_title('Percentiles de Distribución de Tamaños')
+        axes[1, 0].grid(True, alpha=0.3, axis='y')
+        for i, v in enumerate(percentile_values):
+            if np.isfinite(v):
+                axes[1, 0].text(i, v, f'{v:.1f}', ha='center', va='bottom')
+        
+        # Distribución por categorías de tamaño (recuento exacto)
+        size_counts = sketch.category_counts('size')
+        axes[1, 1].bar(list(size_counts.keys()), list(size_counts.values()),
+                      edgecolor='black', alpha=0.7)
+        axes[1, 1].set_xlabel('Categoría de Tamaño')
+        axes[1, 1].set_ylabel('Número de Partículas')
+        axes[1, 1].set_title('Distribución por Categorías de Tamaño')
+        axes[1, 1].grid(True, alpha=0.3, axis='y')
+        axes[1, 1].tick_params(axis='x', rotation=45)
+        
+        # Título general
+        if sample_id:
+            fig.suptitle(f'Análisis de Distribución de Tamaños - {sample_id}',
+                        fontsize=16, fontweight='bold')
+        
+        plt.tight_layout()
+        
+        if save_path:
+            plt.savefig(save_path, bbox_inches='tight', dpi=PLOT_PARAMS['dpi'])
+        
+        return fig
+    
     def plot_class_distribution(self, df: pd.DataFrame,
                                   sample_id: str = None,
                                   save_path: str = None) -> plt.Figure:
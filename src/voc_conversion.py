@@ -0,0 +1,77 @@
+"""
+Módulo de utilidades para la conversión del dataset (LabelImg a YOLO).
+
+Contiene el reparto de la lectura de anotaciones en procesos de trabajo y
+el enlazado de imágenes. Se mantiene en un módulo ligero (sin importar
+ultralytics ni torch) para que cada proceso arranque rápido.
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
+
+# Por debajo de este número de archivos no compensa lanzar procesos
+MIN_FILES_FOR_POOL = 64
+
+
+def map_files(func: Callable, paths: List[str], workers: Optional[int] = None) -> List:
+    """
+    Aplica una función de lectura a varios archivos en un pool de procesos.
+
+    Args:
+        func: Función de nivel de módulo (debe poder enviarse a otro proceso).
+        paths: Rutas de los archivos.
+        workers: Número de procesos. None = número de CPUs; 1 = secuencial.
+
+    Returns:
+        Lista de resultados de func, en el mismo orden que paths.
+    """
+    paths = [str(p) for p in paths]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(paths) < MIN_FILES_FOR_POOL:
+        return [func(p) for p in paths]
+
+    # Trozos grandes para amortizar la comunicación entre procesos
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, paths, chunksize=chunksize))
+
+
+def link_or_copy(src: Path, dst: Path) -> str:
+    """
+    Coloca un archivo en el dataset sin duplicar espacio en disco.
+
+    Intenta, en orden, un enlace duro, un enlace simbólico y por último
+    una copia (p. ej. si origen y destino están en unidades distintas).
+
+    Args:
+        src: Archivo de origen.
+        dst: Ruta de destino (se reemplaza si existe).
+
+    Returns:
+        Método usado: 'hardlink', 'symlink' o 'copy'.
+    """
+    src = Path(src)
+    dst = Path(dst)
+
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        pass
+
+    try:
+        os.symlink(src.resolve(), dst)
+        return 'symlink'
+    except OSError:
+        pass
+
+    shutil.copy2(src, dst)
+    return 'copy'
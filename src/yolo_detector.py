@@ -6,7 +6,9 @@ microplásticos en imágenes microscópicas de máscaras de pestañas.
 """
 
 import cv2
+import threading
 import numpy as np
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import sys
@@ -19,6 +21,7 @@ except ImportError:
 
 sys.path.append(str(Path(__file__).parent.parent))
 from config.config import IMAGE_PARAMS
+from src.model_registry import ModelRegistry
 
 
 class YOLODetector:
@@ -38,7 +41,10 @@ class YOLODetector:
                  model_path: Optional[str] = None,
                  pixels_to_um: float = None,
                  confidence_threshold: float = 0.25,
-                 iou_threshold: float = 0.45):
+                 iou_threshold: float = 0.45,
+                 imgsz: Optional[int] = None,
+                 model_info: Optional[Dict] = None,
+                 model=None):
         """
         Inicializa el detector YOLO.
         
@@ -48,6 +54,12 @@ class YOLODetector:
             pixels_to_um: Factor de conversión de píxeles a micrómetros.
             confidence_threshold: Umbral de confianza para detecciones (0-1).
             iou_threshold: Umbral IoU para Non-Maximum Suppression.
+            imgsz: Tamaño de inferencia. Si es None se usa el del registro
+                   de modelos (los modelos exportados tienen tamaño fijo).
+            model_info: Entrada del registro de modelos (ver ModelRegistry);
+                        su hash se guarda en cada partícula como versión del modelo.
+            model: Modelo de ultralytics ya cargado para model_path (ver
+                   get_detector); si se indica, no se vuelven a cargar los pesos.
         """
         if not YOLO_AVAILABLE:
             raise ImportError(
@@ -59,10 +71,21 @@ class YOLODetector:
         self.confidence_threshold = confidence_threshold
         self.iou_threshold = iou_threshold
         
+        # Los modelos exportados (ONNX, OpenVINO...) tienen un tamaño de entrada fijo
+        if imgsz is None and model_info:
+            imgsz = model_info.get('imgsz')
+        self.imgsz = imgsz
+        
+        # Versión exacta del modelo para sellar los resultados
+        self.model_version = model_info['hash'][:12] if model_info else None
+        self.model_name = model_info['name'] if model_info else None
+        
         # Cargar modelo
-        if model_path and Path(model_path).exists():
+        if model is not None:
+            self.model = model
+        elif model_path and Path(model_path).exists():
             print(f"📦 Cargando modelo personalizado: {model_path}")
-            self.model = YOLO(model_path)
+            self.model = YOLO(model_path, task='detect')
         else:
             print("⚠️ No se encontró modelo personalizado. Usando YOLOv8n base.")
             print("   Para entrenar un modelo personalizado, usa src/train_yolo.py")
@@ -76,6 +99,8 @@ class YOLODetector:
         """
         Detecta microplásticos en una imagen usando YOLOv8.
         
+        Encadena predict_boxes, measure_particles y annotate_image.
+        
         Args:
             image: Imagen como array de numpy (BGR).
             return_annotated: Si True, devuelve imagen con anotaciones.
@@ -85,25 +110,28 @@ class YOLODetector:
             - Lista de partículas detectadas (diccionarios con propiedades)
             - Imagen anotada (si return_annotated=True) o None
         """
-        # Realizar detección
-        results = self.model.predict(
-            image,
-            conf=self.confidence_threshold,
-            iou=self.iou_threshold,
-            verbose=False
-        )[0]
+        prediction = self.predict_boxes([image], batch_size=1)[0]
+        particles = self.measure_particles(image, prediction)
+        annotated_image = self.annotate_image(image, particles) if return_annotated else None
+        return particles, annotated_image
+    
+    def measure_particles(self,
+                          image: np.ndarray,
+                          prediction: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> List[Dict]:
+        """
+        Calcula la morfología y los metadatos de cada caja predicha.
         
-        particles = []
-        annotated_image = image.copy() if return_annotated else None
-        
-        # Procesar cada detección
-        boxes = results.boxes
-        for idx, box in enumerate(boxes):
-            # Extraer información del bounding box
-            xyxy = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-            confidence = float(box.conf[0])
-            class_id = int(box.cls[0])
+        Args:
+            image: Imagen como array de numpy (BGR).
+            prediction: Tupla (cajas, IDs de clase, confianzas) de predict_boxes.
             
+        Returns:
+            Lista de partículas detectadas (diccionarios con propiedades).
+        """
+        particles = []
+        boxes, class_ids, confidences = prediction
+        for idx, (xyxy, class_id, confidence) in enumerate(zip(boxes, class_ids, confidences)):
+            class_id = int(class_id)
             x1, y1, x2, y2 = map(int, xyxy)
             
             # Extraer región de interés
@@ -117,22 +145,92 @@ class YOLODetector:
                 'particle_id': idx + 1,
                 'class_id': class_id,
                 'class_name': self._get_class_name(class_id),
-                'confidence': confidence,
+                'confidence': float(confidence),
                 'bbox': [x1, y1, x2, y2],
-                'detection_method': 'YOLOv8'
+                'detection_method': 'YOLOv8',
+                'model_name': self.model_name,
+                'model_version': self.model_version
             })
             
             particles.append(particle_props)
+        
+        return particles
+    
+    def annotate_image(self, image: np.ndarray, particles: List[Dict]) -> np.ndarray:
+        """
+        Dibuja las partículas sobre una copia de la imagen.
+        
+        Args:
+            image: Imagen como array de numpy (BGR).
+            particles: Partículas de measure_particles.
             
-            # Anotar imagen si se requiere
-            if return_annotated:
-                self._annotate_detection(
-                    annotated_image, 
-                    particle_props, 
-                    x1, y1, x2, y2
-                )
+        Returns:
+            Imagen anotada.
+        """
+        annotated_image = image.copy()
+        for particle in particles:
+            self._annotate_detection(annotated_image, particle, *particle['bbox'])
+        return annotated_image
+    
+    def predict_boxes(self,
+                      images: List,
+                      batch_size: int = 8) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Predice solo las cajas de varias imágenes, en lotes.
         
-        return particles, annotated_image
+        Es la inferencia de detect_particles, sin morfología ni anotación
+        (la mínima para generar anotaciones previas).
+        
+        Args:
+            images: Imágenes como arrays (BGR) o rutas.
+            batch_size: Imágenes por llamada al modelo.
+        
+        Returns:
+            Por imagen, una tupla (cajas (N, 4) x1, y1, x2, y2 en píxeles,
+            IDs de clase (N,), confianzas (N,)).
+        """
+        predictions = []
+        for start in range(0, len(images), batch_size):
+            batch = [str(image) if isinstance(image, Path) else image
+                     for image in images[start:start + batch_size]]
+            results = self.model.predict(
+                batch,
+                conf=self.confidence_threshold,
+                iou=self.iou_threshold,
+                verbose=False,
+                **({'imgsz': self.imgsz} if self.imgsz else {})
+            )
+            for result in results:
+                boxes = result.boxes
+                predictions.append((
+                    boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4),
+                    boxes.cls.cpu().numpy().astype(np.int32),
+                    boxes.conf.cpu().numpy().astype(np.float64)
+                ))
+        return predictions
+    
+    def embed_images(self, images: List) -> Optional[np.ndarray]:
+        """
+        Vectores de características de la red troncal (promediados espacialmente).
+        
+        Args:
+            images: Imágenes como arrays (BGR) o rutas.
+        
+        Returns:
+            Array (N, D), o None si el modelo no lo permite (versiones
+            antiguas de ultralytics o modelos exportados).
+        """
+        if not hasattr(self.model, 'embed'):
+            return None
+        try:
+            embeddings = self.model.embed(
+                [str(image) if isinstance(image, Path) else image for image in images],
+                verbose=False,
+                **({'imgsz': self.imgsz} if self.imgsz else {})
+            )
+        except Exception:
+            return None
+        return np.stack([e.cpu().numpy().reshape(-1) for e in embeddings]).astype(np.float32)
     
     def _calculate_morphology(self, 
                              roi: np.ndarray, 
@@ -342,6 +440,73 @@ class YOLODetector:
         print(f"✅ Imagen anotada guardada: {output_path}")
 
 
+# Modelos de ultralytics cargados, por versión (hash; None = YOLOv8n base)
+_MODEL_CACHE: "OrderedDict[Optional[str], YOLO]" = OrderedDict()
+_MODEL_CACHE_LOCK = threading.Lock()
+MAX_CACHED_MODELS = 4
+
+
+def get_detector(model_path: str,
+                 pixels_to_um: float = None,
+                 confidence_threshold: float = 0.25,
+                 iou_threshold: float = 0.45,
+                 registry: Optional[ModelRegistry] = None) -> YOLODetector:
+    """
+    Obtiene un detector para un modelo, reutilizando los pesos si ya están cargados.
+    
+    Se guardan en caché solo los modelos de ultralytics, por hash, de modo
+    que volver a un modelo ya usado (o cambiar entre varios) no vuelve a
+    cargar los pesos. Cada llamada devuelve un detector nuevo con su propia
+    calibración y umbrales, así que quien lo usa no altera los de otros.
+    El modelo se registra en el registro de modelos si aún no lo estaba.
+    Como YOLODetector, si model_path no existe se usa YOLOv8n base.
+    
+    Args:
+        model_path: Ruta al modelo.
+        pixels_to_um: Factor de conversión de píxeles a micrómetros.
+        confidence_threshold: Umbral de confianza para detecciones (0-1).
+        iou_threshold: Umbral IoU para Non-Maximum Suppression.
+        registry: Registro de modelos (por defecto el del proyecto).
+        
+    Returns:
+        Detector listo para usar.
+    """
+    model_info = None
+    if model_path and Path(model_path).exists():
+        registry = registry or ModelRegistry()
+        model_info = registry.find_by_path(model_path) or registry.register(model_path)
+    else:
+        model_path = None
+    key = model_info['hash'] if model_info else None
+    
+    with _MODEL_CACHE_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            detector = YOLODetector(
+                model_path=model_path,
+                pixels_to_um=pixels_to_um,
+                confidence_threshold=confidence_threshold,
+                iou_threshold=iou_threshold,
+                model_info=model_info
+            )
+            _MODEL_CACHE[key] = detector.model
+            while len(_MODEL_CACHE) > MAX_CACHED_MODELS:
+                _MODEL_CACHE.popitem(last=False)
+            return detector
+        _MODEL_CACHE.move_to_end(key)
+    
+    if model_info:
+        print(f"⚡ Modelo en caché: {model_info['name']} (v{model_info['hash'][:12]})")
+    return YOLODetector(
+        model_path=model_path,
+        pixels_to_um=pixels_to_um,
+        confidence_threshold=confidence_threshold,
+        iou_threshold=iou_threshold,
+        model_info=model_info,
+        model=model
+    )
+
+
 def test_detector():
     """Función de prueba del detector."""
     if not YOLO_AVAILABLE:
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.slide_registration import (frame_grid_positions, mark_slide_duplicates,
+                                    register_frames, save_layout, LAYOUT_FILENAME)
+from src.statistical_analysis import StatisticalAnalyzer
+
+
+FRAME_W, FRAME_H = 320, 240
+ROWS, COLS = 2, 3
+OVERLAP = 0.25
+
+
+class TestSlideDeduplication(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.frames_dir = Path(self.tmp.name)
+        rng = np.random.default_rng(0)
+
+        step_x, step_y = int(FRAME_W * (1 - OVERLAP)), int(FRAME_H * (1 - OVERLAP))
+        slide_w, slide_h = step_x * (COLS - 1) + FRAME_W, step_y * (ROWS - 1) + FRAME_H
+        noise = rng.random((slide_h // 4, slide_w // 4)).astype(np.float32)
+        slide = cv2.resize(noise, (slide_w, slide_h), interpolation=cv2.INTER_CUBIC)
+        slide = np.clip(slide * 255, 0, 255).astype(np.uint8)
+
+        # Partículas en coordenadas de la muestra, lejos de los bordes de los campos
+        xs = rng.uniform(10, slide_w - 10, 60)
+        ys = rng.uniform(10, slide_h - 10, 60)
+        self.n_particles = len(xs)
+
+        rows = []
+        for r in range(ROWS):
+            for c in range(COLS):
+                x0, y0 = c * step_x, r * step_y
+                name = f"slide_r{r}_c{c}"
+                cv2.imwrite(str(self.frames_dir / f"{name}.png"), slide[y0:y0 + FRAME_H, x0:x0 + FRAME_W])
+                inside = (xs >= x0) & (xs < x0 + FRAME_W) & (ys >= y0) & (ys < y0 + FRAME_H)
+                for x, y in zip(xs[inside], ys[inside]):
+                    rows.append({'sample_id': name, 'class_name': 'fragmento', 'area_um2': 10.0,
+                                 'equivalent_diameter_um': 3.57, 'aspect_ratio': 1.2,
+                                 'circularity': 0.8, 'eccentricity': 0.5, 'solidity': 0.9,
+                                 'perimeter_um': 12.0,
+                                 'centroid_x': round(x - x0, 1), 'centroid_y': round(y - y0, 1)})
+        self.particles = StatisticalAnalyzer().particles_to_dataframe(rows)
+
+        frame_paths = sorted(self.frames_dir.glob('*.png'))
+        grid = frame_grid_positions(frame_paths)
+        layout = register_frames(frame_paths, grid, overlap=OVERLAP, downscale=1, workers=2)
+        save_layout(layout, self.frames_dir / LAYOUT_FILENAME)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_overlapping_frames_count_each_particle_once(self):
+        self.assertGreater(len(self.particles), self.n_particles)
+
+        marked = mark_slide_duplicates(self.particles, self.frames_dir)
+        concentration = StatisticalAnalyzer().calculate_concentration(marked, sample_volume_ml=2.0)
+
+        self.assertEqual((~marked['is_duplicate']).sum(), self.n_particles)
+        self.assertAlmostEqual(concentration['particles_per_ml'], self.n_particles / 2.0)
+
+    def test_summary_report_skips_duplicates(self):
+        marked = mark_slide_duplicates(self.particles, self.frames_dir)
+        report = StatisticalAnalyzer().generate_summary_report(marked, 'slide')
+        self.assertIn(f"Número total de partículas detectadas: {self.n_particles}", report)
+
+    def test_folder_without_layout(self):
+        os.remove(self.frames_dir / LAYOUT_FILENAME)
+        self.assertIsNone(mark_slide_duplicates(self.particles, self.frames_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()